@@ -0,0 +1,52 @@
+"""Checkpoint survey efficiency analyses
+
+Revision ID: a7d2e9f4c3b1
+Revises: f6c1d4e8b2a9
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "a7d2e9f4c3b1"
+down_revision = "f6c1d4e8b2a9"
+branch_labels = None
+depends_on = None
+
+TABLES = (
+    "survey_efficiency_for_observations",
+    "survey_efficiency_for_observation_plans",
+)
+
+
+def upgrade():
+    for table in TABLES:
+        op.add_column(
+            table,
+            sa.Column(
+                "injections_completed",
+                sa.Integer(),
+                server_default="0",
+                nullable=False,
+            ),
+        )
+    # analyses that already have light curves ran in one go
+    for table in TABLES:
+        op.execute(
+            f"""
+            UPDATE {table}
+            SET injections_completed = COALESCE(
+                payload->>'number_of_injections', payload->>'numberInjections'
+            )::int
+            WHERE lightcurves IS NOT NULL
+            AND (payload ? 'number_of_injections' OR payload ? 'numberInjections')
+            """
+        )
+
+
+def downgrade():
+    for table in TABLES:
+        op.drop_column(table, "injections_completed")
@@ -0,0 +1,52 @@
+"""Add photstat_rebuilds table
+
+Revision ID: b5e2c9d41f03
+Revises: a3d81c4f7b26
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "b5e2c9d41f03"
+down_revision = "a3d81c4f7b26"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "photstat_rebuilds",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("modified", sa.DateTime(), nullable=False),
+        sa.Column("status", sa.String(), server_default="pending", nullable=False),
+        sa.Column("chunk_size", sa.Integer(), server_default="1000", nullable=False),
+        sa.Column("last_obj_id", sa.String(), nullable=True),
+        sa.Column("num_total", sa.Integer(), nullable=True),
+        sa.Column("num_processed", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("started_at", sa.DateTime(), nullable=True),
+        sa.Column(
+            "num_processed_at_start",
+            sa.Integer(),
+            server_default="0",
+            nullable=False,
+        ),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+        sa.Column("error", sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    for column in ("created_at", "status"):
+        op.create_index(
+            op.f(f"ix_photstat_rebuilds_{column}"),
+            "photstat_rebuilds",
+            [column],
+            unique=False,
+        )
+
+
+def downgrade():
+    op.drop_table("photstat_rebuilds")
@@ -0,0 +1,52 @@
+"""Add localizationcredibleregions table
+
+Revision ID: c7a4e1f9d2b8
+Revises: b5e2c9d41f03
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "c7a4e1f9d2b8"
+down_revision = "b5e2c9d41f03"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing localizations get no rows; containment checks fall back to the
+    # cumulative-probability window over their tiles.
+    op.create_table(
+        "localizationcredibleregions",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("modified", sa.DateTime(), nullable=False),
+        sa.Column("localization_id", sa.Integer(), nullable=False),
+        sa.Column("level", sa.Float(), nullable=False),
+        sa.Column("healpix", postgresql.INT8MULTIRANGE(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["localization_id"], ["localizations.id"], ondelete="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("id", "localization_id", "level"),
+    )
+    op.create_index(
+        op.f("ix_localizationcredibleregions_created_at"),
+        "localizationcredibleregions",
+        ["created_at"],
+        unique=False,
+    )
+    op.create_index(
+        op.f("ix_localizationcredibleregions_localization_id"),
+        "localizationcredibleregions",
+        ["localization_id"],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_table("localizationcredibleregions")
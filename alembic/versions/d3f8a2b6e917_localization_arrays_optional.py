@@ -0,0 +1,49 @@
+"""Make localization uniq and probdensity nullable
+
+Revision ID: d3f8a2b6e917
+Revises: c7a4e1f9d2b8
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "d3f8a2b6e917"
+down_revision = "c7a4e1f9d2b8"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # With misc.localization_storage: file, the arrays are only kept in the
+    # localization's skymap file.
+    op.alter_column(
+        "localizations",
+        "uniq",
+        existing_type=sa.ARRAY(sa.BigInteger()),
+        nullable=True,
+    )
+    op.alter_column(
+        "localizations",
+        "probdensity",
+        existing_type=sa.ARRAY(sa.Float()),
+        nullable=True,
+    )
+
+
+def downgrade():
+    op.alter_column(
+        "localizations",
+        "probdensity",
+        existing_type=sa.ARRAY(sa.Float()),
+        nullable=False,
+    )
+    op.alter_column(
+        "localizations",
+        "uniq",
+        existing_type=sa.ARRAY(sa.BigInteger()),
+        nullable=False,
+    )
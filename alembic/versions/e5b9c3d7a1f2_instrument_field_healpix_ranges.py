@@ -0,0 +1,47 @@
+"""Store the HEALPix ranges of instrument fields
+
+Revision ID: e5b9c3d7a1f2
+Revises: d3f8a2b6e917
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e5b9c3d7a1f2"
+down_revision = "d3f8a2b6e917"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "instrumentfields",
+        sa.Column("healpix_ranges", sa.LargeBinary(), nullable=True),
+    )
+    # int8send is big-endian, the format of skyportal.utils.healpix_ranges
+    op.execute(
+        """
+        UPDATE instrumentfields
+        SET healpix_ranges = tiles.ranges
+        FROM (
+            SELECT
+                instrument_field_id,
+                string_agg(
+                    int8send(lower(healpix)) || int8send(upper(healpix)),
+                    ''::bytea
+                    ORDER BY lower(healpix)
+                ) AS ranges
+            FROM instrumentfieldtiles
+            GROUP BY instrument_field_id
+        ) AS tiles
+        WHERE instrumentfields.id = tiles.instrument_field_id
+        """
+    )
+
+
+def downgrade():
+    op.drop_column("instrumentfields", "healpix_ranges")
@@ -0,0 +1,48 @@
+"""Add instrument_field_uploads table
+
+Revision ID: f6c1d4e8b2a9
+Revises: e5b9c3d7a1f2
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "f6c1d4e8b2a9"
+down_revision = "e5b9c3d7a1f2"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "instrument_field_uploads",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("modified", sa.DateTime(), nullable=False),
+        sa.Column("instrument_id", sa.Integer(), nullable=False),
+        sa.Column("status", sa.String(), server_default="pending", nullable=False),
+        sa.Column("num_total", sa.Integer(), nullable=True),
+        sa.Column("num_processed", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("started_at", sa.DateTime(), nullable=True),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+        sa.Column("error", sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["instrument_id"], ["instruments.id"], ondelete="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    for column in ("created_at", "instrument_id"):
+        op.create_index(
+            op.f(f"ix_instrument_field_uploads_{column}"),
+            "instrument_field_uploads",
+            [column],
+            unique=False,
+        )
+
+
+def downgrade():
+    op.drop_table("instrument_field_uploads")
@@ -10,6 +10,12 @@ Process 0 runs every broker; higher-index processes run only providers whose
 ingestion is safe to replicate (a shared Kafka consumer group Kafka rebalances),
 so REST-polling providers are not duplicated.
 
+Within a process, a Kafka provider runs a worker pool (see
+`skyportal/broker_apis/_kafka.py::run_ingest_pipeline`): decode workers feed DB
+writers through a bounded queue. With `observability.enabled`, its lag, queue
+depth, alert rate and per-stage latency are exported for Prometheus on
+`brokers.metrics_port` + the process index.
+
 Enable with `brokers.ingest_enabled: true` in the config.
 """
 
@@ -23,6 +29,8 @@ from baselayer.app.env import load_env
 from baselayer.app.models import init_db
 from baselayer.log import make_log
 from skyportal.models import Broker
+from skyportal.utils.lookup_cache import listen_for_invalidations
+from skyportal.utils.observability import setup_service_metrics
 
 env, cfg = load_env()
 log = make_log("broker_ingest")
@@ -41,6 +49,10 @@ for _arg in sys.argv[1:]:
 # How often to re-scan the DB for newly-added / activated brokers.
 RESCAN_INTERVAL = 60  # seconds
 
+# Module-level reference so the lookup-cache invalidation task isn't
+# garbage-collected.
+_invalidation_listener = None
+
 
 async def _run_broker(broker):
     """Run one broker's ingestion loop, logging (not raising) on failure so a
@@ -74,7 +86,11 @@ async def _active_ingestion_brokers(session):
 
 
 async def _run_loop():
+    global _invalidation_listener
     running: dict[int, asyncio.Task] = {}
+    # Drop cached ingestion lookups (filters, streams, ...) when another process
+    # changes them; a no-op without Valkey, where the cache TTL applies instead.
+    _invalidation_listener = asyncio.create_task(listen_for_invalidations())
     while True:
         try:
             # Resolve on the baselayer module at call time: init_db() rebinds the
@@ -105,4 +121,10 @@ if __name__ == "__main__":
             time.sleep(3600)
     else:
         log(f"broker_ingest process {_PROCESS_INDEX} starting")
+        metrics_port = cfg.get("brokers.metrics_port")
+        setup_service_metrics(
+            cfg,
+            "broker_ingest",
+            port=None if metrics_port is None else int(metrics_port) + _PROCESS_INDEX,
+        )
         asyncio.run(_run_loop())
@@ -7,6 +7,7 @@ import uuid
 import lxml
 import sqlalchemy as sa
 import xmlschema
+from confluent_kafka import TopicPartition
 from gcn_kafka import Consumer
 
 from baselayer.app import models
@@ -29,6 +30,7 @@ from skyportal.utils.gcn import (
 )
 from skyportal.utils.notifications import post_notification
 from skyportal.utils.services import check_loaded
+from skyportal.utils.worker_pool import DedupWorkerPool, OffsetTracker
 
 env, cfg = load_env()
 
@@ -41,10 +43,17 @@ json_notice_types = cfg.get("gcn.notice_types.json", [])
 
 reject_tags = cfg.get("gcn.reject_tags", [])
 
+# Skymaps are downloaded and processed on a pool of threads, so that a slow
+# skymap does not delay the ingestion of the notices that follow it.
+skymap_workers = int(cfg.get("gcn.skymap_workers", 4))
+skymap_queue_size = int(cfg.get("gcn.skymap_queue_size", 32))
+
 log = make_log("gcnserver")
 
 user_id = 1
 
+skymap_pool = None
+
 
 def get_root_from_payload(payload):
     schema = (
@@ -63,6 +72,83 @@ def get_root_from_payload(payload):
     return root
 
 
+def get_skymap_pool():
+    global skymap_pool
+    if skymap_pool is None:
+        skymap_pool = DedupWorkerPool(
+            skymap_workers, skymap_queue_size, name="gcn_skymap"
+        )
+    return skymap_pool
+
+
+async def _ingest_skymap(dateobs, notice_id):
+    """Create the localization of a notice; returns whether a notification
+    was posted for it."""
+    async with models.async_plain_session_factory() as session:
+        user = await session.scalar(sa.select(User).where(User.id == user_id))
+        session.user_or_token = user
+        localization_id = await post_skymap_from_notice(
+            dateobs,
+            notice_id,
+            user_id,
+            session,
+            asynchronous=False,
+            notify=False,
+        )
+    request_body = {
+        "target_class_name": "Localization",
+        "target_id": localization_id,
+    }
+    return post_notification(request_body, timeout=30)
+
+
+def ingest_skymap(dateobs, notice_id, root, notice_type):
+    """Fetch and process the skymap of an ingested notice, then notify users
+    of the localization, or of the notice when there is none.
+
+    Runs on the skymap pool. A notice pointing at a skymap URL already being
+    ingested waits for that job, and is skipped if it succeeded (the
+    localization is the same), or ingests the skymap itself otherwise.
+    """
+    notified_on_skymap = False
+    status, metadata = get_skymap_metadata(root, notice_type, 15)
+    if status == "available":
+        key = metadata["url"]
+    else:
+        key = (dateobs, notice_id)
+
+    try:
+        with get_skymap_pool().claim(key) as claimed:
+            if not claimed:
+                log(
+                    f"Skymap {key} was ingested by another job, skipping it for gcn_event: {dateobs}, notice_id: {notice_id}"
+                )
+            elif status in ["available", "cone", "healpix_file"]:
+                log(
+                    f"Ingesting skymap for gcn_event: {dateobs}, notice_id: {notice_id}"
+                )
+                notified_on_skymap = asyncio.run(_ingest_skymap(dateobs, notice_id))
+            elif status == "unavailable":
+                log(
+                    f"No skymap available for gcn_event: {dateobs}, notice_id: {notice_id} with url: {metadata.get('url', None)}"
+                )
+            else:
+                log(
+                    f"No skymap available for gcn_event: {dateobs}, notice_id: {notice_id}"
+                )
+    except Exception as e:
+        log(
+            f"Failed to ingest skymap for gcn_event: {dateobs}, notice_id: {notice_id}: {e}"
+        )
+
+    if not notified_on_skymap:
+        request_body = {
+            "target_class_name": "GcnNotice",
+            "target_id": notice_id,
+        }
+        post_notification(request_body, timeout=30)
+
+
 def is_configured():
     if client_id is None or client_id == "":
         log("No client_id configured to poll gcn events (config: gcn.client_id")
@@ -110,12 +196,19 @@ def poll_events(*args, **kwargs):
     except Exception as e:
         log(f"Failed to subscribe to gcn events: {e}")
         return
+
+    def commit(key, offset):
+        try:
+            consumer.commit(offsets=[TopicPartition(*key, offset)], asynchronous=False)
+        except Exception as e:
+            log(f"Failed to commit offset {offset} of {key}: {e}")
+
+    offsets = OffsetTracker(commit)
     while True:
         try:
             for message in consumer.consume():
                 payload = message.value()
                 topic = message.topic()
-                consumer.commit(message)
 
                 if payload is None:
                     continue
@@ -123,210 +216,186 @@ def poll_events(*args, **kwargs):
                 if payload.find(b"Broker: Unknown topic or partition") != -1:
                     continue
 
-                # initialize some variables tht will be used later
-                notice_type = (
-                    str(topic)
-                    .replace("gcn.notices.", "")
-                    .replace("gcn.classic.voevent.", "")
-                )
-                root, tags, alert_type, dateobs, notice_id = (
-                    None,
-                    None,
-                    None,
-                    None,
-                    None,
-                )
-
-                if any(topic in notice_type for notice_type in voevent_notice_types):
-                    alert_type = "voevent"
-                    root = get_root_from_payload(payload)
-                    tags = get_tags(root, notice_type)
-                    # if the notice_type is svom.voevent.grm but there is no ra/dec/error radius
-                    # or if the error radius is negative, we reject the event
-                    if notice_type == "svom.voevent.grm":
-                        loc = root.find(
-                            "./WhereWhen/ObsDataLocation/ObservationLocation"
-                        )
-                        if loc is None:
-                            log(
-                                f"Rejecting gcn_event from {topic} due to missing location"
-                            )
-                            continue
-                        error = loc.find("./AstroCoords/Position2D/Error2Radius")
-                        if error is None:
-                            log(
-                                f"Rejecting gcn_event from {topic} due to missing error"
-                            )
-                            continue
-                        try:
-                            error = float(error.text)
-                            if error < 0:
-                                raise ValueError("error is negative")
-                        except ValueError:
-                            log(
-                                f"Rejecting gcn_event from {topic} due to invalid error: {error}"
-                            )
-                            continue
-
-                elif any(topic in notice_type for notice_type in json_notice_types):
-                    alert_type = "json"
-                    payload = json.loads(payload.decode("utf8"))
-                    if "igwn.gwalert" in notice_type:
-                        # LVK JSON alert (GCN Classic LVC VOEvents ceased in 2026):
-                        # normalize to the canonical JSON-notice shape.
-                        payload = from_igwn_gwalert(payload)
-                        notice_type = payload["notice_type"]
-                    else:
-                        payload["notice_type"] = notice_type
-                    tags = get_json_tags(payload)
-
-                    if payload["notice_type"] == "icecube.lvk_nu_track_search":
-                        # 2 sigma
-                        pval_bayesian = payload.get("pval_bayesian", 1)
-                        if (
-                            not isinstance(pval_bayesian, int | float)
-                            or pval_bayesian > 0.05
-                        ):
-                            log(
-                                f"Rejecting gcn_event from {topic} due to pval_bayesian: {pval_bayesian}"
-                            )
-                            continue
-
-                tags_intersection = list(set(tags).intersection(set(reject_tags)))
-                if len(tags_intersection) > 0:
-                    log(
-                        f"Rejecting gcn_event from {topic} due to tag(s): {tags_intersection}"
+                # the offset is committed once the notice, and its skymap
+                # if any, is ingested, so a restart picks up the notices whose
+                # skymap jobs were still queued or running
+                key, offset = (topic, message.partition()), message.offset()
+                offsets.start(key, offset)
+                skymap_job = None
+                try:
+                    # initialize some variables tht will be used later
+                    notice_type = (
+                        str(topic)
+                        .replace("gcn.notices.", "")
+                        .replace("gcn.classic.voevent.", "")
+                    )
+                    root, tags, alert_type, dateobs, notice_id = (
+                        None,
+                        None,
+                        None,
+                        None,
+                        None,
                     )
-                    continue
 
-                async def _ingest():
-                    dateobs, notice_id = None, None
-                    async with models.async_plain_session_factory() as session:
-                        # check if the user exists in the DB, assign to session
-                        user = await session.scalar(
-                            sa.select(User).where(User.id == user_id)
-                        )
-                        if user is None:
-                            log(
-                                f"User {user_id} not found in DB, cannot ingest gcn_event"
+                    if any(
+                        topic in notice_type for notice_type in voevent_notice_types
+                    ):
+                        alert_type = "voevent"
+                        root = get_root_from_payload(payload)
+                        tags = get_tags(root, notice_type)
+                        # if the notice_type is svom.voevent.grm but there is no ra/dec/error radius
+                        # or if the error radius is negative, we reject the event
+                        if notice_type == "svom.voevent.grm":
+                            loc = root.find(
+                                "./WhereWhen/ObsDataLocation/ObservationLocation"
                             )
-                            return
-                        session.user_or_token = user
-
-                        # skip ingesting a retraction if the event does not exist
-                        # (VOEvent path; JSON retractions are resolved by alias in
-                        # post_gcnevent_from_json).
-                        if alert_type == "voevent" and notice_type == "LVC_RETRACTION":
-                            dateobs = get_dateobs(root)
-                            trigger_id = get_trigger(root)
-                            existing_event = None
-                            if trigger_id is not None:
-                                existing_event = await session.scalar(
-                                    sa.select(GcnEvent).where(
-                                        GcnEvent.trigger_id == trigger_id
-                                    )
-                                )
-                            if existing_event is None and dateobs is not None:
-                                existing_event = await session.scalar(
-                                    sa.select(GcnEvent).where(
-                                        GcnEvent.dateobs == dateobs
-                                    )
+                            if loc is None:
+                                log(
+                                    f"Rejecting gcn_event from {topic} due to missing location"
                                 )
-                            if existing_event is None:
+                                continue
+                            error = loc.find("./AstroCoords/Position2D/Error2Radius")
+                            if error is None:
                                 log(
-                                    f"No event found to retract for gcn_event from {message.topic()}, skipping"
+                                    f"Rejecting gcn_event from {topic} due to missing error"
                                 )
-                                return
-
-                        # event ingestion
-                        log(f"Ingesting gcn_event from {message.topic()}")
-                        try:
-                            if alert_type == "voevent":
-                                (
-                                    dateobs,
-                                    _,
-                                    notice_id,
-                                ) = await post_gcnevent_from_xml(
-                                    payload,
-                                    user_id,
-                                    session,
-                                    notice_type=notice_type,
-                                    post_skymap=False,
-                                    asynchronous=False,
-                                    notify=False,
+                                continue
+                            try:
+                                error = float(error.text)
+                                if error < 0:
+                                    raise ValueError("error is negative")
+                            except ValueError:
+                                log(
+                                    f"Rejecting gcn_event from {topic} due to invalid error: {error}"
                                 )
-                            elif alert_type == "json":
-                                (
-                                    dateobs,
-                                    _,
-                                    notice_id,
-                                ) = await post_gcnevent_from_json(
-                                    payload,
-                                    user_id,
-                                    session,
-                                    post_skymap=False,
-                                    asynchronous=False,
-                                    notify=False,
+                                continue
+
+                    elif any(topic in notice_type for notice_type in json_notice_types):
+                        alert_type = "json"
+                        payload = json.loads(payload.decode("utf8"))
+                        if "igwn.gwalert" in notice_type:
+                            # LVK JSON alert (GCN Classic LVC VOEvents ceased in 2026):
+                            # normalize to the canonical JSON-notice shape.
+                            payload = from_igwn_gwalert(payload)
+                            notice_type = payload["notice_type"]
+                        else:
+                            payload["notice_type"] = notice_type
+                        tags = get_json_tags(payload)
+
+                        if payload["notice_type"] == "icecube.lvk_nu_track_search":
+                            # 2 sigma
+                            pval_bayesian = payload.get("pval_bayesian", 1)
+                            if (
+                                not isinstance(pval_bayesian, int | float)
+                                or pval_bayesian > 0.05
+                            ):
+                                log(
+                                    f"Rejecting gcn_event from {topic} due to pval_bayesian: {pval_bayesian}"
                                 )
-                        except Exception as e:
-                            traceback.print_exc()
-                            log(
-                                f"Failed to ingest gcn_event from {message.topic()}: {e}"
-                            )
-                            return
+                                continue
 
-                        notified_on_skymap = False
-                        status, metadata = None, None
-                        if alert_type == "voevent":
-                            status, metadata = get_skymap_metadata(
-                                root, notice_type, 15
-                            )
-                        elif alert_type == "json":
-                            status, metadata = get_skymap_metadata(
-                                payload, notice_type, 15
+                    tags_intersection = list(set(tags).intersection(set(reject_tags)))
+                    if len(tags_intersection) > 0:
+                        log(
+                            f"Rejecting gcn_event from {topic} due to tag(s): {tags_intersection}"
+                        )
+                        continue
+
+                    async def _ingest():
+                        dateobs, notice_id = None, None
+                        async with models.async_plain_session_factory() as session:
+                            # check if the user exists in the DB, assign to session
+                            user = await session.scalar(
+                                sa.select(User).where(User.id == user_id)
                             )
+                            if user is None:
+                                log(
+                                    f"User {user_id} not found in DB, cannot ingest gcn_event"
+                                )
+                                return
+                            session.user_or_token = user
+
+                            # skip ingesting a retraction if the event does not exist
+                            # (VOEvent path; JSON retractions are resolved by alias in
+                            # post_gcnevent_from_json).
+                            if (
+                                alert_type == "voevent"
+                                and notice_type == "LVC_RETRACTION"
+                            ):
+                                dateobs = get_dateobs(root)
+                                trigger_id = get_trigger(root)
+                                existing_event = None
+                                if trigger_id is not None:
+                                    existing_event = await session.scalar(
+                                        sa.select(GcnEvent).where(
+                                            GcnEvent.trigger_id == trigger_id
+                                        )
+                                    )
+                                if existing_event is None and dateobs is not None:
+                                    existing_event = await session.scalar(
+                                        sa.select(GcnEvent).where(
+                                            GcnEvent.dateobs == dateobs
+                                        )
+                                    )
+                                if existing_event is None:
+                                    log(
+                                        f"No event found to retract for gcn_event from {message.topic()}, skipping"
+                                    )
+                                    return
 
-                        if status in ["available", "cone", "healpix_file"]:
-                            log(
-                                f"Ingesting skymap for gcn_event: {dateobs}, notice_id: {notice_id}"
-                            )
+                            # event ingestion
+                            log(f"Ingesting gcn_event from {message.topic()}")
                             try:
-                                localization_id = await post_skymap_from_notice(
-                                    dateobs,
-                                    notice_id,
-                                    user_id,
-                                    session,
-                                    asynchronous=False,
-                                    notify=False,
-                                )
-                                request_body = {
-                                    "target_class_name": "Localization",
-                                    "target_id": localization_id,
-                                }
-                                notified_on_skymap = post_notification(
-                                    request_body, timeout=30
-                                )
+                                if alert_type == "voevent":
+                                    (
+                                        dateobs,
+                                        _,
+                                        notice_id,
+                                    ) = await post_gcnevent_from_xml(
+                                        payload,
+                                        user_id,
+                                        session,
+                                        notice_type=notice_type,
+                                        post_skymap=False,
+                                        asynchronous=False,
+                                        notify=False,
+                                    )
+                                elif alert_type == "json":
+                                    (
+                                        dateobs,
+                                        _,
+                                        notice_id,
+                                    ) = await post_gcnevent_from_json(
+                                        payload,
+                                        user_id,
+                                        session,
+                                        post_skymap=False,
+                                        asynchronous=False,
+                                        notify=False,
+                                    )
                             except Exception as e:
+                                traceback.print_exc()
                                 log(
-                                    f"Failed to ingest skymap for gcn_event: {dateobs}, notice_id: {notice_id}: {e}"
+                                    f"Failed to ingest gcn_event from {message.topic()}: {e}"
                                 )
-                        elif status == "unavailable":
-                            log(
-                                f"No skymap available for gcn_event: {dateobs}, notice_id: {notice_id} with url: {metadata.get('url', None)}"
-                            )
-                        else:
-                            log(
-                                f"No skymap available for gcn_event: {dateobs}, notice_id: {notice_id}"
-                            )
+                                return
 
-                        if not notified_on_skymap:
-                            request_body = {
-                                "target_class_name": "GcnNotice",
-                                "target_id": notice_id,
-                            }
-                            post_notification(request_body, timeout=30)
+                        # the skymap (and the notification) is handled on the
+                        # pool, while the next notices are ingested
+                        return get_skymap_pool().submit(
+                            ingest_skymap,
+                            dateobs,
+                            notice_id,
+                            root if alert_type == "voevent" else payload,
+                            notice_type,
+                        )
 
-                asyncio.run(_ingest())
+                    skymap_job = asyncio.run(_ingest())
+                finally:
+                    if skymap_job is None:
+                        offsets.finish(key, offset)
+                    else:
+                        offsets.finish_when_done(skymap_job, key, offset)
 
         except Exception as e:
             traceback.print_exc()
@@ -2,6 +2,8 @@ import asyncio
 import itertools
 import time
 import traceback
+from concurrent.futures import FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
 
 import arrow
 import sqlalchemy as sa
@@ -21,6 +23,12 @@ from skyportal.models import (
     EventObservationPlan,
     ObservationPlanRequest,
 )
+from skyportal.utils.observation_plan_pool import (
+    create_pool,
+    num_workers,
+    record_duration,
+    submit_plan_requests,
+)
 from skyportal.utils.services import check_loaded
 
 env, cfg = load_env()
@@ -175,225 +183,247 @@ def prioritize_requests(requests):
         return 0
 
 
-@check_loaded(logger=log)
-def service(*args, **kwargs):
-    log("Starting observation plan queue.")
-    while True:
+def claim_requests(in_flight_rids):
+    """Pick the most urgent plan request (or combined group of requests) not
+    already being generated; returns its request IDs and event dateobs, or
+    None if there is nothing to do."""
+    with DBSession() as session:
+        set_statement_timeout(session)
+        stmt = sa.select(ObservationPlanRequest).where(
+            # we only want to process plans that have been created in the last 72 hours
+            sa.or_(
+                sa.and_(
+                    ObservationPlanRequest.status == "pending submission",
+                    ObservationPlanRequest.created_at
+                    > arrow.utcnow().shift(days=-3).datetime,
+                ),
+                # or plans that have been "running" for more than 5 minutes but less than 1 hours
+                # this is a way to grab plans that have been stuck in the running state
+                # and have not been processed
+                sa.and_(
+                    ObservationPlanRequest.status == "running",
+                    ObservationPlanRequest.created_at
+                    < arrow.utcnow().shift(minutes=-5).datetime,
+                    ObservationPlanRequest.created_at
+                    > arrow.utcnow().shift(hours=-1).datetime,
+                ),
+            )
+        )
+        if in_flight_rids:
+            # plans being generated by the pool are "running" legitimately
+            stmt = stmt.where(ObservationPlanRequest.id.notin_(in_flight_rids))
+        single_requests = session.scalars(stmt).unique().all()
+
+        # reprocessing plans that were marked as running before (and probably stuck in that state)
+        # is lower priority, so if we have any pending submission plans, we prioritize those
+        # and remove the running plans from the list
+        if any(request.status == "pending submission" for request in single_requests):
+            single_requests = [
+                request
+                for request in single_requests
+                if request.status == "pending submission"
+            ]
+
+        # requests is a list. We want to group that list of plans to be a list of list,
+        # we group based on the plans 'combined_id' which is a unique uuid for a group of plans
+        # plans that are not grouped simply don't have one
+        combined_requests = [
+            request for request in single_requests if request.combined_id is not None
+        ]
+        requests = [
+            list(group)
+            for _, group in itertools.groupby(
+                combined_requests, lambda x: x.combined_id
+            )
+        ] + [[request] for request in single_requests if request.combined_id is None]
+
+        if len(requests) == 0:
+            return None
+
+        log(f"Prioritizing {len(requests)} observation plan requests...")
+
+        index = prioritize_requests(requests)
+
+        plan_requests = requests[index]
+        # snapshot the ids and dateobs now so nothing lazy-loads after the
+        # session closes.
+        rids = [pr.id for pr in plan_requests]
+        dateobs_list = list({pr.gcnevent.dateobs for pr in plan_requests})
+    return rids, dateobs_list
+
+
+def complete_plans(rids, dateobs_list, plan_ids):
+    """Mark generated plans complete, refresh the frontend, and run the
+    auto-send and survey efficiency analyses of default plans."""
+    # submit committed the status on its own session, so re-fetch
+    # (populate_existing) and advance running -> complete, then push the
+    # frontend refresh.
+    with DBSession() as session:
+        set_statement_timeout(session)
+        for rid in rids:
+            plan_request = session.scalar(
+                sa.select(ObservationPlanRequest)
+                .where(ObservationPlanRequest.id == rid)
+                .execution_options(populate_existing=True)
+            )
+            if plan_request is None:
+                continue
+            log(f"Plan {rid} status: {plan_request.status}")
+            if plan_request.status == "running":
+                plan_request.status = "complete"
+        session.commit()
+
+    try:
+        flow = Flow()
+        for dateobs in dateobs_list:
+            flow.push(
+                "*",
+                "skyportal/REFRESH_GCNEVENT_OBSERVATION_PLAN_REQUESTS",
+                payload={"gcnEvent_dateobs": dateobs},
+            )
+    except Exception as e:
+        log(f"Error refreshing observation plan requests on the frontend: {e}")
+
+    log(f"Generated plans: {plan_ids}")
+
+    # Per-plan post-processing (auto-send + survey efficiency): snapshot in a
+    # short txn, then run the async calls with no txn.
+    for id in plan_ids:
         try:
-            # 1. Read/claim (short txn): pick the plan(s) to process and snapshot
-            # everything the slow submit + later refresh need, then release the
-            # connection before submit() so we don't sit idle-in-transaction.
             with DBSession() as session:
                 set_statement_timeout(session)
-                stmt = sa.select(ObservationPlanRequest).where(
-                    # we only want to process plans that have been created in the last 72 hours
-                    sa.or_(
-                        sa.and_(
-                            ObservationPlanRequest.status == "pending submission",
-                            ObservationPlanRequest.created_at
-                            > arrow.utcnow().shift(days=-3).datetime,
-                        ),
-                        # or plans that have been "running" for more than 5 minutes but less than 1 hours
-                        # this is a way to grab plans that have been stuck in the running state
-                        # and have not been processed
-                        sa.and_(
-                            ObservationPlanRequest.status == "running",
-                            ObservationPlanRequest.created_at
-                            < arrow.utcnow().shift(minutes=-5).datetime,
-                            ObservationPlanRequest.created_at
-                            > arrow.utcnow().shift(hours=-1).datetime,
-                        ),
+                plan = session.scalars(
+                    sa.select(EventObservationPlan).where(
+                        EventObservationPlan.id == int(id)
                     )
-                )
-                single_requests = session.scalars(stmt).unique().all()
-
-                # reprocessing plans that were marked as running before (and probably stuck in that state)
-                # is lower priority, so if we have any pending submission plans, we prioritize those
-                # and remove the running plans from the list
-                if any(
-                    request.status == "pending submission"
-                    for request in single_requests
-                ):
-                    single_requests = [
-                        request
-                        for request in single_requests
-                        if request.status == "pending submission"
-                    ]
-
-                # requests is a list. We want to group that list of plans to be a list of list,
-                # we group based on the plans 'combined_id' which is a unique uuid for a group of plans
-                # plans that are not grouped simply don't have one
-                combined_requests = [
-                    request
-                    for request in single_requests
-                    if request.combined_id is not None
-                ]
-                requests = [
-                    list(group)
-                    for _, group in itertools.groupby(
-                        combined_requests, lambda x: x.combined_id
+                ).first()
+                if plan is None:
+                    continue
+                default = plan.observation_plan_request.payload.get("default", None)
+                if default is None:
+                    continue
+                defaultobsplanrequest = session.scalars(
+                    sa.select(DefaultObservationPlanRequest).where(
+                        DefaultObservationPlanRequest.id == int(default)
                     )
-                ] + [
-                    [request]
-                    for request in single_requests
-                    if request.combined_id is None
-                ]
-
-                if len(requests) == 0:
-                    time.sleep(5)
+                ).first()
+                if defaultobsplanrequest is None:
                     continue
+                obsplan_request_id = plan.observation_plan_request.id
+                auto_send = defaultobsplanrequest.auto_send
+                survey_eff_data_list = [
+                    se.to_dict()
+                    for se in defaultobsplanrequest.default_survey_efficiencies
+                ]
 
-                log(f"Prioritizing {len(requests)} observation plan requests...")
-
-                index = prioritize_requests(requests)
+            if auto_send:
+                # bridge to the async impl on a fresh async session
+                async def _send(rid=obsplan_request_id, default=default):
+                    async with models.async_plain_session_factory() as s:
+                        await send_observation_plan(
+                            rid,
+                            s,
+                            auto_send=True,
+                            default_obsplan_id=default,
+                        )
 
-                plan_requests = requests[index]
-                is_combined = len(plan_requests) > 1
-                # api_class_obsplan is a class ref (safe to hold detached); snapshot
-                # the ids and dateobs now so nothing lazy-loads after the session closes.
-                api = plan_requests[0].allocation.instrument.api_class_obsplan
-                rids = [pr.id for pr in plan_requests]
-                dateobs_list = list({pr.gcnevent.dateobs for pr in plan_requests})
+                asyncio.run(_send())
 
-            # 2. Slow work (no txn open): submit runs on its own async session.
-            try:
-                if is_combined:
+            for survey_eff_data in survey_eff_data_list:
+                try:
 
-                    async def _submit_multiple(api=api, rids=rids):
+                    async def _post_eff(
+                        data=survey_eff_data,
+                        rid=obsplan_request_id,
+                    ):
                         async with models.async_plain_session_factory() as s:
-                            return await api.submit_multiple(
-                                rids, s, asynchronous=False
+                            await post_survey_efficiency_analysis(
+                                data,
+                                rid,
+                                1,
+                                s,
+                                asynchronous=False,
                             )
 
-                    plan_ids = asyncio.run(_submit_multiple())
-                else:
-
-                    async def _submit(api=api, rid=rids[0]):
-                        async with models.async_plain_session_factory() as s:
-                            return await api.submit(rid, s, asynchronous=False)
+                    asyncio.run(_post_eff())
+                except Exception as e:
+                    if "Need at least one observation to evaluate efficiency" in str(e):
+                        log(
+                            f"Error processing default survey efficiency for plan {id}: {e}"
+                        )
+                    else:
+                        raise e
+        except Exception as e:
+            traceback.print_exc()
+            log(
+                f"Error occured processing default queue submission or survey efficiency for plan {id}: {e}"
+            )
+            time.sleep(2)
 
-                    plan_ids = [asyncio.run(_submit())]
-            except Exception as e:
-                traceback.print_exc()
-                if is_combined:
-                    log(f"Error processing combined plans: {rids}: {str(e)}")
-                else:
-                    log(
-                        f"Error processing observation plan: {e.args[0] if e.args else e}"
-                    )
-                mark_failed(rids)
-                time.sleep(2)
-                continue
 
-            # 3. Short write txn: submit committed the status on its own session,
-            # so re-fetch (populate_existing) and advance running -> complete, then
-            # push the frontend refresh.
-            with DBSession() as session:
-                set_statement_timeout(session)
-                for rid in rids:
-                    plan_request = session.scalar(
-                        sa.select(ObservationPlanRequest)
-                        .where(ObservationPlanRequest.id == rid)
-                        .execution_options(populate_existing=True)
-                    )
-                    if plan_request is None:
-                        continue
-                    log(f"Plan {rid} status: {plan_request.status}")
-                    if plan_request.status == "running":
-                        plan_request.status = "complete"
-                session.commit()
-
-            try:
-                flow = Flow()
-                for dateobs in dateobs_list:
-                    flow.push(
-                        "*",
-                        "skyportal/REFRESH_GCNEVENT_OBSERVATION_PLAN_REQUESTS",
-                        payload={"gcnEvent_dateobs": dateobs},
-                    )
-            except Exception as e:
-                log(f"Error refreshing observation plan requests on the frontend: {e}")
+def collect(in_flight, timeout):
+    """Wait up to ``timeout`` seconds for plans being generated, and finish
+    those that are done."""
+    if not in_flight:
+        return
+    done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+    for future in done:
+        rids, dateobs_list = in_flight.pop(future)
+        try:
+            plan_ids, instrument_names, seconds = future.result()
+        except Exception as e:
+            traceback.print_exc()
+            if len(rids) > 1:
+                log(f"Error processing combined plans: {rids}: {str(e)}")
+            else:
+                log(f"Error processing observation plan: {e.args[0] if e.args else e}")
+            mark_failed(rids)
+            continue
+        record_duration(instrument_names, seconds)
+        log(
+            f"Plan request(s) {rids} ({', '.join(instrument_names)}) took {seconds:.1f}s"
+        )
+        try:
+            complete_plans(rids, dateobs_list, plan_ids)
+        except Exception as e:
+            traceback.print_exc()
+            log(f"Error completing observation plans {plan_ids}: {e}")
 
-            log(f"Generated plans: {plan_ids}")
 
-            # 4. Per-plan post-processing (auto-send + survey efficiency). Same
-            # split: snapshot in a short txn, then run the async calls with no txn.
-            for id in plan_ids:
+@check_loaded(logger=log)
+def service(*args, **kwargs):
+    max_workers = num_workers()
+    log(f"Starting observation plan queue with {max_workers} workers.")
+    pool = create_pool(max_workers)
+    # future -> (request ids, event dateobs) of the plans being generated
+    in_flight = {}
+    while True:
+        try:
+            # 1. Finish the plans the workers are done with.
+            collect(in_flight, timeout=0)
+
+            # 2. Hand the most urgent independent requests to free workers.
+            # Each worker submits on its own sessions; the slow plan
+            # generation runs there, without a transaction open here.
+            while len(in_flight) < max_workers:
+                in_flight_rids = [rid for rids, _ in in_flight.values() for rid in rids]
+                claimed = claim_requests(in_flight_rids)
+                if claimed is None:
+                    break
+                rids, dateobs_list = claimed
                 try:
-                    with DBSession() as session:
-                        set_statement_timeout(session)
-                        plan = session.scalars(
-                            sa.select(EventObservationPlan).where(
-                                EventObservationPlan.id == int(id)
-                            )
-                        ).first()
-                        if plan is None:
-                            continue
-                        default = plan.observation_plan_request.payload.get(
-                            "default", None
-                        )
-                        if default is None:
-                            continue
-                        defaultobsplanrequest = session.scalars(
-                            sa.select(DefaultObservationPlanRequest).where(
-                                DefaultObservationPlanRequest.id == int(default)
-                            )
-                        ).first()
-                        if defaultobsplanrequest is None:
-                            continue
-                        obsplan_request_id = plan.observation_plan_request.id
-                        auto_send = defaultobsplanrequest.auto_send
-                        survey_eff_data_list = [
-                            se.to_dict()
-                            for se in defaultobsplanrequest.default_survey_efficiencies
-                        ]
-
-                    if auto_send:
-                        # bridge to the async impl on a fresh async session
-                        async def _send(rid=obsplan_request_id, default=default):
-                            async with models.async_plain_session_factory() as s:
-                                await send_observation_plan(
-                                    rid,
-                                    s,
-                                    auto_send=True,
-                                    default_obsplan_id=default,
-                                )
-
-                        asyncio.run(_send())
-
-                    for survey_eff_data in survey_eff_data_list:
-                        try:
-
-                            async def _post_eff(
-                                data=survey_eff_data,
-                                rid=obsplan_request_id,
-                            ):
-                                async with models.async_plain_session_factory() as s:
-                                    await post_survey_efficiency_analysis(
-                                        data,
-                                        rid,
-                                        1,
-                                        s,
-                                        asynchronous=False,
-                                    )
-
-                            asyncio.run(_post_eff())
-                        except Exception as e:
-                            if (
-                                "Need at least one observation to evaluate efficiency"
-                                in str(e)
-                            ):
-                                log(
-                                    f"Error processing default survey efficiency for plan {id}: {e}"
-                                )
-                            else:
-                                raise e
-                except Exception as e:
-                    traceback.print_exc()
-                    log(
-                        f"Error occured processing default queue submission or survey efficiency for plan {id}: {e}"
-                    )
-                    time.sleep(2)
+                    future = pool.submit(submit_plan_requests, rids)
+                except BrokenProcessPool as e:
+                    log(f"Observation plan pool broken ({e}), restarting it")
+                    pool = create_pool(max_workers)
+                    future = pool.submit(submit_plan_requests, rids)
+                in_flight[future] = (rids, dateobs_list)
+
+            # 3. Wait for a plan to finish, or for new requests.
+            if in_flight:
+                collect(in_flight, timeout=5)
+            else:
+                time.sleep(5)
 
         except Exception as e:
             log(f"Error occured processing the observation plan queue: {e}")
@@ -0,0 +1,44 @@
+"""Runner for background PhotStat rebuilds.
+
+All the logic lives in ``skyportal.utils.phot_stat_rebuild`` so it can be
+imported and tested without this module's ``init_db`` rebinding the session.
+This file only reads configuration and drives the loop.
+"""
+
+import asyncio
+import time
+import traceback
+
+from baselayer.app.env import load_env
+from baselayer.app.models import init_db
+from baselayer.log import make_log
+from skyportal.utils.phot_stat_rebuild import DEFAULT_NUM_WORKERS, run_pending
+from skyportal.utils.services import check_loaded
+
+env, cfg = load_env()
+
+init_db(**cfg["database"])
+
+log = make_log("phot_stat_rebuild")
+
+
+@check_loaded(logger=log)
+def service(*args, **kwargs):
+    config = cfg.get("phot_stat_rebuild", {}) or {}
+    interval = float(config.get("poll_interval", 30))
+    num_workers = int(config.get("num_workers", DEFAULT_NUM_WORKERS))
+
+    while True:
+        try:
+            asyncio.run(run_pending(num_workers=num_workers))
+        except Exception as e:
+            traceback.print_exc()
+            log(f"PhotStat rebuild failed: {e}")
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    try:
+        service()
+    except Exception as e:
+        log(f"Error: {e}")
@@ -0,0 +1,77 @@
+"""Runner for survey efficiency analyses of executed observations.
+
+All the logic lives in ``skyportal.utils.survey_efficiency`` so it can be
+imported and tested without this module's ``init_db`` rebinding the session.
+This file only reads configuration and drives the loop.
+"""
+
+import time
+import traceback
+from concurrent.futures.process import BrokenProcessPool
+
+from baselayer.app.env import load_env
+from baselayer.app.models import init_db
+from baselayer.log import make_log
+from skyportal.utils.services import check_loaded
+from skyportal.utils.survey_efficiency import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_NUM_WORKERS,
+    claim_analysis,
+    create_pool,
+    interrupted_analyses,
+    mark_failed,
+    run_analysis,
+)
+
+env, cfg = load_env()
+
+init_db(**cfg["database"])
+
+log = make_log("survey_efficiency_queue")
+
+
+@check_loaded(logger=log)
+def service(*args, **kwargs):
+    config = cfg.get("survey_efficiency", {}) or {}
+    interval = float(config.get("poll_interval", 10))
+    num_workers = max(int(config.get("num_workers", DEFAULT_NUM_WORKERS)), 1)
+    batch_size = int(config.get("batch_size", DEFAULT_BATCH_SIZE))
+
+    pool = create_pool(num_workers)
+    # analyses a restart interrupted resume from their last checkpoint
+    queue = list(interrupted_analyses())
+    if queue:
+        log(f"Resuming survey efficiency analyses {queue}")
+
+    while True:
+        try:
+            analysis_id = queue.pop(0) if queue else claim_analysis()
+        except Exception as e:
+            log(f"Error claiming a survey efficiency analysis: {e}")
+            time.sleep(interval)
+            continue
+        if analysis_id is None:
+            time.sleep(interval)
+            continue
+
+        try:
+            run_analysis(pool, analysis_id, num_workers, batch_size)
+        except BrokenProcessPool as e:
+            log(f"Worker process died running analysis {analysis_id}, restarting")
+            mark_failed(analysis_id, e)
+            pool.shutdown(wait=False, cancel_futures=True)
+            pool = create_pool(num_workers)
+        except Exception as e:
+            traceback.print_exc()
+            log(f"Unable to complete survey efficiency analysis {analysis_id}: {e}")
+            try:
+                mark_failed(analysis_id, e)
+            except Exception as error:
+                log(f"Error marking survey efficiency analysis as failed: {error}")
+
+
+if __name__ == "__main__":
+    try:
+        service()
+    except Exception as e:
+        log(f"Error: {e}")
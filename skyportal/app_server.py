@@ -102,6 +102,7 @@ from skyportal.handlers.api import (
     GroupUsersFromOtherGroupsHandler,
     HealpixUpdateHandler,
     InstrumentFieldHandler,
+    InstrumentFieldUploadHandler,
     InstrumentHandler,
     InstrumentLogExternalAPIHandler,
     InstrumentLogHandler,
@@ -167,6 +168,7 @@ from skyportal.handlers.api import (
     PhotometryValidationHandler,
     PhotStatAggregateHandler,
     PhotStatHandler,
+    PhotStatRebuildHandler,
     PhotStatUpdateHandler,
     PS1QueryHandler,
     PublicGroupHandler,
@@ -438,6 +440,7 @@ skyportal_handlers = [
     (r"/api/sources/([0-9A-Za-z-_\.\+]+)/phot_stat", PhotStatHandler),
     (r"/api/phot_stats", PhotStatUpdateHandler),
     (r"/api/phot_stats/aggregate", PhotStatAggregateHandler),
+    (r"/api/phot_stats/rebuild(/[0-9]+)?", PhotStatRebuildHandler),
     (r"/api/localization/tags", LocalizationTagsHandler),
     (r"/api/localization/properties", LocalizationPropertiesHandler),
     (r"/api/localization(/.*)/name(/.*)/download", LocalizationDownloadHandler),
@@ -457,6 +460,10 @@ skyportal_handlers = [
     (r"/api/mmadetector/time_intervals(/[0-9]+)?", MMADetectorTimeIntervalHandler),
     (r"/api/listing(/[0-9]+)?", UserObjListHandler),
     (r"/api/group_admission_requests(/[0-9]+)?", GroupAdmissionRequestHandler),
+    (
+        r"/api/instrument(/[0-9]+)/fields/upload(/[0-9]+)?",
+        InstrumentFieldUploadHandler,
+    ),
     (r"/api/instrument(/[0-9]+)/fields", InstrumentFieldHandler),
     (r"/api/instrument(/[0-9]+)/log", InstrumentLogHandler),
     (r"/api/instrument(/[0-9]+)/external_api", InstrumentLogExternalAPIHandler),
@@ -1,3 +1,6 @@
+# Imported for its side effect of registering the ingestion lookup caches, so
+# every process that writes Filters/Streams/Instruments publishes invalidations.
+from . import _save  # noqa: F401
 from .alerce import ALERCEBROKER
 from .ampel import AMPELBROKER
 from .antares import ANTARESBROKER
@@ -2,9 +2,14 @@
 
 Every Kafka-based provider (babamul, BOOM, ...) builds the same consumer config
 from a broker's ``altdata['kafka']`` block and decodes Avro the same way; keep it
-here rather than re-deriving it per provider.
+here rather than re-deriving it per provider. ``run_ingest_pipeline`` is the
+shared decode-worker / DB-writer pool a provider's ``run_ingestion`` can run on.
 """
 
+from baselayer.log import make_log
+
+log = make_log("broker/kafka")
+
 
 def kafka_consumer_config(kafka, default_group):
     """Build a confluent_kafka Consumer config from an ``altdata['kafka']`` block
@@ -36,3 +41,238 @@ def read_avro(value):
     for record in fastavro.reader(io.BytesIO(value)):
         return record
     return None
+
+
+class _IngestMetrics:
+    """OpenTelemetry instruments for one Kafka ingestion pipeline.
+
+    Every measurement carries the ``broker`` attribute so several brokers in
+    one process stay distinguishable. Recording is a no-op unless the process
+    configured a meter provider (see ``utils/observability.py``).
+    """
+
+    def __init__(self, broker_name):
+        from ..utils.observability import get_meter
+
+        meter = get_meter("skyportal.broker_ingest")
+        self.attributes = {"broker": broker_name}
+        self.alerts = meter.create_counter(
+            "broker_ingest.alerts",
+            unit="{alert}",
+            description="Alerts written to the database (rate() gives alerts/s).",
+        )
+        self.stage_duration = meter.create_histogram(
+            "broker_ingest.stage.duration",
+            unit="ms",
+            description="Time spent per pipeline stage: consume (Kafka fetch), "
+            "decode, queue (waiting for a writer) and write (DB ingest).",
+        )
+        self.queue_depth = meter.create_up_down_counter(
+            "broker_ingest.queue.depth",
+            unit="{batch}",
+            description="Decoded batches waiting for a DB writer.",
+        )
+        self.lag = meter.create_gauge(
+            "broker_ingest.consumer.lag",
+            unit="{message}",
+            description="Messages between a partition's high watermark and the "
+            "consumer position.",
+        )
+
+    def stage(self, stage, started):
+        """Record the time since ``started`` (a ``time.perf_counter()``)."""
+        import time
+
+        self.stage_duration.record(
+            (time.perf_counter() - started) * 1000,
+            {**self.attributes, "stage": stage},
+        )
+
+    def record_lag(self, consumer):
+        """Record each assigned partition's lag from the locally cached
+        watermarks (no broker round trip)."""
+        try:
+            for tp in consumer.position(consumer.assignment()):
+                if tp.offset < 0:  # no position yet
+                    continue
+                _, high = consumer.get_watermark_offsets(tp, cached=True)
+                if high >= 0:
+                    self.lag.set(
+                        high - tp.offset,
+                        {
+                            **self.attributes,
+                            "topic": tp.topic,
+                            "partition": tp.partition,
+                        },
+                    )
+        except Exception as e:
+            log(f"could not read consumer lag: {e}")
+
+
+def _consume_and_decode(consumer, num_messages, timeout, decode, metrics):
+    """Fetch up to ``num_messages`` and decode them, in a worker thread.
+
+    Returns ``(items, offsets)``: the non-None ``decode(value)`` results and the
+    next offset to commit per (topic, partition) for every message fetched.
+    """
+    import time
+
+    from confluent_kafka import KafkaError
+
+    started = time.perf_counter()
+    msgs = consumer.consume(num_messages, timeout)
+    metrics.stage("consume", started)
+    if not msgs:
+        return [], {}
+
+    started = time.perf_counter()
+    items, offsets = [], {}
+    for msg in msgs:
+        if msg.error():
+            if msg.error().code() != KafkaError._PARTITION_EOF:
+                log(f"Kafka error: {msg.error()}")
+            continue
+        offsets[(msg.topic(), msg.partition())] = msg.offset() + 1
+        try:
+            item = decode(msg.value())
+        except Exception as e:
+            log(f"Failed to decode message at {msg.topic()}:{msg.offset()}: {e}")
+            continue
+        if item is not None:
+            items.append(item)
+    metrics.stage("decode", started)
+    metrics.record_lag(consumer)
+    return items, offsets
+
+
+def _commit(consumer, offsets):
+    from confluent_kafka import TopicPartition
+
+    consumer.commit(
+        offsets=[TopicPartition(t, p, o) for (t, p), o in offsets.items()],
+        asynchronous=False,
+    )
+
+
+async def run_ingest_pipeline(
+    make_consumer,
+    decode,
+    write,
+    *,
+    broker_name,
+    num_consumers=1,
+    num_writers=1,
+    queue_size=None,
+    batch_size=100,
+    linger=2.0,
+    stop=None,
+    max_messages=None,
+):
+    """Run a Kafka ingestion worker pool until ``stop`` is set (or
+    ``max_messages`` have been decoded). Returns the number of items decoded.
+
+    ``num_consumers`` decode workers each own a Kafka consumer (from
+    ``make_consumer()``, already subscribed, auto-commit off): they fetch
+    micro-batches of up to ``batch_size`` messages (waiting at most ``linger``
+    seconds) and ``decode`` them off the event loop. Decoded batches go through
+    a bounded queue (``queue_size`` batches, default ``2 * num_writers``) to
+    ``num_writers`` coroutines that await ``write(items)``. A full queue blocks
+    the decoders, so Kafka fetching never outruns the database.
+
+    Offsets are committed per consumer in fetch order, and only once every
+    earlier batch of that consumer has been written. If ``write`` raises, the
+    pipeline stops without committing that batch, so it is redelivered on
+    restart.
+    """
+    import asyncio
+    import collections
+    import time
+
+    metrics = _IngestMetrics(broker_name)
+    queue = asyncio.Queue(maxsize=queue_size or 2 * num_writers)
+    decoded = {"count": 0}
+
+    def done():
+        return (stop is not None and stop.is_set()) or (
+            max_messages is not None and decoded["count"] >= max_messages
+        )
+
+    async def commit_written(consumer, pending, wait=False):
+        # Commit the longest written prefix of this consumer's batches.
+        while pending and (wait or pending[0][0].done()):
+            written, offsets = pending.popleft()
+            await written  # re-raises a writer failure: stop, don't commit
+            if offsets:
+                await asyncio.to_thread(_commit, consumer, offsets)
+
+    async def decoder():
+        consumer = make_consumer()
+        pending = collections.deque()
+        fetch = None
+        try:
+            while not done():
+                num_messages = batch_size
+                if max_messages is not None:
+                    num_messages = min(num_messages, max_messages - decoded["count"])
+                # Shielded: a cancelled decoder must not close the consumer
+                # while its thread is still inside consume().
+                fetch = asyncio.ensure_future(
+                    asyncio.to_thread(
+                        _consume_and_decode,
+                        consumer,
+                        num_messages,
+                        linger,
+                        decode,
+                        metrics,
+                    )
+                )
+                items, offsets = await asyncio.shield(fetch)
+                fetch = None
+                if offsets:
+                    decoded["count"] += len(items)
+                    written = asyncio.get_running_loop().create_future()
+                    pending.append((written, offsets))
+                    await queue.put((items, written, time.perf_counter()))
+                    metrics.queue_depth.add(1, metrics.attributes)
+                await commit_written(consumer, pending)
+            await commit_written(consumer, pending, wait=True)
+        finally:
+            if fetch is not None:
+                await asyncio.wait([fetch])
+                if not fetch.cancelled():
+                    fetch.exception()  # its messages are redelivered anyway
+            # close() leaves the consumer group, which can block for a while
+            await asyncio.to_thread(consumer.close)
+
+    async def writer():
+        while True:
+            entry = await queue.get()
+            if entry is None:
+                return
+            items, written, enqueued = entry
+            metrics.queue_depth.add(-1, metrics.attributes)
+            metrics.stage("queue", enqueued)
+            started = time.perf_counter()
+            try:
+                if items:
+                    await write(items)
+            except Exception as e:
+                written.set_exception(e)
+                # Retrieved here: once this writer fails the decoders are
+                # cancelled, and may never await ``written``.
+                written.exception()
+                raise
+            metrics.stage("write", started)
+            metrics.alerts.add(len(items), metrics.attributes)
+            written.set_result(None)
+
+    # TaskGroups so one worker crashing cancels its siblings, not orphans them.
+    async with asyncio.TaskGroup() as writers:
+        for _ in range(num_writers):
+            writers.create_task(writer())
+        async with asyncio.TaskGroup() as decoders:
+            for _ in range(num_consumers):
+                decoders.create_task(decoder())
+        for _ in range(num_writers):
+            await queue.put(None)
+    return decoded["count"]
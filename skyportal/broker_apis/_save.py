@@ -9,8 +9,17 @@ provider's ``save_as_source`` should fetch the object and delegate here.
 
 from baselayer.log import make_log
 
+from ..utils.lookup_cache import lookup_cache
+
 log = make_log("broker/save")
 
+# Static lookups every ingested alert needs, cached per process and invalidated
+# when their models change (see skyportal/utils/lookup_cache.py).
+_INSTRUMENT_IDS = lookup_cache("broker_ingest.instrument_ids", ["Instrument"])
+_STREAM_IDS = lookup_cache("broker_ingest.programid_stream_ids", ["Stream"])
+_FILTERS = lookup_cache("broker_ingest.filters", ["Filter", "Group"])
+_USERS = lookup_cache("broker_ingest.users", ["User"])
+
 # AB zeropoint per survey (psfFlux is in Jy after the 1e-9 scaling below).
 ZP_PER_SURVEY = {"LSST": 8.9, "ZTF": 23.9}
 
@@ -81,37 +90,111 @@ def _passes_criteria(data, criteria):
     return True
 
 
-async def _filters_passing_criteria(session, filter_ids, data):
-    """Subset of ``filter_ids`` whose Filter criteria the alert satisfies (a
-    filter with no criteria always passes)."""
+async def _filter_info(session, filter_ids):
+    """``{filter_id: info}`` for the existing ``filter_ids``, where ``info`` is a
+    plain dict of what ingestion needs from a Filter (name, group, autosave,
+    criteria). Cached per process, so steady-state ingestion reads no Filters."""
     import sqlalchemy as sa
+    from sqlalchemy.orm import joinedload
 
     from ..models import Filter
 
-    rows = (
-        await session.scalars(sa.select(Filter).where(Filter.id.in_(filter_ids)))
-    ).all()
-    criteria_by_id = {f.id: (f.altdata or {}).get("criteria") for f in rows}
+    async def load(missing):
+        rows = (
+            await session.scalars(
+                sa.select(Filter)
+                .options(joinedload(Filter.group))
+                .where(Filter.id.in_(missing))
+            )
+        ).all()
+        return {
+            f.id: {
+                "name": f.name,
+                "group_id": f.group_id,
+                # origin matches the legacy broker-plugin format so filter
+                # annotations group with the historical ones.
+                "group_name": (
+                    (f.group.nickname or f.group.name) if f.group is not None else None
+                ),
+                "autosave": bool(f.autosave),
+                "criteria": (f.altdata or {}).get("criteria"),
+            }
+            for f in rows
+        }
+
+    return await _FILTERS.get_many(set(filter_ids or ()), load)
+
+
+async def _filters_passing_criteria(session, filter_ids, data):
+    """Subset of ``filter_ids`` whose Filter criteria the alert satisfies (a
+    filter with no criteria always passes)."""
+    info = await _filter_info(session, filter_ids)
     return [
-        fid for fid in filter_ids if _passes_criteria(data, criteria_by_id.get(fid))
+        fid
+        for fid in filter_ids
+        if _passes_criteria(data, (info.get(fid) or {}).get("criteria"))
     ]
 
 
 async def programid_to_stream_ids(session):
-    """Map (survey, programid) -> [stream_id] from each Stream's altdata."""
+    """Map (survey, programid) -> [stream_id] from each Stream's altdata.
+
+    Cached per process; treat the returned mapping as read-only."""
     import sqlalchemy as sa
 
     from ..models import Stream
 
-    streams = (await session.scalars(sa.select(Stream))).all()
-    mapper: dict = {}
-    for stream in streams:
-        altdata = stream.altdata or {}
-        if "collection" not in altdata or "selector" not in altdata:
-            continue
-        key = (altdata["collection"].split("_")[0], max(altdata["selector"]))
-        mapper.setdefault(key, []).append(stream.id)
-    return mapper
+    async def load():
+        streams = (await session.scalars(sa.select(Stream))).all()
+        mapper: dict = {}
+        for stream in streams:
+            altdata = stream.altdata or {}
+            if "collection" not in altdata or "selector" not in altdata:
+                continue
+            key = (altdata["collection"].split("_")[0], max(altdata["selector"]))
+            mapper.setdefault(key, []).append(stream.id)
+        return mapper
+
+    return await _STREAM_IDS.get("all", load)
+
+
+async def _survey_lookups(session, survey):
+    """``(instrument_id, programid2streamid)`` for ``survey``, both cached per
+    process."""
+    import sqlalchemy as sa
+
+    from ..models import Instrument
+
+    instrument_id = await _INSTRUMENT_IDS.get(
+        survey,
+        lambda: session.scalar(
+            sa.select(Instrument.id).where(Instrument.name == survey)
+        ),
+    )
+    if instrument_id is None:
+        raise ValueError(f"Instrument '{survey}' not found in the database.")
+    return instrument_id, await programid_to_stream_ids(session)
+
+
+async def ingest_user(session, user_id=1):
+    """The ``User`` that ingested rows are attributed to, attached to ``session``.
+
+    The user is loaded once per process and merged into each session without a
+    query (``load=False``); call again after a rollback, which expires it."""
+    from ..models import User
+
+    async def load():
+        user = await session.get(User, user_id)
+        if user is not None:
+            # Detach a fully-loaded copy, so a later rollback or close of this
+            # session can't expire the cached instance.
+            session.expunge(user)
+        return user
+
+    user = await _USERS.get(user_id, load)
+    if user is None:
+        return None
+    return await session.merge(user, load=False)
 
 
 def build_photometry_groups(object_id, survey, data, instrument_id, programid2streamid):
@@ -225,7 +308,6 @@ async def _ingest_object(
     """
     import sqlalchemy as sa
     from sqlalchemy.dialects.postgresql import insert as pg_insert
-    from sqlalchemy.orm import joinedload
 
     from baselayer.app.models import utcnow
 
@@ -233,10 +315,8 @@ async def _ingest_object(
     from ..models import (
         Annotation,
         Candidate,
-        Filter,
         Group,
         GroupAnnotation,
-        Instrument,
         Obj,
         Source,
     )
@@ -253,13 +333,7 @@ async def _ingest_object(
         if not filter_ids and not group_ids:
             return {"id": object_id}
 
-    instrument_id = await session.scalar(
-        sa.select(Instrument.id).where(Instrument.name == survey)
-    )
-    if instrument_id is None:
-        raise ValueError(f"Instrument '{survey}' not found in the database.")
-
-    programid2streamid = await programid_to_stream_ids(session)
+    instrument_id, programid2streamid = await _survey_lookups(session, survey)
 
     obj = await session.scalar(sa.select(Obj).where(Obj.id == object_id))
     created = obj is None
@@ -311,20 +385,20 @@ async def _ingest_object(
         # Auto-save: a filter with `autosave` set also saves the passing object as
         # a Source in the filter's group, so it skips manual scanning. Skip if
         # already saved to that group.
-        autosave_filters = (
-            await session.scalars(
-                sa.select(Filter).where(Filter.id.in_(filter_ids), Filter.autosave)
-            )
-        ).all()
-        for f in autosave_filters:
+        filters = await _filter_info(session, filter_ids)
+        for f in filters.values():
+            if not f["autosave"]:
+                continue
             already = await session.scalar(
                 sa.select(Source).where(
                     Source.obj_id == object_id,
-                    Source.group_id == f.group_id,
+                    Source.group_id == f["group_id"],
                 )
             )
             if already is None:
-                session.add(Source(obj=obj, group_id=f.group_id, saved_by_id=user.id))
+                session.add(
+                    Source(obj=obj, group_id=f["group_id"], saved_by_id=user.id)
+                )
 
     # autoflush is off on skyportal's async session; flush so the new Obj (and any
     # Candidate rows) are visible to add_external_photometry's existence check.
@@ -341,38 +415,28 @@ async def _ingest_object(
         if (annotations_by_filter_id or {}).get(fid)
     }
     if annotated:
-        filters = (
-            await session.scalars(
-                sa.select(Filter)
-                .options(joinedload(Filter.group))
-                .where(Filter.id.in_(annotated))
-            )
-        ).all()
-        for filt in filters:
-            group = filt.group
-            # origin matches the legacy broker-plugin format so new annotations
-            # group with the historical ones.
-            group_name = (group.nickname or group.name) if group else None
-            origin = f"{group_name}:{filt.name}"
+        filters = await _filter_info(session, annotated)
+        for fid, filt in filters.items():
+            origin = f"{filt['group_name']}:{filt['name']}"
             annotation_id = await session.scalar(
                 pg_insert(Annotation)
                 .values(
                     obj_id=object_id,
                     origin=origin,
-                    data=annotated[filt.id],
+                    data=annotated[fid],
                     author_id=user.id,
                 )
                 .on_conflict_do_update(
                     index_elements=["obj_id", "origin"],
-                    set_={"data": annotated[filt.id], "modified": utcnow},
+                    set_={"data": annotated[fid], "modified": utcnow},
                     where=Annotation.author_id == user.id,
                 )
                 .returning(Annotation.id)
             )
-            if annotation_id is not None and group is not None:
+            if annotation_id is not None and filt["group_id"] is not None:
                 await session.execute(
                     pg_insert(GroupAnnotation)
-                    .values(group_id=group.id, annotation_id=annotation_id)
+                    .values(group_id=filt["group_id"], annotation_id=annotation_id)
                     .on_conflict_do_nothing()
                 )
 
@@ -400,6 +464,262 @@ async def _ingest_object(
     return {"id": object_id}
 
 
+async def _ingest_objects(batch, survey, session, user):
+    """Set-based counterpart of ``_ingest_object`` for the ingestion path: write
+    many alert objects of one survey with a handful of statements per batch
+    instead of a dozen per alert. Returns the ids of the objects ingested.
+
+    Parameters
+    ----------
+    batch : list of dict
+        One entry per alert, with ``data`` (a standard alert object),
+        ``filter_ids``, and optionally ``passing_alert_id``, ``cutouts`` and
+        ``annotations_by_filter_id`` — the keyword arguments of
+        ``save_object_as_candidate``.
+    survey : str
+        "ZTF", "LSST", ... — shared by every alert in ``batch``.
+
+    Nothing is committed: the writes are only flushed, so the caller commits
+    the whole batch as one transaction (or rolls it back).
+    """
+    import uuid
+    from datetime import timedelta
+
+    import sqlalchemy as sa
+    from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+    from baselayer.app.models import utcnow
+
+    from ..handlers.api.photometry import MAX_NUMBER_ROWS, add_external_photometry
+    from ..models import Annotation, Candidate, GroupAnnotation, Obj, Source
+    from ..utils.naive_datetime import utcnow_naive
+
+    # Ingestion criteria gate over the (cached) Filter info; alerts left with no
+    # passing filter are dropped before any write.
+    all_filter_ids = {fid for item in batch for fid in item.get("filter_ids") or []}
+    filters_by_id = await _filter_info(session, all_filter_ids)
+    # A filter id with no Filter row is dropped here rather than failing the
+    # Candidate foreign key for the whole batch.
+    items = []
+    for item in batch:
+        filter_ids = [
+            fid
+            for fid in item.get("filter_ids") or []
+            if fid in filters_by_id
+            and _passes_criteria(
+                item["data"],
+                filters_by_id[fid]["criteria"],
+            )
+        ]
+        if filter_ids:
+            items.append({**item, "filter_ids": filter_ids})
+    if not items:
+        return []
+
+    instrument_id, programid2streamid = await _survey_lookups(session, survey)
+
+    # Objs: one INSERT ... ON CONFLICT DO NOTHING; the first alert of an object
+    # in the batch provides its discovery position.
+    obj_rows = {}
+    for item in items:
+        cand = item["data"].get("candidate") or {}
+        obj_rows.setdefault(
+            item["data"]["objectId"],
+            {
+                "id": item["data"]["objectId"],
+                "ra": cand.get("ra"),
+                "dec": cand.get("dec"),
+                "ra_dis": cand.get("ra"),
+                "dec_dis": cand.get("dec"),
+                "score": cand.get("drb"),
+                "origin": survey,
+                "internal_key": str(uuid.uuid4()),
+            },
+        )
+    await session.execute(
+        pg_insert(Obj)
+        .values(list(obj_rows.values()))
+        .on_conflict_do_nothing(index_elements=["id"])
+    )
+    obj_ids = list(obj_rows)
+
+    # Candidates, deduped on the passing alert (the same alert may be
+    # re-consumed) with one read of the batch's existing (obj, filter, alert)
+    # keys. Each row gets a distinct passed_at so several alerts of one object
+    # in the batch don't collide on the (obj_id, filter_id, passed_at) index.
+    candidate_keys = {
+        (item["data"]["objectId"], fid, item.get("passing_alert_id"))
+        for item in items
+        for fid in item["filter_ids"]
+    }
+    existing = {
+        tuple(row)
+        for row in (
+            await session.execute(
+                sa.select(
+                    Candidate.obj_id, Candidate.filter_id, Candidate.passing_alert_id
+                ).where(
+                    Candidate.obj_id.in_(obj_ids),
+                    Candidate.filter_id.in_(all_filter_ids),
+                )
+            )
+        ).all()
+    }
+    now = utcnow_naive()
+    candidate_rows = [
+        {
+            "obj_id": obj_id,
+            "filter_id": fid,
+            "passing_alert_id": alert_id,
+            "passed_at": now + timedelta(microseconds=i),
+            "uploader_id": user.id,
+        }
+        for i, (obj_id, fid, alert_id) in enumerate(
+            sorted(candidate_keys - existing, key=str)
+        )
+    ]
+    if candidate_rows:
+        await session.execute(
+            pg_insert(Candidate).values(candidate_rows).on_conflict_do_nothing()
+        )
+
+    # Auto-save into each autosave filter's group unless already saved there.
+    # Sources stay ORM objects: their after_insert listeners (analysis and
+    # follow-up auto-triggers) must still fire.
+    autosave_pairs = {
+        (item["data"]["objectId"], filters_by_id[fid]["group_id"])
+        for item in items
+        for fid in item["filter_ids"]
+        if filters_by_id[fid]["autosave"]
+    }
+    if autosave_pairs:
+        saved = {
+            tuple(row)
+            for row in (
+                await session.execute(
+                    sa.select(Source.obj_id, Source.group_id).where(
+                        Source.obj_id.in_({o for o, _ in autosave_pairs}),
+                        Source.group_id.in_({g for _, g in autosave_pairs}),
+                    )
+                )
+            ).all()
+        }
+        for obj_id, group_id in autosave_pairs - saved:
+            session.add(Source(obj_id=obj_id, group_id=group_id, saved_by_id=user.id))
+    await session.flush()
+
+    # Filter annotations: one upsert on the (obj_id, origin) unique key for the
+    # whole batch (last alert wins; a single INSERT ... ON CONFLICT DO UPDATE
+    # cannot touch the same row twice), then one GroupAnnotation insert.
+    annotation_rows = {}
+    group_by_origin = {}
+    for item in items:
+        for fid in item["filter_ids"]:
+            ann = (item.get("annotations_by_filter_id") or {}).get(fid)
+            if not ann:
+                continue
+            filt = filters_by_id[fid]
+            origin = f"{filt['group_name']}:{filt['name']}"
+            annotation_rows[(item["data"]["objectId"], origin)] = {
+                "obj_id": item["data"]["objectId"],
+                "origin": origin,
+                "data": ann,
+                "author_id": user.id,
+            }
+            group_by_origin[origin] = filt["group_id"]
+    if annotation_rows:
+        stmt = pg_insert(Annotation).values(list(annotation_rows.values()))
+        annotations = (
+            await session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=["obj_id", "origin"],
+                    set_={"data": stmt.excluded.data, "modified": utcnow},
+                    where=Annotation.author_id == user.id,
+                ).returning(Annotation.id, Annotation.origin)
+            )
+        ).all()
+        group_annotation_rows = [
+            {"group_id": group_by_origin[origin], "annotation_id": annotation_id}
+            for annotation_id, origin in annotations
+            if group_by_origin.get(origin) is not None
+        ]
+        if group_annotation_rows:
+            await session.execute(
+                pg_insert(GroupAnnotation)
+                .values(group_annotation_rows)
+                .on_conflict_do_nothing()
+            )
+
+    # Photometry: merge every object's points into one payload per (survey,
+    # programid) stream group (obj_id becomes a column), so the whole batch goes
+    # through bulk_upsert_photometry in a few statements.
+    merged: dict = {}
+    for item in items:
+        groups = build_photometry_groups(
+            item["data"]["objectId"],
+            survey,
+            item["data"],
+            instrument_id,
+            programid2streamid,
+        )
+        for key, pd in groups.items():
+            n = len(pd["mjd"])
+            if not n:
+                continue
+            target = merged.setdefault(
+                key,
+                {
+                    "obj_id": [],
+                    "stream_ids": pd["stream_ids"],
+                    "instrument_id": instrument_id,
+                },
+            )
+            target["obj_id"].extend([pd["obj_id"]] * n)
+            for col, values in pd.items():
+                if col in ("obj_id", "stream_ids", "instrument_id"):
+                    continue
+                if not isinstance(values, list):
+                    values = [values] * n
+                target.setdefault(col, []).extend(values)
+
+    for pd in merged.values():
+        for start in range(0, len(pd["obj_id"]), MAX_NUMBER_ROWS):
+            chunk = {
+                k: (v[start : start + MAX_NUMBER_ROWS] if isinstance(v, list) else v)
+                for k, v in pd.items()
+            }
+            chunk["stream_ids"] = list(pd["stream_ids"])
+            # Bulk ingestion must not inherit the sitewide default-share.
+            await add_external_photometry(
+                chunk, user, session, apply_default_share=False, commit=False
+            )
+
+    # Best-effort thumbnails from each object's latest alert that carries cutouts.
+    cutouts_by_obj = {
+        item["data"]["objectId"]: item["cutouts"]
+        for item in items
+        if item.get("cutouts")
+    }
+    if cutouts_by_obj:
+        from ._thumbnails import add_thumbnails
+
+        for object_id, cutouts in cutouts_by_obj.items():
+            try:
+                await add_thumbnails(
+                    object_id,
+                    cutouts,
+                    survey,
+                    session,
+                    user_id=user.id,
+                    commit=False,
+                )
+            except Exception as e:
+                log(f"Failed to add thumbnails for {object_id}: {e}")
+
+    await session.flush()
+    return obj_ids
+
+
 async def save_object_as_source(data, survey, session, user, group_ids, cutouts=None):
     """Interactive save: create an Obj + Source(s) under ``group_ids`` and ingest
     photometry. A provider's ``save_as_source`` delegates here."""
@@ -435,6 +755,16 @@ async def save_object_as_candidate(
     )
 
 
+async def save_objects_as_candidates(batch, survey, session, user):
+    """Batched ingestion save: ``save_object_as_candidate`` for many alerts of one
+    survey at once, written with set-based statements (see ``_ingest_objects``).
+    Each ``batch`` entry holds ``data``, ``filter_ids`` and optionally
+    ``passing_alert_id``, ``cutouts`` and ``annotations_by_filter_id``.
+
+    Unlike the per-alert saves this does not commit; the caller commits."""
+    return await _ingest_objects(batch, survey, session, user)
+
+
 async def save_object_photometry(data, survey, session, user, cutouts=None):
     """Ingest an Obj and its photometry only — no Candidate/Source. Used for a
     cross-survey match's counterpart obj, which is linked via a SuperObj rather
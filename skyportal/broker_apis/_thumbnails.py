@@ -6,6 +6,7 @@ the save machinery this is survey-keyed, not broker-keyed.
 """
 
 import base64
+import contextlib
 import gzip
 import io
 
@@ -118,10 +119,13 @@ def make_thumbnail(obj_id, cutout_data, cutout_type, thumbnail_type, survey):
     }
 
 
-async def add_thumbnails(obj_id, cutouts, survey, session, user_id=1):
+async def add_thumbnails(obj_id, cutouts, survey, session, user_id=1, commit=True):
     """Render science/template/difference cutouts from ``cutouts`` (a dict with
     cutoutScience/Template/Difference FITS payloads) and post them as thumbnails.
-    Best-effort: a failed cutout is logged and skipped, not fatal."""
+    Best-effort: a failed cutout is logged and skipped, not fatal.
+
+    With ``commit=False`` each thumbnail is only flushed, inside a savepoint so
+    a failed one does not abort the caller's transaction."""
     from ..handlers.api.thumbnail import post_thumbnail
 
     for cutout_type, thumbnail_type in THUMBNAIL_TYPES:
@@ -132,6 +136,10 @@ async def add_thumbnails(obj_id, cutouts, survey, session, user_id=1):
             thumbnail = make_thumbnail(
                 obj_id, cutout_data, cutout_type, thumbnail_type, survey
             )
-            await post_thumbnail(thumbnail, user_id=user_id, session=session)
+            savepoint = contextlib.nullcontext() if commit else session.begin_nested()
+            async with savepoint:
+                await post_thumbnail(
+                    thumbnail, user_id=user_id, session=session, commit=commit
+                )
         except Exception as e:
             log(f"Failed to create thumbnail {thumbnail_type} for {obj_id}: {e}")
@@ -119,14 +119,12 @@ class BABAMULBROKER(BrokerAPI):
         """
         import asyncio
 
-        import sqlalchemy as sa
         from confluent_kafka import Consumer, KafkaError
 
         from baselayer.app.models import async_plain_session_factory
 
-        from ..models import User
         from ._kafka import kafka_consumer_config, read_avro
-        from ._save import save_object_as_candidate
+        from ._save import ingest_user, save_object_as_candidate
 
         altdata = broker.altdata or {}
         kafka = altdata.get("kafka") or {}
@@ -159,7 +157,7 @@ class BABAMULBROKER(BrokerAPI):
                 )
                 try:
                     async with async_plain_session_factory() as session:
-                        user = await session.scalar(sa.select(User).where(User.id == 1))
+                        user = await ingest_user(session)
                         await save_object_as_candidate(
                             record,
                             survey,
@@ -23,6 +23,14 @@ VALIDATE_TIMEOUT = 180  # seconds
 RADIUS_UNIT_MAP = {"deg": "Degrees", "arcmin": "Arcminutes", "arcsec": "Arcseconds"}
 NO_CUTOUT_PROJECTION = {"cutoutScience": 0, "cutoutTemplate": 0, "cutoutDifference": 0}
 
+# Kafka ingestion micro-batching: up to DEFAULT_BATCH_SIZE alerts per consume
+# call, waiting at most DEFAULT_LINGER seconds to fill a batch. Overridable per
+# broker via altdata['kafka']['batch_size'] / ['linger'].
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_LINGER = 2.0  # seconds
+# Ingested candidates/photometry are attributed to the provisioned admin user.
+INGEST_USER_ID = 1
+
 # token cache keyed by (base_url, username): (token, expiry). Providers are
 # stateless, so the short-lived bearer token is cached at module scope.
 _TOKENS: dict = {}
@@ -370,6 +378,68 @@ def _normalize_boom_alert(record):
     }
 
 
+def _route_boom_record(record, boom_map, sso_targets, default_filter_ids):
+    """Decode a BOOM Kafka result record into everything its ingest needs: the
+    normalized alert, the skyportal Filters it passed (sidereal and SSO-routed),
+    their annotations, and any cutouts. Pure, so a whole batch can be routed
+    before any DB work."""
+    from ..utils.sso_ingest import (
+        extract_designation,
+        sidereal_filter_ids,
+        sso_routing_for,
+    )
+
+    data = _normalize_boom_alert(record)
+    # Route to the skyportal Filters mapped to the passing BOOM filters.
+    passed = [
+        boom_map[f["filter_id"]]
+        for f in (record.get("filters") or [])
+        if f.get("filter_id") in boom_map
+    ]
+    filter_ids = passed or default_filter_ids
+
+    # Carry each passing filter's annotations (a JSON string from BOOM) through
+    # to the ingest so it becomes a filter annotation on the obj.
+    annotations_by_filter_id = {}
+    for f in record.get("filters") or []:
+        fid = boom_map.get(f.get("filter_id"))
+        if fid is None:
+            continue
+        ann = f.get("annotations")
+        if isinstance(ann, str):
+            try:
+                ann = json.loads(ann)
+            except (json.JSONDecodeError, TypeError):
+                ann = None
+        if isinstance(ann, dict) and ann:
+            annotations_by_filter_id[fid] = ann
+    cutouts = {
+        k: record[k]
+        for k in ("cutoutScience", "cutoutTemplate", "cutoutDifference")
+        if record.get(k) is not None
+    } or None
+    sso_filter_ids, sso_group_ids = sso_routing_for(filter_ids, sso_targets)
+    designation = (
+        extract_designation(data, annotations_by_filter_id) if sso_filter_ids else None
+    )
+    # SSO-routed filters never take the sidereal path: a moving object keyed by
+    # sky position yields fixed-position photometry and single-point sources.
+    # Without a designation there is no identity to ingest, so those alerts are
+    # dropped rather than polluting the SSO group. Non-SSO filters the alert also
+    # passed still ingest normally.
+    return {
+        "record": record,
+        "survey": _record_survey(record),
+        "data": data,
+        "annotations_by_filter_id": annotations_by_filter_id,
+        "cutouts": cutouts,
+        "designation": designation,
+        "sso_filter_ids": sso_filter_ids,
+        "sso_group_ids": sso_group_ids,
+        "sidereal_ids": sidereal_filter_ids(filter_ids, sso_filter_ids),
+    }
+
+
 async def _ingest_survey_matches(
     broker, record, main_obj_id, main_survey, session, user
 ):
@@ -692,14 +762,14 @@ class BOOMBROKER(BrokerAPI):
         ids it passed (``Filter.altdata['boom']['filter_id']``), falling back to
         ``broker.altdata['filter_ids']``. Kafka config in ``broker.altdata['kafka']``.
         """
-        import asyncio
-
         import sqlalchemy as sa
+        from confluent_kafka import Consumer
 
         from baselayer.app.models import async_plain_session_factory
 
         from ..models import Filter
         from ..utils.sso_ingest import sso_filter_targets
+        from ._kafka import kafka_consumer_config, read_avro, run_ingest_pipeline
 
         altdata = broker.altdata or {}
         kafka = altdata.get("kafka") or {}
@@ -722,177 +792,186 @@ class BOOMBROKER(BrokerAPI):
             # solar-system ingest instead of the sidereal one.
             sso_targets = sso_filter_targets(filters)
 
-        # N consumers sharing one group id; Kafka rebalances partitions across
-        # them. Defaults to 1.
+        # A worker pool: N decode workers, each a consumer sharing one group id
+        # (Kafka rebalances partitions across them), feed M DB writers through a
+        # bounded queue of micro-batches. Offsets are committed only once a
+        # batch has been written, so a crash replays it; the Candidate dedup on
+        # ``passing_alert_id`` makes the replay idempotent.
         num_consumers = max(1, int(kafka.get("num_consumers", 1)))
+        num_writers = max(1, int(kafka.get("num_writers", 1)))
         log(
-            f"BOOM ingestion (broker {broker.id}): {num_consumers} consumer(s) "
-            f"in group {group_id}, topics {topics}"
+            f"BOOM ingestion (broker {broker.id}): {num_consumers} consumer(s), "
+            f"{num_writers} writer(s) in group {group_id}, topics {topics}"
+        )
+
+        def make_consumer():
+            consumer = Consumer(
+                {**kafka_consumer_config(kafka, group_id), "enable.auto.commit": False}
+            )
+            consumer.subscribe(topics)
+            return consumer
+
+        def decode(value):
+            record = read_avro(value)
+            if record is None:
+                return None
+            return _route_boom_record(record, boom_map, sso_targets, default_filter_ids)
+
+        total = await run_ingest_pipeline(
+            make_consumer,
+            decode,
+            lambda alerts: BOOMBROKER._ingest_batch(broker, alerts),
+            broker_name=broker.name,
+            num_consumers=num_consumers,
+            num_writers=num_writers,
+            queue_size=kafka.get("queue_size"),
+            batch_size=max(1, int(kafka.get("batch_size", DEFAULT_BATCH_SIZE))),
+            linger=float(kafka.get("linger", DEFAULT_LINGER)),
+            stop=stop,
+            max_messages=max_messages,
         )
-        # TaskGroup so one consumer crashing cancels its siblings, not orphans them.
-        async with asyncio.TaskGroup() as tg:
-            tasks = [
-                tg.create_task(
-                    BOOMBROKER._consume_stream(
-                        broker,
-                        kafka,
-                        topics,
-                        group_id,
-                        boom_map,
-                        sso_targets,
-                        default_filter_ids,
-                        stop,
-                        max_messages,
-                    )
-                )
-                for _ in range(num_consumers)
-            ]
-        total = sum(t.result() for t in tasks)
         log(f"BOOM ingestion (broker {broker.id}): consumed {total} alerts")
         return total
 
     @staticmethod
-    async def _consume_stream(
-        broker,
-        kafka,
-        topics,
-        group_id,
-        boom_map,
-        sso_targets,
-        default_filter_ids,
-        stop,
-        max_messages,
-    ):
-        """One Kafka consumer's poll/ingest loop. Consumers sharing ``group_id``
-        have Kafka rebalance the topic partitions across them."""
-        import asyncio
+    async def _ingest_batch(broker, alerts):
+        """Ingest a micro-batch of routed alerts (see ``_route_boom_record``)
+        on one session.
+
+        The sidereal alerts are grouped by survey, written with the set-based
+        ``save_objects_as_candidates`` and committed together: one transaction
+        for the batch. If it fails, it is rolled back and the alerts are
+        retried one by one, so a single bad alert can't drop the rest of the
+        batch. SSO alerts, those retries and cross-survey matches go through
+        the per-alert path, which commits each alert on its own."""
+        from baselayer.app.models import async_plain_session_factory
 
-        import sqlalchemy as sa
-        from confluent_kafka import Consumer, KafkaError
+        from ._save import ingest_user, save_objects_as_candidates
 
-        from baselayer.app.models import async_plain_session_factory
+        async with async_plain_session_factory() as session:
+            user = await ingest_user(session, INGEST_USER_ID)
 
-        from ..models import User
-        from ..utils.sso_ingest import (
-            extract_designation,
-            ingest_sso_alert,
-            sidereal_filter_ids,
-            sso_routing_for,
-        )
-        from ._kafka import kafka_consumer_config, read_avro
+            async def guarded(alert, ingest, *args):
+                # ``ingest(*args, session, user)`` with the current user: a
+                # failure rolls back and expires every loaded instance, the user
+                # included, so it is re-attached for the next alert.
+                nonlocal user
+                try:
+                    await ingest(*args, session, user)
+                except Exception as e:
+                    log(f"Error ingesting alert {alert['data']['objectId']}: {e}")
+                    await session.rollback()
+                    user = await ingest_user(session, INGEST_USER_ID)
+
+            sidereal_by_survey = {}
+            for alert in alerts:
+                if alert["designation"]:
+                    await guarded(alert, BOOMBROKER._ingest_alert, broker, alert)
+                elif alert["sidereal_ids"]:
+                    sidereal_by_survey.setdefault(alert["survey"], []).append(alert)
+            if not sidereal_by_survey:
+                return
+
+            try:
+                for survey, survey_alerts in sidereal_by_survey.items():
+                    await save_objects_as_candidates(
+                        [
+                            {
+                                "data": a["data"],
+                                "filter_ids": a["sidereal_ids"],
+                                "passing_alert_id": a["record"].get("candid"),
+                                "cutouts": a["cutouts"],
+                                "annotations_by_filter_id": a[
+                                    "annotations_by_filter_id"
+                                ],
+                            }
+                            for a in survey_alerts
+                        ],
+                        survey,
+                        session,
+                        user,
+                    )
+                # One commit for the batch, before run_ingest_pipeline commits
+                # its Kafka offsets.
+                await session.commit()
+            except Exception as e:
+                num_sidereal = sum(map(len, sidereal_by_survey.values()))
+                log(
+                    f"Batched ingest of {num_sidereal} alerts failed, "
+                    f"retrying one by one: {e}"
+                )
+                await session.rollback()
+                user = await ingest_user(session, INGEST_USER_ID)
+                for survey_alerts in sidereal_by_survey.values():
+                    for alert in survey_alerts:
+                        await guarded(alert, BOOMBROKER._ingest_alert, broker, alert)
+                return
+
+            # Only associate cross-survey matches for alerts ingested as
+            # candidates, so we don't create orphan counterpart objs.
+            for survey, survey_alerts in sidereal_by_survey.items():
+                for alert in survey_alerts:
+                    if alert["record"].get("survey_matches"):
+                        await guarded(
+                            alert,
+                            _ingest_survey_matches,
+                            broker,
+                            alert["record"],
+                            alert["data"]["objectId"],
+                            survey,
+                        )
+
+    @staticmethod
+    async def _ingest_alert(broker, alert, session, user):
+        """Ingest one routed alert on ``session``: SSO alerts go to the
+        solar-system ingest, everything else becomes a Candidate (plus any
+        cross-survey matches)."""
+        import asyncio
+
+        from ..utils.sso_ingest import ingest_sso_alert
         from ._save import save_object_as_candidate
 
-        consumer = Consumer(kafka_consumer_config(kafka, group_id))
-        consumer.subscribe(topics)
-        count = 0
-        try:
-            while not (stop is not None and stop.is_set()):
-                # poll is blocking; offload so one loop can host several consumers.
-                msg = await asyncio.to_thread(consumer.poll, 2.0)
-                if msg is None:
-                    continue
-                if msg.error():
-                    if msg.error().code() != KafkaError._PARTITION_EOF:
-                        log(f"Kafka error: {msg.error()}")
-                    continue
-                record = read_avro(msg.value())
-                if record is None:
-                    continue
-
-                survey = _record_survey(record)
-                data = _normalize_boom_alert(record)
-                # Route to the skyportal Filters mapped to the passing BOOM filters.
-                passed = [
-                    boom_map[f["filter_id"]]
-                    for f in (record.get("filters") or [])
-                    if f.get("filter_id") in boom_map
-                ]
-                filter_ids = passed or default_filter_ids
-
-                # Carry each passing filter's annotations (a JSON string from BOOM)
-                # through to the ingest so it becomes a filter annotation on the obj.
-                annotations_by_filter_id = {}
-                for f in record.get("filters") or []:
-                    fid = boom_map.get(f.get("filter_id"))
-                    if fid is None:
-                        continue
-                    ann = f.get("annotations")
-                    if isinstance(ann, str):
-                        try:
-                            ann = json.loads(ann)
-                        except (json.JSONDecodeError, TypeError):
-                            ann = None
-                    if isinstance(ann, dict) and ann:
-                        annotations_by_filter_id[fid] = ann
-                cutouts = {
-                    k: record[k]
-                    for k in ("cutoutScience", "cutoutTemplate", "cutoutDifference")
-                    if record.get(k) is not None
-                } or None
-                sso_filter_ids, sso_group_ids = sso_routing_for(filter_ids, sso_targets)
-                designation = (
-                    extract_designation(data, annotations_by_filter_id)
-                    if sso_filter_ids
-                    else None
+        record, data, survey = alert["record"], alert["data"], alert["survey"]
+        if alert["designation"]:
+            await ingest_sso_alert(
+                data,
+                survey,
+                session,
+                user,
+                alert["designation"],
+                alert["sso_group_ids"],
+                filter_ids=alert["sso_filter_ids"],
+                passing_alert_id=record.get("candid"),
+                annotations_by_filter_id=alert["annotations_by_filter_id"],
+                # sync _request offloaded so it can't block the loop.
+                fetch_history=lambda s, d: asyncio.to_thread(
+                    _fetch_sso_history, broker, s, d
+                ),
+            )
+        elif alert["sidereal_ids"]:
+            await save_object_as_candidate(
+                data,
+                survey,
+                session,
+                user,
+                alert["sidereal_ids"],
+                passing_alert_id=record.get("candid"),
+                cutouts=alert["cutouts"],
+                annotations_by_filter_id=alert["annotations_by_filter_id"],
+            )
+            # Only associate cross-survey matches when the primary was ingested
+            # as a candidate, so we don't create orphan counterpart objs for
+            # alerts nobody is scanning. Moving objects are matched by
+            # designation, not position.
+            if record.get("survey_matches"):
+                await _ingest_survey_matches(
+                    broker,
+                    record,
+                    data["objectId"],
+                    survey,
+                    session,
+                    user,
                 )
-                # SSO-routed filters never take the sidereal path: a moving object
-                # keyed by sky position yields fixed-position photometry and single-
-                # point sources. Without a designation there is no identity to
-                # ingest, so those alerts are dropped rather than polluting the SSO
-                # group. Non-SSO filters the alert also passed still ingest normally.
-                sidereal_ids = sidereal_filter_ids(filter_ids, sso_filter_ids)
-                try:
-                    async with async_plain_session_factory() as session:
-                        user = await session.scalar(sa.select(User).where(User.id == 1))
-                        if designation:
-                            await ingest_sso_alert(
-                                data,
-                                survey,
-                                session,
-                                user,
-                                designation,
-                                sso_group_ids,
-                                filter_ids=sso_filter_ids,
-                                passing_alert_id=record.get("candid"),
-                                annotations_by_filter_id=annotations_by_filter_id,
-                                # sync _request offloaded so it can't block the loop.
-                                fetch_history=lambda s, d: asyncio.to_thread(
-                                    _fetch_sso_history, broker, s, d
-                                ),
-                            )
-                        elif sidereal_ids:
-                            await save_object_as_candidate(
-                                data,
-                                survey,
-                                session,
-                                user,
-                                sidereal_ids,
-                                passing_alert_id=record.get("candid"),
-                                cutouts=cutouts,
-                                annotations_by_filter_id=annotations_by_filter_id,
-                            )
-                            # Only associate cross-survey matches when the primary was
-                            # ingested as a candidate, so we don't create orphan
-                            # counterpart objs for alerts nobody is scanning. Moving
-                            # objects are matched by designation, not position.
-                            if record.get("survey_matches"):
-                                await _ingest_survey_matches(
-                                    broker,
-                                    record,
-                                    data["objectId"],
-                                    survey,
-                                    session,
-                                    user,
-                                )
-                except Exception as e:
-                    log(f"Error ingesting alert {record.get('objectId')}: {e}")
-                count += 1
-                if max_messages is not None and count >= max_messages:
-                    break
-        finally:
-            consumer.close()
-        log(f"BOOM ingestion (broker {broker.id}): consumed {count} alerts")
-        return count
 
     # ------------------------------------------------------------------ #
     # Filters (BOOM aggregation-pipeline "filters", versioned server-side).
@@ -120,7 +120,11 @@ from .group import (
 )
 from .group_admission_request import GroupAdmissionRequestHandler
 from .healpix import HealpixUpdateHandler
-from .instrument import InstrumentFieldHandler, InstrumentHandler
+from .instrument import (
+    InstrumentFieldHandler,
+    InstrumentFieldUploadHandler,
+    InstrumentHandler,
+)
 from .instrument_log import (
     InstrumentLogExternalAPIHandler,
     InstrumentLogHandler,
@@ -169,6 +173,7 @@ from .observingrun import ObservingRunBulkEditHandler, ObservingRunHandler
 from .phot_stat import (
     PhotStatAggregateHandler,
     PhotStatHandler,
+    PhotStatRebuildHandler,
     PhotStatUpdateHandler,
 )
 from .photometric_series import PhotometricSeriesHandler
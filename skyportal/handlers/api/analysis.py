@@ -49,7 +49,7 @@ from ...models import (
     User,
     UserNotification,
 )
-from ...utils.extinction import calculate_extinction
+from ...utils.extinction import extinction_by_filter
 from ...utils.naive_datetime import utcnow_naive
 from ...utils.parse import str_to_bool
 from ..base import BaseHandler, format_doc
@@ -213,10 +213,9 @@ def deredden_photometry_df(df, ra, dec):
     Filters without a supported coefficient are left unchanged."""
     if ra is None or dec is None or not (np.isfinite(ra) and np.isfinite(dec)):
         return df
-    a_lambda = {
-        filt: calculate_extinction(float(ra), float(dec), filt)
-        for filt in df["filter"].dropna().unique()
-    }
+    a_lambda = extinction_by_filter(
+        float(ra), float(dec), df["filter"].dropna().unique()
+    )
     # A filter with no supported coefficient is left uncorrected; warn so a
     # partially-corrected multi-survey light curve isn't a silent surprise.
     skipped = sorted(f for f, v in a_lambda.items() if v is None)
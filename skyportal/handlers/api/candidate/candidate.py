@@ -9,7 +9,6 @@ from copy import copy
 import arrow
 import astropy.units as u
 import healpix_alchemy as ha
-import numpy as np
 import sqlalchemy as sa
 from astropy.time import Time
 from marshmallow.exceptions import ValidationError
@@ -48,12 +47,19 @@ from ....models import (
     Spectrum,
     SuperObj,
 )
-from ....utils.cache import Cache, array_to_bytes
+from ....utils.cache import array_to_bytes, bytes_to_array, shared_cache
 from ....utils.calculations import great_circle_distance
 from ....utils.data_access import (
     accessible_group_and_filter_ids,
     accessible_group_ids_async,
 )
+from ....utils.pagination import (
+    TOTAL_MATCHES_MODES,
+    decode_cursor,
+    encode_cursor,
+    estimate_count,
+    keyset_clause,
+)
 from ....utils.parse import get_page_and_n_per_page
 from ....utils.sizeof import SIZE_WARNING_THRESHOLD, sizeof
 from ...base import BaseHandler
@@ -64,9 +70,8 @@ from .candidate_filter import (
 MAX_NUM_DAYS_USING_LOCALIZATION = 31 * 12 * 10  # 10 years
 
 _, cfg = load_env()
-cache_dir = "cache/candidates_queries"
-cache = Cache(
-    cache_dir=cache_dir,
+cache = shared_cache(
+    "candidates_queries",
     max_age=cfg["misc.minutes_to_keep_candidate_query_cache"] * 60,
 )
 log = make_log("api/candidate")
@@ -396,6 +401,28 @@ class CandidateHandler(BaseHandler):
             schema:
               type: integer
             description: Page number for paginated query results. Defaults to 1
+          - in: query
+            name: cursor
+            nullable: true
+            schema:
+              type: string
+            description: |
+              Switches to cursor pagination: pass an empty string for the
+              first page, then the `nextCursor` of the previous response.
+              Candidates are ordered by their most recent `passed_at` (then
+              object ID), newest first, and only one page of IDs is fetched
+              per request. Not compatible with sortByAnnotationOrigin, which
+              keeps pageNumber pagination.
+          - in: query
+            name: totalMatches
+            nullable: true
+            schema:
+              type: string
+              enum: [exact, estimate, none]
+            description: |
+              How to report `totalMatches` in cursor mode: an exact count
+              (default), the query planner's estimate, or not at all
+              (`null`), which is cheapest when paging through a large result.
           - in: query
             name: autosave
             nullable: true
@@ -688,6 +715,12 @@ class CandidateHandler(BaseHandler):
                                 type: integer
                               numPerPage:
                                 type: integer
+                              nextCursor:
+                                type: string
+                                nullable: true
+                                description: |
+                                  Cursor for the next page, or null on the
+                                  last page. Only set in cursor mode.
             400:
               content:
                 application/json:
@@ -814,6 +847,8 @@ class CandidateHandler(BaseHandler):
         # Not documented in API docs as this is for frontend-only usage & will confuse
         # users looking through the API docs
         query_id = self.get_query_argument("queryID", None)
+        cursor = self.get_query_argument("cursor", None)
+        total_matches_mode = self.get_query_argument("totalMatches", "exact")
         saved_status = self.get_query_argument("savedStatus", "all")
         start_date = self.get_query_argument("startDate", None)
         end_date = self.get_query_argument("endDate", None)
@@ -928,6 +963,18 @@ class CandidateHandler(BaseHandler):
         except ValueError as e:
             return self.error(str(e))
 
+        if cursor is not None:
+            if sort_by_origin is not None:
+                return self.error(
+                    "cursor pagination does not support sortByAnnotationOrigin; "
+                    "use pageNumber instead"
+                )
+            if total_matches_mode not in TOTAL_MATCHES_MODES:
+                return self.error(
+                    f"Invalid totalMatches: {total_matches_mode}. "
+                    f"Must be one of {', '.join(TOTAL_MATCHES_MODES)}"
+                )
+
         async with self.AsyncSession() as session:
             # first, we get the list of group IDs and filter IDs
             # that the user has access to
@@ -1401,20 +1448,34 @@ class CandidateHandler(BaseHandler):
                 )
 
             try:
-                query_results = await grab_query_results(
-                    session,
-                    q,
-                    page_number,
-                    n_per_page,
-                    "candidates",
-                    order_by=order_by,
-                    query_id=query_id,
-                    use_cache=True,
-                    include_detection_stats=True,
-                )
+                if cursor is not None:
+                    query_results = await grab_query_results_by_cursor(
+                        session,
+                        q,
+                        candidate_subquery.c.passed_at,
+                        cursor,
+                        n_per_page,
+                        "candidates",
+                        include_detection_stats=True,
+                        total_matches_mode=total_matches_mode,
+                    )
+                else:
+                    query_results = await grab_query_results(
+                        session,
+                        q,
+                        page_number,
+                        n_per_page,
+                        "candidates",
+                        order_by=order_by,
+                        query_id=query_id,
+                        use_cache=True,
+                        include_detection_stats=True,
+                    )
             except ValueError as e:
                 if "Page number out of range" in str(e):
                     return self.error("Page number out of range.")
+                if cursor is not None:
+                    return self.error(str(e))
                 raise
 
             matching_source_ids_result = await session.scalars(
@@ -1815,14 +1876,14 @@ async def grab_query_results(
 
     if page:
         if use_cache:
-            cache_filename = cache[query_id]
-            if cache_filename is not None:
-                all_ids = np.load(cache_filename)
+            cached = await cache.aget(query_id)
+            if cached is not None:
+                all_ids = bytes_to_array(cached)
             else:
                 query_id = str(uuid.uuid4())
                 all_result = await session.scalars(ordered_ids)
                 all_ids = all_result.unique().all()
-                cache[query_id] = array_to_bytes(all_ids)
+                await cache.aset(query_id, array_to_bytes(all_ids))
             total_matches = len(all_ids)
             obj_ids_in_page = all_ids[
                 ((page - 1) * n_items_per_page) : (page * n_items_per_page)
@@ -1865,26 +1926,96 @@ async def grab_query_results(
         ):
             raise ValueError("Page number out of range.")
 
+    info[items_name] = await load_objs_in_order(
+        session, obj_ids_in_page, include_thumbnails, include_detection_stats
+    )
+    return info
+
+
+async def grab_query_results_by_cursor(
+    session,
+    q,
+    passed_at,
+    cursor,
+    n_items_per_page,
+    items_name,
+    include_thumbnails=True,
+    include_detection_stats=False,
+    total_matches_mode="exact",
+):
+    """
+    Keyset-paginated counterpart of grab_query_results: returns the page of
+    Objs from ``q`` after ``cursor``, ordered by their latest ``passed_at``
+    column value then Obj ID, both descending. Only that page of IDs is read
+    from the database, so deep pages cost as much as the first one.
+
+    ``cursor`` is "" for the first page, or the ``nextCursor`` of the previous
+    page; ``total_matches_mode`` is one of TOTAL_MATCHES_MODES. Raises
+    ValueError for an invalid cursor.
+    """
+    keyed = (
+        q.add_columns(func.max(passed_at).label("sort_key")).group_by(Obj.id).subquery()
+    )
+    page_query = sa.select(keyed.c.id, keyed.c.sort_key)
+    if cursor:
+        sort_key, last_id = decode_cursor(cursor, scope="passed_at:desc")
+        if not isinstance(sort_key, datetime.datetime):
+            raise ValueError(f"Invalid cursor: {cursor}")
+        page_query = page_query.where(
+            keyset_clause(keyed.c.sort_key, keyed.c.id, "desc", sort_key, last_id)
+        )
+    rows = (
+        await session.execute(
+            page_query.order_by(
+                keyed.c.sort_key.desc().nullslast(), keyed.c.id.desc()
+            ).limit(n_items_per_page + 1)
+        )
+    ).all()
+
+    info = {"numPerPage": n_items_per_page, "nextCursor": None}
+    if len(rows) > n_items_per_page:
+        rows = rows[:n_items_per_page]
+        info["nextCursor"] = encode_cursor(
+            rows[-1].sort_key, rows[-1].id, scope="passed_at:desc"
+        )
+
+    all_ids = sa.select(keyed.c.id)
+    if total_matches_mode == "exact":
+        info["totalMatches"] = await session.scalar(
+            sa.select(func.count()).select_from(all_ids.subquery())
+        )
+    elif total_matches_mode == "estimate":
+        info["totalMatches"] = await estimate_count(session, all_ids)
+    else:
+        info["totalMatches"] = None
+
+    info[items_name] = await load_objs_in_order(
+        session, [row.id for row in rows], include_thumbnails, include_detection_stats
+    )
+    return info
+
+
+async def load_objs_in_order(
+    session, obj_ids, include_thumbnails=True, include_detection_stats=False
+):
+    """Load the Objs with IDs ``obj_ids``, as one-element rows in that order."""
+    if len(obj_ids) == 0:
+        return []
+
     options = []
     if include_thumbnails:
         options.append(selectinload(Obj.thumbnails))
     if include_detection_stats:
         options.append(selectinload(Obj.photstats))
 
-    items = []
-    if len(obj_ids_in_page) > 0:
-        obj_ids_values = get_obj_id_values(obj_ids_in_page)
-
-        items_result = await session.execute(
-            sa.select(Obj)
-            .options(*options)
-            .join(obj_ids_values, obj_ids_values.c.id == Obj.id)
-            .order_by(obj_ids_values.c.ordering)
-        )
-        items = items_result.unique().all()
-
-    info[items_name] = items
-    return info
+    obj_ids_values = get_obj_id_values(obj_ids)
+    items_result = await session.execute(
+        sa.select(Obj)
+        .options(*options)
+        .join(obj_ids_values, obj_ids_values.c.id == Obj.id)
+        .order_by(obj_ids_values.c.ordering)
+    )
+    return items_result.unique().all()
 
 
 class BulkDeleteCandidatesHandler(BaseHandler):
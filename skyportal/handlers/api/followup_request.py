@@ -38,7 +38,7 @@ from scipy.stats import norm
 from sqlalchemy import func
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import joinedload, selectinload, undefer
+from sqlalchemy.orm import joinedload, selectinload
 from sqlalchemy.sql.expression import cast
 from tornado.ioloop import IOLoop
 
@@ -2666,22 +2666,15 @@ class FollowupRequestPrioritizationHandler(BaseHandler):
                     )
 
                 localization = await session.scalar(
-                    Localization.select(session.user_or_token)
-                    .where(
+                    Localization.select(session.user_or_token).where(
                         Localization.id == localization_id,
                     )
-                    .options(
-                        undefer(Localization.uniq),
-                        undefer(Localization.probdensity),
-                        undefer(Localization.distmu),
-                        undefer(Localization.distsigma),
-                        undefer(Localization.distnorm),
-                    )
                 )
                 if localization is None:
                     return self.error(
                         message=f"Missing localization with id {localization_id}"
                     )
+                await localization.load_skymap_arrays(session)
 
                 ras = np.array(
                     [followup_request.obj.ra for followup_request in followup_requests]
@@ -8,7 +8,7 @@ import io
 import json
 import operator  # noqa: F401
 import os
-import tempfile
+import time
 import traceback
 from typing import Annotated
 from urllib.parse import urlparse, urlsplit
@@ -16,9 +16,7 @@ from urllib.parse import urlparse, urlsplit
 import arrow
 import astropy
 import gcn
-import healpy as hp
 import humanize
-import ligo.skymap.bayestar as ligo_bayestar
 import ligo.skymap.io
 import ligo.skymap.postprocess
 import lxml
@@ -90,29 +88,37 @@ from ...models import (
     User,
     UserNotification,
 )
+from ...utils.crossmatch import (
+    credible_region_moc,
+    crossmatch_matrix,
+    moc_product,
+    save_credible_regions,
+)
 from ...utils.gcn import (
+    contour_from_flat,
     from_bytes,
     from_cone,
     from_ellipse,
     from_igwn_gwalert,
     from_polygon,
     from_url,
-    get_contour,
     get_dateobs,
     get_json_tags,
     get_notice_aliases,
     get_properties,
     get_skymap,
     get_skymap_metadata,
-    get_skymap_properties,
     get_tags,
     get_trigger,
     get_xml_notice_type,
     has_skymap,
+    skymap_properties,
 )
+from ...utils.localization_tiles import copy_localization_tiles
 from ...utils.naive_datetime import UTCTZnaiveDateTime, utcnow_naive
 from ...utils.notifications import post_notification
 from ...utils.parse import get_page_and_n_per_page
+from ...utils.skymap_pipeline import StageTimer, submit
 from ..base import BaseHandler, format_doc
 from .galaxy import MAX_GALAXIES, get_galaxies, get_galaxies_completeness
 from .gcn_gracedb import post_gracedb_data
@@ -2327,35 +2333,70 @@ def add_tiles_and_properties_and_contour(
         localization = session.scalar(
             sa.select(Localization).where(Localization.id == localization_id)
         )
+        timer = StageTimer(localization_id)
+
+        if localization.uniq is not None:
+            with timer.stage("skymap_file"):
+                try:
+                    localization.save_skymap_file()
+                except OSError as e:
+                    log(f"Could not save skymap of localization {localization_id}: {e}")
+        arrays = localization.skymap_arrays
+        uniq, probdensity = arrays["UNIQ"], arrays["PROBDENSITY"]
+
+        # The CPU-bound stages run in worker processes on plain arrays while
+        # this thread writes the tiles.
+        with timer.stage("rasterize"):
+            flat = np.asarray(localization.flat_2d)
+        started = time.perf_counter()
+        properties_future = submit(skymap_properties, uniq, probdensity)
+        contour_future = submit(contour_from_flat, flat)
+
+        log(f"Adding tiles for localization {localization_id}")
+        with timer.stage("tiles"):
+            if parent_session is None:
+                session.add(localization)
+            copy_localization_tiles(
+                session, localization_id, localization.dateobs, uniq, probdensity
+            )
+            log(f"Adding credible regions for localization {localization_id}")
+            save_credible_regions(session, localization_id, uniq, probdensity)
+            session.commit()
 
         log(f"Retrieving skymap properties for localization {localization_id}")
-        properties_dict, tags_list = get_skymap_properties(localization)
-        if properties is not None:
-            properties_dict.update(properties)
-        if tags is not None:
-            tags_list.extend(tags)
-
-        properties = LocalizationProperty(
-            localization_id=localization_id, sent_by_id=user.id, data=properties_dict
+        properties_dict, tags_list = timer.wait(
+            "properties", properties_future, started
         )
-        session.add(properties)
+        with timer.stage("tags"):
+            if properties is not None:
+                properties_dict.update(properties)
+            if tags is not None:
+                tags_list.extend(tags)
 
-        tags = [
-            LocalizationTag(
+            properties = LocalizationProperty(
                 localization_id=localization_id,
-                text=text,
                 sent_by_id=user.id,
+                data=properties_dict,
             )
-            for text in tags_list
-        ]
-        session.add_all(tags)
+            session.add(properties)
 
-        log(f"Adding default localization tags for localization {localization_id}")
-        gcn_tags = add_default_gcn_tags(user, session, localization=localization)
-        if gcn_tags is not None and len(gcn_tags) > 0:
-            session.add_all(gcn_tags)
+            tags = [
+                LocalizationTag(
+                    localization_id=localization_id,
+                    text=text,
+                    sent_by_id=user.id,
+                )
+                for text in tags_list
+            ]
+            session.add_all(tags)
             session.commit()
 
+            log(f"Adding default localization tags for localization {localization_id}")
+            gcn_tags = add_default_gcn_tags(user, session, localization=localization)
+            if gcn_tags is not None and len(gcn_tags) > 0:
+                session.add_all(gcn_tags)
+                session.commit()
+
         if notify:
             try:
                 loop = asyncio.get_event_loop()
@@ -2372,26 +2413,12 @@ def add_tiles_and_properties_and_contour(
                 lambda: post_notification(request_body, timeout=30),
             )
 
-        log(f"Adding tiles for localization {localization_id}")
-        tiles = [
-            LocalizationTile(
-                localization_id=localization_id,
-                healpix=uniq,
-                probdensity=probdensity,
-                dateobs=localization.dateobs,
-            )
-            for uniq, probdensity in zip(localization.uniq, localization.probdensity)
-        ]
-
-        if parent_session is None:
-            session.add(localization)
-        session.add_all(tiles)
-        session.commit()
-
         log(f"Adding contour for localization {localization_id}")
-        localization = get_contour(localization)
-        session.add(localization)
-        session.commit()
+        localization.contour = timer.wait("contour", contour_future, started)
+        with timer.stage("contour_write"):
+            session.add(localization)
+            session.commit()
+        timer.finish(localization.created_at)
 
         # The contour is generated in this background task after the event is
         # ingested, so the page initially fetches the localization with a null
@@ -2961,19 +2988,13 @@ class LocalizationHandler(BaseHandler):
                     Localization.dateobs == dateobs_parsed,
                     Localization.localization_name == localization_name,
                 )
-                .options(
-                    undefer(Localization.uniq),
-                    undefer(Localization.probdensity),
-                    undefer(Localization.distmu),
-                    undefer(Localization.distsigma),
-                    undefer(Localization.distnorm),
-                    undefer(Localization.contour),
-                )
+                .options(undefer(Localization.contour))
             )
             if localization is None:
                 return self.error("Localization not found", status=404)
 
             if include_2D_map:
+                await localization.load_skymap_arrays(session)
                 data = {
                     **localization.to_dict(),
                     "flat_2d": localization.flat_2d,
@@ -5148,24 +5169,11 @@ class LocalizationDownloadHandler(BaseHandler):
             return self.error(f"Failed to parse dateobs: str({e})")
 
         localization_name = localization_name.strip()
-        local_temp_files = []
 
         async with self.AsyncSession() as session:
             try:
                 localization = await session.scalar(
-                    Localization.select(
-                        session.user_or_token,
-                        options=[
-                            undefer(Localization.uniq),
-                            undefer(Localization.probdensity),
-                            # 3D distance columns are deferred; undefer them so
-                            # is_3d / table don't trigger a lazy load (which
-                            # raises MissingGreenlet under the async session).
-                            undefer(Localization.distmu),
-                            undefer(Localization.distsigma),
-                            undefer(Localization.distnorm),
-                        ],
-                    ).where(
+                    Localization.select(session.user_or_token).where(
                         Localization.dateobs == dateobs_parsed,
                         Localization.localization_name == localization_name,
                     )
@@ -5174,33 +5182,32 @@ class LocalizationDownloadHandler(BaseHandler):
                     return self.error("Localization not found", status=404)
 
                 output_format = "fits"
-                with tempfile.NamedTemporaryFile(suffix=".fits") as fitsfile:
-                    localization_path = localization.get_localization_path()
-                    if localization_path is None:
-                        ligo.skymap.io.write_sky_map(
-                            fitsfile.name, localization.table, moc=True
-                        )
-                        with open(fitsfile.name, mode="rb") as g:
-                            content = g.read()
-                        local_temp_files.append(fitsfile.name)
-                    else:
-                        with open(localization_path, mode="rb") as g:
-                            content = g.read()
-
-                data = io.BytesIO(content)
                 filename = f"{localization.localization_name}.{output_format}"
 
+                # stream the original skymap, or the saved multi-order one,
+                # from disk rather than loading the arrays from the database
+                localization_path = localization.get_localization_path()
+                if localization_path is None or not os.path.exists(localization_path):
+                    localization_path = localization.skymap_path
+                if os.path.exists(localization_path):
+                    with open(localization_path, mode="rb") as g:
+                        await self.send_file(g, filename, output_type=output_format)
+                    return
+
+                # the arrays are deferred; load them here, as a lazy load
+                # raises MissingGreenlet under the async session
+                await session.refresh(
+                    localization,
+                    ["uniq", "probdensity", "distmu", "distsigma", "distnorm"],
+                )
+                data = io.BytesIO()
+                ligo.skymap.io.write_sky_map(data, localization.table, moc=True)
+                data.seek(0)
+
                 await self.send_file(data, filename, output_type=output_format)
 
             except Exception as e:
                 return self.error(f"Failed to create skymap for download: str({e})")
-            finally:
-                # clean up local files
-                for f in local_temp_files:
-                    try:
-                        os.remove(f)
-                    except:  # noqa E722
-                        pass
 
 
 class LocalizationCrossmatchHandler(BaseHandler):
@@ -5236,29 +5243,16 @@ class LocalizationCrossmatchHandler(BaseHandler):
             id2_int = int(id2)
         except (ValueError, TypeError):
             return self.error("Localization IDs must be integers")
-        local_temp_files = []
 
         async with self.AsyncSession() as session:
             try:
                 localization1 = await session.scalar(
-                    Localization.select(
-                        session.user_or_token,
-                        options=[
-                            undefer(Localization.uniq),
-                            undefer(Localization.probdensity),
-                        ],
-                    ).where(
+                    Localization.select(session.user_or_token).where(
                         Localization.id == id1_int,
                     )
                 )
                 localization2 = await session.scalar(
-                    Localization.select(
-                        session.user_or_token,
-                        options=[
-                            undefer(Localization.uniq),
-                            undefer(Localization.probdensity),
-                        ],
-                    ).where(
+                    Localization.select(session.user_or_token).where(
                         Localization.id == id2_int,
                     )
                 )
@@ -5266,25 +5260,26 @@ class LocalizationCrossmatchHandler(BaseHandler):
                 if localization1 is None or localization2 is None:
                     return self.error("Localization not found", status=404)
 
-                output_format = "fits"
-
-                skymap1 = localization1.flat_2d
-                skymap2 = localization2.flat_2d
-                skymap = skymap1 * skymap2
-                skymap = skymap / np.sum(skymap)
+                await localization1.load_skymap_arrays(session)
+                await localization2.load_skymap_arrays(session)
 
-                skymap = hp.reorder(skymap, "RING", "NESTED")
-                skymap = ligo_bayestar.derasterize(Table([skymap], names=["PROB"]))
-                with tempfile.NamedTemporaryFile(suffix=".fits") as fitsfile:
-                    ligo.skymap.io.write_sky_map(
-                        fitsfile.name, skymap, format="fits", moc=True
-                    )
+                output_format = "fits"
 
-                    with open(fitsfile.name, mode="rb") as g:
-                        content = g.read()
-                    local_temp_files.append(fitsfile.name)
+                # product of the multi-order maps, at the finer resolution of
+                # the two wherever they overlap
+                arrays1 = localization1.skymap_arrays
+                arrays2 = localization2.skymap_arrays
+                uniq, probdensity = moc_product(
+                    arrays1["UNIQ"],
+                    arrays1["PROBDENSITY"],
+                    arrays2["UNIQ"],
+                    arrays2["PROBDENSITY"],
+                )
+                skymap = Table([uniq, probdensity], names=["UNIQ", "PROBDENSITY"])
 
-                data = io.BytesIO(content)
+                data = io.BytesIO()
+                ligo.skymap.io.write_sky_map(data, skymap, format="fits", moc=True)
+                data.seek(0)
                 filename = f"{localization1.localization_name}_{localization2.localization_name}.{output_format}"
 
                 await self.send_file(
@@ -5295,13 +5290,6 @@ class LocalizationCrossmatchHandler(BaseHandler):
 
             except Exception as e:
                 return self.error(f"Failed to create skymap for download: str({e})")
-            finally:
-                # clean up local files
-                for f in local_temp_files:
-                    try:
-                        os.remove(f)
-                    except:  # noqa E722
-                        pass
 
 
 class GcnEventInstrumentFieldHandler(BaseHandler):
@@ -5898,10 +5886,79 @@ class ObjGcnEventHandler(BaseHandler):
             return self.success()
 
 
-def crossmatch_gcn_objects(obj_id, event_ids, user_id, integrated_probability=0.95):
-    """Find events in which an object is within the integrated probability contour.
-    obj_id : str
-        Object ID
+def gcn_crossmatch_matrix(
+    session, user, obj_ids, event_ids, integrated_probability=0.95
+):
+    """Crossmatch many objects against many GCN events at once.
+
+    Each event's first localization is reduced to its credible-region MOC
+    once, from the localization's own multi-order arrays, and every object's
+    HEALPix index is tested against every MOC in one vectorized pass. Objects
+    and events the user cannot access, objects without a position, and events
+    without a localization are left out.
+
+    Parameters
+    ----------
+    session : sqlalchemy.orm.Session
+        Synchronous database session.
+    user : User
+        User whose permissions apply.
+    obj_ids : list of str
+        Object IDs to crossmatch.
+    event_ids : list of int
+        GCN Event IDs to crossmatch against.
+    integrated_probability : float
+        Confidence level up to which to perform crossmatch.
+
+    Returns
+    -------
+    dict
+        ``obj_ids`` and ``dateobs`` label the rows and columns of ``member``
+        (whether the object is within the credible region of the event) and
+        ``cum_prob`` (cumulative probability of the tile containing the
+        object, NaN outside the skymap), both NumPy arrays of shape
+        ``(len(obj_ids), len(dateobs))``.
+    """
+    objs = session.execute(
+        Obj.select(user, columns=[Obj.id, Obj.healpix]).where(
+            Obj.id.in_(obj_ids), Obj.healpix.isnot(None)
+        )
+    ).all()
+
+    events = session.scalars(
+        GcnEvent.select(
+            user,
+            options=[joinedload(GcnEvent.localizations)],
+        ).where(GcnEvent.id.in_(event_ids))
+    ).unique()
+    localizations = {
+        event.dateobs: event.localizations[0]
+        for event in events
+        if len(event.localizations) > 0
+    }
+    dateobs = sorted(localizations)
+    mocs = []
+    for d in dateobs:
+        arrays = localizations[d].skymap_arrays
+        mocs.append(credible_region_moc(arrays["UNIQ"], arrays["PROBDENSITY"]))
+
+    member, cum_prob = crossmatch_matrix(
+        [obj.healpix for obj in objs], mocs, cumprob=integrated_probability
+    )
+    return {
+        "obj_ids": [obj.id for obj in objs],
+        "dateobs": dateobs,
+        "member": member,
+        "cum_prob": cum_prob,
+    }
+
+
+def crossmatch_gcn_objects(obj_ids, event_ids, user_id, integrated_probability=0.95):
+    """Find events in which objects are within the integrated probability contour,
+    and record each match as a pending GcnEventObj association.
+
+    obj_ids : str or List[str]
+        Object ID(s)
     events_id : List[int]
         GCN Event IDs to crossmatch against
     user_id : int
@@ -5909,6 +5966,8 @@ def crossmatch_gcn_objects(obj_id, event_ids, user_id, integrated_probability=0.
     integrated_probability : float
         Confidence level up to which to perform crossmatch
     """
+    if isinstance(obj_ids, str):
+        obj_ids = [obj_ids]
 
     if Session.registry.has():
         session = Session()
@@ -5918,101 +5977,40 @@ def crossmatch_gcn_objects(obj_id, event_ids, user_id, integrated_probability=0.
     user = session.scalar(sa.select(User).where(User.id == user_id))
 
     try:
-        obj = session.scalars(
-            Obj.select(user, mode="update").where(Obj.id == obj_id)
-        ).first()
-        if obj is None:
-            raise ValueError(f"Cannot find object with ID {obj_id}.")
-
-        events = []
-        for event_id in event_ids:
-            event = session.scalars(
-                GcnEvent.select(
-                    user,
-                    options=[
-                        joinedload(GcnEvent.localizations),
-                    ],
-                ).where(GcnEvent.id == event_id)
-            ).first()
-            if event is None:
-                continue
-            if len(event.localizations) == 0:
-                continue
-            localization_id = event.localizations[0].id
-
-            partition_key = event.dateobs
-            # now get the dateobs in the format YYYY_MM
-            localizationtile_partition_name = (
-                f"{partition_key.year}_{partition_key.month:02d}"
-            )
-            localizationtilescls = LocalizationTile.partitions.get(
-                localizationtile_partition_name, None
-            )
-            if localizationtilescls is None:
-                localizationtilescls = LocalizationTile
-            else:
-                # check that there is actually a localizationTile with the given localization_id in the partition
-                # if not, use the default partition
-                if not (
-                    session.scalars(
-                        sa.select(localizationtilescls.localization_id).where(
-                            localizationtilescls.localization_id == localization_id
-                        )
-                    ).first()
-                ):
-                    localizationtilescls = LocalizationTile.partitions.get(
-                        "def", LocalizationTile
-                    )
-
-            cum_prob = (
-                sa.func.sum(
-                    localizationtilescls.probdensity * localizationtilescls.healpix.area
-                )
-                .over(order_by=localizationtilescls.probdensity.desc())
-                .label("cum_prob")
-            )
-            localizationtile_subquery = (
-                sa.select(localizationtilescls.probdensity, cum_prob).filter(
-                    localizationtilescls.localization_id == localization_id
-                )
-            ).subquery()
-
-            min_probdensity = (
-                sa.select(
-                    sa.func.min(localizationtile_subquery.columns.probdensity)
-                ).filter(
-                    localizationtile_subquery.columns.cum_prob <= integrated_probability
-                )
-            ).scalar_subquery()
+        objs = session.scalars(
+            Obj.select(user, mode="update").where(Obj.id.in_(obj_ids))
+        ).all()
+        if len(objs) == 0:
+            raise ValueError(f"Cannot find objects with IDs {obj_ids}.")
 
-            obj_query = sa.select(Obj.id).where(
-                Obj.id == obj.id,
-                localizationtilescls.localization_id == localization_id,
-                localizationtilescls.probdensity >= min_probdensity,
-                localizationtilescls.healpix.contains(Obj.healpix),
-            )
-            obj_check = session.scalars(obj_query).first()
-            if obj_check is not None:
-                events.append(event.dateobs)
+        matrix = gcn_crossmatch_matrix(
+            session,
+            user,
+            [obj.id for obj in objs],
+            event_ids,
+            integrated_probability=integrated_probability,
+        )
+        matches = {
+            (matrix["obj_ids"][i], matrix["dateobs"][j])
+            for i, j in zip(*np.nonzero(matrix["member"]))
+        }
 
         # Record each containment as a pending association: the crossmatch
         # proposes, a human rules on it. Existing rows are left alone so a
         # decision already made is not reset to pending.
         existing = {
-            row.dateobs
+            (row.obj_id, row.dateobs)
             for row in session.scalars(
                 sa.select(GcnEventObj).where(
-                    GcnEventObj.obj_id == obj.id,
-                    GcnEventObj.dateobs.in_(events),
+                    GcnEventObj.obj_id.in_([obj_id for obj_id, _ in matches]),
+                    GcnEventObj.dateobs.in_([dateobs for _, dateobs in matches]),
                 )
             ).all()
         }
-        for dateobs in events:
-            if dateobs in existing:
-                continue
+        for obj_id, dateobs in sorted(matches - existing):
             session.add(
                 GcnEventObj(
-                    obj_id=obj.id,
+                    obj_id=obj_id,
                     dateobs=dateobs,
                     status="pending",
                     confirmer_id=user_id,
@@ -6021,15 +6019,16 @@ def crossmatch_gcn_objects(obj_id, event_ids, user_id, integrated_probability=0.
         session.commit()
 
         flow = Flow()
-        flow.push(
-            "*",
-            "skyportal/REFRESH_SOURCE",
-            payload={"obj_key": obj.internal_key},
-        )
+        for obj in objs:
+            flow.push(
+                "*",
+                "skyportal/REFRESH_SOURCE",
+                payload={"obj_key": obj.internal_key},
+            )
 
-        log(f"Generated GCN crossmatch for {obj_id}")
+        log(f"Generated GCN crossmatch for {', '.join(obj_ids)}")
     except Exception as e:
-        log(f"Unable to generate GCN crossmatch for {obj_id}: {e}")
+        log(f"Unable to generate GCN crossmatch for {', '.join(obj_ids)}: {e}")
     finally:
         session.close()
         Session.remove()
@@ -10,7 +10,6 @@ from astropy import coordinates
 from astropy import units as u
 from astropy.coordinates import SkyCoord
 from astropy.time import Time
-from healpix_alchemy import Tile
 from marshmallow.exceptions import ValidationError
 from regions import CircleSkyRegion, PolygonSkyRegion, RectangleSkyRegion, Regions
 from sqlalchemy.orm import (
@@ -33,14 +32,17 @@ from ...models import (
     Instrument,
     InstrumentField,
     InstrumentFieldTile,
+    InstrumentFieldUpload,
     InstrumentLog,
     Localization,
     LocalizationTile,
     Photometry,
     Telescope,
 )
+from ...utils import instrument_fields
 from ...utils.asynchronous import run_async
 from ...utils.cache import Cache, array_to_bytes
+from ...utils.naive_datetime import utcnow_naive
 from ..base import BaseHandler, format_doc
 
 log = make_log("api/instrument")
@@ -173,6 +175,12 @@ class InstrumentHandler(BaseHandler):
                             id:
                               type: integer
                               description: New instrument ID
+                            fields_upload_id:
+                              type: integer
+                              description: |
+                                ID of the generation of the fields, if
+                                field_data was given; follow it with
+                                GET /api/instrument/{id}/fields/upload
           400:
             content:
               application/json:
@@ -329,6 +337,7 @@ class InstrumentHandler(BaseHandler):
                         "Filters in references must be a subset of the instrument filters"
                     )
 
+            upload_id = None
             if field_data is not None:
                 if (field_region is None) and (field_fov_type is None):
                     return self.error(
@@ -343,21 +352,32 @@ class InstrumentHandler(BaseHandler):
                 if not {"ID", "RA", "Dec"}.issubset(field_data):
                     return self.error("ID, RA, and Dec required in field_data.")
 
-                log(f"Started generating fields for instrument {instrument.id}")
+                # read before the commit below expires the instrument
+                instrument_id, instrument_name = instrument.id, instrument.name
+                upload = InstrumentFieldUpload(instrument_id=instrument.id)
+                session.add(upload)
+                await session.commit()
+                upload_id = upload.id
+
+                log(f"Started generating fields for instrument {instrument_id}")
                 # run async
                 IOLoop.current().run_in_executor(
                     None,
                     lambda: add_tiles(
-                        instrument.id,
-                        instrument.name,
+                        instrument_id,
+                        instrument_name,
                         regions,
                         field_data,
                         references=references,
+                        upload_id=upload_id,
                     ),
                 )
 
             self.push_all(action="skyportal/REFRESH_INSTRUMENTS")
-            return self.success(data={"id": instrument.id})
+            data = {"id": instrument.id}
+            if upload_id is not None:
+                data["fields_upload_id"] = upload_id
+            return self.success(data=data)
 
     @auth_or_token
     async def get(self, instrument_id: int | None = None):
@@ -998,17 +1018,27 @@ class InstrumentHandler(BaseHandler):
                     if not {"ID", "RA", "Dec"}.issubset(field_data):
                         return self.error("ID, RA, and Dec required in field_data.")
 
-                log(f"Started generating fields for instrument {instrument.id}")
+                # read before the commit below expires the instrument
+                instrument_id, instrument_name = instrument.id, instrument.name
+                upload_id = None
+                if field_data is not None:
+                    upload = InstrumentFieldUpload(instrument_id=instrument.id)
+                    session.add(upload)
+                    await session.commit()
+                    upload_id = upload.id
+
+                log(f"Started generating fields for instrument {instrument_id}")
                 # run async
                 IOLoop.current().run_in_executor(
                     None,
                     lambda: add_tiles(
-                        instrument.id,
-                        instrument.name,
+                        instrument_id,
+                        instrument_name,
                         regions,
                         field_data,
                         references=references,
                         modify=True,
+                        upload_id=upload_id,
                     ),
                 )
 
@@ -1121,7 +1151,40 @@ def add_tiles(
     references=None,
     modify=False,
     session=None,
+    upload_id=None,
 ):
+    """Create (or, with ``modify``, replace) the fields of an instrument and
+    their tiles, from the field centers in ``field_data`` and the field shape
+    in ``regions``.
+
+    Parameters
+    ----------
+    instrument_id : int
+        Instrument the fields belong to.
+    instrument_name : str
+        Name of the instrument, for the fields' contours.
+    regions : regions.Region or list of regions.Region
+        Shape of the field, centered on (0, 0).
+    field_data : pandas.DataFrame
+        Field centers (``RA`` and ``Dec``) and, optionally, numbers (``ID``);
+        fields without a number are numbered after the instrument's last
+        one, unless the instrument already has a field at that position.
+        None to only set ``references``.
+    references : pandas.DataFrame, optional
+        Reference images (``field``, ``filter`` and ``limmag``) of the fields.
+    modify : bool
+        Whether to replace the fields the instrument already has with the
+        same numbers, rather than adding new ones.
+    session : sqlalchemy.orm.Session, optional
+        Database session, committed after each batch of fields.
+    upload_id : int, optional
+        InstrumentFieldUpload recording the progress.
+
+    Returns
+    -------
+    list of int
+        The number (``field_id``) of the field of each row of ``field_data``.
+    """
     field_ids = []
     if session is None:
         if Session.registry.has():
@@ -1207,204 +1270,156 @@ def add_tiles(
         coords = np.stack([np.array(ra), np.array(dec)])
 
         # Copy the tile coordinates such that there is one per field
-        # in the grid
+        # in the grid, and transform all of them at once
         coords_icrs = coordinates.SkyCoord(
             *np.tile(coords[:, np.newaxis, ...], (len(field_data["RA"]), 1, 1)),
             unit=u.deg,
             frame=skyoffset_frames[:, np.newaxis, np.newaxis],
         ).transform_to(coordinates.ICRS)
+        # vertices of shape (n_fields, n_regions, n_vertices)
+        vertices_ra, vertices_dec = coords_icrs.ra.deg, coords_icrs.dec.deg
+        del coords_icrs
 
         if "ID" in field_data:
-            ids = field_data["ID"]
+            ids = [int(field_id) for field_id in field_data["ID"]]
         else:
             ids = [-1] * len(field_data["RA"])
 
-        for ii, (field_id, ra, dec, coords) in enumerate(
-            zip(ids, field_data["RA"], field_data["Dec"], coords_icrs)
+        # Decide which fields to create, and which to replace (or, for fields
+        # numbered on insertion, skip), with one query for the existing fields.
+        existing = session.execute(
+            sa.select(
+                InstrumentField.id,
+                InstrumentField.field_id,
+                InstrumentField.ra,
+                InstrumentField.dec,
+            ).where(InstrumentField.instrument_id == instrument_id)
+        ).all()
+        id_by_position = {(f.ra, f.dec): f.field_id for f in existing}
+        id_by_field_id = {f.field_id: f.id for f in existing}
+        max_field_id = max((f.field_id or 0 for f in existing), default=0)
+        del existing
+
+        fields = []
+        for ii, (field_id, ra, dec) in enumerate(
+            zip(ids, field_data["RA"], field_data["Dec"])
         ):
-            if field_id == -1:
-                field = (
-                    DBSession()
-                    .scalars(
-                        sa.select(InstrumentField).where(
-                            InstrumentField.instrument_id == instrument_id,
-                            InstrumentField.ra == ra,
-                            InstrumentField.dec == dec,
-                        )
-                    )
-                    .first()
-                )
-                if field is not None:
-                    field_ids.append(field.field_id)
+            ra, dec = float(ra), float(dec)
+            numbered = field_id == -1
+            if numbered:
+                if (ra, dec) in id_by_position:
+                    field_ids.append(id_by_position[(ra, dec)])
                     continue
-
-            # compute full contour
-            geometry = []
-            for coord in coords:
-                tab = list(
-                    zip(
-                        (*coord.ra.deg, coord.ra.deg[0]),
-                        (*coord.dec.deg, coord.dec.deg[0]),
-                    )
-                )
-                geometry.append(tab)
-
-            contour = {
-                "properties": {
-                    "instrument": instrument_name,
-                    "field_id": int(field_id),
+                max_field_id += 1
+                field_id = max_field_id
+                id_by_position[(ra, dec)] = field_id
+            else:
+                max_field_id = max(max_field_id, field_id)
+            field_ids.append(field_id)
+
+            contour_args = (
+                instrument_name,
+                None if numbered else field_id,
+                ra,
+                dec,
+                vertices_ra[ii],
+                vertices_dec[ii],
+            )
+            contour = instrument_fields.field_contour(*contour_args)
+            fields.append(
+                {
+                    "index": ii,
+                    "numbered": numbered,
+                    "id": id_by_field_id.get(field_id) if modify else None,
+                    "field_id": field_id,
                     "ra": ra,
                     "dec": dec,
-                },
-                "type": "FeatureCollection",
-                "features": [
-                    {
-                        "type": "Feature",
-                        "geometry": {
-                            "type": "MultiLineString",
-                            "coordinates": geometry,
-                        },
-                    },
-                ],
-            }
-            if field_id == -1:
-                del contour["properties"]["field_id"]
-
-            if needs_summary:
-                # compute summary (bounding-box) contour
-                geometry = []
-                min_ra, max_ra = np.min(coords[0].ra.deg), np.max(coords[0].ra.deg)
-                min_dec, max_dec = np.min(coords[0].dec.deg), np.max(coords[0].dec.deg)
-                for coord in coords:
-                    min_ra = min(min_ra, np.min(coord.ra.deg))
-                    max_ra = max(max_ra, np.max(coord.ra.deg))
-                    min_dec = min(min_dec, np.min(coord.dec.deg))
-                    max_dec = max(max_dec, np.max(coord.dec.deg))
-                geometry_summary = [
-                    (min_ra, min_dec),
-                    (max_ra, min_dec),
-                    (max_ra, max_dec),
-                    (min_ra, max_dec),
-                    (min_ra, min_dec),
-                ]
+                    "contour": contour,
+                    "contour_summary": instrument_fields.field_contour_summary(
+                        *contour_args
+                    )
+                    if needs_summary
+                    else contour,
+                }
+            )
+
+        instrument_fields.update_upload(
+            session,
+            upload_id,
+            status="running",
+            num_total=len(fields),
+            num_processed=0,
+            started_at=utcnow_naive(),
+        )
+        session.commit()
 
-                contour_summary = {
-                    "properties": {
-                        "instrument": instrument_name,
-                        "field_id": int(field_id),
-                        "ra": ra,
-                        "dec": dec,
-                    },
-                    "type": "FeatureCollection",
-                    "features": [
+        # Tile the fields (on a process pool for large uploads), and write
+        # them in batches as their tiles come in.
+        indices = [field["index"] for field in fields]
+        tiled = instrument_fields.iter_field_ranges(
+            vertices_ra[indices], vertices_dec[indices]
+        )
+        for start in range(0, len(fields), instrument_fields.BATCH_SIZE):
+            batch = fields[start : start + instrument_fields.BATCH_SIZE]
+            for field in batch:
+                field["ranges"] = next(tiled)
+            instrument_fields.write_fields(session, instrument_id, batch)
+
+            references_batch = (
+                [
+                    field
+                    for field in batch
+                    if not field["numbered"] and field["field_id"] in reference_filters
+                ]
+                if references is not None
+                else []
+            )
+            if len(references_batch) > 0:
+                has_mags = "limmag" in list(references.columns)
+                session.execute(
+                    sa.update(InstrumentField),
+                    [
                         {
-                            "type": "Feature",
-                            "geometry": {
-                                "type": "LineString",
-                                "coordinates": geometry_summary,
-                            },
-                        },
+                            "id": field["id"],
+                            "reference_filters": reference_filters[field["field_id"]],
+                            **(
+                                {
+                                    "reference_filter_mags": reference_filter_mags[
+                                        field["field_id"]
+                                    ]
+                                }
+                                if has_mags
+                                else {}
+                            ),
+                        }
+                        for field in references_batch
                     ],
-                }
-                if field_id == -1:
-                    del contour_summary["properties"]["field_id"]
-            else:
-                contour_summary = contour
-
-            if field_id == -1:
-                max_field_id = session.execute(
-                    sa.select(sa.func.max(InstrumentField.field_id)).where(
-                        InstrumentField.instrument_id == instrument_id,
-                    )
-                ).scalar_one()
-                if max_field_id is None:
-                    max_field_id = 0
-
-                field = InstrumentField(
-                    instrument_id=instrument_id,
-                    contour=contour,
-                    contour_summary=contour_summary,
-                    ra=ra,
-                    dec=dec,
-                    field_id=max_field_id + 1,
                 )
-                session.add(field)
-                session.commit()
-            else:
-                create_field = True
-                if modify:
-                    field = session.scalars(
-                        sa.select(InstrumentField).where(
-                            InstrumentField.instrument_id == instrument_id,
-                            InstrumentField.field_id == int(field_id),
-                        )
-                    ).first()
 
-                    if field is not None:
-                        session.execute(
-                            sa.delete(InstrumentFieldTile).where(
-                                InstrumentFieldTile.instrument_id == instrument_id,
-                                InstrumentFieldTile.instrument_field_id == field.id,
-                            )
-                        )
-                        session.commit()
-
-                        create_field = False
-
-                if create_field:
-                    field = InstrumentField(
-                        instrument_id=instrument_id,
-                        field_id=int(field_id),
-                        contour=contour,
-                        contour_summary=contour_summary,
-                        ra=ra,
-                        dec=dec,
-                    )
-
-                    session.add(field)
-                    session.commit()
-                else:
-                    # we update the contour and contour_summary
-                    setattr(field, "contour", contour)
-                    setattr(field, "contour_summary", contour_summary)
-                    session.add(field)
-                    session.commit()
-
-                if references is not None and field_id in reference_filters:
-                    setattr(field, "reference_filters", reference_filters[field_id])
-                    if "limmag" in list(references.columns):
-                        setattr(
-                            field,
-                            "reference_filter_mags",
-                            reference_filter_mags[field_id],
-                        )
-                    session.add(field)
-                    session.commit()
-
-            field_ids.append(field.field_id)
-
-            tiles = []
-            for coord in coords:
-                for hpx in Tile.tiles_from_polygon_skycoord(coord):
-                    tiles.append(
-                        InstrumentFieldTile(
-                            instrument_id=instrument_id,
-                            instrument_field_id=field.id,
-                            healpix=hpx,
-                        )
-                    )
-            session.add_all(tiles)
+            instrument_fields.update_upload(
+                session, upload_id, num_processed=start + len(batch)
+            )
             session.commit()
+            # release the written fields' contours and tiles
+            fields[start : start + len(batch)] = [None] * len(batch)
 
         instrument = session.scalars(
             sa.select(Instrument).where(
                 Instrument.id == instrument_id,
             )
         ).first()
-        if instrument is not None and len(instrument.fields) > 0:
-            instrument.has_fields = True
-        else:
-            instrument.has_fields = False
+        if instrument is not None:
+            instrument.has_fields = (
+                session.scalar(
+                    sa.select(InstrumentField.id)
+                    .where(InstrumentField.instrument_id == instrument_id)
+                    .limit(1)
+                )
+                is not None
+            )
+        instrument_fields.update_upload(
+            session, upload_id, status="done", finished_at=utcnow_naive()
+        )
         session.commit()
 
         log(f"Successfully generated fields for instrument {instrument_id}")
@@ -1420,6 +1435,18 @@ def add_tiles(
         run_async(vaccum_analyze_instrumentfieldtiles)
     except Exception as e:
         log(f"Unable to generate fields for instrument {instrument_id}: {e}")
+        session.rollback()
+        try:
+            instrument_fields.update_upload(
+                session,
+                upload_id,
+                status="failed",
+                finished_at=utcnow_naive(),
+                error=str(e),
+            )
+            session.commit()
+        except Exception as e:
+            log(f"Unable to record the failure of fields upload {upload_id}: {e}")
     finally:
         Session.remove()
         return field_ids
@@ -1478,3 +1505,68 @@ class InstrumentFieldHandler(BaseHandler):
 
         self.push_all(action="skyportal/REFRESH_INSTRUMENTS")
         return self.success()
+
+
+class InstrumentFieldUploadHandler(BaseHandler):
+    @auth_or_token
+    async def get(self, instrument_id: int, upload_id: int | None = None):
+        """
+        ---
+        summary: Get the progress of an instrument's fields upload
+        description: |
+          Progress of the background generation of an instrument's fields
+          and their tiles from an uploaded field list (the most recent one
+          if no ID is given), with an estimate of the time remaining.
+        tags:
+          - instruments
+        responses:
+          200:
+            content:
+              application/json:
+                schema:
+                  allOf:
+                    - $ref: '#/components/schemas/Success'
+                    - type: object
+                      properties:
+                        data:
+                          type: object
+                          properties:
+                            fractionDone:
+                              type: number
+                            etaSeconds:
+                              type: number
+                              nullable: true
+          400:
+            content:
+              application/json:
+                schema: Error
+        """
+        async with self.AsyncSession() as session:
+            stmt = InstrumentFieldUpload.select(session.user_or_token).where(
+                InstrumentFieldUpload.instrument_id == instrument_id
+            )
+            if upload_id is not None:
+                stmt = stmt.where(InstrumentFieldUpload.id == upload_id)
+            else:
+                stmt = stmt.order_by(InstrumentFieldUpload.created_at.desc()).limit(1)
+            upload = await session.scalar(stmt)
+            if upload is None:
+                return self.error(
+                    f"No fields upload with ID {upload_id} for instrument {instrument_id}"
+                    if upload_id is not None
+                    else f"No fields upload for instrument {instrument_id}"
+                )
+
+            data = upload.to_dict()
+            data["fractionDone"] = (
+                upload.num_processed / upload.num_total
+                if upload.num_total
+                else (1.0 if upload.status == "done" else 0.0)
+            )
+            data["etaSeconds"] = None
+            if upload.status == "running" and upload.num_total is not None:
+                elapsed = (utcnow_naive() - upload.started_at).total_seconds()
+                if upload.num_processed > 0 and elapsed > 0:
+                    remaining = max(upload.num_total - upload.num_processed, 0)
+                    data["etaSeconds"] = remaining * elapsed / upload.num_processed
+            return self.success(data=data)
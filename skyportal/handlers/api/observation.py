@@ -13,7 +13,6 @@ import numpy as np
 import pandas as pd
 import requests
 import sqlalchemy as sa
-from astropy.coordinates import SkyCoord
 from astropy.time import Time, TimeDelta
 from marshmallow.exceptions import ValidationError
 from pydantic import Field
@@ -45,13 +44,13 @@ from ...models import (
     Localization,
     LocalizationTile,
     QueuedObservation,
-    SurveyEfficiencyForObservationPlan,
     SurveyEfficiencyForObservations,
     Telescope,
 )
 from ...models.schema import ObservationExternalAPIHandlerPost
+from ...utils import healpix_ranges
 from ...utils.cache import Cache
-from ...utils.observation_plan import combine_healpix_tuples
+from ...utils.executed_observations import copy_executed_observations
 from ...utils.parse import str_to_bool
 from ...utils.simsurvey import (
     get_simsurvey_parameters,
@@ -62,7 +61,6 @@ from .observation_plan import (
     TREASUREMAP_FILTERS,
     TREASUREMAP_INSTRUMENT_IDS,
     TREASUREMAP_URL,
-    observation_simsurvey,
     observation_simsurvey_plot,
 )
 
@@ -195,96 +193,20 @@ def add_observations(instrument_id, obstable):
         obstable["field_id"] = field_ids
 
     try:
-        id_mapper = {}  # mapper from Instrument.field_id to InstrumentField.id
-        unique_field_ids = obstable["field_id"].unique()
-        unique_field_ids_batched = np.array_split(unique_field_ids, 100)
-        for field_ids in unique_field_ids_batched:
-            fields = (
-                session.scalars(
-                    sa.select(InstrumentField).where(
-                        InstrumentField.instrument_id == int(instrument_id),
-                        InstrumentField.field_id.in_([int(f) for f in field_ids]),
-                    )
-                )
-                .unique()
-                .all()
+        try:
+            inserted = copy_executed_observations(session, instrument_id, obstable)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            return log(
+                f"Unable to add observations for instrument {instrument_id}: {e}"
             )
-            missing = list(set(field_ids) - {f.field_id for f in fields})
-            if len(missing) > 0:
-                return log(
-                    f"Unable to add observations for instrument {instrument_id}: {len(missing)} fields are missing: {missing[:100]}"
-                )
-            for field in fields:
-                id_mapper[field.field_id] = field.id
-
-        del unique_field_ids, unique_field_ids_batched
-
-        # same here, we batch query the DB to see what observations already exist
-        unique_observation_ids = obstable["observation_id"].unique()
-        unique_observation_ids_batched = np.array_split(unique_observation_ids, 100)
-        missing = []
-        for observation_ids in unique_observation_ids_batched:
-            observations = session.scalars(
-                sa.select(ExecutedObservation.observation_id).where(
-                    ExecutedObservation.instrument_id == int(instrument_id),
-                    ExecutedObservation.observation_id.in_(
-                        [int(o) for o in observation_ids]
-                    ),
-                )
-            ).all()
-            missing.extend(set(observation_ids) - set(observations))
 
-        if len(missing) < len(unique_observation_ids):
+        if inserted < len(obstable):
             log(
-                f"Unable to add some observations for instrument {instrument_id}: {len(unique_observation_ids) - len(missing)} observations (out of {len(unique_observation_ids)}) already exist. These will be skipped"
+                f"Unable to add some observations for instrument {instrument_id}: {len(obstable) - inserted} observations (out of {len(obstable)}) already exist. These will be skipped"
             )
 
-        # remove the observations that already exist, so only keep those which id is in the missing list
-        obstable = obstable[obstable["observation_id"].isin(missing)]
-
-        del missing, unique_observation_ids, unique_observation_ids_batched
-
-        # again, batch the insertions. Split the positional indices (a numpy
-        # array) and slice with iloc, rather than np.array_split(obstable, ...):
-        # as of pandas 3.0 the latter returns numpy ndarrays (not DataFrames),
-        # which lack .iterrows().
-        for index_chunk in np.array_split(np.arange(len(obstable)), 100):
-            if len(index_chunk) == 0:
-                continue
-            chunk = obstable.iloc[index_chunk]
-            observations = []
-            try:
-                for _, row in chunk.iterrows():
-                    # enable multiple obstime formats
-                    try:
-                        # can catch iso and isot this way
-                        obstime = Time(row["obstime"])
-                    except ValueError:
-                        # otherwise catch jd as the numerical example
-                        obstime = Time(row["obstime"], format="jd")
-
-                    observations.append(
-                        ExecutedObservation(
-                            instrument_id=instrument_id,
-                            observation_id=int(row["observation_id"]),
-                            instrument_field_id=int(id_mapper[row["field_id"]]),
-                            obstime=obstime.datetime,
-                            seeing=row.get("seeing", None),
-                            limmag=float(row["limmag"]),
-                            exposure_time=int(row["exposure_time"]),
-                            filt=row["filter"],
-                            processed_fraction=float(row["processed_fraction"]),
-                            target_name=row["target_name"],
-                        )
-                    )
-                session.add_all(observations)
-                session.commit()
-            except Exception as e:
-                session.rollback()
-                return log(
-                    f"Unable to add observations for instrument {instrument_id}: {e}"
-                )
-
         flow = Flow()
         flow.push("*", "skyportal/REFRESH_OBSERVATIONS")
 
@@ -569,13 +491,16 @@ async def get_observations(
         if return_statistics:
             if stats_method == "python":
                 t0 = time.time()
-                localization_tiles_result = await session.scalars(
-                    sa.select(localizationtilescls)
+                localization_tiles_result = await session.execute(
+                    sa.select(
+                        localizationtilescls.healpix.lower,
+                        localizationtilescls.healpix.upper,
+                        localizationtilescls.probdensity,
+                    )
                     .where(
                         localizationtilescls.localization_id == localization.id,
                         localizationtilescls.probdensity >= min_probdensity,
                     )
-                    .order_by(localizationtilescls.probdensity.desc())
                     .distinct()
                 )
                 localization_tiles = localization_tiles_result.all()
@@ -587,81 +512,27 @@ async def get_observations(
                     )
 
                 t0 = time.time()
-                instrument_field_tuples_result = await session.execute(
-                    sa.select(
-                        InstrumentFieldTile.healpix.lower,
-                        InstrumentFieldTile.healpix.upper,
-                    )
-                    .join(
-                        obs_subquery,
-                        InstrumentFieldTile.instrument_field_id
-                        == obs_subquery.c.instrument_field_id,
-                    )
-                    .order_by(InstrumentFieldTile.healpix.lower)
-                    .distinct()
+                fields = await healpix_ranges.load_fields_async(
+                    session,
+                    sa.select(obs_subquery.c.instrument_field_id),
                 )
-                instrument_field_tuples = instrument_field_tuples_result.all()
-
-                field_lower_bounds = np.array([f[0] for f in instrument_field_tuples])
-                field_upper_bounds = np.array([f[1] for f in instrument_field_tuples])
-
                 if stats_logging:
                     log(
                         "STATS: ",
-                        f"Number of field tiles= {len(instrument_field_tuples)}. "
+                        f"len(merged_tuples)= {len(fields[0])}, "
+                        f"total_area= {healpix_ranges.area(fields):.2f}. "
                         f"Runtime= {time.time() - t0:.2f}s. ",
                     )
 
+                # total area and integrated probability of the localization
+                # tiles covered by the fields
                 t0 = time.time()
-                merged_tuples = combine_healpix_tuples(instrument_field_tuples)
-                total_area = sum(t[1] - t[0] for t in merged_tuples)
-                total_area *= ha.constants.PIXEL_AREA
-                if stats_logging:
-                    log(
-                        "STATS: ",
-                        f"len(merged_tuples)= {len(merged_tuples)}, "
-                        f"total_area= {total_area:.2f}. "
-                        f"Runtime= {time.time() - t0:.2f}s. ",
-                    )
-
-                t0 = time.time()
-                intarea = 0  # total area covered by instrument field tiles
-                intprob = 0  # total probability covered by instrument field tiles
-
-                for i, t in enumerate(localization_tiles):
-                    # has True values where tile t has any overlap with one of the fields
-                    overlap_array = np.logical_and(
-                        t.healpix.lower <= field_upper_bounds,
-                        t.healpix.upper >= field_lower_bounds,
-                    )
-                    overlap_indices = np.where(overlap_array)[0]
-
-                    # only add area/prob if there's any overlap
-                    overlap = 0
-                    if len(overlap_indices) > 0:
-                        # print(f'sum(overlap_array): {np.sum(overlap_array)}')
-                        lower_upper = zip(
-                            field_lower_bounds[overlap_indices],
-                            field_upper_bounds[overlap_indices],
-                        )
-                        # tuples of (lower, upper) for all fields that overlap with tile t
-                        new_fields = [(tup[0], tup[1]) for tup in lower_upper]
-
-                        # combine any overlapping fields
-                        output_fields = combine_healpix_tuples(new_fields)
-
-                        # get the area of the combined fields that overlaps with tile t
-                        for lower, upper in output_fields:
-                            mx = np.minimum(t.healpix.upper, upper)
-                            mn = np.maximum(t.healpix.lower, lower)
-                            overlap += mx - mn
-
-                    intarea += overlap
-                    intprob += t.probdensity * overlap
-
-                # sum_probability *= ha.constants.PIXEL_AREA
-                intarea *= ha.constants.PIXEL_AREA
-                intprob *= ha.constants.PIXEL_AREA
+                intarea, intprob = healpix_ranges.coverage(
+                    fields,
+                    [t[0] for t in localization_tiles],
+                    [t[1] for t in localization_tiles],
+                    [t[2] for t in localization_tiles],
+                )
 
                 if stats_logging:
                     log(
@@ -2003,182 +1874,16 @@ class ObservationTreasureMapHandler(BaseHandler):
             return self.success()
 
 
-def retrieve_observations_and_simsurvey(
-    session,
-    start_date,
-    end_date,
-    localization_id,
-    instrument_id,
-    survey_efficiency_analysis_id,
-    survey_efficiency_analysis_type,
-):
-    """Query for observations and run survey analysis
-
-    Parameters
-    ----------
-
-    session: sqlalchemy.Session
-        Database session for this transaction
-    start_date: datetime
-        Start time of the observations
-    end_date: datetime
-        End time of the observations
-    localization_id : int
-        The id of the skyportal.models.localization.Localization that the request is made based on
-    instrument_id : int
-        The id of the skyportal.models.instrument.Instrument that the request is made based on
-    survey_efficiency_analysis_id : int
-        The id of the survey efficiency analysis for the request (either skyportal.models.survey_efficiency.SurveyEfficiencyForObservations or skyportal.models.survey_efficiency.SurveyEfficiencyForObservationPlan).
-    survey_efficiency_analysis_type : str
-        Either SurveyEfficiencyForObservations or SurveyEfficiencyForObservationPlan.
-    """
-
-    if survey_efficiency_analysis_type == "SurveyEfficiencyForObservations":
-        survey_efficiency_analysis = session.scalars(
-            sa.select(SurveyEfficiencyForObservations).where(
-                SurveyEfficiencyForObservations.id == survey_efficiency_analysis_id
-            )
-        ).first()
-        if survey_efficiency_analysis is None:
-            raise ValueError(
-                f"No SurveyEfficiencyForObservations with ID {survey_efficiency_analysis_id}"
-            )
-    elif survey_efficiency_analysis_type == "SurveyEfficiencyForObservations":
-        survey_efficiency_analysis = session.scalars(
-            sa.select(SurveyEfficiencyForObservationPlan).where(
-                SurveyEfficiencyForObservationPlan.id == survey_efficiency_analysis_id
-            )
-        ).first()
-        if survey_efficiency_analysis is None:
-            raise ValueError(
-                f"No SurveyEfficiencyForObservationPlan with ID {survey_efficiency_analysis_id}"
-            )
-    else:
-        raise ValueError(
-            "survey_efficiency_analysis_type must be SurveyEfficiencyForObservations or SurveyEfficiencyForObservationPlan"
-        )
-
-    payload = survey_efficiency_analysis.payload
-
-    instrument = session.scalars(
-        sa.select(Instrument)
-        .options(joinedload(Instrument.telescope))
-        .where(Instrument.id == instrument_id)
-    ).first()
-
-    localization = session.scalars(
-        sa.select(Localization).where(Localization.id == localization_id)
-    ).first()
-
-    # get_observations is async; bridge from this sync executor thread by
-    # opening an AsyncVerifiedSession on a temporary event loop.
-    import asyncio
-
-    from baselayer.app.models import AsyncVerifiedSession
-
-    user = session.user_or_token
-
-    async def _fetch_observations():
-        async with AsyncVerifiedSession(user) as asession:
-            return await get_observations(
-                asession,
-                start_date,
-                end_date,
-                telescope_name=instrument.telescope.name,
-                instrument_name=instrument.name,
-                localization_dateobs=localization.dateobs,
-                localization_name=localization.localization_name,
-                localization_cumprob=payload["localization_cumprob"],
-            )
-
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        data = loop.run_until_complete(_fetch_observations())
-    finally:
-        loop.close()
-
-    observations = data["observations"]
-
-    if len(observations) == 0:
-        raise ValueError("Need at least one observation to run SimSurvey")
-
-    unique_filters = list({observation["filt"] for observation in observations})
-
-    if not set(unique_filters).issubset(set(instrument.sensitivity_data.keys())):
-        raise ValueError("Need sensitivity_data for all filters present")
-
-    for filt in unique_filters:
-        if not {"exposure_time", "limiting_magnitude", "zeropoint"}.issubset(
-            set(instrument.sensitivity_data[filt].keys())
-        ):
-            raise ValueError(
-                f"Sensitivity_data dictionary missing keys for filter {filt}"
-            )
-
-    # get height and width
-    stmt = (
-        InstrumentField.select(session.user_or_token)
-        .where(InstrumentField.id == observations[0]["field"]["id"])
-        .options(undefer(InstrumentField.contour_summary))
-    )
-    field = session.scalars(stmt).first()
-    if field is None:
-        raise ValueError(
-            f"Missing field {observations[0]['field']['id']} required to estimate field size"
-        )
-    contour_summary = field.to_dict()["contour_summary"]["features"][0]
-    coordinates = np.squeeze(np.array(contour_summary["geometry"]["coordinates"]))
-    coords = SkyCoord(
-        coordinates[:, 0] * u.deg, coordinates[:, 1] * u.deg, frame="icrs"
-    )
-    width, height = None, None
-    for c1 in coords:
-        for c2 in coords:
-            dra, ddec = c1.spherical_offsets_to(c2)
-            dra = dra.to(u.deg)
-            ddec = ddec.to(u.deg)
-            if width is None and height is None:
-                width = dra
-                height = ddec
-            else:
-                if dra > width:
-                    width = dra
-                if ddec > height:
-                    height = ddec
-
-    observation_simsurvey(
-        observations,
-        localization.id,
-        instrument.id,
-        survey_efficiency_analysis_id,
-        survey_efficiency_analysis_type,
-        width=width.value,
-        height=height.value,
-        number_of_injections=payload["number_of_injections"],
-        number_of_detections=payload["number_of_detections"],
-        detection_threshold=payload["detection_threshold"],
-        minimum_phase=payload["minimum_phase"],
-        maximum_phase=payload["maximum_phase"],
-        model_name=payload["model_name"],
-        optional_injection_parameters=payload["optional_injection_parameters"],
-    )
-
-    flow = Flow()
-    flow.push(
-        "*",
-        "skyportal/REFRESH_GCNEVENT_SURVEY_EFFICIENCY",
-        payload={"gcnEvent_dateobs": localization.dateobs},
-    )
-
-
 class ObservationSimSurveyHandler(BaseHandler):
     @auth_or_token
     async def get(self, instrument_id: InstrumentId):
         """
         ---
         summary: Perform SimSurvey efficiency calculation
-        description: Perform simsurvey efficiency calculation
+        description: |
+          Queue a simsurvey efficiency calculation. The analysis is run by
+          the survey efficiency queue; its light curves are updated as
+          batches of injections complete.
         tags:
           - observations
         parameters:
@@ -2415,7 +2120,7 @@ class ObservationSimSurveyHandler(BaseHandler):
                 localization_id=localization.id,
                 groups=groups,
                 payload=payload,
-                status="running",
+                status="pending submission",
             )
 
             session.add(survey_efficiency_analysis)
@@ -2427,34 +2132,11 @@ class ObservationSimSurveyHandler(BaseHandler):
             )
 
             self.push_notification(
-                "Simsurvey analysis in progress. Should be available soon."
+                "Simsurvey analysis queued. Should be available soon."
             )
 
-            # retrieve_observations_and_simsurvey is sync and runs in an executor
-            # thread. Open a fresh sync Session inside that helper rather than
-            # passing the async session through.
+            # the survey_efficiency_queue service runs the analysis
             sea_id = survey_efficiency_analysis.id
-            localization_id_final = localization.id
-            instrument_id_final = instrument.id
-
-            def _run_simsurvey():
-                sync_session = Session(bind=DBSession.session_factory.kw["bind"])
-                try:
-                    sync_session.user_or_token = self.current_user
-                    retrieve_observations_and_simsurvey(
-                        sync_session,
-                        start_date,
-                        end_date,
-                        localization_id_final,
-                        instrument_id_final,
-                        sea_id,
-                        "SurveyEfficiencyForObservations",
-                    )
-                finally:
-                    sync_session.close()
-                    Session.remove()
-
-            IOLoop.current().run_in_executor(None, _run_simsurvey)
 
             return self.success(data={"id": sea_id})
 
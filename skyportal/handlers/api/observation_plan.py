@@ -3,7 +3,6 @@ import functools
 import io
 import json
 import operator  # noqa: F401
-import os
 import random
 import re
 import tempfile
@@ -13,7 +12,6 @@ import uuid
 from datetime import datetime, timedelta
 from typing import Annotated
 
-import afterglowpy
 import arrow
 import astropy
 import geopandas
@@ -27,8 +25,6 @@ import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 import requests
-import simsurvey
-import sncosmo
 import sqlalchemy as sa
 from astroplan import (
     AirmassConstraint,
@@ -41,14 +37,10 @@ from astropy.coordinates import EarthLocation, SkyCoord
 from astropy.time import Time
 from astropy.utils.masked import MaskedNDArray
 from ligo.skymap import plot  # noqa: F401 F811
-from ligo.skymap.bayestar import rasterize
-from ligo.skymap.distance import parameters_to_marginal_moments
 from ligo.skymap.tool.ligo_skymap_plot_airmass import main as plot_airmass
 from marshmallow.exceptions import ValidationError
 from matplotlib import animation, dates
 from pydantic import Field
-from simsurvey.models import AngularTimeSeriesSource
-from simsurvey.utils import model_tools
 from sncosmo import get_bandpass
 from sqlalchemy import func
 from sqlalchemy.orm import (
@@ -95,7 +87,12 @@ from ...models.schema import ObservationPlanPost
 from ...utils.earthquake import COUNTRIES_FILE
 from ...utils.naive_datetime import utcnow_naive
 from ...utils.parse import get_page_and_n_per_page
-from ...utils.simsurvey import get_simsurvey_parameters, random_parameters_notheta
+from ...utils.simsurvey import (
+    get_simsurvey_parameters,
+    localization_skymap,
+    simulate_lightcurves,
+    survey_pointings,
+)
 from ..base import BaseHandler, format_doc
 
 LocalizationId = Annotated[
@@ -1961,20 +1958,15 @@ class ObservationPlanMovieHandler(BaseHandler):
                 )
 
             localization = await session.scalar(
-                Localization.select(session.user_or_token)
-                .where(Localization.id == observation_plan_request.localization_id)
-                .options(
-                    undefer(Localization.uniq),
-                    undefer(Localization.probdensity),
-                    undefer(Localization.distmu),
-                    undefer(Localization.distsigma),
-                    undefer(Localization.distnorm),
+                Localization.select(session.user_or_token).where(
+                    Localization.id == observation_plan_request.localization_id
                 )
             )
             if localization is None:
                 return self.error(
                     message=f"Invalid Localization dateobs: {observation_plan_request.localization_id}"
                 )
+            await localization.load_skymap_arrays(session)
 
             observation_plans = observation_plan_request.observation_plans
             if not observation_plans or not observation_plans[0].planned_observations:
@@ -2509,18 +2501,11 @@ class ObservationPlanWorldmapPlotHandler(BaseHandler):
             result = await session.scalars(stmt)
             telescopes = result.all()
 
-            stmt = (
-                Localization.select(self.current_user)
-                .where(Localization.id == localization_id_int)
-                .options(
-                    undefer(Localization.uniq),
-                    undefer(Localization.probdensity),
-                    undefer(Localization.distmu),
-                    undefer(Localization.distsigma),
-                    undefer(Localization.distnorm),
-                )
+            stmt = Localization.select(self.current_user).where(
+                Localization.id == localization_id_int
             )
             localization = await session.scalar(stmt)
+            await localization.load_skymap_arrays(session)
             m = localization.flat_2d
             nside = localization.nside
             npix = len(m)
@@ -2768,18 +2753,11 @@ class ObservationPlanAirmassChartHandler(BaseHandler):
             )
             telescope = await session.scalar(stmt)
 
-            stmt = (
-                Localization.select(self.current_user)
-                .where(Localization.id == localization_id_int)
-                .options(
-                    undefer(Localization.uniq),
-                    undefer(Localization.probdensity),
-                    undefer(Localization.distmu),
-                    undefer(Localization.distsigma),
-                    undefer(Localization.distnorm),
-                )
+            stmt = Localization.select(self.current_user).where(
+                Localization.id == localization_id_int
             )
             localization = await session.scalar(stmt)
+            await localization.load_skymap_arrays(session)
 
             trigger_time = astropy.time.Time(localization.dateobs, format="datetime")
 
@@ -3038,206 +3016,22 @@ def observation_simsurvey(
                 "survey_efficiency_analysis_type must be SurveyEfficiencyForObservations or SurveyEfficiencyForObservationPlan"
             )
 
-        trigger_time = astropy.time.Time(localization.dateobs, format="datetime")
-
-        keys = ["ra", "dec", "field_id", "limMag", "jd", "filter", "skynoise"]
-        pointings = {k: [] for k in keys}
-        for obs in observations:
-            nmag = -2.5 * np.log10(
-                np.sqrt(
-                    instrument.sensitivity_data[obs["filt"]]["exposure_time"]
-                    / obs["exposure_time"]
-                )
-            )
-
-            if "limmag" in obs:
-                limMag = obs["limmag"]
-            else:
-                limMag = (
-                    instrument.sensitivity_data[obs["filt"]]["limiting_magnitude"]
-                    + nmag
-                )
-            zp = instrument.sensitivity_data[obs["filt"]]["zeropoint"] + nmag
-
-            pointings["ra"].append(obs["field"]["ra"])
-            pointings["dec"].append(obs["field"]["dec"])
-            pointings["filter"].append(obs["filt"])
-            pointings["jd"].append(Time(obs["obstime"], format="datetime").jd)
-            pointings["field_id"].append(obs["field"]["field_id"])
-
-            pointings["limMag"].append(limMag)
-            pointings["skynoise"].append(10 ** (-0.4 * (limMag - zp)) / 5.0)
-            pointings["zp"] = zp
-
-        df = pd.DataFrame.from_dict(pointings)
-        plan = simsurvey.SurveyPlan(
-            time=df["jd"],
-            band=df["filter"],
-            obs_field=df["field_id"].astype(int),
-            skynoise=df["skynoise"],
-            zp=df["zp"],
-            width=width,
-            height=height,
-            fields={
-                k: v for k, v in pointings.items() if k in ["ra", "dec", "field_id"]
-            },
+        data = simulate_lightcurves(
+            survey_pointings(observations, instrument.sensitivity_data),
+            localization_skymap(localization),
+            width,
+            height,
+            number_of_injections=number_of_injections,
+            number_of_detections=number_of_detections,
+            detection_threshold=detection_threshold,
+            minimum_phase=minimum_phase,
+            maximum_phase=maximum_phase,
+            model_name=model_name,
+            optional_injection_parameters=optional_injection_parameters,
         )
 
-        order = hp.nside2order(localization.nside)
-        t = rasterize(localization.table, order)
-
-        if {"DISTMU", "DISTSIGMA", "DISTNORM"}.issubset(set(t.colnames)):
-            result = t["PROB"], t["DISTMU"], t["DISTSIGMA"], t["DISTNORM"]
-            hp_data = hp.reorder(result, "NESTED", "RING")
-            map_struct = {}
-            map_struct["prob"] = hp_data[0]
-            map_struct["distmu"] = hp_data[1]
-            map_struct["distsigma"] = hp_data[2]
-
-            distmean, diststd = parameters_to_marginal_moments(
-                map_struct["prob"], map_struct["distmu"], map_struct["distsigma"]
-            )
-
-            distance_lower = astropy.coordinates.Distance(
-                np.max([1, (distmean - 5 * diststd)]) * u.Mpc
-            )
-            distance_upper = astropy.coordinates.Distance(
-                np.max([2, (distmean + 5 * diststd)]) * u.Mpc
-            )
-        else:
-            result = t["PROB"]
-            hp_data = hp.reorder(result, "NESTED", "RING")
-            map_struct = {}
-            map_struct["prob"] = hp_data
-            distance_lower = astropy.coordinates.Distance(1 * u.Mpc)
-            distance_upper = astropy.coordinates.Distance(1000 * u.Mpc)
-
-        if model_name == "kilonova":
-            phase, wave, cos_theta, flux = model_tools.read_possis_file(
-                optional_injection_parameters["injection_filename"]
-            )
-            transientprop = {
-                "lcmodel": sncosmo.Model(
-                    AngularTimeSeriesSource(
-                        phase=phase, wave=wave, flux=flux, cos_theta=cos_theta
-                    )
-                )
-            }
-            template = "AngularTimeSeriesSource"
-
-        elif model_name == "afterglow":
-            phases = np.linspace(
-                optional_injection_parameters["t_i"],
-                optional_injection_parameters["t_f"],
-                optional_injection_parameters["ntime"],
-            )
-            wave = np.linspace(
-                optional_injection_parameters["lambda_min"],
-                optional_injection_parameters["lambda_max"],
-                optional_injection_parameters["nlambda"],
-            )
-            nu = 3e8 / (wave * 1e-10)
-
-            grb_param_keys = [
-                "jetType",
-                "specType",
-                "thetaObs",
-                "E0",
-                "thetaCore",
-                "thetaWing",
-                "n0",
-                "p",
-                "epsilon_e",
-                "epsilon_B",
-                "z",
-                "d_L",
-                "xi_N",
-            ]
-            grb_params = {k: optional_injection_parameters[k] for k in grb_param_keys}
-            # explicitly case E0 and d_L as float as they like to be an int
-            grb_params["E0"] = float(grb_params["E0"])
-            grb_params["d_L"] = float(grb_params["d_L"])
-
-            flux = []
-            for phase in phases:
-                t = phase * np.ones(nu.shape)
-                mJys = afterglowpy.fluxDensity(t, nu, **grb_params)
-                Jys = 1e-3 * mJys
-                # convert to erg/s/cm^2/A
-                flux.append(Jys * 2.99792458e-05 / (wave**2))
-            transientprop = {
-                "lcmodel": sncosmo.Model(
-                    sncosmo.TimeSeriesSource(phases, wave, np.array(flux))
-                ),
-                "lcsimul_func": random_parameters_notheta,
-            }
-            template = None
-
-        elif model_name == "linear":
-            phases = np.linspace(
-                optional_injection_parameters["t_i"],
-                optional_injection_parameters["t_f"],
-                optional_injection_parameters["ntime"],
-            )
-            wave = np.linspace(
-                optional_injection_parameters["lambda_min"],
-                optional_injection_parameters["lambda_max"],
-                optional_injection_parameters["nlambda"],
-            )
-            magdiff = (
-                optional_injection_parameters["mag"]
-                + phases * optional_injection_parameters["dmag"]
-            )
-            F_Lxlambda2 = 10 ** (-(magdiff + 2.406) / 2.5)
-            waves, F_Lxlambda2s = np.meshgrid(wave, F_Lxlambda2)
-            flux = F_Lxlambda2s / (waves) ** 2
-            transientprop = {
-                "lcmodel": sncosmo.Model(sncosmo.TimeSeriesSource(phases, wave, flux)),
-                "lcsimul_func": random_parameters_notheta,
-            }
-            template = None
-
-        tr = simsurvey.get_transient_generator(
-            [distance_lower.z, distance_upper.z],
-            transient="generic",
-            template=template,
-            ntransient=number_of_injections,
-            ratefunc=lambda z: 5e-7,
-            dec_range=(-90, 90),
-            ra_range=(0, 360),
-            mjd_range=(trigger_time.jd, trigger_time.jd),
-            transientprop=transientprop,
-            skymap=map_struct,
-            sfd98_dir=os.path.join(cfg["misc.dustmap_folder"], "sfd"),
-            apply_mwebv=True,
-        )
-
-        survey = simsurvey.SimulSurvey(
-            generator=tr,
-            plan=plan,
-            phase_range=(minimum_phase, maximum_phase),
-            n_det=number_of_detections,
-            threshold=detection_threshold,
-        )
-
-        lcs = survey.get_lightcurves(notebook=True)
-
-        data = {
-            "lcs": lcs._properties["lcs"],
-            "meta": lcs._properties["meta"],
-            "meta_rejected": lcs._properties["meta_rejected"],
-            "meta_notobserved": lcs._properties["meta_notobserved"],
-            "stats": lcs._derived_properties["stats"],
-            "side": lcs._side_properties,
-        }
-
-        class NumpyEncoder(json.JSONEncoder):
-            def default(self, obj):
-                if isinstance(obj, np.ndarray):
-                    return obj.tolist()
-                return json.JSONEncoder.default(self, obj)
-
-        survey_efficiency_analysis.lightcurves = json.dumps(data, cls=NumpyEncoder)
+        survey_efficiency_analysis.lightcurves = json.dumps(data)
+        survey_efficiency_analysis.injections_completed = number_of_injections
         survey_efficiency_analysis.status = "complete"
 
         session.merge(survey_efficiency_analysis)
@@ -7,6 +7,7 @@ from sqlalchemy import func
 from sqlalchemy.orm import selectinload
 
 from baselayer.app.access import auth_or_token, permissions
+from baselayer.app.env import load_env
 from baselayer.log import make_log
 
 from ...models import (
@@ -14,12 +15,16 @@ from ...models import (
     Obj,
     Photometry,
     PhotStat,
+    PhotStatRebuild,
     Source,
 )
+from ...utils.naive_datetime import utcnow_naive
 from ..base import BaseHandler
 
 ObjId = Annotated[str, Field(description="object ID to get statistics on")]
 
+_, cfg = load_env()
+
 log = make_log("api/source")
 
 DEFAULT_SOURCES_PER_PAGE = 100
@@ -760,6 +765,176 @@ class PhotStatUpdateHandler(BaseHandler):
         return self.success(data=results)
 
 
+class PhotStatRebuildHandler(BaseHandler):
+    @auth_or_token
+    async def get(self, rebuild_id: int | None = None):
+        """
+        ---
+        summary: Get the progress of a PhotStat rebuild
+        description: |
+          Progress of a background rebuild of every object's PhotStat
+          (the most recent one if no ID is given), with an estimate of
+          the time remaining.
+        tags:
+          - photometry
+        responses:
+          200:
+            content:
+              application/json:
+                schema:
+                  allOf:
+                    - $ref: '#/components/schemas/Success'
+                    - type: object
+                      properties:
+                        data:
+                          type: object
+                          properties:
+                            fractionDone:
+                              type: number
+                            etaSeconds:
+                              type: number
+                              nullable: true
+          400:
+            content:
+              application/json:
+                schema: Error
+        """
+        async with self.AsyncSession() as session:
+            stmt = PhotStatRebuild.select(session.user_or_token)
+            if rebuild_id is not None:
+                stmt = stmt.where(PhotStatRebuild.id == rebuild_id)
+            else:
+                stmt = stmt.order_by(PhotStatRebuild.created_at.desc()).limit(1)
+            rebuild = await session.scalar(stmt)
+            if rebuild is None:
+                return self.error(
+                    f"No PhotStat rebuild with ID {rebuild_id}"
+                    if rebuild_id is not None
+                    else "No PhotStat rebuild has been requested"
+                )
+
+            data = rebuild.to_dict()
+            data["fractionDone"] = (
+                rebuild.num_processed / rebuild.num_total
+                if rebuild.num_total
+                else (1.0 if rebuild.status == "done" else 0.0)
+            )
+            # estimate the rate since the service last (re)started this rebuild
+            data["etaSeconds"] = None
+            if rebuild.status == "running" and rebuild.num_total is not None:
+                done = rebuild.num_processed - rebuild.num_processed_at_start
+                elapsed = (utcnow_naive() - rebuild.started_at).total_seconds()
+                if done > 0 and elapsed > 0:
+                    remaining = max(rebuild.num_total - rebuild.num_processed, 0)
+                    data["etaSeconds"] = remaining * elapsed / done
+            return self.success(data=data)
+
+    @auth_or_token
+    @permissions(["System admin"])
+    async def post(self):
+        """
+        ---
+        summary: Rebuild every object's PhotStat
+        description: |
+          Queue a background recomputation of the photometric statistics of
+          every object, e.g. after changing the detection threshold. It is
+          run in chunks by the phot_stat_rebuild service and resumes after
+          a restart; follow it with GET /api/phot_stats/rebuild/{id}.
+        tags:
+          - photometry
+        requestBody:
+          content:
+            application/json:
+              schema:
+                type: object
+                properties:
+                  chunkSize:
+                    type: integer
+                    description: |
+                      Number of objects recomputed per transaction.
+                      Defaults to the phot_stat_rebuild.chunk_size config.
+        responses:
+          200:
+            content:
+              application/json:
+                schema:
+                  allOf:
+                    - $ref: '#/components/schemas/Success'
+                    - type: object
+                      properties:
+                        data:
+                          type: object
+                          properties:
+                            id:
+                              type: integer
+          400:
+            content:
+              application/json:
+                schema: Error
+        """
+        data = self.get_json()
+        chunk_size = data.get(
+            "chunkSize", cfg.get("phot_stat_rebuild.chunk_size", 1000)
+        )
+        try:
+            chunk_size = int(chunk_size)
+        except (TypeError, ValueError):
+            return self.error(f"Cannot parse chunkSize ({chunk_size}) as an integer.")
+        if chunk_size < 1:
+            return self.error("chunkSize must be a positive integer.")
+
+        async with self.AsyncSession() as session:
+            unfinished = await session.scalar(
+                sa.select(PhotStatRebuild.id).where(
+                    PhotStatRebuild.status.in_(["pending", "running"])
+                )
+            )
+            if unfinished is not None:
+                return self.error(
+                    f"PhotStat rebuild {unfinished} is still in progress; "
+                    "cancel it before requesting another."
+                )
+            rebuild = PhotStatRebuild(status="pending", chunk_size=chunk_size)
+            session.add(rebuild)
+            await session.commit()
+            return self.success(data={"id": rebuild.id})
+
+    @auth_or_token
+    @permissions(["System admin"])
+    async def delete(self, rebuild_id: int):
+        """
+        ---
+        summary: Cancel a PhotStat rebuild
+        description: |
+          Stop a pending or running rebuild after its current chunk.
+          PhotStats already rebuilt are kept.
+        tags:
+          - photometry
+        responses:
+          200:
+            content:
+              application/json:
+                schema: Success
+          400:
+            content:
+              application/json:
+                schema: Error
+        """
+        async with self.AsyncSession() as session:
+            result = await session.execute(
+                sa.update(PhotStatRebuild)
+                .where(PhotStatRebuild.id == rebuild_id)
+                .where(PhotStatRebuild.status.in_(["pending", "running"]))
+                .values(status="cancelled", finished_at=utcnow_naive())
+            )
+            await session.commit()
+            if result.rowcount == 0:
+                return self.error(
+                    f"No pending or running PhotStat rebuild with ID {rebuild_id}"
+                )
+            return self.success()
+
+
 class PhotStatAggregateHandler(BaseHandler):
     @auth_or_token
     async def get(self):
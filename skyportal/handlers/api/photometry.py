@@ -51,7 +51,7 @@ from ...models.schema import (
     PhotometryRangeQuery,
 )
 from ...utils.data_access import default_extra_share_group_ids
-from ...utils.extinction import calculate_extinction, deredden_flux
+from ...utils.extinction import deredden_flux, extinction_by_filter
 from ...utils.naive_datetime import utcnow_naive
 from ...utils.parse import str_to_bool
 from ..base import BaseHandler, format_doc
@@ -65,9 +65,10 @@ log = make_log("api/photometry")
 MAX_NUMBER_ROWS = 10000
 
 # Above this many newly-inserted points for one object, recompute its PhotStat
-# from the table (full_update) instead of incrementally adding each point — past
-# this break-even the single recompute is cheaper than the per-point updates, and
-# it bounds any floating-point drift in the running mean/RMS stats.
+# from the table (full_update) instead of merging the new points into the
+# running stats (add_photometry_points) — a post this large is usually a whole
+# lightcurve, and the recompute bounds any floating-point drift in the running
+# mean/RMS stats.
 INCREMENTAL_PHOTSTAT_MAX = 50
 
 
@@ -630,6 +631,260 @@ def serialize(
     return return_value
 
 
+# Response layouts of ObjPhotometryHandler besides the default "records" (one
+# JSON object per point), mapped to their content type. They are built by
+# columnar_photometry from one DataFrame instead of serialize() per point.
+COLUMNAR_LAYOUTS = {
+    "columns": "application/json",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# Photometry columns read by columnar_photometry.
+PHOT_COLUMNAR_COLUMNS = (
+    "id",
+    "obj_id",
+    "ra",
+    "dec",
+    "filter",
+    "mjd",
+    "flux",
+    "fluxerr",
+    "instrument_id",
+    "ra_unc",
+    "dec_unc",
+    "origin",
+    "altdata",
+    "created_at",
+    "ref_flux",
+    "ref_fluxerr",
+    "original_user_data",
+)
+
+
+def _relative_zeropoints(filters, magsys):
+    """Map each filter to 2.5 log10 of its zero-point band flux in ``magsys``
+    (the per-filter term of `serialize`'s magnitude-system corrections)."""
+    magsys = sncosmo.get_magsystem(magsys)
+    zeropoints = {}
+    for filter in filters:
+        try:
+            zeropoints[filter] = 2.5 * np.log10(magsys.zpbandflux(filter))
+        except ValueError as e:
+            raise ValueError(
+                f"Could not serialize photometry with filter: {filter}, "
+                f"due to error: {e}"
+            )
+    return zeropoints
+
+
+def columnar_photometry(df, outsys, format, extinction_dict=None):
+    """Vectorized counterpart of `serialize` for a whole table of photometry.
+
+    Computes the same scalar fields as `serialize` (or `_serialize_plot` for
+    ``format="plot"``), one column at a time; the per-point nested fields
+    (groups, annotations, owner, streams, validations) are not included.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        One row per point, with the PHOT_COLUMNAR_COLUMNS and instrument_name.
+    outsys : str
+        Magnitude system of the output.
+    format : str
+        One of "mag", "flux", "both" or "plot".
+    extinction_dict : dict, optional
+        Extinction (mag) per filter, to add the de-reddened columns.
+
+    Returns
+    -------
+    pandas.DataFrame
+    """
+    if format not in ["mag", "flux", "both", "plot"]:
+        raise ValueError(
+            "Invalid output format specified. Must be one of "
+            f"['flux', 'mag', 'both', 'plot'], got '{format}'."
+        )
+    filters = df["filter"]
+    flux = df["flux"].to_numpy(dtype=float)
+    fluxerr = df["fluxerr"].to_numpy(dtype=float)
+    # swiftxrt is always reported in AB, as in serialize
+    is_ab = (filters == "swiftxrt").to_numpy()
+    unique_filters = filters.unique()
+    zp_ab = _relative_zeropoints(unique_filters, "ab")
+    zp_out = _relative_zeropoints(unique_filters[unique_filters != "swiftxrt"], outsys)
+    relzp_db = filters.map(zp_ab).to_numpy(dtype=float)
+    relzp_out = np.where(is_ab, relzp_db, filters.map(zp_out).to_numpy(dtype=float))
+    db_correction = relzp_out - relzp_db
+    corrected_db_zp = PHOT_ZP + db_correction
+    magsys_name = np.where(is_ab, "ab", sncosmo.get_magsystem(outsys).name)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        detected = flux > 0
+        mag = np.where(
+            detected, -2.5 * np.log10(flux) + PHOT_ZP + db_correction, np.nan
+        )
+        magerr = np.where(
+            detected & (fluxerr > 0), 2.5 / np.log(10) * fluxerr / flux, np.nan
+        )
+
+    out = pd.DataFrame({"id": df["id"], "obj_id": df["obj_id"]})
+    if format == "plot":
+        out["filter"] = filters
+        out["mjd"] = df["mjd"]
+        out["origin"] = df["origin"]
+    else:
+        for name in ("ra", "dec", "filter", "mjd"):
+            out[name] = df[name]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out["snr"] = np.where(
+                np.isfinite(flux) & (fluxerr != 0), flux / fluxerr, np.nan
+            )
+        for name in (
+            "instrument_id",
+            "instrument_name",
+            "ra_unc",
+            "dec_unc",
+            "origin",
+            "altdata",
+            "created_at",
+        ):
+            out[name] = df[name]
+
+    if format in ["mag", "both", "plot"]:
+        # limiting magnitudes given at upload are converted from their own
+        # magnitude system; otherwise they are the 5-sigma flux limit
+        packet_limits = df["original_user_data"].map(
+            lambda data: (
+                (float(data["limiting_mag"]), data["magsys"])
+                if data is not None and "limiting_mag" in data
+                else None
+            )
+        )
+        has_packet_limit = packet_limits.notna().to_numpy()
+        with np.errstate(divide="ignore"):
+            limiting_mag = -2.5 * np.log10(5 * fluxerr) + corrected_db_zp
+        if has_packet_limit.any():
+            keys = list(
+                zip(
+                    filters[has_packet_limit],
+                    (magsys for _, magsys in packet_limits[has_packet_limit]),
+                )
+            )
+            packet_zps = {
+                (filter, magsys): _relative_zeropoints([filter], magsys)[filter]
+                for filter, magsys in set(keys)
+            }
+            limiting_mag[has_packet_limit] = (
+                np.array([limit for limit, _ in packet_limits[has_packet_limit]])
+                + relzp_out[has_packet_limit]
+                - np.array([packet_zps[key] for key in keys])
+            )
+        out["mag"] = mag
+        out["magerr"] = magerr
+        if format != "plot":
+            out["magsys"] = magsys_name
+        out["limiting_mag"] = limiting_mag
+    if format in ["flux", "both"]:
+        out["flux"] = flux
+        out["magsys"] = magsys_name
+        out["zp"] = corrected_db_zp
+        out["fluxerr"] = fluxerr
+
+    if format == "plot":
+        return out
+
+    if extinction_dict is not None:
+        extinction = filters.map(extinction_dict).to_numpy(dtype=float)
+        out["extinction"] = extinction
+        with np.errstate(invalid="ignore"):
+            out["flux_corr"] = np.where(
+                np.isfinite(extinction) & detected,
+                flux * 10 ** (0.4 * extinction),
+                np.where(np.isfinite(extinction), flux, np.nan),
+            )
+        if format in ["mag", "both"]:
+            out["mag_corr"] = mag - extinction
+
+    ref_flux = df["ref_flux"].to_numpy(dtype=float)
+    ref_fluxerr = df["ref_fluxerr"].to_numpy(dtype=float)
+    has_ref = np.isfinite(ref_flux) & np.isfinite(ref_fluxerr)
+    if has_ref.any():
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ref_detected = has_ref & (ref_flux > 0)
+            tot_detected = ref_detected & detected
+            tot_flux = np.where(tot_detected, ref_flux + flux, np.nan)
+            tot_fluxerr = np.where(
+                has_ref & (ref_fluxerr > 0) & (fluxerr > 0),
+                np.sqrt(ref_fluxerr**2 + fluxerr**2),
+                np.nan,
+            )
+            magref = np.where(ref_detected, -2.5 * np.log10(ref_flux) + PHOT_ZP, np.nan)
+            if format in ["mag", "both"]:
+                magref = magref + db_correction
+            out["ref_flux"] = np.where(has_ref, ref_flux, np.nan)
+            out["tot_flux"] = tot_flux
+            out["ref_fluxerr"] = np.where(has_ref, ref_fluxerr, np.nan)
+            out["tot_fluxerr"] = tot_fluxerr
+            out["magref"] = magref
+            out["magtot"] = np.where(
+                tot_detected, -2.5 * np.log10(tot_flux) + PHOT_ZP, np.nan
+            )
+            out["e_magref"] = np.where(
+                ref_detected & (ref_fluxerr > 0),
+                2.5 / np.log(10) * ref_fluxerr / ref_flux,
+                np.nan,
+            )
+            out["e_magtot"] = np.where(
+                tot_detected & (ref_fluxerr > 0) & (fluxerr > 0),
+                2.5 / np.log(10) * tot_fluxerr / tot_flux,
+                np.nan,
+            )
+    return out
+
+
+def _column_to_list(column):
+    """JSON-ready list of the values of a DataFrame column, missing values
+    (NaN, NaT) as None."""
+    if column.dtype.kind in "fMO":
+        return column.astype(object).where(column.notna(), None).tolist()
+    return column.tolist()
+
+
+def encode_columnar(df, layout):
+    """Encode ``df`` in one of the COLUMNAR_LAYOUTS.
+
+    "columns" gives a dict of lists (JSON struct-of-arrays, NaN as None);
+    "arrow" (an Arrow IPC stream) and "parquet" give zstd-compressed bytes, with
+    JSON-valued columns (e.g. altdata) encoded as JSON strings.
+    """
+    if layout == "columns":
+        return {name: _column_to_list(column) for name, column in df.items()}
+
+    import pyarrow as pa  # lazy: only needed for the binary layouts
+
+    df = df.copy()
+    for name, column in df.items():
+        if (
+            column.dtype == object
+            and column.map(lambda v: isinstance(v, dict | list)).any()
+        ):
+            df[name] = column.map(
+                lambda v: None if v is None else json.dumps(v, cls=NumpyEncoder)
+            )
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    buffer = pa.BufferOutputStream()
+    if layout == "arrow":
+        options = pa.ipc.IpcWriteOptions(compression="zstd")
+        with pa.ipc.new_stream(buffer, table.schema, options=options) as writer:
+            writer.write_table(table)
+    else:
+        import pyarrow.parquet as pq
+
+        pq.write_table(table, buffer, compression="zstd")
+    return buffer.getvalue().to_pybytes()
+
+
 async def standardize_photometry_data(data, session):
     if not isinstance(data, dict):
         raise ValidationError(
@@ -971,22 +1226,30 @@ async def _redden_standardized_photometry(df, unique_oids, session):
             )
         ).all()
     }
-    # A_lambda per (obj, filter), computed once at the source coordinates.
-    a_lambda = {}
-    for oid, filt in {tuple(pair) for pair in zip(df["obj_id"], df["filter"])}:
+    # A_lambda per (obj, filter), from one dust map query over all objects.
+    oids = list(dict.fromkeys(df["obj_id"]))
+    for oid in oids:
         ra, dec = obj_coords.get(oid, (None, None))
         if nan_to_none(ra) is None or nan_to_none(dec) is None:
             raise ValidationError(
                 f"Cannot store extinction-corrected photometry for object {oid}: "
                 "it has no coordinates."
             )
-        a = calculate_extinction(ra, dec, filt)
+    index = {oid: i for i, oid in enumerate(oids)}
+    extinctions = extinction_by_filter(
+        np.array([obj_coords[oid][0] for oid in oids], dtype=float),
+        np.array([obj_coords[oid][1] for oid in oids], dtype=float),
+        df["filter"].unique(),
+    )
+    a_lambda = {}
+    for oid, filt in {tuple(pair) for pair in zip(df["obj_id"], df["filter"])}:
+        a = extinctions[filt]
         if a is None:
             raise ValidationError(
                 f"No Galactic extinction coefficient for filter '{filt}' "
                 f"(object {oid}); cannot store extinction-corrected photometry."
             )
-        a_lambda[(oid, filt)] = a
+        a_lambda[(oid, filt)] = float(a[index[oid]])
 
     # observed_flux = corrected_flux * 10 ** (-0.4 * A_lambda)
     factor = np.array(
@@ -1225,11 +1488,14 @@ async def insert_new_photometry_data(
     validate=True,
     refresh=False,
     duplicates=None,
+    commit=True,
 ):
     # validate=True ⇒ ON CONFLICT DO NOTHING + raise if any row conflicted
     # (preserves the user-visible "duplicates already exist" error path).
     # validate=False ⇒ ON CONFLICT DO NOTHING but silently return existing IDs
     # (the PUT upsert path's "new rows" branch where the pre-check already ran).
+    # commit=False ⇒ only flush, for callers writing several inserts in one
+    # transaction (batched broker ingestion commits once per batch).
     if duplicates is None:
         duplicates = "error" if validate else "ignore"
 
@@ -1370,8 +1636,8 @@ async def insert_new_photometry_data(
     # Initial PhotStat values mirror PhotStat.__init__ — raw pg_insert bypasses
     # the ORM __init__ that initializes the nullable JSONB dict/list columns.
     #
-    # Per obj, take the incremental path (add only the points WE inserted, via
-    # add_photometry_point — O(new points), no lightcurve re-read) when the
+    # Per obj, take the incremental path (merge only the points WE inserted, via
+    # add_photometry_points — O(new points), no lightcurve re-read) when the
     # PhotStat already existed and few points were actually inserted; otherwise
     # full_update. `_inserted` (from RETURNING xmax=0) marks rows OUR insert
     # created, not a pre-existing/concurrent collision, so under the per-obj
@@ -1422,8 +1688,7 @@ async def insert_new_photometry_data(
             obj_id not in newly_created_obj_ids
             and len(inserted_params) <= INCREMENTAL_PHOTSTAT_MAX
         ):
-            for packet in inserted_params:
-                phot_stat_by_obj[obj_id].add_photometry_point(packet)
+            phot_stat_by_obj[obj_id].add_photometry_points(inserted_params)
         else:
             full_update_obj_ids.append(obj_id)
 
@@ -1452,7 +1717,10 @@ async def insert_new_photometry_data(
             phot_stat_by_obj[obj_id].full_update(phot_by_obj.get(obj_id, []))
         for p in all_phot:
             session.expunge(p)
-    await session.commit()
+    if commit:
+        await session.commit()
+    else:
+        await session.flush()
 
     if refresh:
         flow = Flow()
@@ -1567,7 +1835,13 @@ async def get_stream_ids(data, user, session):
 
 
 async def add_external_photometry(
-    json, user, session, duplicates="update", refresh=False, apply_default_share=True
+    json,
+    user,
+    session,
+    duplicates="update",
+    refresh=False,
+    apply_default_share=True,
+    commit=True,
 ):
     """Post external photometry to the database (e.g. from a facility API
     or the TNS retrieval worker).
@@ -1587,6 +1861,10 @@ async def add_external_photometry(
     apply_default_share : bool
         Whether to add the configured default-share groups when none are given.
         False for broker ingestion so ingested photometry is not shared publicly.
+    commit : bool
+        Whether to commit the insert. With False the rows are only flushed and
+        errors are raised rather than rolled back, so the caller can write
+        several payloads in one transaction and roll it back as a whole.
     """
     if duplicates not in ["error", "ignore", "update"]:
         raise ValueError(
@@ -1708,13 +1986,15 @@ async def add_external_photometry(
                 session,
                 validate=duplicates in ["error"],
                 refresh=refresh,
+                commit=commit,
             )
 
             if duplicates in ["ignore", "update"]:
                 for (df_index, _), id in zip(new_photometry.iterrows(), ids):
                     id_map[df_index] = id
 
-        await session.commit()
+        if commit:
+            await session.commit()
 
         if duplicates in ["ignore", "update"]:
             ids = [id_map[pdidx] for pdidx, _ in df.iterrows()]
@@ -1731,6 +2011,9 @@ async def add_external_photometry(
             )
         return ids, upload_id
     except Exception as e:
+        if not commit:
+            # the caller owns the transaction, and rolls all of it back
+            raise
         await session.rollback()
         log(f"Unable to post photometry: {e}")
         return None, None
@@ -2427,6 +2710,61 @@ class PhotometryHandler(BaseHandler):
             return self.success()
 
 
+def photometry_obj_ids(session, obj_id, include_superobjs_photometry=False):
+    """IDs of the objects whose photometry is shown for ``obj_id``: itself and,
+    optionally, every object sharing a SuperObj with it."""
+    obj_ids = {obj_id}
+    if include_superobjs_photometry:
+        super_objs = (
+            session.scalars(
+                sa.select(SuperObj).where(SuperObj.objs.any(Obj.id == obj_id))
+            )
+            .unique()
+            .all()
+        )
+        for super_obj in super_objs:
+            obj_ids.update({o.id for o in super_obj.objs})
+    return obj_ids
+
+
+def latest_period(session, obj_id):
+    """The period in the most recently modified annotation of ``obj_id`` that
+    has one (under "period", "Period" or "PERIOD"), or None."""
+    period, modified = None, arrow.Arrow(1, 1, 1)
+    annotations = session.scalars(
+        Annotation.select(session.user_or_token).where(Annotation.obj_id == obj_id)
+    ).all()
+    period_str_options = ["period", "Period", "PERIOD"]
+    for an in annotations:
+        if not isinstance(an.data, dict):
+            continue
+        for period_str in period_str_options:
+            if period_str in an.data and arrow.get(an.modified) > modified:
+                period = an.data[period_str]
+                modified = arrow.get(an.modified)
+    return period
+
+
+def photometry_table(session, obj_ids):
+    """The photometry of ``obj_ids`` readable by the session's user, as a
+    DataFrame with the PHOT_COLUMNAR_COLUMNS and instrument_name, read in one
+    query without building ORM objects."""
+    accessible = (
+        Photometry.select(session.user_or_token, columns=[Photometry.id])
+        .where(Photometry.obj_id.in_(obj_ids))
+        .subquery()
+    )
+    result = session.execute(
+        sa.select(
+            *(getattr(Photometry, c) for c in PHOT_COLUMNAR_COLUMNS),
+            Instrument.name.label("instrument_name"),
+        )
+        .join(Instrument, Instrument.id == Photometry.instrument_id)
+        .where(Photometry.id.in_(sa.select(accessible.c.id)))
+    )
+    return pd.DataFrame(result.all(), columns=list(result.keys()))
+
+
 class ObjPhotometryHandler(BaseHandler):
     @auth_or_token
     def get(
@@ -2464,6 +2802,24 @@ class ObjPhotometryHandler(BaseHandler):
 
         include_extinction = str_to_bool(include_extinction, default=False)
 
+        layout = self.get_query_argument("layout", "records")
+        if layout != "records":
+            if layout not in COLUMNAR_LAYOUTS:
+                return self.error(
+                    f"Invalid layout: {layout}. Must be one of "
+                    f"records, {', '.join(COLUMNAR_LAYOUTS)}"
+                )
+            if (
+                include_owner_info
+                or include_stream_info
+                or include_validation_info
+                or include_annotation_info
+            ):
+                return self.error(
+                    "includeOwnerInfo, includeStreamInfo, includeValidationInfo "
+                    "and includeAnnotationInfo require layout=records"
+                )
+
         with self.Session() as session:
             obj: Obj = session.scalars(
                 Obj.select(session.user_or_token).where(Obj.id == obj_id)
@@ -2474,6 +2830,20 @@ class ObjPhotometryHandler(BaseHandler):
                     status=403,
                 )
 
+            if layout != "records":
+                return self._get_columnar(
+                    session,
+                    obj,
+                    layout,
+                    individual_or_series,
+                    format,
+                    outsys,
+                    include_extinction=include_extinction,
+                    include_superobjs_photometry=include_superobjs_photometry,
+                    deduplicate_photometry=deduplicate_photometry,
+                    phase_fold_data=phase_fold_data,
+                )
+
             phot_data = []
             series_data = []
             if individual_or_series in ["individual", "both"]:
@@ -2515,19 +2885,9 @@ class ObjPhotometryHandler(BaseHandler):
                         # point — the lazy default makes dense sources time out.
                         options.append(selectinload(Photometry.validations))
 
-                obj_ids = {obj_id}
-                if include_superobjs_photometry:
-                    super_objs = (
-                        session.scalars(
-                            sa.select(SuperObj).where(
-                                SuperObj.objs.any(Obj.id == obj_id)
-                            )
-                        )
-                        .unique()
-                        .all()
-                    )
-                    for super_obj in super_objs:
-                        obj_ids.update({o.id for o in super_obj.objs})
+                obj_ids = photometry_obj_ids(
+                    session, obj_id, include_superobjs_photometry
+                )
 
                 stmt = (
                     Photometry.select(
@@ -2552,12 +2912,9 @@ class ObjPhotometryHandler(BaseHandler):
                     and nan_to_none(obj.ra) is not None
                     and nan_to_none(obj.dec) is not None
                 ):
-                    extinction_dict = {}
-                    filters = {phot.filter for phot in photometry}
-                    for filt in filters:
-                        extinction_dict[filt] = calculate_extinction(
-                            obj.ra, obj.dec, filt
-                        )
+                    extinction_dict = extinction_by_filter(
+                        obj.ra, obj.dec, {phot.filter for phot in photometry}
+                    )
 
                 phot_data = [
                     serialize(
@@ -2603,21 +2960,7 @@ class ObjPhotometryHandler(BaseHandler):
             data.sort(key=lambda x: x["mjd"])
 
             if phase_fold_data:
-                period, modified = None, arrow.Arrow(1, 1, 1)
-
-                annotations = session.scalars(
-                    Annotation.select(session.user_or_token).where(
-                        Annotation.obj_id == obj_id
-                    )
-                ).all()
-                period_str_options = ["period", "Period", "PERIOD"]
-                for an in annotations:
-                    if not isinstance(an.data, dict):
-                        continue
-                    for period_str in period_str_options:
-                        if period_str in an.data and arrow.get(an.modified) > modified:
-                            period = an.data[period_str]
-                            modified = arrow.get(an.modified)
+                period = latest_period(session, obj_id)
                 if period is None:
                     self.error(f"No period for object {obj_id}")
                 for ii in range(len(data)):
@@ -2625,6 +2968,82 @@ class ObjPhotometryHandler(BaseHandler):
 
             return self.success(data=data)
 
+    def _get_columnar(
+        self,
+        session,
+        obj,
+        layout,
+        individual_or_series,
+        format,
+        outsys,
+        include_extinction=False,
+        include_superobjs_photometry=False,
+        deduplicate_photometry=False,
+        phase_fold_data=False,
+    ):
+        """Respond with the photometry of ``obj`` in a columnar ``layout``,
+        built from DataFrames rather than per-point dicts."""
+        tables = []
+        if individual_or_series in ["individual", "both"]:
+            df = photometry_table(
+                session,
+                photometry_obj_ids(session, obj.id, include_superobjs_photometry),
+            )
+            extinction_dict = None
+            if (
+                include_extinction
+                and format != "plot"
+                and len(df) > 0
+                and nan_to_none(obj.ra) is not None
+                and nan_to_none(obj.dec) is not None
+            ):
+                extinction_dict = extinction_by_filter(
+                    obj.ra, obj.dec, df["filter"].unique()
+                )
+            try:
+                df = columnar_photometry(df, outsys, format, extinction_dict)
+            except ValueError as e:
+                return self.error(str(e))
+            if deduplicate_photometry and format != "plot" and len(df) > 0:
+                # drop duplicate mjd/filter points, keeping most recent
+                df = df.sort_values(by="created_at", ascending=False).drop_duplicates(
+                    ["mjd", "filter"]
+                )
+            tables.append(df)
+
+        if individual_or_series in ["series", "both"]:
+            series = (
+                session.scalars(
+                    PhotometricSeries.select(session.user_or_token).where(
+                        PhotometricSeries.obj_id == obj.id
+                    )
+                )
+                .unique()
+                .all()
+            )
+            tables.extend(s.get_data_with_extra_columns() for s in series)
+
+        # pandas deprecates concatenating empty frames; keep one for its columns
+        tables = [t for t in tables if len(t) > 0] or tables[:1]
+        df = pd.concat(tables, ignore_index=True) if tables else pd.DataFrame()
+        if "mjd" in df:
+            df = df.sort_values(by="mjd", kind="stable", ignore_index=True)
+
+        if phase_fold_data:
+            period = latest_period(session, obj.id)
+            if period is None:
+                return self.error(f"No period for object {obj.id}")
+            df["phase"] = np.mod(df["mjd"], period) / period
+
+        if layout == "columns":
+            return self.success(data=encode_columnar(df, layout))
+        try:
+            content = encode_columnar(df, layout)
+        except ImportError:
+            return self.error(f"layout={layout} requires the pyarrow package")
+        self.set_header("Content-Type", COLUMNAR_LAYOUTS[layout])
+        return self.write(content)
+
     @permissions(["Delete bulk photometry"])
     def delete(self, obj_id: str):
         """
@@ -2862,6 +3281,26 @@ ObjPhotometryHandler.get.__doc__ = f"""
                 - mag
                 - flux
                 - plot
+          - in: query
+            name: layout
+            required: false
+            description: >-
+              Shape of the response. "records" (default) returns a JSON list
+              with one object per point. The columnar layouts are computed
+              for all points at once and are much cheaper for dense
+              lightcurves: "columns" returns JSON `data` mapping each field
+              to an array of values, "arrow" an Apache Arrow IPC stream and
+              "parquet" a Parquet file (both zstd-compressed, with JSON
+              fields such as altdata as JSON strings). Columnar layouts carry
+              the scalar fields only, so the include{{Owner,Stream,
+              Validation,Annotation}}Info flags require "records".
+            schema:
+              type: string
+              enum:
+                - records
+                - columns
+                - arrow
+                - parquet
           - in: query
             name: magsys
             required: false
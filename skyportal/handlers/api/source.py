@@ -2017,6 +2017,27 @@ class SourceHandler(BaseHandler):
             description: |
                 String to identify query. If provided, will be used to recover previous cached results
                 and speed up query. Defaults to None.
+          - in: query
+            name: cursor
+            nullable: true
+            schema:
+                type: string
+            description: |
+                Use keyset pagination instead of pageNumber: pass an empty value
+                for the first page, then the nextCursor returned with each page
+                (null after the last page). Every page costs the same, however
+                deep. Not available with useCache or localization queries; NULL
+                sort values always come last.
+          - in: query
+            name: totalMatches
+            nullable: true
+            schema:
+                type: string
+                enum: [exact, estimate, none]
+            description: |
+                With cursor, how to report totalMatches: counted (exact, the
+                default), the query planner's estimate (estimate), or not at
+                all (none, e.g. for pages after the first).
           responses:
             200:
               content:
@@ -2039,6 +2060,9 @@ class SourceHandler(BaseHandler):
                                 type: integer
                               numPerPage:
                                 type: integer
+                              nextCursor:
+                                type: string
+                                nullable: true
             400:
               content:
                 application/json:
@@ -2159,6 +2183,10 @@ class SourceHandler(BaseHandler):
         use_cache = self.get_query_argument("useCache", False)
         query_id = self.get_query_argument("queryID", None)
 
+        # optional, keyset pagination
+        cursor = self.get_query_argument("cursor", None)
+        total_matches_mode = self.get_query_argument("totalMatches", "exact")
+
         class Validator(Schema):
             saved_after = UTCTZnaiveDateTime(required=False, load_default=None)
             saved_before = UTCTZnaiveDateTime(required=False, load_default=None)
@@ -2402,6 +2430,8 @@ class SourceHandler(BaseHandler):
                     includeGeoJSON=includeGeoJSON,
                     use_cache=use_cache,
                     query_id=query_id,
+                    cursor=cursor,
+                    total_matches_mode=total_matches_mode,
                     verbose=False,
                 )
             except ValueError as e:
@@ -12,6 +12,7 @@ from conesearch_alchemy.math import cosd, sind
 from geojson import Feature, Point
 from mocpy import MOC
 from sqlalchemy.sql import and_, bindparam, text
+from tornado.ioloop import IOLoop
 
 from baselayer.app.env import load_env
 from baselayer.log import make_log
@@ -33,13 +34,26 @@ from skyportal.models import (
     cosmo,
 )
 
-from ...utils.cache import Cache, array_to_bytes
+from ...utils.cache import array_to_bytes, bytes_to_array, shared_cache
 from ...utils.calculations import radec2lb
+from ...utils.crossmatch import (
+    credible_region_condition,
+    credible_region_exists_statement,
+    precomputed_level,
+)
+from ...utils.extinction import ebv as sfd_ebv
+from ...utils.pagination import (
+    TOTAL_MATCHES_MODES,
+    cursor_bindparam,
+    decode_cursor,
+    encode_cursor,
+    estimate_count,
+    keyset_condition,
+)
 
 _, cfg = load_env()
-cache_dir = "cache/sources_queries"
-cache = Cache(
-    cache_dir=cache_dir,
+cache = shared_cache(
+    "sources_queries",
     max_age=cfg["misc.minutes_to_keep_source_query_cache"] * 60,
 )
 log = make_log("api/sources")
@@ -525,6 +539,75 @@ def resolve_obj_join(statement):
     )
 
 
+async def fetch_cursor_page(
+    session,
+    statement,
+    query_params,
+    sort_order,
+    cursor,
+    scope,
+    num_per_page,
+    total_matches_mode="exact",
+    json_key=False,
+):
+    """Fetch one keyset-paginated page of a grouped sources query.
+
+    ``statement`` is the SQL of the unordered query; it must select an ``id``
+    and a ``sort_key`` column. PostgreSQL orders it by ``sort_key`` (NULLs
+    last, ties broken by ``id``) and returns only the page after ``cursor``
+    (an empty string for the first page), so no page costs more than the first.
+
+    Returns
+    -------
+    ids : list
+        The ids of the page, in order.
+    next_cursor : str or None
+        Token for the following page, None on the last page.
+    total : int or None
+        Number of matches, counted exactly, estimated by the planner, or
+        not at all (None), according to ``total_matches_mode``.
+    """
+    order = sort_order.upper()
+    params = list(query_params)
+    where = ""
+    if cursor:
+        key, last_id = decode_cursor(cursor, scope)
+        where = "WHERE " + keyset_condition(
+            "page.sort_key", "page.id", sort_order, key is None
+        )
+        params.append(bindparam("cursor_id", last_id))
+        if key is not None:
+            params.append(cursor_bindparam("cursor_key", key, json_value=json_key))
+    params.append(bindparam("page_limit", num_per_page + 1, type_=sa.Integer))
+
+    rows = (
+        await session.execute(
+            text(
+                f"""SELECT page.id, page.sort_key FROM ({statement}) AS page
+                {where}
+                ORDER BY page.sort_key {order} NULLS LAST, page.id {order}
+                LIMIT :page_limit
+                """
+            ).bindparams(*params)
+        )
+    ).all()
+    next_cursor = None
+    if len(rows) > num_per_page:
+        rows = rows[:num_per_page]
+        next_cursor = encode_cursor(rows[-1][1], rows[-1][0], scope)
+
+    total = None
+    if total_matches_mode == "exact":
+        total = await session.scalar(
+            text(f"SELECT count(*) FROM ({statement}) AS matches").bindparams(
+                *query_params
+            )
+        )
+    elif total_matches_mode == "estimate":
+        total = await estimate_count(session, statement, query_params)
+    return [row[0] for row in rows], next_cursor, total
+
+
 async def get_sources(
     user_id,
     session,
@@ -607,6 +690,8 @@ async def get_sources(
     includeGeoJSON=False,
     use_cache=False,
     query_id=None,
+    cursor=None,
+    total_matches_mode="exact",
     verbose=False,
 ):
     try:
@@ -631,6 +716,19 @@ async def get_sources(
                 "Cannot use cache and specify a query_id when requesting the first page"
             )
 
+    # keyset pagination: an empty cursor requests the first page
+    if cursor is not None:
+        if use_cache:
+            raise ValueError("Cannot use cache together with cursor pagination")
+        if localization_dateobs is not None:
+            raise ValueError(
+                "Cursor pagination is not supported with localization queries"
+            )
+        if total_matches_mode not in TOTAL_MATCHES_MODES:
+            raise ValueError(
+                f"Invalid total_matches_mode: must be one of {', '.join(TOTAL_MATCHES_MODES)}"
+            )
+
     try:
         # it takes one query argument, which is the query type
         # and the group_ids to query
@@ -1562,26 +1660,38 @@ async def get_sources(
                     session,
                     user,
                 )
-                # this is twice as fast as if we ran each query (the localization tiles query,
-                # and its overall with the sources) separately.
-                # we used caching for that in prod, but now that we have partitions, we can do it this way
-                localization_queries.append(
-                    f"""EXISTS (
-                    SELECT lt.id
-                    FROM (
-                        SELECT  {partition}.id,
-                                {partition}.healpix,
-                                {partition}.probdensity,
-                                SUM({partition}.probdensity *
-                                    (upper({partition}.healpix) - lower({partition}.healpix)) * 3.6331963520923245e-18
-                                ) OVER (ORDER BY {partition}.probdensity DESC) AS cum_prob
-                        FROM {partition}
-                        WHERE {partition}.localization_id = {localization_id}
-                    ) AS lt
-                    WHERE lt.cum_prob <= {localization_cumprob} and lt.healpix @> objs.healpix
-                    ORDER BY lt.probdensity DESC
-                    )"""
-                )
+                level = precomputed_level(localization_cumprob)
+                if level is not None and await session.scalar(
+                    credible_region_exists_statement(localization_id, level)
+                ):
+                    # the credible region was stored with the tiles: a binary
+                    # search over its ranges per source
+                    localization_queries.append(
+                        credible_region_condition(
+                            localization_id, level, "objs.healpix"
+                        )
+                    )
+                else:
+                    # this is twice as fast as if we ran each query (the localization tiles query,
+                    # and its overall with the sources) separately.
+                    # we used caching for that in prod, but now that we have partitions, we can do it this way
+                    localization_queries.append(
+                        f"""EXISTS (
+                        SELECT lt.id
+                        FROM (
+                            SELECT  {partition}.id,
+                                    {partition}.healpix,
+                                    {partition}.probdensity,
+                                    SUM({partition}.probdensity *
+                                        (upper({partition}.healpix) - lower({partition}.healpix)) * 3.6331963520923245e-18
+                                    ) OVER (ORDER BY {partition}.probdensity DESC) AS cum_prob
+                            FROM {partition}
+                            WHERE {partition}.localization_id = {localization_id}
+                        ) AS lt
+                        WHERE lt.cum_prob <= {localization_cumprob} and lt.healpix @> objs.healpix
+                        ORDER BY lt.probdensity DESC
+                        )"""
+                    )
                 if localization_reject_sources or sort_by == "gcn_status":
                     joins.append(
                         f"""
@@ -1671,6 +1781,8 @@ async def get_sources(
             "pageNumber": page_number,
             "numPerPage": num_per_page,
         }
+        if cursor is not None:
+            data["nextCursor"] = None
 
         # when querying for group sources, return the group_id used
         if len(group_ids) == 1:
@@ -1680,9 +1792,9 @@ async def get_sources(
             all_source_ids = []
 
             if use_cache and query_id is not None:
-                cache_filename = cache[query_id]
-                if cache_filename is not None:
-                    all_source_ids = np.load(cache_filename)
+                cached = await cache.aget(query_id)
+                if cached is not None:
+                    all_source_ids = bytes_to_array(cached)
                     data["queryID"] = query_id
                     if len(all_source_ids) == 0:
                         return data
@@ -1736,7 +1848,7 @@ async def get_sources(
                         )
                 else:
                     statement = f"""
-                        SELECT sources.id
+                        SELECT sources.id{", sources.id AS sort_key" if cursor is not None else ""}
                         FROM sources INNER JOIN objs ON sources.obj_id = objs.id
                         {" ".join(joins)}
                         WHERE {" AND ".join(statements)}
@@ -1753,6 +1865,31 @@ async def get_sources(
                         )
                         query_params.extend(allocation_bindparams)
 
+                    if cursor is not None:
+                        # same ascending-id order as the offset path below
+                        (
+                            source_ids,
+                            data["nextCursor"],
+                            data["totalMatches"],
+                        ) = await fetch_cursor_page(
+                            session,
+                            statement,
+                            query_params,
+                            "asc",
+                            cursor,
+                            "save_summary",
+                            num_per_page,
+                            total_matches_mode,
+                        )
+                        sources_result = await session.scalars(
+                            Source.select(user).where(Source.id.in_(source_ids))
+                        )
+                        data["sources"] = sorted(
+                            sources_result.all(),
+                            key=lambda s: source_ids.index(s.id),
+                        )
+                        return data
+
                     statement = (
                         text(statement).bindparams(*query_params).columns(id=sa.String)
                     )
@@ -1786,7 +1923,7 @@ async def get_sources(
                 if use_cache:
                     all_source_ids_bytes = array_to_bytes(all_source_ids)
                     query_id = hashlib.sha256(all_source_ids_bytes).hexdigest()
-                    cache[query_id] = all_source_ids_bytes
+                    await cache.aset(query_id, all_source_ids_bytes)
                     data["queryID"] = query_id
 
             sources, total_matches = [], len(all_source_ids)
@@ -1821,9 +1958,9 @@ async def get_sources(
             all_obj_ids = []
 
             if use_cache and query_id is not None:
-                cache_filename = cache[query_id]
-                if cache_filename is not None:
-                    all_obj_ids = np.load(cache_filename)
+                cached = await cache.aget(query_id)
+                if cached is not None:
+                    all_obj_ids = bytes_to_array(cached)
                     data["queryID"] = query_id
                     if len(all_obj_ids) == 0:
                         return data
@@ -1996,25 +2133,8 @@ async def get_sources(
                             """
                         )
 
-                    # ADD QUERY STATEMENTS
-                    statement = f"""SELECT {OBJ_ID_TOKEN} AS id, MAX(sources.saved_at) AS most_recent_saved_at
-                        FROM {SOURCES_FROM_TOKEN}
-                        {" ".join(joins)}
-                        WHERE {" AND ".join(statements)}
-                        GROUP BY {OBJ_ID_TOKEN}
-                    """
-
-                    if ":accessible_group_ids" in statement:
-                        statement = statement.replace(
-                            ":accessible_group_ids", accessible_groups_query_str
-                        )
-                        query_params.extend(accessible_groups_bindparams)
-                    if ":allocation_ids" in statement:
-                        statement = statement.replace(
-                            ":allocation_ids", allocation_query_str
-                        )
-                        query_params.extend(allocation_bindparams)
-
+                    # SORT KEY
+                    nulls_last = True
                     if annotation_sort:
                         # Correlated subquery on the grouped obj id; -> keeps the
                         # JSONB type so numeric values sort numerically. Restrict
@@ -2033,22 +2153,22 @@ async def get_sources(
                                 "from group_annotations where group_id in "
                                 f"{ann_groups_str}) "
                             )
-                        statement += (
-                            "ORDER BY (SELECT annotations_sort.data -> :sort_ann_key "
+                        sort_expr = (
+                            "(SELECT annotations_sort.data -> :sort_ann_key "
                             "FROM annotations AS annotations_sort "
                             "WHERE annotations_sort.obj_id = objs.id "
                             "AND annotations_sort.origin = :sort_ann_origin "
-                            f"{ann_access_clause}LIMIT 1) "
-                            f"{sort_order.upper()} NULLS LAST"
+                            f"{ann_access_clause}LIMIT 1)"
                         )
                         query_params.append(sa.bindparam("sort_ann_key", sort_ann_key))
                         query_params.append(
                             sa.bindparam("sort_ann_origin", sort_ann_origin)
                         )
                     elif sort_by == "favorites":
-                        statement += f"""ORDER BY bool_and(listings.obj_id IS NULL) {sort_order.upper()}"""
+                        sort_expr = "bool_and(listings.obj_id IS NULL)"
+                        nulls_last = False
                     elif sort_by in NULL_FIELDS:
-                        statement += f"""ORDER BY {SORT_BY[sort_by]} {sort_order.upper()} NULLS LAST"""
+                        sort_expr = SORT_BY[sort_by]
                     elif sort_by.startswith("altdata."):
                         fields = sort_by.split(".")[1:]
                         # qualified so resolve_obj_join keeps the objs join
@@ -2060,25 +2180,73 @@ async def get_sources(
                             query_params.append(
                                 sa.bindparam(f"altdata_field_{i + 1}", field)
                             )
-                        statement += f"""ORDER BY {altdata_substatement} {sort_order.upper()} NULLS LAST"""
+                        sort_expr = altdata_substatement
                     else:
-                        statement += (
-                            f"""ORDER BY {SORT_BY[sort_by]} {sort_order.upper()}"""
-                        )
+                        sort_expr = SORT_BY[sort_by]
+                        nulls_last = False
+
+                    # in cursor mode, select the sort key so the page query can
+                    # order on it; use the aggregate itself, as the same SELECT
+                    # list cannot reference the most_recent_saved_at alias
+                    sort_key_column = ""
+                    if cursor is not None:
+                        if sort_expr == "most_recent_saved_at":
+                            sort_key_column = ", MAX(sources.saved_at) AS sort_key"
+                        else:
+                            sort_key_column = f", {sort_expr} AS sort_key"
 
-                    statement = (
-                        text(resolve_obj_join(statement))
-                        .bindparams(*query_params)
-                        .columns(id=sa.String, most_recent_saved_at=sa.DateTime)
-                    )
-                    if verbose:
-                        log_verbose(f"Params:\n{query_params}")
-                        log_verbose(f"Query:\n{statement}")
+                    # ADD QUERY STATEMENTS
+                    statement = f"""SELECT {OBJ_ID_TOKEN} AS id, MAX(sources.saved_at) AS most_recent_saved_at{sort_key_column}
+                        FROM {SOURCES_FROM_TOKEN}
+                        {" ".join(joins)}
+                        WHERE {" AND ".join(statements)}
+                        GROUP BY {OBJ_ID_TOKEN}
+                    """
+
+                    if ":accessible_group_ids" in statement:
+                        statement = statement.replace(
+                            ":accessible_group_ids", accessible_groups_query_str
+                        )
+                        query_params.extend(accessible_groups_bindparams)
+                    if ":allocation_ids" in statement:
+                        statement = statement.replace(
+                            ":allocation_ids", allocation_query_str
+                        )
+                        query_params.extend(allocation_bindparams)
 
                     startTime = time.time()
 
-                    results = await session.execute(statement)
-                    all_obj_ids = [r[0] for r in results]
+                    if cursor is not None:
+                        (
+                            all_obj_ids,
+                            data["nextCursor"],
+                            data["totalMatches"],
+                        ) = await fetch_cursor_page(
+                            session,
+                            resolve_obj_join(statement),
+                            query_params,
+                            sort_order,
+                            cursor,
+                            f"{sort_by}:{sort_order}",
+                            num_per_page,
+                            total_matches_mode,
+                            json_key=annotation_sort,
+                        )
+                    else:
+                        statement += f"ORDER BY {sort_expr} {sort_order.upper()}"
+                        if nulls_last:
+                            statement += " NULLS LAST"
+                        statement = (
+                            text(resolve_obj_join(statement))
+                            .bindparams(*query_params)
+                            .columns(id=sa.String, most_recent_saved_at=sa.DateTime)
+                        )
+                        if verbose:
+                            log_verbose(f"Params:\n{query_params}")
+                            log_verbose(f"Query:\n{statement}")
+
+                        results = await session.execute(statement)
+                        all_obj_ids = [r[0] for r in results]
                     if len(all_obj_ids) != len(set(all_obj_ids)):
                         raise ValueError(
                             f"Duplicate obj_ids in query results, query is incorrect: {all_obj_ids}"
@@ -2096,21 +2264,26 @@ async def get_sources(
                 if use_cache:
                     all_obj_ids_bytes = array_to_bytes(all_obj_ids)
                     query_id = hashlib.sha256(all_obj_ids_bytes).hexdigest()
-                    cache[query_id] = all_obj_ids_bytes
+                    await cache.aset(query_id, all_obj_ids_bytes)
                     data["queryID"] = query_id
 
-            objs, total_matches = [], len(all_obj_ids)
-            data["totalMatches"] = total_matches
-            if start > total_matches:
-                return data
-            if end > total_matches:
-                end = total_matches
+            if cursor is not None:
+                # already just the requested page
+                obj_ids = all_obj_ids
+            else:
+                total_matches = len(all_obj_ids)
+                data["totalMatches"] = total_matches
+                if start > total_matches:
+                    return data
+                if end > total_matches:
+                    end = total_matches
 
-            startTime = time.time()
+                obj_ids = all_obj_ids[start:end]
+                if isinstance(obj_ids, np.ndarray):
+                    obj_ids = obj_ids.tolist()
 
-            obj_ids = all_obj_ids[start:end]
-            if isinstance(obj_ids, np.ndarray):
-                obj_ids = obj_ids.tolist()
+            objs = []
+            startTime = time.time()
             objs_result = await session.scalars(
                 sa.select(Obj).where(Obj.id.in_(obj_ids)).distinct()
             )
@@ -2216,9 +2389,19 @@ async def get_sources(
             startTime = time.time()
             obj_coords = np.array([[obj["ra"], obj["dec"]] for obj in objs])
             obj_coords_gal = radec2lb(obj_coords[:, 0], obj_coords[:, 1])
+            try:
+                # off the IOLoop: the first query in a process loads (or
+                # downloads) the dust maps
+                obj_ebv = await IOLoop.current().run_in_executor(
+                    None, sfd_ebv, obj_coords[:, 0], obj_coords[:, 1]
+                )
+            except Exception as e:
+                log(f"Could not query the SFD dust map: {e}")
+                obj_ebv = np.full(len(objs), np.nan)
             for i in range(len(objs)):
                 objs[i]["gal_lon"] = obj_coords_gal[0][i]
                 objs[i]["gal_lat"] = obj_coords_gal[1][i]
+                objs[i]["ebv"] = None if np.isnan(obj_ebv[i]) else float(obj_ebv[i])
                 redshift = objs[i]["redshift"]
                 luminosity_distance = get_luminosity_distance(objs[i])
                 objs[i]["luminosity_distance"] = luminosity_distance
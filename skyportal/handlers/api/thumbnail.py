@@ -68,7 +68,7 @@ class ThumbnailPutBody(BaseModel):
     )
 
 
-async def post_thumbnail(data, user_id, session):
+async def post_thumbnail(data, user_id, session, commit=True):
     """Post thumbnail to database (async).
     data: dict
         Thumbnail dictionary
@@ -76,6 +76,8 @@ async def post_thumbnail(data, user_id, session):
         SkyPortal ID of User posting the Thumbnail
     session: sqlalchemy.ext.asyncio.AsyncSession
         Async DB session for this transaction
+    commit : bool
+        Whether to commit; with False the thumbnail is only flushed
     """
 
     user = await session.scalar(sa.select(User).where(User.id == user_id))
@@ -125,7 +127,10 @@ async def post_thumbnail(data, user_id, session):
             f.write(file_bytes)
 
         session.add(t)
-        await session.commit()
+        if commit:
+            await session.commit()
+        else:
+            await session.flush()
 
     except (LookupError, StatementError) as e:
         if "enum" in str(e):
@@ -1,3 +1,4 @@
+import os
 from math import ceil
 
 from pydantic import ValidationError as PydanticValidationError
@@ -104,8 +105,8 @@ class BaseHandler(BaselayerHandler):
         max_file_size=20 * 1024**2,
     ):
         """
-        data : bytesIO
-            File contents.
+        data : bytesIO or binary file
+            File contents; files are streamed from disk.
         filename : str
             Downloaded filename.
         chunk_size : int
@@ -116,7 +117,11 @@ class BaseHandler(BaselayerHandler):
         # Adapted from
         # https://bhch.github.io/posts/2017/12/serving-large-files-with-tornado-safely-without-blocking/
         mb = 1024 * 1024 * 1
-        if not (data.getbuffer().nbytes < max_file_size):
+        if hasattr(data, "getbuffer"):
+            file_size = data.getbuffer().nbytes
+        else:
+            file_size = os.fstat(data.fileno()).st_size
+        if not (file_size < max_file_size):
             return self.error(
                 f"Refusing to send files larger than {max_file_size / mb:.2f} MB"
             )
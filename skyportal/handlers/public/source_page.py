@@ -1,6 +1,5 @@
 from typing import Annotated
 
-import numpy as np
 import sqlalchemy as sa
 from pydantic import Field
 
@@ -9,7 +8,7 @@ from baselayer.app.models import DBSession
 
 from ...models.public_pages.public_release import PublicRelease
 from ...models.public_pages.public_source_page import PublicSourcePage
-from ...utils.cache import Cache
+from ...utils.cache import bytes_to_dict, shared_cache
 from ..base import BaseHandler
 
 SourceId = Annotated[
@@ -21,9 +20,8 @@ VersionHash = Annotated[
 
 env, cfg = load_env()
 
-cache_dir = "cache/public_pages/sources"
-cache = Cache(
-    cache_dir=cache_dir,
+cache = shared_cache(
+    "public_pages/sources",
     max_age=cfg["misc.minutes_to_keep_public_source_pages_cache"] * 60,
 )
 
@@ -121,12 +119,10 @@ class SourcePageHandler(BaseHandler):
                     version = get_version(session, None, source_id, version_hash)
                     if version is None:
                         return self.error("Page not found", status=404)
-                version.generate_page()
-                cache_key = f"source_{source_id}_version_{version_hash}"
-                cached = cache[cache_key]
+                data = version.generate_page()
+            else:
+                data = bytes_to_dict(cached)
 
-            data = np.load(cached, allow_pickle=True)
-            data = data.item()
             if data["public"]:
                 self.set_header("Content-Type", "text/html; charset=utf-8")
                 return self.write(data["html"])
@@ -173,14 +169,10 @@ class ReleaseSourcePageHandler(BaseHandler):
                 version = get_version(session, release_name, source_id, version_hash)
                 if version is None:
                     return self.error("Page not found", status=404)
-                version.generate_page()
-                cache_key = (
-                    f"release_{release_name}_source_{source_id}_version_{version_hash}"
-                )
-                cached = cache[cache_key]
+                data = version.generate_page()
+            else:
+                data = bytes_to_dict(cached)
 
-            data = np.load(cached, allow_pickle=True)
-            data = data.item()
             if data["public"]:
                 self.set_header("Content-Type", "text/html; charset=utf-8")
                 return self.write(data["html"])
@@ -2,6 +2,7 @@ __all__ = [
     "Instrument",
     "InstrumentField",
     "InstrumentFieldTile",
+    "InstrumentFieldUpload",
     "InstrumentLog",
     "InstrumentSharingService",
 ]
@@ -24,6 +25,7 @@ from baselayer.app.models import (
     DBSession,
     join_model,
     public,
+    restricted,
 )
 from baselayer.log import make_log
 from skyportal import facility_apis
@@ -119,6 +121,18 @@ class InstrumentField(Base):
         )
     )
 
+    healpix_ranges = deferred(
+        sa.Column(
+            sa.LargeBinary,
+            nullable=True,
+            doc=(
+                "Depth-29 HEALPix ranges covered by the field's tiles, as "
+                "big-endian int64 (lower, upper) pairs "
+                "(see skyportal.utils.healpix_ranges)"
+            ),
+        )
+    )
+
     reference_filters = sa.Column(
         sa.ARRAY(sa.String), nullable=True, comment="Reference template filters"
     )
@@ -196,6 +210,62 @@ class InstrumentField(Base):
         return self.instrument.telescope.observer.altaz(time, self.target).alt
 
 
+class InstrumentFieldUpload(Base):
+    """The generation of an instrument's fields and their tiles from an
+    uploaded field list, run in the background by ``add_tiles``; records its
+    progress."""
+
+    __tablename__ = "instrument_field_uploads"
+
+    read = public
+    create = update = delete = restricted
+
+    instrument_id = sa.Column(
+        sa.ForeignKey("instruments.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+        doc="Instrument ID",
+    )
+
+    status = sa.Column(
+        sa.String,
+        nullable=False,
+        server_default="pending",
+        doc="One of: pending, running, done, failed.",
+    )
+
+    num_total = sa.Column(
+        sa.Integer,
+        nullable=True,
+        doc="Number of fields to generate, counted when the upload starts.",
+    )
+
+    num_processed = sa.Column(
+        sa.Integer,
+        nullable=False,
+        server_default="0",
+        doc="Number of fields written so far.",
+    )
+
+    started_at = sa.Column(
+        sa.DateTime,
+        nullable=True,
+        doc="When the generation of the fields started.",
+    )
+
+    finished_at = sa.Column(
+        sa.DateTime,
+        nullable=True,
+        doc="When the generation of the fields finished or failed.",
+    )
+
+    error = sa.Column(
+        sa.String,
+        nullable=True,
+        doc="Message from the failure, if the upload failed.",
+    )
+
+
 class InstrumentLog(Base):
     """A log for instrument status"""
 
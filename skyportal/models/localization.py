@@ -3,11 +3,12 @@ __all__ = [
     "LocalizationTag",
     "LocalizationProperty",
     "LocalizationTile",
+    "LocalizationCredibleRegion",
 ]
 
 import datetime
+import os
 
-import dustmaps.sfd
 import healpix_alchemy
 import healpy
 import ligo.skymap.bayestar as ligo_bayestar
@@ -22,7 +23,7 @@ from astropy.table import Table
 from dateutil.relativedelta import relativedelta
 from dustmaps.config import config
 from sqlalchemy import event, func
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.postgresql import INT8MULTIRANGE, JSONB
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.sql.ddl import DDL
@@ -35,6 +36,8 @@ from baselayer.app.models import (
 )
 from baselayer.log import make_log
 
+from ..utils import skymap_cache, skymap_file
+from ..utils.extinction import ebv as sfd_ebv
 from ..utils.files import delete_file_data, save_file_data
 
 _, cfg = load_env()
@@ -94,16 +97,18 @@ class Localization(Base):
     uniq = deferred(
         sa.Column(
             sa.ARRAY(sa.BigInteger),
-            nullable=False,
-            doc="Multiresolution HEALPix UNIQ pixel index array",
+            nullable=True,
+            doc="Multiresolution HEALPix UNIQ pixel index array. Null when "
+            "the arrays are only stored on disk (see skymap_arrays).",
         )
     )
 
     probdensity = deferred(
         sa.Column(
             sa.ARRAY(sa.Float),
-            nullable=False,
-            doc="Multiresolution HEALPix probability density array",
+            nullable=True,
+            doc="Multiresolution HEALPix probability density array. Null when "
+            "the arrays are only stored on disk (see skymap_arrays).",
         )
     )
 
@@ -166,6 +171,14 @@ class Localization(Base):
         doc="Tags associated with this Localization.",
     )
 
+    credible_regions = relationship(
+        "LocalizationCredibleRegion",
+        back_populates="localization",
+        cascade="delete",
+        passive_deletes=True,
+        doc="Precomputed credible regions of the localization.",
+    )
+
     notice_id = sa.Column(
         sa.ForeignKey("gcnnotices.id", ondelete="CASCADE"),
         nullable=True,
@@ -174,26 +187,98 @@ class Localization(Base):
 
     @hybrid_property
     def is_3d(self):
-        return (
-            self.distmu is not None
-            and self.distsigma is not None
-            and self.distnorm is not None
-        )
+        return self.skymap_arrays["DISTMU"] is not None
 
     @is_3d.expression
     def is_3d(cls):
+        # only sees the arrays stored in the database
         return sa.and_(
             cls.distmu.isnot(None),
             cls.distsigma.isnot(None),
             cls.distnorm.isnot(None),
         )
 
+    @property
+    def skymap_arrays(self):
+        """Multi-order skymap arrays, keyed by FITS column name (UNIQ,
+        PROBDENSITY, DISTMU, DISTSIGMA, DISTNORM; the distance arrays are None
+        for 2D skymaps).
+
+        They are memory-mapped from the localization's skymap file when it has
+        one (see skyportal.utils.skymap_file), and read-only in that case;
+        otherwise they come from the database columns."""
+        arrays = self.__dict__.get("_skymap_arrays")
+        if arrays is None and self.id is not None:
+            arrays = skymap_file.read(self.skymap_path)
+            if arrays is not None:
+                self.__dict__["_skymap_arrays"] = arrays
+        if arrays is None:
+            distance = (self.distmu, self.distsigma, self.distnorm)
+            if any(column is None for column in distance):
+                distance = (None, None, None)
+            arrays = dict(
+                zip(
+                    skymap_file.COLUMNS,
+                    (
+                        None if self.uniq is None else np.asarray(self.uniq, np.int64),
+                        self.probdensity,
+                        *distance,
+                    ),
+                )
+            )
+        return arrays
+
+    async def load_skymap_arrays(self, session):
+        """Make `skymap_arrays` readable under an async ``session``.
+
+        The arrays are read from the skymap file when there is one; otherwise
+        the deferred database columns are loaded here, as lazy-loading them
+        raises MissingGreenlet under an async session. Queries should not
+        undefer the columns, so that nothing is fetched when a file exists."""
+        if "_skymap_arrays" in self.__dict__ or self.id is None:
+            return
+        arrays = skymap_file.read(self.skymap_path)
+        if arrays is not None:
+            self.__dict__["_skymap_arrays"] = arrays
+            return
+        await session.refresh(
+            self, ["uniq", "probdensity", "distmu", "distsigma", "distnorm"]
+        )
+
+    @property
+    def skymap_path(self):
+        """Path of the localization's multi-order skymap file."""
+        return skymap_file.skymap_path(self._data_folder())
+
+    def save_skymap_file(self):
+        """Write the multi-order skymap from the database columns to the
+        localization's skymap file, from which it is read afterwards. With
+        ``misc.localization_storage: file``, the columns are then cleared
+        (the caller commits)."""
+        skymap_file.write(
+            self.skymap_path,
+            self.uniq,
+            self.probdensity,
+            self.distmu,
+            self.distsigma,
+            self.distnorm,
+        )
+        self.__dict__.pop("_skymap_arrays", None)
+        if not skymap_file.store_arrays_in_database():
+            self.uniq = None
+            self.probdensity = None
+            self.distmu = None
+            self.distsigma = None
+            self.distnorm = None
+
     @property
     def table_2d(self):
         """Get multiresolution HEALPix dataset, probability density only."""
+        arrays = self.skymap_arrays
         return Table(
-            [np.asarray(self.uniq, dtype=np.int64), self.probdensity],
+            [arrays["UNIQ"], arrays["PROBDENSITY"]],
             names=["UNIQ", "PROBDENSITY"],
+            copy=False,
         )
 
     @property
@@ -201,38 +286,64 @@ class Localization(Base):
         """Get multiresolution HEALPix dataset, probability density and
         distance."""
         if self.is_3d:
+            arrays = self.skymap_arrays
             return Table(
-                [
-                    np.asarray(self.uniq, dtype=np.int64),
-                    self.probdensity,
-                    self.distmu,
-                    self.distsigma,
-                    self.distnorm,
-                ],
-                names=["UNIQ", "PROBDENSITY", "DISTMU", "DISTSIGMA", "DISTNORM"],
+                [arrays[name] for name in skymap_file.COLUMNS],
+                names=list(skymap_file.COLUMNS),
+                copy=False,
             )
         else:
             return self.table_2d
 
     @property
     def flat_2d(self):
-        """Get flat resolution HEALPix dataset, probability density only."""
-        order = healpy.nside2order(Localization.nside)
-        result = ligo_bayestar.rasterize(self.table_2d, order)["PROB"]
-        return healpy.reorder(result, "NESTED", "RING")
+        """Get flat resolution HEALPix dataset, probability density only.
+
+        The raster is cached on disk and memory-mapped (see
+        skyportal.utils.skymap_cache), so the returned array is read-only."""
+
+        def rasterize():
+            order = healpy.nside2order(Localization.nside)
+            result = ligo_bayestar.rasterize(self.table_2d, order)["PROB"]
+            return healpy.reorder(result, "NESTED", "RING")
+
+        return self._cached_raster("2d", rasterize)
 
     @property
     def flat(self):
         """Get flat resolution HEALPix dataset, probability density and
-        distance."""
+        distance. Read-only, like flat_2d."""
         if self.is_3d:
-            order = healpy.nside2order(Localization.nside)
-            t = ligo_bayestar.rasterize(self.table, order)
-            result = t["PROB"], t["DISTMU"], t["DISTSIGMA"], t["DISTNORM"]
-            return healpy.reorder(result, "NESTED", "RING")
+
+            def rasterize():
+                order = healpy.nside2order(Localization.nside)
+                t = ligo_bayestar.rasterize(self.table, order)
+                result = t["PROB"], t["DISTMU"], t["DISTSIGMA"], t["DISTNORM"]
+                return healpy.reorder(result, "NESTED", "RING")
+
+            return tuple(self._cached_raster("3d", rasterize))
         else:
             return (self.flat_2d,)
 
+    def _data_folder(self):
+        """Folder holding the localization's files on disk."""
+        if self._localization_path:
+            return os.path.dirname(self._localization_path)
+        root_folder = cfg.get("localizations_folder", "localizations_data")
+        return os.path.join(root_folder, str(self.id))
+
+    def _cached_raster(self, kind, rasterize):
+        return skymap_cache.cached_raster(
+            self.id,
+            skymap_cache.fingerprint(
+                self.dateobs, self.localization_name, self.created_at
+            ),
+            self._data_folder(),
+            Localization.nside,
+            kind,
+            rasterize,
+        )
+
     @property
     def center(self):
         """Get information about the center of the localization."""
@@ -257,7 +368,7 @@ class Localization(Base):
         center_info["gal_lon"] = coord.galactic.l.deg
 
         try:
-            ebv = float(dustmaps.sfd.SFDQuery()(coord))
+            ebv = sfd_ebv(coord.ra.deg, coord.dec.deg)
         except Exception:
             ebv = None
         center_info["ebv"] = ebv
@@ -308,6 +419,10 @@ class Localization(Base):
         """
 
         try:
+            self.__dict__.pop("_skymap_arrays", None)
+            if os.path.exists(self.skymap_path):
+                os.remove(self.skymap_path)
+            skymap_cache.evict(self.id, self._data_folder())
             delete_file_data(self._localization_path)
 
             # reset the filename
@@ -552,6 +667,41 @@ class LocalizationProperty(Base):
     data = sa.Column(JSONB, doc="Localization properties in JSON format.", index=True)
 
 
+class LocalizationCredibleRegion(Base):
+    """The credible region of a localization at a given level, as the sorted,
+    merged depth-29 HEALPix ranges of its tiles. Stored for the levels in
+    skyportal.utils.crossmatch.CREDIBLE_LEVELS when the tiles are added, so
+    containment is a binary search (``healpix @> position``) rather than a
+    cumulative-probability window over the tiles."""
+
+    read = AccessibleIfRelatedRowsAreAccessible(localization="read")
+
+    localization = relationship(
+        "Localization",
+        back_populates="credible_regions",
+        doc="The Localization this credible region belongs to.",
+    )
+
+    localization_id = sa.Column(
+        sa.ForeignKey("localizations.id", ondelete="CASCADE"),
+        primary_key=True,
+        index=True,
+        doc="localization ID",
+    )
+
+    level = sa.Column(
+        sa.Float,
+        primary_key=True,
+        doc="Cumulative probability of the credible region (e.g. 0.9).",
+    )
+
+    healpix = sa.Column(
+        INT8MULTIRANGE,
+        nullable=False,
+        doc="Depth-29 nested HEALPix ranges covering the credible region.",
+    )
+
+
 class LocalizationTag(Base):
     """Store qualitative tags for localizations."""
 
@@ -33,6 +33,7 @@ from baselayer.app.models import (
 )
 from baselayer.log import make_log
 
+from ..utils.extinction import ebv as sfd_ebv
 from .candidate import Candidate
 from .cosmo import cosmo
 from .photometric_series import PhotometricSeries
@@ -934,11 +935,11 @@ class Obj(Base, conesearch_alchemy.Point):
     def ebv(self):
         """E(B-V) extinction for the object"""
 
-        coord = ap_coord.SkyCoord(self.ra, self.dec, unit="deg")
         try:
-            return float(dustmaps.sfd.SFDQuery()(coord))
+            ebv = sfd_ebv(self.ra, self.dec)
         except Exception:
             return None
+        return None if np.isnan(ebv) else ebv
 
 
 Obj.candidates = relationship(
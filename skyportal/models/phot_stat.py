@@ -1,4 +1,4 @@
-__all__ = ["PhotStat"]
+__all__ = ["PhotStat", "PhotStatRebuild", "update_phot_stats"]
 
 import bisect
 import copy
@@ -11,12 +11,11 @@ from sqlalchemy.dialects.postgresql import JSONB
 
 # see this: https://amercader.net/blog/beware-of-json-fields-in-sqlalchemy/
 from sqlalchemy.ext.mutable import MutableDict
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import Session, object_session, relationship
 
 from baselayer.app.env import load_env
 from baselayer.app.models import (
     Base,
-    DBSession,
     public,
     restricted,
 )
@@ -28,6 +27,116 @@ _, cfg = load_env()
 PHOT_DETECTION_THRESHOLD = cfg["misc.photometry_detection_threshold_nsigma"]
 
 
+def _photometry_arrays(phot_list):
+    """
+    Read the fields PhotStat needs from a list of photometry points
+    into NumPy arrays.
+
+    Parameters
+    ----------
+    phot_list: 1D array-like of skyportal.models.Photometry or dicts
+        Photometry points of a single object.
+
+    Returns
+    -------
+    tuple of np.ndarray
+        Filters, MJDs, magnitudes, detection flags, limiting magnitudes
+        and non-forced-photometry detection flags. Non-detections without
+        a valid limiting magnitude are dropped.
+    """
+    filters = []
+    mjds = []
+    mags = []
+    dets = []
+    dets_no_forced_phot = []
+    lims = []
+    for phot in phot_list:
+        # Read fields once. For ORM instances, accessing attributes goes
+        # through the identity map without round-tripping; for expired
+        # instances it triggers at most a single refresh. Calling
+        # Photometry.to_dict() here used to issue one SELECT per row
+        # because Base.to_dict() has an expired-instance refresh fallback.
+        if isinstance(phot, Photometry):
+            filt = phot.filter
+            mjd = phot.mjd
+            flux = phot.flux
+            fluxerr = phot.fluxerr
+            origin = phot.origin or ""
+            original_user_data = phot.original_user_data
+            mag = None  # Photometry has no stored mag; computed from flux below
+        elif isinstance(phot, dict):
+            filt = phot["filter"]
+            mjd = phot["mjd"]
+            flux = phot["flux"]
+            fluxerr = phot["fluxerr"]
+            origin = phot.get("origin", "")
+            original_user_data = phot.get("original_user_data")
+            mag = phot.get("mag")
+        else:
+            raise TypeError("phot must be a dict or Photometry object")
+
+        filters.append(filt)
+        mjds.append(mjd)
+
+        if mag is not None:
+            mags.append(mag)
+        elif flux is not None and flux > 0:
+            mags.append(-2.5 * np.log10(flux) + PHOT_ZP)
+        else:
+            mags.append(np.nan)
+
+        is_detected = (
+            flux is not None
+            and fluxerr is not None
+            and fluxerr > 0
+            and flux / fluxerr > PHOT_DETECTION_THRESHOLD
+        )
+        dets.append(is_detected)
+
+        if (
+            origin not in ["fp", "forced phot", "forced photometry", "alert_fp"]
+            and is_detected
+        ):
+            dets_no_forced_phot.append(True)
+        else:
+            dets_no_forced_phot.append(False)
+
+        if not is_detected:
+            if isinstance(original_user_data, str):
+                try:
+                    original_user_data = json.loads(original_user_data)
+                except (TypeError, ValueError):
+                    original_user_data = None
+            if original_user_data is not None and "limiting_mag" in original_user_data:
+                lims.append(original_user_data["limiting_mag"])
+            else:
+                fivesigma = 5 * fluxerr
+                if fivesigma > 0:
+                    lims.append(-2.5 * np.log10(fivesigma) + PHOT_ZP)
+                else:
+                    lims.append(np.nan)
+        else:
+            lims.append(np.nan)
+
+    filters = np.array(filters, dtype=str)
+    mjds = np.array(mjds, dtype=float)
+    mags = np.array(mags, dtype=float)
+    dets = np.array(dets, dtype=bool)
+    lims = np.array(lims, dtype=float)
+    dets_no_forced_phot = np.array(dets_no_forced_phot, dtype=bool)
+
+    # make sure all non-detections have limiting magnitudes
+    good = dets | ~np.isnan(lims)
+    return (
+        filters[good],
+        mjds[good],
+        mags[good],
+        dets[good],
+        lims[good],
+        dets_no_forced_phot[good],
+    )
+
+
 class PhotStat(Base):
     """
     Keep track of some photometric statistics
@@ -592,31 +701,7 @@ class PhotStat(Base):
                     self.last_non_detection_mjd = None
 
             # update the rise and decay rates
-            if (
-                self.first_detected_filter is not None
-                and self.first_detected_filter in self.peak_mag_per_filter
-            ):
-                peak_mag = self.peak_mag_per_filter[self.first_detected_filter]
-                peak_mjd = self.peak_mjd_per_filter[self.first_detected_filter]
-                if peak_mjd > self.first_detected_mjd:
-                    self.rise_rate = -(peak_mag - self.first_detected_mag) / (
-                        peak_mjd - self.first_detected_mjd
-                    )
-                else:
-                    self.rise_rate = None
-
-            if (
-                self.last_detected_filter is not None
-                and self.last_detected_filter in self.peak_mag_per_filter
-            ):
-                peak_mag = self.peak_mag_per_filter[self.last_detected_filter]
-                peak_mjd = self.peak_mjd_per_filter[self.last_detected_filter]
-                if peak_mjd < self.last_detected_mjd:
-                    self.decay_rate = -(peak_mag - self.last_detected_mag) / (
-                        peak_mjd - self.last_detected_mjd
-                    )
-                else:
-                    self.decay_rate = None
+            self._update_rates()
 
             # update the number of detections
             self.num_det_global += 1
@@ -656,6 +741,202 @@ class PhotStat(Base):
 
         self.last_update = utcnow_naive()
 
+    def add_photometry_points(self, phot_list):
+        """
+        Add a batch of new photometry points to the object's statistics.
+        The result is the same as calling add_photometry_point on each
+        point, but the running statistics are merged once for the whole
+        batch with vectorized operations, so the cost does not grow with
+        a Python loop over the stats for every point.
+
+        Parameters
+        ----------
+        phot_list: 1D array-like of skyportal.models.Photometry or dicts
+            New photometry points that were added to the object.
+
+        """
+        filters, mjds, mags, dets, lims, dets_no_forced_phot = _photometry_arrays(
+            phot_list
+        )
+        if len(mjds) == 0:
+            return  # no valid points, nothing to update
+
+        self.num_obs_global += len(mjds)
+        for filt, count in zip(*np.unique(filters, return_counts=True)):
+            self.num_obs_per_filter[filt] = self.num_obs_per_filter.get(filt, 0) + int(
+                count
+            )
+
+        self.recent_obs_mjd = max(mjds.max(), self.recent_obs_mjd or 0)
+
+        if np.any(dets):
+            good_mjds = mjds[dets]
+            good_mags = mags[dets]
+            good_filters = filters[dets]
+
+            idx = np.argmin(good_mjds)
+            if (
+                self.first_detected_mjd is None
+                or good_mjds[idx] < self.first_detected_mjd
+            ):
+                self.first_detected_mjd = good_mjds[idx]
+                self.first_detected_mag = good_mags[idx]
+                self.first_detected_filter = good_filters[idx]
+            idx = np.argmax(good_mjds)
+            if (
+                self.last_detected_mjd is None
+                or good_mjds[idx] > self.last_detected_mjd
+            ):
+                self.last_detected_mjd = good_mjds[idx]
+                self.last_detected_mag = good_mags[idx]
+                self.last_detected_filter = good_filters[idx]
+
+            if np.any(dets_no_forced_phot):
+                good_mjds_no_fp = mjds[dets_no_forced_phot]
+                good_mags_no_fp = mags[dets_no_forced_phot]
+                good_filters_no_fp = filters[dets_no_forced_phot]
+
+                idx = np.argmin(good_mjds_no_fp)
+                if (
+                    self.first_detected_no_forced_phot_mjd is None
+                    or good_mjds_no_fp[idx] < self.first_detected_no_forced_phot_mjd
+                ):
+                    self.first_detected_no_forced_phot_mjd = good_mjds_no_fp[idx]
+                    self.first_detected_no_forced_phot_mag = good_mags_no_fp[idx]
+                    self.first_detected_no_forced_phot_filter = good_filters_no_fp[idx]
+                idx = np.argmax(good_mjds_no_fp)
+                if (
+                    self.last_detected_no_forced_phot_mjd is None
+                    or good_mjds_no_fp[idx] > self.last_detected_no_forced_phot_mjd
+                ):
+                    self.last_detected_no_forced_phot_mjd = good_mjds_no_fp[idx]
+                    self.last_detected_no_forced_phot_mag = good_mags_no_fp[idx]
+                    self.last_detected_no_forced_phot_filter = good_filters_no_fp[idx]
+                self.num_det_no_forced_phot_global += len(good_mjds_no_fp)
+
+            # merge the mean and RMS of the old and new detections
+            self.mean_mag_global, self.mag_rms_global = self.merge_moments(
+                self.mean_mag_global,
+                self.mag_rms_global,
+                self.num_det_global,
+                good_mags,
+            )
+
+            idx = np.argmin(good_mags)
+            if self.peak_mag_global is None or self.peak_mag_global > good_mags[idx]:
+                self.peak_mag_global = good_mags[idx]
+                self.peak_mjd_global = good_mjds[idx]
+            self.faintest_mag_global = max(
+                good_mags.max(), self.faintest_mag_global or -np.inf
+            )
+
+            # stats for detections for each filter
+            for filt in np.unique(good_filters):
+                filt_mjds = good_mjds[good_filters == filt]
+                filt_mags = good_mags[good_filters == filt]
+                num_det = self.num_det_per_filter.get(filt, 0)
+
+                (
+                    self.mean_mag_per_filter[filt],
+                    self.mag_rms_per_filter[filt],
+                ) = self.merge_moments(
+                    self.mean_mag_per_filter.get(filt),
+                    self.mag_rms_per_filter.get(filt),
+                    num_det,
+                    filt_mags,
+                )
+                idx = np.argmin(filt_mags)
+                if (
+                    filt not in self.peak_mag_per_filter
+                    or self.peak_mag_per_filter[filt] > filt_mags[idx]
+                ):
+                    self.peak_mag_per_filter[filt] = filt_mags[idx]
+                    self.peak_mjd_per_filter[filt] = filt_mjds[idx]
+                self.faintest_mag_per_filter[filt] = max(
+                    filt_mags.max(), self.faintest_mag_per_filter.get(filt, -np.inf)
+                )
+                self.num_det_per_filter[filt] = num_det + len(filt_mags)
+
+            self.num_det_global += len(good_mjds)
+
+            # colors are differences of the (updated) mean magnitudes
+            mean_mags = self.mean_mag_per_filter
+            for f1 in mean_mags:
+                for f2 in mean_mags:
+                    if f1 != f2:
+                        self.mean_color[f"{f1}-{f2}"] = mean_mags[f1] - mean_mags[f2]
+
+            self._update_rates()
+
+        if not np.all(dets):
+            lim_mags = lims[~dets]
+            lim_filters = filters[~dets]
+            self.deepest_limit_global = max(
+                lim_mags.max(), self.deepest_limit_global or -np.inf
+            )
+            for filt in np.unique(lim_filters):
+                self.deepest_limit_per_filter[filt] = max(
+                    lim_mags[lim_filters == filt].max(),
+                    self.deepest_limit_per_filter.get(filt, -np.inf),
+                )
+
+        # predetections are the non-detections before the first detection;
+        # a new early detection can remove some of the existing ones
+        predetection_mjds = [*(self.predetection_mjds or []), *mjds[~dets]]
+        if self.first_detected_mjd is not None:
+            predetection_mjds = [
+                mjd for mjd in predetection_mjds if mjd < self.first_detected_mjd
+            ]
+        self.predetection_mjds = sorted(float(mjd) for mjd in predetection_mjds)
+        if self.predetection_mjds:
+            self.last_non_detection_mjd = self.predetection_mjds[-1]
+        else:
+            self.last_non_detection_mjd = None
+
+        # find the time between first detection and last non-detection
+        if (
+            self.first_detected_mjd is not None
+            and self.last_non_detection_mjd is not None
+        ):
+            self.time_to_non_detection = (
+                self.first_detected_mjd - self.last_non_detection_mjd
+            )
+        else:
+            self.time_to_non_detection = None
+
+        self.last_update = utcnow_naive()
+
+    def _update_rates(self):
+        """
+        Recompute the rise and decay rates from the first/last
+        detections and the peak magnitude in their filters.
+        """
+        if (
+            self.first_detected_filter is not None
+            and self.first_detected_filter in self.peak_mag_per_filter
+        ):
+            peak_mag = self.peak_mag_per_filter[self.first_detected_filter]
+            peak_mjd = self.peak_mjd_per_filter[self.first_detected_filter]
+            if peak_mjd > self.first_detected_mjd:
+                self.rise_rate = -(peak_mag - self.first_detected_mag) / (
+                    peak_mjd - self.first_detected_mjd
+                )
+            else:
+                self.rise_rate = None
+
+        if (
+            self.last_detected_filter is not None
+            and self.last_detected_filter in self.peak_mag_per_filter
+        ):
+            peak_mag = self.peak_mag_per_filter[self.last_detected_filter]
+            peak_mjd = self.peak_mjd_per_filter[self.last_detected_filter]
+            if peak_mjd < self.last_detected_mjd:
+                self.decay_rate = -(peak_mag - self.last_detected_mag) / (
+                    peak_mjd - self.last_detected_mjd
+                )
+            else:
+                self.decay_rate = None
+
     def full_update(self, phot_list):
         """
         Update this object's photometric stats
@@ -679,98 +960,9 @@ class PhotStat(Base):
             self.last_full_update = utcnow_naive()
             return
 
-        filters = []
-        mjds = []
-        mags = []
-        dets = []
-        dets_no_forced_phot = []
-        lims = []
-        for phot in phot_list:
-            # Read fields once. For ORM instances, accessing attributes goes
-            # through the identity map without round-tripping; for expired
-            # instances it triggers at most a single refresh. Calling
-            # Photometry.to_dict() here used to issue one SELECT per row
-            # because Base.to_dict() has an expired-instance refresh fallback.
-            if isinstance(phot, Photometry):
-                filt = phot.filter
-                mjd = phot.mjd
-                flux = phot.flux
-                fluxerr = phot.fluxerr
-                origin = phot.origin or ""
-                original_user_data = phot.original_user_data
-                mag = None  # Photometry has no stored mag; computed from flux below
-            elif isinstance(phot, dict):
-                filt = phot["filter"]
-                mjd = phot["mjd"]
-                flux = phot["flux"]
-                fluxerr = phot["fluxerr"]
-                origin = phot.get("origin", "")
-                original_user_data = phot.get("original_user_data")
-                mag = phot.get("mag")
-            else:
-                raise TypeError("phot must be a dict or Photometry object")
-
-            filters.append(filt)
-            mjds.append(mjd)
-
-            if mag is not None:
-                mags.append(mag)
-            elif flux is not None and flux > 0:
-                mags.append(-2.5 * np.log10(flux) + PHOT_ZP)
-            else:
-                mags.append(np.nan)
-
-            is_detected = (
-                flux is not None
-                and fluxerr is not None
-                and fluxerr > 0
-                and flux / fluxerr > PHOT_DETECTION_THRESHOLD
-            )
-            dets.append(is_detected)
-
-            if (
-                origin not in ["fp", "forced phot", "forced photometry", "alert_fp"]
-                and is_detected
-            ):
-                dets_no_forced_phot.append(True)
-            else:
-                dets_no_forced_phot.append(False)
-
-            if not is_detected:
-                if isinstance(original_user_data, str):
-                    try:
-                        original_user_data = json.loads(original_user_data)
-                    except (TypeError, ValueError):
-                        original_user_data = None
-                if (
-                    original_user_data is not None
-                    and "limiting_mag" in original_user_data
-                ):
-                    lims.append(original_user_data["limiting_mag"])
-                else:
-                    fivesigma = 5 * fluxerr
-                    if fivesigma > 0:
-                        lims.append(-2.5 * np.log10(fivesigma) + PHOT_ZP)
-                    else:
-                        lims.append(np.nan)
-            else:
-                lims.append(np.nan)
-
-        filters = np.array(filters, dtype=str)
-        mjds = np.array(mjds, dtype=float)
-        mags = np.array(mags, dtype=float)
-        dets = np.array(dets, dtype=bool)
-        lims = np.array(lims, dtype=float)
-        dets_no_forced_phot = np.array(dets_no_forced_phot, dtype=bool)
-
-        # make sure all non-detections have limiting magnitudes
-        bad_idx = ~dets & np.isnan(lims)
-        filters = filters[~bad_idx]
-        mjds = mjds[~bad_idx]
-        mags = mags[~bad_idx]
-        dets = dets[~bad_idx]
-        lims = lims[~bad_idx]
-        dets_no_forced_phot = dets_no_forced_phot[~bad_idx]
+        filters, mjds, mags, dets, lims, dets_no_forced_phot = _photometry_arrays(
+            phot_list
+        )
 
         # verification over, add the new data
         # total number of points
@@ -853,31 +1045,7 @@ class PhotStat(Base):
                         self.mean_color[f"{f1}-{f2}"] = mean_mags[f1] - mean_mags[f2]
 
             # update the rise and decay rates
-            if (
-                self.first_detected_filter is not None
-                and self.first_detected_filter in self.peak_mag_per_filter
-            ):
-                peak_mag = self.peak_mag_per_filter[self.first_detected_filter]
-                peak_mjd = self.peak_mjd_per_filter[self.first_detected_filter]
-                if peak_mjd > self.first_detected_mjd:
-                    self.rise_rate = -(peak_mag - self.first_detected_mag) / (
-                        peak_mjd - self.first_detected_mjd
-                    )
-                else:
-                    self.rise_rate = None
-
-            if (
-                self.last_detected_filter is not None
-                and self.last_detected_filter in self.peak_mag_per_filter
-            ):
-                peak_mag = self.peak_mag_per_filter[self.last_detected_filter]
-                peak_mjd = self.peak_mjd_per_filter[self.last_detected_filter]
-                if peak_mjd < self.last_detected_mjd:
-                    self.decay_rate = -(peak_mag - self.last_detected_mag) / (
-                        peak_mjd - self.last_detected_mjd
-                    )
-                else:
-                    self.decay_rate = None
+            self._update_rates()
 
         # if any are non-detections
         if np.any(dets == 0):
@@ -935,46 +1103,194 @@ class PhotStat(Base):
 
         return np.sqrt(new_var)
 
+    @staticmethod
+    def merge_moments(current_mean, current_scatter, number, new):
+        """
+        Calculate the new average and scatter (RMS) given the current
+        average and scatter of ``number`` points and an array of new
+        values, combining both sets in one step (Chan et al. 1979).
+        Equivalent to calling update_average/update_scatter once per
+        new value.
+        """
+        new_number = len(new)
+        new_mean = np.nanmean(new)
+        new_var = np.nanvar(new)
+        if current_mean is None or not number:
+            return new_mean, np.sqrt(new_var)
+
+        total = number + new_number
+        delta = new_mean - current_mean
+        mean = current_mean + delta * new_number / total
+        m2 = (
+            current_scatter**2 * number
+            + new_var * new_number
+            + delta**2 * number * new_number / total
+        )
+        return mean, np.sqrt(m2 / total)
+
 
-@event.listens_for(Photometry, "after_insert")
-def insert_into_phot_stat(mapper, connection, target):
-    # Create or update PhotStat object
-    @event.listens_for(DBSession(), "before_flush", once=True)
-    def receive_after_flush(session, context, instances):
-        obj_id = target.obj_id
-        phot_stat = session.scalars(
-            sa.select(PhotStat).where(PhotStat.obj_id == obj_id)
-        ).first()
-        if phot_stat is None:
-            columns = [
-                Photometry.filter,
-                Photometry.mjd,
-                Photometry.mag,
-                Photometry.flux,
-                Photometry.fluxerr,
-                Photometry.origin,
-                Photometry.original_user_data,
-            ]
-            colnames = [
-                "filter",
-                "mjd",
-                "mag",
-                "flux",
-                "fluxerr",
-                "origin",
-                "original_user_data",
-            ]
+class PhotStatRebuild(Base):
+    """A background recomputation of every object's PhotStat, run by the
+    phot_stat_rebuild service. Objects are processed in order of their ID,
+    and ``last_obj_id`` records the last one written, so an interrupted
+    rebuild resumes where it stopped.
+    """
 
-            all_phot = session.execute(
-                sa.select(*columns)
-                .select_from(Photometry)
-                .where(Photometry.obj_id == obj_id)
-            ).all()
-            phot_data = [dict(zip(colnames, values)) for values in all_phot]
+    __tablename__ = "photstat_rebuilds"
+
+    read = public
+    create = update = delete = restricted
+
+    status = sa.Column(
+        sa.String,
+        nullable=False,
+        server_default="pending",
+        index=True,
+        doc="One of: pending, running, done, failed, cancelled.",
+    )
+
+    chunk_size = sa.Column(
+        sa.Integer,
+        nullable=False,
+        server_default="1000",
+        doc="Number of objects recomputed and written per transaction.",
+    )
+
+    last_obj_id = sa.Column(
+        sa.String,
+        nullable=True,
+        doc="ID of the last object whose PhotStat was written (the keyset cursor).",
+    )
+
+    num_total = sa.Column(
+        sa.Integer,
+        nullable=True,
+        doc="Number of objects to process, counted when the rebuild starts.",
+    )
+
+    num_processed = sa.Column(
+        sa.Integer,
+        nullable=False,
+        server_default="0",
+        doc="Number of objects whose PhotStat has been rebuilt so far.",
+    )
+
+    started_at = sa.Column(
+        sa.DateTime,
+        nullable=True,
+        doc="When the service started (or last resumed) this rebuild.",
+    )
+
+    num_processed_at_start = sa.Column(
+        sa.Integer,
+        nullable=False,
+        server_default="0",
+        doc="Value of num_processed at started_at, used to estimate the rate.",
+    )
+
+    finished_at = sa.Column(
+        sa.DateTime,
+        nullable=True,
+        doc="When the rebuild finished, failed or was cancelled.",
+    )
+
+    error = sa.Column(
+        sa.String,
+        nullable=True,
+        doc="Message from the failure, if the rebuild failed.",
+    )
+
+
+def update_phot_stats(session, phot_list):
+    """
+    Bring the PhotStat rows of the objects in ``phot_list`` up to date
+    with newly inserted photometry, with one update per object.
+
+    Objects that already have a PhotStat get the new points merged in
+    (PhotStat.add_photometry_points); objects without one get a new
+    PhotStat computed from all of their photometry, which must therefore
+    already be flushed. This is what runs after every ORM flush that
+    inserts Photometry, and it can be called directly by writers that
+    bypass ORM events (e.g. COPY-based inserts). It needs a synchronous
+    session: from an AsyncSession use ``session.run_sync``.
+
+    Parameters
+    ----------
+    session: sqlalchemy.orm.Session
+        Session the PhotStat rows are read with and added to.
+    phot_list: list of skyportal.models.Photometry or dicts
+        Newly inserted photometry points, each with an ``obj_id``.
+
+    Returns
+    -------
+    dict
+        The updated PhotStat objects, keyed by obj_id.
+    """
+    points_by_obj = {}
+    for phot in phot_list:
+        obj_id = phot.obj_id if isinstance(phot, Photometry) else phot["obj_id"]
+        points_by_obj.setdefault(obj_id, []).append(phot)
+    if not points_by_obj:
+        return {}
+
+    phot_stats = {
+        phot_stat.obj_id: phot_stat
+        for phot_stat in session.scalars(
+            sa.select(PhotStat).where(PhotStat.obj_id.in_(list(points_by_obj)))
+        )
+    }
+    for obj_id, points in points_by_obj.items():
+        if obj_id in phot_stats:
+            phot_stats[obj_id].add_photometry_points(points)
+
+    new_obj_ids = [obj_id for obj_id in points_by_obj if obj_id not in phot_stats]
+    if new_obj_ids:
+        colnames = [
+            "filter",
+            "mjd",
+            "mag",
+            "flux",
+            "fluxerr",
+            "origin",
+            "original_user_data",
+        ]
+        all_phot = session.execute(
+            sa.select(Photometry.obj_id, *(getattr(Photometry, c) for c in colnames))
+            .select_from(Photometry)
+            .where(Photometry.obj_id.in_(new_obj_ids))
+        ).all()
+        phot_by_obj = {}
+        for obj_id, *values in all_phot:
+            phot_by_obj.setdefault(obj_id, []).append(dict(zip(colnames, values)))
+        for obj_id in new_obj_ids:
             phot_stat = PhotStat(obj_id=obj_id)
-            phot_stat.full_update(phot_data)
+            phot_stat.full_update(phot_by_obj.get(obj_id, []))
             session.add(phot_stat)
+            phot_stats[obj_id] = phot_stat
 
-        else:
-            phot_stat.add_photometry_point(target)
-            session.add(phot_stat)
+    return phot_stats
+
+
+# Session.info key collecting the Photometry rows inserted by a flush.
+_PENDING_KEY = "phot_stat_pending"
+
+
+@event.listens_for(Photometry, "after_insert")
+def insert_into_phot_stat(mapper, connection, target):
+    # only collect the row: PhotStat is updated once per object, after the flush
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_PENDING_KEY, []).append(target)
+
+
+@event.listens_for(Session, "after_flush_postexec")
+def update_phot_stats_after_flush(session, flush_context):
+    # changes made here are flushed by the enclosing commit (or the next flush)
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        update_phot_stats(session, pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_pending_phot_stats(session):
+    session.info.pop(_PENDING_KEY, None)
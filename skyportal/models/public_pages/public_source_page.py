@@ -12,15 +12,14 @@ from baselayer.app.env import load_env
 from baselayer.app.json_util import to_json
 from baselayer.app.models import Base, CustomUserAccessControl, UserAccessControl
 
-from ...utils.cache import Cache, dict_to_bytes
+from ...utils.cache import dict_to_bytes, shared_cache
 from ..group import GroupUser
 from ..source import Source
 
 env, cfg = load_env()
 
-cache_dir = "cache/public_pages/sources"
-cache = Cache(
-    cache_dir=cache_dir,
+cache = shared_cache(
+    "public_pages/sources",
     max_age=cfg["misc.minutes_to_keep_public_source_pages_cache"] * 60,
 )
 
@@ -113,7 +112,8 @@ class PublicSourcePage(Base):
             return "no data"
 
     def generate_page(self):
-        """Generate the public page for the source and cache it."""
+        """Generate the public page for the source, cache it and return it
+        as a ``{"public": ..., "html": ...}`` dict."""
         data = self.data
         if isinstance(data, str):
             try:
@@ -125,9 +125,9 @@ class PublicSourcePage(Base):
         else:
             cache_key = f"source_{self.source_id}_version_{self.hash}"
         public_source_page_html = self.get_html(data)
-        cache[cache_key] = dict_to_bytes(
-            {"public": True, "html": public_source_page_html}
-        )
+        page = {"public": True, "html": public_source_page_html}
+        cache[cache_key] = dict_to_bytes(page)
+        return page
 
     def get_html(self, public_data):
         """Get the HTML content of the public source page."""
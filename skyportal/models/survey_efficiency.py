@@ -67,6 +67,14 @@ class SurveyEfficiencyAnalysisMixin:
 
     lightcurves = sa.Column(psql.JSONB, doc="Simulated light curve dictionary")
 
+    injections_completed = sa.Column(
+        sa.Integer,
+        nullable=False,
+        server_default="0",
+        doc="Number of transients simulated so far, i.e. in lightcurves. "
+        "An interrupted analysis resumes with the remaining injections.",
+    )
+
     @property
     def number_of_transients(self):
         """Number of simulated transients."""
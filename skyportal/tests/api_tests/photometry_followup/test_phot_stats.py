@@ -810,6 +810,71 @@ def test_phot_stats_bad_data(upload_data_token, public_group, ztf_camera):
     check_phot_stat_is_consistent(ps2.__dict__, mjd, mag, filt, det, lim)
 
 
+def test_phot_stat_add_photometry_points_matches_full_update():
+    """Merging a batch of points into existing stats gives the same result as
+    a full recompute and as adding the points one at a time."""
+    rng = np.random.default_rng(42)
+    num_points = 40
+    photometry = []
+    for i in range(num_points):
+        # mix bright detections with faint non-detections, some of which
+        # fall before the first detection
+        detected = i % 3 != 0
+        photometry.append(
+            {
+                "obj_id": "batch_source",
+                "filter": rng.choice(["ztfg", "ztfr", "ztfi"]),
+                "mjd": rng.uniform(55000, 56000)
+                if detected
+                else rng.uniform(54500, 55500),
+                "flux": rng.normal(300, 10) if detected else rng.normal(5, 1),
+                "fluxerr": 10.0,
+                "origin": "fp" if i % 5 == 0 else None,
+            }
+        )
+
+    full = PhotStat("batch_source")
+    full.full_update(photometry)
+
+    batched = PhotStat("batch_source")
+    batched.full_update(photometry[:10])
+    batched.add_photometry_points(photometry[10:25])
+    batched.add_photometry_points(photometry[25:])
+
+    sequential = PhotStat("batch_source")
+    sequential.full_update(photometry[:10])
+    for p in photometry[10:]:
+        sequential.add_photometry_point(p)
+
+    for ps in (batched, sequential):
+        for key in (
+            "num_obs_global",
+            "num_det_global",
+            "num_obs_per_filter",
+            "num_det_per_filter",
+            "first_detected_mjd",
+            "last_detected_mjd",
+            "peak_mag_global",
+            "faintest_mag_global",
+            "deepest_limit_global",
+            "predetection_mjds",
+            "last_non_detection_mjd",
+            "time_to_non_detection",
+            "rise_rate",
+            "decay_rate",
+        ):
+            assert getattr(ps, key) == getattr(full, key), key
+        assert np.isclose(ps.mean_mag_global, full.mean_mag_global)
+        assert np.isclose(ps.mag_rms_global, full.mag_rms_global)
+        for filt, mean_mag in full.mean_mag_per_filter.items():
+            assert np.isclose(ps.mean_mag_per_filter[filt], mean_mag)
+            assert np.isclose(
+                ps.mag_rms_per_filter[filt], full.mag_rms_per_filter[filt]
+            )
+        for color, value in full.mean_color.items():
+            assert np.isclose(ps.mean_color[color], value)
+
+
 def check_phot_stat_is_consistent(phot_stat, mjd, mag, filt, det, lim):
     filter_set = set(filt)
 
@@ -1173,3 +1238,42 @@ def test_phot_stat_aggregate(upload_data_token, public_group, ztf_camera):
     )
     assert status == 200
     assert source_id not in {p["id"] for p in data["data"]["points"]}
+
+
+def test_phot_stat_rebuild_requires_admin_and_reports_progress(
+    upload_data_token, super_admin_token
+):
+    status, data = api(
+        "POST", "phot_stats/rebuild", data={"chunkSize": 50}, token=upload_data_token
+    )
+    assert status == 401
+
+    status, data = api(
+        "POST", "phot_stats/rebuild", data={"chunkSize": 0}, token=super_admin_token
+    )
+    assert status == 400
+
+    status, data = api(
+        "POST", "phot_stats/rebuild", data={"chunkSize": 50}, token=super_admin_token
+    )
+    assert status == 200
+    rebuild_id = data["data"]["id"]
+
+    status, data = api(
+        "GET", f"phot_stats/rebuild/{rebuild_id}", token=upload_data_token
+    )
+    assert status == 200
+    assert data["data"]["id"] == rebuild_id
+    assert data["data"]["chunk_size"] == 50
+    assert data["data"]["status"] in ("pending", "running", "done")
+    assert 0 <= data["data"]["fractionDone"] <= 1
+
+    # the service may already have finished it; otherwise cancel it so it
+    # does not rebuild the whole test database
+    status, data = api(
+        "DELETE", f"phot_stats/rebuild/{rebuild_id}", token=super_admin_token
+    )
+    status, data = api("GET", "phot_stats/rebuild", token=super_admin_token)
+    assert status == 200
+    assert data["data"]["id"] == rebuild_id
+    assert data["data"]["status"] in ("cancelled", "done")
@@ -1,4 +1,5 @@
 import asyncio
+import io
 import os
 import uuid
 
@@ -2075,6 +2076,52 @@ def test_source_photometry_format_plot_is_slim(view_only_token, public_source):
                 assert np.allclose(plot_point[field], mag_point[field])
 
 
+@pytest.mark.parametrize("format", ["mag", "flux", "plot"])
+def test_source_photometry_columnar_layouts_match_records(
+    view_only_token, public_source, format
+):
+    endpoint = f"sources/{public_source.id}/photometry?format={format}&magsys=vega"
+    status, records = api("GET", endpoint, token=view_only_token)
+    assert status == 200
+    records = records["data"]
+    assert len(records) > 0
+
+    status, columns = api("GET", f"{endpoint}&layout=columns", token=view_only_token)
+    assert status == 200
+    columns = columns["data"]
+    # same points, in the same (mjd) order
+    assert columns["id"] == [p["id"] for p in records]
+    for field in ("mag", "magerr", "limiting_mag", "flux", "fluxerr", "zp"):
+        if field not in records[0]:
+            continue
+        expected = [p[field] for p in records]
+        assert [v is None for v in columns[field]] == [v is None for v in expected]
+        assert np.allclose(
+            [v for v in columns[field] if v is not None],
+            [v for v in expected if v is not None],
+        )
+
+    response = api(
+        "GET", f"{endpoint}&layout=parquet", token=view_only_token, raw_response=True
+    )
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == "application/vnd.apache.parquet"
+    df = pd.read_parquet(io.BytesIO(response.content))
+    assert df["id"].tolist() == columns["id"]
+
+
+def test_source_photometry_columnar_layout_rejects_nested_fields(
+    view_only_token, public_source
+):
+    status, data = api(
+        "GET",
+        f"sources/{public_source.id}/photometry?layout=columns&includeOwnerInfo=true",
+        token=view_only_token,
+    )
+    assert status == 400
+    assert "layout=records" in data["message"]
+
+
 def test_token_user_retrieve_null_photometry(
     upload_data_token, public_source, ztf_camera, public_group
 ):
@@ -1622,6 +1622,79 @@ def test_candidate_list_pagination(
     assert "Page number out of range" in data["message"]
 
 
+def test_candidate_list_cursor_pagination(
+    view_only_token,
+    upload_data_token,
+    public_group,
+    public_filter,
+):
+    # Candidates that passed in the future, so a startDate isolates them
+    start = utcnow_naive() + datetime.timedelta(days=30)
+    obj_ids = [str(uuid.uuid4()) for _ in range(3)]
+    for i, obj_id in enumerate(obj_ids):
+        status, data = api(
+            "POST",
+            "candidates",
+            data={
+                "id": obj_id,
+                "ra": 234.22,
+                "dec": -22.33,
+                "redshift": 3,
+                "transient": False,
+                "ra_dis": 2.3,
+                "filter_ids": [public_filter.id],
+                "passed_at": str(start + datetime.timedelta(hours=i + 1)),
+            },
+            token=upload_data_token,
+        )
+        assert status == 200
+
+    params = {
+        "numPerPage": 2,
+        "groupIDs": f"{public_group.id}",
+        "startDate": str(start),
+    }
+    status, data = api(
+        "GET", "candidates", params={**params, "cursor": ""}, token=view_only_token
+    )
+    assert status == 200
+    assert [c["id"] for c in data["data"]["candidates"]] == obj_ids[:0:-1]
+    assert data["data"]["totalMatches"] == 3
+    assert "queryID" not in data["data"]
+    cursor = data["data"]["nextCursor"]
+    assert cursor
+
+    status, data = api(
+        "GET",
+        "candidates",
+        params={**params, "cursor": cursor, "totalMatches": "none"},
+        token=view_only_token,
+    )
+    assert status == 200
+    assert [c["id"] for c in data["data"]["candidates"]] == obj_ids[:1]
+    assert data["data"]["nextCursor"] is None
+    assert data["data"]["totalMatches"] is None
+
+    # Annotation sorts keep offset pagination
+    status, data = api(
+        "GET",
+        "candidates",
+        params={**params, "cursor": cursor, "sortByAnnotationOrigin": "kowalski"},
+        token=view_only_token,
+    )
+    assert status == 400
+    assert "sortByAnnotationOrigin" in data["message"]
+
+    status, data = api(
+        "GET",
+        "candidates",
+        params={**params, "cursor": "garbage"},
+        token=view_only_token,
+    )
+    assert status == 400
+    assert "Invalid cursor" in data["message"]
+
+
 def test_candidates_annotation_filtering(
     public_candidate,
     ztf_camera,
@@ -11,7 +11,7 @@ from astropy.table import Table
 from astropy.time import Time
 
 from skyportal.handlers.api.gcn import add_default_gcn_tags
-from skyportal.models import DBSession, DefaultGcnTag, User
+from skyportal.models import DBSession, DefaultGcnTag, Localization, User
 from skyportal.tests import api, retry_until
 from skyportal.tests.external.test_moving_objects import (
     add_telescope_and_instrument,
@@ -394,6 +394,51 @@ def test_gcn_from_polygon(super_admin_token):
     assert "IPN" in data["tags"]
 
 
+def test_localization_crossmatch_without_skymap_file(super_admin_token):
+    localization_name = str(uuid.uuid4())
+    dateobs = "2022-09-04T08:31:27"
+    polygon = [(30.0, 60.0), (40.0, 60.0), (40.0, 70.0), (30.0, 70.0)]
+    skymap = {"polygon": polygon, "localization_name": localization_name}
+    event_data = {"dateobs": dateobs, "skymap": skymap, "tags": ["IPN"]}
+
+    status, data = api("POST", "gcn_event", data=event_data, token=super_admin_token)
+    assert status == 200
+    assert data["status"] == "success"
+
+    def get_localization():
+        status, data = api(
+            "GET",
+            f"localization/{dateobs}/name/{localization_name}",
+            token=super_admin_token,
+        )
+        assert status == 200
+        return data["data"]
+
+    localization_id = retry_until(get_localization)["id"]
+
+    # the arrays are read from the database when there is no skymap file,
+    # as for localizations saved before skymap files existed
+    with DBSession() as session:
+        localization = session.scalar(
+            sa.select(Localization).where(Localization.id == localization_id)
+        )
+        if os.path.exists(localization.skymap_path):
+            os.remove(localization.skymap_path)
+
+    response = api(
+        "GET",
+        "localizationcrossmatch",
+        params={"id1": localization_id, "id2": localization_id},
+        token=super_admin_token,
+        raw_response=True,
+    )
+    assert response.status_code == 200
+    assert response.content.startswith(b"SIMPLE")
+
+    status, data = api("DELETE", f"gcn_event/{dateobs}", token=super_admin_token)
+    assert status == 200
+
+
 def test_gcn_Swift(super_admin_token):
     datafile = f"{os.path.dirname(__file__)}/../../data/SWIFT_1125809-092.xml"
     with open(datafile, "rb") as fid:
@@ -11,15 +11,23 @@ import asyncio
 import time
 import uuid
 from datetime import timedelta
+from types import SimpleNamespace
 
 import numpy as np
 import sqlalchemy as sa
+from astropy import units as u
+from healpix_alchemy.constants import HPX
+from sqlalchemy.orm import undefer
 
 from baselayer.app import models
 from skyportal.models import Localization
 from skyportal.tests import api
 from skyportal.utils.crossmatch import (
     contained_in_localization,
+    credible_region_moc,
+    credible_region_ranges,
+    crossmatch_matrix,
+    load_credible_region,
     search_cone,
 )
 from skyportal.utils.naive_datetime import utcnow_naive
@@ -160,6 +168,125 @@ def test_skymap_containment_uses_localization_tiles(super_admin_token, public_gr
     )
 
 
+def test_crossmatch_matrix_agrees_with_tile_containment(
+    super_admin_token, public_group2
+):
+    """The vectorized obj x event matrix matches the per-localization SQL
+    containment, for both a skymap and a cone localization."""
+    names = []
+    for skymap, name in [
+        (
+            {
+                "polygon": [(98.0, 8.0), (102.0, 8.0), (102.0, 12.0), (98.0, 12.0)],
+                "localization_name": str(uuid.uuid4()),
+            },
+            None,
+        ),
+        ({"ra": 42.0, "dec": 12.0, "error": 0.5}, "42.00000_12.00000_0.50000"),
+    ]:
+        dateobs = _unique_dateobs()
+        payload = {
+            "dateobs": dateobs.isoformat(),
+            "skymap": skymap,
+            "tags": ["TEST"],
+            "group_ids": [public_group2.id],
+        }
+        status, data = api("POST", "gcn_event", data=payload, token=super_admin_token)
+        assert status == 200, data
+        names.append((dateobs, name or skymap["localization_name"]))
+    positions = [(100.0, 10.0), (140.0, 10.0), (42.0, 12.1), (42.0, 14.0)]
+
+    localizations = []
+    with models.DBSession() as session:
+        for dateobs, name in names:
+            localization = session.scalar(
+                sa.select(Localization)
+                .options(undefer(Localization.uniq), undefer(Localization.probdensity))
+                .where(
+                    Localization.dateobs == dateobs,
+                    Localization.localization_name == name,
+                )
+            )
+            assert localization is not None
+            assert _wait_for_tiles(localization.id) > 0
+            localizations.append(localization)
+        mocs = [
+            credible_region_moc(localization.uniq, localization.probdensity)
+            for localization in localizations
+        ]
+
+    healpix = HPX.lonlat_to_healpix(
+        np.array([p[0] for p in positions]) * u.deg,
+        np.array([p[1] for p in positions]) * u.deg,
+    )
+    for cumprob in (1.0, 0.95):
+        member, cum_prob = crossmatch_matrix(healpix, mocs, cumprob=cumprob)
+        assert member.shape == cum_prob.shape == (len(positions), len(mocs))
+
+        async def run(localization):
+            async with models.async_plain_session_factory() as session:
+                return await contained_in_localization(
+                    session, localization, positions, cumprob=cumprob
+                )
+
+        assert set(np.flatnonzero(member[:, 0])) == asyncio.run(run(localizations[0]))
+
+    # The cone's peak is in its 95% region, a position far away is not.
+    assert member[2, 1] and not member[1, 1]
+
+
+def test_stored_credible_regions_match_tile_containment(
+    super_admin_token, public_group2
+):
+    """Credible regions are stored with the tiles, and containment through
+    them agrees with the cumulative-probability window over the tiles."""
+    dateobs = _unique_dateobs()
+    payload = {
+        "dateobs": dateobs.isoformat(),
+        "skymap": {"ra": 200.0, "dec": -20.0, "error": 2.0},
+        "tags": ["TEST"],
+        "group_ids": [public_group2.id],
+    }
+    status, data = api("POST", "gcn_event", data=payload, token=super_admin_token)
+    assert status == 200, data
+
+    with models.DBSession() as session:
+        localization = session.scalar(
+            sa.select(Localization)
+            .options(undefer(Localization.uniq), undefer(Localization.probdensity))
+            .where(Localization.dateobs == dateobs)
+        )
+        assert localization is not None
+        assert _wait_for_tiles(localization.id) > 0
+
+        lo, hi = load_credible_region(session, localization.id, 0.9)
+        expected = credible_region_ranges(
+            credible_region_moc(localization.uniq, localization.probdensity), 0.9
+        )
+        np.testing.assert_array_equal(lo, expected[0])
+        np.testing.assert_array_equal(hi, expected[1])
+        # levels that are not stored are not made up
+        assert load_credible_region(session, localization.id, 0.91) is None
+
+    positions = [(200.0 + dx, -20.0) for dx in np.linspace(-6, 6, 25)]
+
+    # a stand-in not named like a cone, so containment uses the skymap rather
+    # than the analytic cone
+    skymap = SimpleNamespace(
+        id=localization.id, dateobs=localization.dateobs, localization_name="skymap"
+    )
+
+    async def run(cumprob):
+        async with models.async_plain_session_factory() as session:
+            return await contained_in_localization(
+                session, skymap, positions, cumprob=cumprob
+            )
+
+    assert 12 in asyncio.run(run(0.9))
+    # 0.9 is stored; 0.9 + 1e-7 is not and goes through the tiles
+    assert asyncio.run(run(0.9)) == asyncio.run(run(0.9 + 1e-7))
+
+
 def test_containment_of_empty_input_is_empty(super_admin_token, public_group2):
     """No positions in, no indices out -- and no query issued."""
 
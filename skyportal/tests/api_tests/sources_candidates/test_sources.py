@@ -660,6 +660,88 @@ def test_source_summary_pagination(super_admin_user, super_admin_token):
     assert len(fetched_ids) == 50
 
 
+def test_sources_cursor_pagination(super_admin_user, super_admin_token):
+    group_name = str(uuid.uuid4())
+    status, data = api(
+        "POST",
+        "groups",
+        data={"name": group_name, "group_admins": [super_admin_user.id]},
+        token=super_admin_token,
+    )
+    assert status == 200
+    group_id = data["data"]["id"]
+
+    ids = set()
+    for i in range(25):
+        obj_id = str(uuid.uuid4())
+        ids.add(obj_id)
+        status, data = api(
+            "POST",
+            "sources",
+            data={
+                "id": obj_id,
+                "ra": 234.22,
+                "dec": 22.33,
+                # repeated and missing values exercise the tie-break and NULLs
+                "redshift": None if i % 5 == 0 else 0.1 * (i % 7),
+                "group_ids": [group_id],
+            },
+            token=super_admin_token,
+        )
+        assert status == 200
+
+    query = f"sources?group_ids={group_id}&sortBy=redshift&sortOrder=desc"
+    fetched, redshifts, cursor, pages = [], [], "", 0
+    while cursor is not None:
+        status, data = api(
+            "GET",
+            f"{query}&numPerPage=10&cursor={cursor}"
+            + ("&totalMatches=none" if cursor else ""),
+            token=super_admin_token,
+        )
+        assert status == 200, data
+        if pages == 0:
+            assert data["data"]["totalMatches"] == 25
+        else:
+            assert data["data"]["totalMatches"] is None
+        fetched.extend(s["id"] for s in data["data"]["sources"])
+        redshifts.extend(s["redshift"] for s in data["data"]["sources"])
+        cursor = data["data"]["nextCursor"]
+        pages += 1
+
+    assert pages == 3
+    assert set(fetched) == ids
+    assert len(fetched) == 25
+    # descending across page boundaries, with the NULL redshifts last
+    known = [z for z in redshifts if z is not None]
+    assert redshifts == known + [None] * 5
+    assert known == sorted(known, reverse=True)
+
+    # save summary mode pages through source ids in ascending order
+    fetched, cursor = [], ""
+    while cursor is not None:
+        status, data = api(
+            "GET",
+            f"sources?saveSummary=true&group_ids={group_id}&numPerPage=10&cursor={cursor}",
+            token=super_admin_token,
+        )
+        assert status == 200
+        fetched.extend(s["obj_id"] for s in data["data"]["sources"])
+        cursor = data["data"]["nextCursor"]
+    assert sorted(fetched) == sorted(ids)
+
+    # a cursor is tied to the sort order it was issued for
+    status, data = api("GET", f"{query}&numPerPage=10&cursor=", token=super_admin_token)
+    cursor = data["data"]["nextCursor"]
+    status, data = api(
+        "GET",
+        f"sources?group_ids={group_id}&sortBy=ra&numPerPage=10&cursor={cursor}",
+        token=super_admin_token,
+    )
+    assert status == 400
+    assert "different sort order" in data["message"]
+
+
 def test_sources_sorting(upload_data_token, view_only_token, public_group):
     obj_id = str(uuid.uuid4())
     obj_id2 = str(uuid.uuid4())
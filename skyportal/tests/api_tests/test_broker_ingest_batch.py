@@ -0,0 +1,161 @@
+import asyncio
+import uuid
+
+import pytest
+import sqlalchemy as sa
+
+from baselayer.app import models as baselayer_models
+from skyportal.broker_apis._save import save_objects_as_candidates
+from skyportal.models import Annotation, Candidate, DBSession, Instrument, Obj, User
+from skyportal.tests.fixtures import InstrumentFactory
+
+
+@pytest.fixture()
+def ztf_instrument():
+    """The ingest looks up the survey instrument by name; ensure a "ZTF" one exists."""
+    created = None
+    if (
+        DBSession().scalar(sa.select(Instrument).where(Instrument.name == "ZTF"))
+        is None
+    ):
+        created = InstrumentFactory(name="ZTF")
+        DBSession().commit()
+    yield
+    if created is not None:
+        InstrumentFactory.teardown(created)
+
+
+@pytest.fixture()
+def obj_ids():
+    obj_ids = [f"ZTF{uuid.uuid4().hex[:10]}" for _ in range(3)]
+    yield obj_ids
+    DBSession().execute(sa.delete(Obj).where(Obj.id.in_(obj_ids)))
+    DBSession().commit()
+
+
+def ingest_batch(batch, user_id, commit=True):
+    """Write ``batch`` and, like ``BOOMBROKER._ingest_batch``, commit it (or
+    roll it back) as one transaction."""
+
+    async def _run():
+        async with baselayer_models.async_plain_session_factory() as session:
+            user = await session.get(User, user_id)
+            obj_ids = await save_objects_as_candidates(batch, "ZTF", session, user)
+            if commit:
+                await session.commit()
+            else:
+                await session.rollback()
+            return obj_ids
+
+    return asyncio.run(_run())
+
+
+def alert(obj_id, filter_id, alert_id, annotations=None):
+    return {
+        "data": {
+            "objectId": obj_id,
+            "candidate": {"ra": 10.0, "dec": 20.0, "drb": 0.99},
+        },
+        "filter_ids": [filter_id],
+        "passing_alert_id": alert_id,
+        "annotations_by_filter_id": {filter_id: annotations} if annotations else {},
+    }
+
+
+def test_batch_ingest_creates_objs_and_candidates(
+    super_admin_user, public_filter, ztf_instrument, obj_ids
+):
+    """One batch creates every Obj and one Candidate per passing alert, including
+    two alerts of the same object."""
+    batch = [alert(obj_id, public_filter.id, i) for i, obj_id in enumerate(obj_ids)]
+    batch.append(alert(obj_ids[0], public_filter.id, 99))
+
+    ingested = ingest_batch(batch, super_admin_user.id)
+    assert sorted(ingested) == sorted(obj_ids)
+
+    DBSession().expire_all()
+    assert DBSession().scalar(
+        sa.select(sa.func.count(Obj.id)).where(Obj.id.in_(obj_ids))
+    ) == len(obj_ids)
+    candidates = (
+        DBSession()
+        .execute(
+            sa.select(Candidate.obj_id, Candidate.passing_alert_id).where(
+                Candidate.obj_id.in_(obj_ids), Candidate.filter_id == public_filter.id
+            )
+        )
+        .all()
+    )
+    assert len(candidates) == len(batch)
+
+
+def test_batch_ingest_is_one_transaction(
+    super_admin_user, public_filter, ztf_instrument, obj_ids
+):
+    """The batch write only flushes, so rolling it back leaves nothing behind:
+    no Obj or Candidate is committed along the way."""
+    batch = [alert(obj_id, public_filter.id, i) for i, obj_id in enumerate(obj_ids)]
+    assert sorted(ingest_batch(batch, super_admin_user.id, commit=False)) == sorted(
+        obj_ids
+    )
+
+    DBSession().expire_all()
+    assert (
+        DBSession().scalar(sa.select(sa.func.count(Obj.id)).where(Obj.id.in_(obj_ids)))
+        == 0
+    )
+    assert (
+        DBSession().scalar(
+            sa.select(sa.func.count(Candidate.id)).where(Candidate.obj_id.in_(obj_ids))
+        )
+        == 0
+    )
+
+
+def test_batch_ingest_is_idempotent_on_replay(
+    super_admin_user, public_filter, ztf_instrument, obj_ids
+):
+    """Re-consuming the same batch (offsets not yet committed) adds no Candidates
+    and refreshes the filter annotation instead of raising."""
+    batch = [
+        alert(obj_id, public_filter.id, i, {"mag_now": 18.5})
+        for i, obj_id in enumerate(obj_ids)
+    ]
+    ingest_batch(batch, super_admin_user.id)
+    batch[0]["annotations_by_filter_id"] = {public_filter.id: {"mag_now": 17.0}}
+    ingest_batch(batch, super_admin_user.id)
+
+    DBSession().expire_all()
+    n_candidates = DBSession().scalar(
+        sa.select(sa.func.count(Candidate.id)).where(
+            Candidate.obj_id.in_(obj_ids), Candidate.filter_id == public_filter.id
+        )
+    )
+    assert n_candidates == len(obj_ids)
+    group = public_filter.group
+    annotation = DBSession().scalar(
+        sa.select(Annotation).where(
+            Annotation.obj_id == obj_ids[0],
+            Annotation.origin == f"{group.nickname or group.name}:{public_filter.name}",
+        )
+    )
+    assert annotation.data == {"mag_now": 17.0}
+
+
+def test_batch_ingest_skips_alerts_failing_criteria(
+    super_admin_user, public_filter, ztf_instrument, obj_ids
+):
+    """A filter's ingestion criteria drop failing alerts before any Obj is
+    written."""
+    public_filter.altdata = {"criteria": {"min_detections": 1}}
+    DBSession().add(public_filter)
+    DBSession().commit()
+
+    batch = [alert(obj_id, public_filter.id, i) for i, obj_id in enumerate(obj_ids)]
+    assert ingest_batch(batch, super_admin_user.id) == []
+
+    DBSession().expire_all()
+    assert (
+        DBSession().scalar(sa.select(sa.func.count(Obj.id)).where(Obj.id.in_(obj_ids)))
+        == 0
+    )
@@ -0,0 +1,169 @@
+"""Tests for the shared Kafka ingestion worker pool
+(``skyportal.broker_apis._kafka.run_ingest_pipeline``), driven by an in-memory
+fake consumer so no Kafka broker is needed."""
+
+import asyncio
+import gc
+import time
+
+import pytest
+
+from skyportal.broker_apis._kafka import run_ingest_pipeline
+
+
+class _FakeMessage:
+    def __init__(self, partition, offset, value):
+        self._partition, self._offset, self._value = partition, offset, value
+
+    def error(self):
+        return None
+
+    def topic(self):
+        return "alerts"
+
+    def partition(self):
+        return self._partition
+
+    def offset(self):
+        return self._offset
+
+    def value(self):
+        return self._value
+
+
+class _FakeConsumer:
+    """Serves ``values`` from one partition and records committed offsets."""
+
+    def __init__(self, values):
+        self.messages = [_FakeMessage(0, i, v) for i, v in enumerate(values)]
+        self.committed = []
+        self.closed = False
+
+    def consume(self, num_messages, timeout):
+        batch, self.messages = (
+            self.messages[:num_messages],
+            self.messages[num_messages:],
+        )
+        return batch
+
+    def assignment(self):
+        return []
+
+    def position(self, partitions):
+        return []
+
+    def commit(self, offsets=None, asynchronous=True):
+        self.committed.extend((tp.partition, tp.offset) for tp in offsets)
+
+    def close(self):
+        self.closed = True
+
+
+def test_pipeline_writes_batches_and_commits_after_write():
+    consumer = _FakeConsumer([b"1", b"2", b"3", b"skip", b"4", b"5"])
+    written = []
+
+    def decode(value):
+        return None if value == b"skip" else int(value)
+
+    async def write(items):
+        written.extend(items)
+
+    count = asyncio.run(
+        run_ingest_pipeline(
+            lambda: consumer,
+            decode,
+            write,
+            broker_name="test",
+            num_writers=2,
+            batch_size=2,
+            linger=0,
+            max_messages=5,
+        )
+    )
+    assert count == 5
+    assert sorted(written) == [1, 2, 3, 4, 5]
+    # Every fetched message (including the undecodable one) is committed, in
+    # order, once written.
+    assert consumer.committed[-1] == (0, 6)
+    assert [o for _, o in consumer.committed] == sorted(
+        o for _, o in consumer.committed
+    )
+    assert consumer.closed
+
+
+def test_pipeline_does_not_commit_a_failed_write():
+    consumer = _FakeConsumer([b"1", b"2"])
+
+    async def write(items):
+        raise RuntimeError("database down")
+
+    with pytest.raises(ExceptionGroup):
+        asyncio.run(
+            run_ingest_pipeline(
+                lambda: consumer,
+                int,
+                write,
+                broker_name="test",
+                batch_size=2,
+                linger=0,
+                max_messages=2,
+            )
+        )
+    assert consumer.committed == []
+    assert consumer.closed
+
+
+class _SlowConsumer(_FakeConsumer):
+    """A consumer whose fetches after the first block for a while, and which
+    records whether it was closed during one."""
+
+    def __init__(self, values):
+        super().__init__(values)
+        self.fetching = False
+        self.closed_while_fetching = False
+
+    def consume(self, num_messages, timeout):
+        self.fetching = True
+        if not self.messages:
+            time.sleep(0.3)
+        batch = super().consume(num_messages, timeout)
+        self.fetching = False
+        return batch
+
+    def close(self):
+        self.closed_while_fetching = self.fetching
+        super().close()
+
+
+def test_pipeline_closes_consumer_after_in_flight_fetch():
+    """A writer failure cancels the decoders; the consumer is closed only once
+    the fetch running on its thread has returned, and the failed write's
+    future is not reported as never retrieved."""
+    consumer = _SlowConsumer([b"1"])
+    unhandled = []
+
+    async def write(items):
+        await asyncio.sleep(0.05)  # the decoder is fetching again by now
+        raise RuntimeError("database down")
+
+    async def run():
+        asyncio.get_running_loop().set_exception_handler(
+            lambda loop, context: unhandled.append(context)
+        )
+        with pytest.raises(ExceptionGroup):
+            await run_ingest_pipeline(
+                lambda: consumer,
+                int,
+                write,
+                broker_name="test",
+                batch_size=1,
+                linger=0,
+            )
+        gc.collect()
+
+    asyncio.run(run())
+    assert consumer.closed
+    assert not consumer.closed_while_fetching
+    assert consumer.committed == []
+    assert unhandled == []
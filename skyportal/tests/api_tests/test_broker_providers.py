@@ -31,6 +31,7 @@ from skyportal.broker_apis.boom import (
     _BOOM_SENTINEL,
     BOOMBROKER,
     _normalize_boom_alert,
+    _route_boom_record,
 )
 from skyportal.broker_apis.fink import (
     FINKBROKER,
@@ -623,6 +624,34 @@ def test_boom_normalize_empty_photometry():
     assert d["candidate"]["drb"] == 0.99
 
 
+def test_boom_route_record_maps_filters_and_annotations():
+    """Routing a batch record maps passing BOOM filter ids to skyportal Filters,
+    decodes their JSON annotations, and keeps only the cutouts present."""
+    record = {
+        **_boom_record([]),
+        "filters": [
+            {"filter_id": 7, "annotations": json.dumps({"mag_now": 18.5})},
+            {"filter_id": 8, "annotations": "not json"},
+            {"filter_id": 99},
+        ],
+        "cutoutScience": b"sci",
+    }
+    routed = _route_boom_record(record, {7: 1, 8: 2}, {}, [3])
+    assert routed["survey"] == "ZTF"
+    assert routed["data"]["objectId"] == "BOOM_norm"
+    assert routed["sidereal_ids"] == [1, 2]
+    assert routed["annotations_by_filter_id"] == {1: {"mag_now": 18.5}}
+    assert routed["cutouts"] == {"cutoutScience": b"sci"}
+    assert routed["designation"] is None
+
+
+def test_boom_route_record_falls_back_to_default_filters():
+    """A record passing no mapped BOOM filter routes to the broker's defaults."""
+    routed = _route_boom_record(_boom_record([]), {7: 1}, {}, [3])
+    assert routed["sidereal_ids"] == [3]
+    assert routed["cutouts"] is None
+
+
 def test_pittgoogle_normalize_bigquery_rows():
     rows = [
         {
@@ -1,10 +1,23 @@
+import asyncio
+import itertools
 import os
 import shutil
 import time
 from os.path import join as pjoin
+from types import SimpleNamespace
 
 import pytest
 
+from skyportal.utils import cache as cache_module
+from skyportal.utils.cache import (
+    DiskCacheBackend,
+    SharedCache,
+    ValkeyCacheBackend,
+    array_to_bytes,
+    bytes_to_array,
+    bytes_to_dict,
+    dict_to_bytes,
+)
 from skyportal.utils.offset import Cache
 
 
@@ -93,3 +106,195 @@ def test_cache_no_max_limit(cache_parent_dir):
         cache[str(i)] = b"x"
 
     assert len(cache) == 100
+
+
+class _FakeSyncRedis:
+    """Minimal blocking stand-in for redis.Redis, exposing just what
+    ValkeyCacheBackend uses."""
+
+    def __init__(self):
+        self.store, self.expirations, self.zsets = {}, {}, {}
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def getex(self, key, ex=None):
+        if key in self.store:
+            self.expirations[key] = ex
+        return self.store.get(key)
+
+    def set(self, key, value, ex=None):
+        self.store[key] = value
+        self.expirations[key] = ex
+
+    def unlink(self, *keys):
+        for key in keys:
+            self.store.pop(key, None)
+
+    def zadd(self, name, mapping, xx=False):
+        zset = self.zsets.setdefault(name, {})
+        for member, score in mapping.items():
+            if not xx or member in zset:
+                zset[member] = score
+
+    def zrem(self, name, member):
+        self.zsets.get(name, {}).pop(member, None)
+
+    def zremrangebyscore(self, name, low, high):
+        zset = self.zsets.get(name, {})
+        for member in [m for m, s in zset.items() if s <= high]:
+            del zset[member]
+
+    def zcard(self, name):
+        return len(self.zsets.get(name, {}))
+
+    def zpopmin(self, name, count):
+        zset = self.zsets.get(name, {})
+        popped = sorted(zset.items(), key=lambda item: item[1])[:count]
+        for member, _ in popped:
+            del zset[member]
+        return popped
+
+    def pipeline(self, transaction=True):
+        return _FakePipeline(self)
+
+
+class _FakePipeline:
+    def __init__(self, client):
+        self._client, self._calls = client, []
+
+    def __getattr__(self, name):
+        method = getattr(self._client, name)
+        return lambda *args, **kwargs: self._calls.append((method, args, kwargs))
+
+    def execute(self):
+        return [method(*args, **kwargs) for method, args, kwargs in self._calls]
+
+
+class _FakeAsyncRedis:
+    """Async stand-in for redis.asyncio.Redis over a `_FakeSyncRedis`."""
+
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, name):
+        method = getattr(self._client, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+
+        return call
+
+    def pipeline(self, transaction=True):
+        return _FakeAsyncPipeline(self._client)
+
+
+class _FakeAsyncPipeline(_FakePipeline):
+    async def execute(self):
+        return super().execute()
+
+
+class _BrokenRedis:
+    def __getattr__(self, name):
+        raise ConnectionError("Valkey down")
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_shared_cache_disk_backend(cache_parent_dir):
+    cache = SharedCache(
+        "test", DiskCacheBackend(pjoin(cache_parent_dir, "shared"), max_items=2)
+    )
+    assert cache["ids"] is None
+    cache["ids"] = array_to_bytes(["ZTF1", "ZTF2"])
+    assert list(bytes_to_array(cache["ids"])) == ["ZTF1", "ZTF2"]
+    assert (cache.hits, cache.misses) == (1, 1)
+    del cache["ids"]
+    assert cache["ids"] is None
+
+
+@pytest.fixture()
+def ticking_clock(monkeypatch):
+    """Replace the clock scoring the Valkey LRU index with one that advances a
+    second per read, so access times are distinct without sleeping."""
+    ticks = itertools.count(1_000_000)
+    monkeypatch.setattr(
+        cache_module, "time", SimpleNamespace(time=lambda: float(next(ticks)))
+    )
+
+
+def test_shared_cache_valkey_backend_expiry_and_eviction(ticking_clock):
+    client = _FakeSyncRedis()
+    cache = SharedCache(
+        "test", ValkeyCacheBackend(client, "test", max_items=4, max_age=60)
+    )
+    cache["page"] = dict_to_bytes({"public": True, "html": "<p/>"})
+    assert bytes_to_dict(cache["page"]) == {"public": True, "html": "<p/>"}
+    assert client.expirations["skyportal:cache:test:page"] == 60
+
+    for i in range(3):
+        cache[str(i)] = b"x"
+    cache["page"]  # most recently used again
+    for i in range(3, 5):
+        cache[str(i)] = b"x"
+
+    # the two least recently used entries were evicted
+    assert cache["0"] is None and cache["1"] is None
+    assert all(cache[key] is not None for key in ("page", "2", "3", "4"))
+    assert client.zcard("skyportal:cache_index:test") == 4
+
+
+def test_shared_cache_valkey_backend_degrades_to_miss():
+    cache = SharedCache("test", ValkeyCacheBackend(_BrokenRedis(), "test"))
+    cache["k"] = b"x"
+    assert cache["k"] is None
+    del cache["k"]
+    assert run(cache.aget("k")) is None
+
+
+def test_shared_cache_disk_backend_async(cache_parent_dir):
+    cache = SharedCache(
+        "test", DiskCacheBackend(pjoin(cache_parent_dir, "shared_async"))
+    )
+    assert run(cache.aget("ids")) is None
+    run(cache.aset("ids", array_to_bytes(["ZTF1"])))
+    assert list(bytes_to_array(run(cache.aget("ids")))) == ["ZTF1"]
+    assert (cache.hits, cache.misses) == (1, 1)
+    run(cache.adelete("ids"))
+    assert cache["ids"] is None
+
+
+def test_shared_cache_valkey_backend_async(ticking_clock):
+    client = _FakeSyncRedis()
+    # the blocking client must not be used from the event loop
+    backend = ValkeyCacheBackend(
+        _BrokenRedis(),
+        "test",
+        max_items=2,
+        max_age=60,
+        async_client=_FakeAsyncRedis(client),
+    )
+    cache = SharedCache("test", backend)
+
+    async def access():
+        await cache.aset("a", b"1")
+        await cache.aset("b", b"2")
+        assert await cache.aget("a") == b"1"  # most recently used again
+        await cache.aset("c", b"3")
+        assert await cache.aget("b") is None
+        await cache.adelete("c")
+        return [await cache.aget(key) for key in ("a", "c")]
+
+    assert run(access()) == [b"1", None]
+    assert client.expirations["skyportal:cache:test:a"] == 60
+    assert (cache.hits, cache.misses) == (2, 2)
+
+
+def test_shared_cache_valkey_backend_async_degrades_to_miss():
+    backend = ValkeyCacheBackend(_BrokenRedis(), "test", async_client=_BrokenRedis())
+    cache = SharedCache("test", backend)
+    run(cache.aset("k", b"x"))
+    assert run(cache.aget("k")) is None
+    run(cache.adelete("k"))
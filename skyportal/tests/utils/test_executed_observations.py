@@ -0,0 +1,61 @@
+"""Unit tests for COPY-based observation insertion
+(skyportal.utils.executed_observations)."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from skyportal.utils import executed_observations
+
+FIELD_IDS = pd.DataFrame({"field_id": [1, 2], "instrument_field_id": [101, 102]})
+
+
+def obstable(**columns):
+    table = {
+        "observation_id": [84434604, 84434651],
+        "field_id": [2, 1],
+        "obstime": [2458598.5, 2458599.0],
+        "seeing": [1.57415, None],
+        "limmag": [20.40705, 20.49405],
+        "exposure_time": [30, 30],
+        "filter": ["ztfr", "ztfg"],
+        "processed_fraction": [1.0, 0.5],
+        "target_name": ["a\tb", None],
+    }
+    table.update(columns)
+    return pd.DataFrame(table, index=[7, 3])
+
+
+def test_parse_obstimes_formats():
+    jd = executed_observations.parse_obstimes(np.array([2458598.5]))
+    isot = executed_observations.parse_obstimes(["2019-04-25T00:00:00"])
+    mixed = executed_observations.parse_obstimes(
+        np.array(["2019-04-25 00:00:00", 2458598.5], dtype=object)
+    )
+    assert list(jd) == list(isot) == ["2019-04-25T00:00:00.000"]
+    assert list(mixed) == ["2019-04-25T00:00:00.000"] * 2
+
+
+def test_observations_buffer_rows():
+    frame = executed_observations.observations_frame(5, obstable(), FIELD_IDS)
+    lines = executed_observations.observations_buffer(frame).splitlines()
+    assert len(lines) == 2
+    rows = [line.split("\t") for line in lines]
+    assert all(len(r) == len(executed_observations.COLUMNS) for r in rows)
+    row = dict(zip(executed_observations.COLUMNS, rows[0]))
+    assert row["instrument_id"] == "5"
+    assert row["instrument_field_id"] == "102"
+    assert row["observation_id"] == "84434604"
+    assert row["obstime"] == "2019-04-25T00:00:00.000"
+    assert row["filt"] == "ztfr"
+    assert row["target_name"] == "a\\tb"
+    row = dict(zip(executed_observations.COLUMNS, rows[1]))
+    assert row["instrument_field_id"] == "101"
+    assert row["seeing"] == row["target_name"] == "\\N"
+
+
+def test_observations_frame_missing_fields():
+    with pytest.raises(ValueError, match="1 fields are missing: \\[3\\]"):
+        executed_observations.observations_frame(
+            5, obstable(field_id=[1, 3]), FIELD_IDS
+        )
@@ -4,7 +4,10 @@ import pytest
 from skyportal.utils.extinction import (
     calculate_extinction,
     deredden_flux,
+    ebv,
+    extinction_by_filter,
     get_extinction_coefficient,
+    sfd_query,
 )
 
 
@@ -37,6 +40,35 @@ def test_extinction_calculation():
     assert extinction >= 0, "Extinction should be non-negative"
 
 
+def test_batch_ebv_matches_single_queries():
+    ra = np.array([0.0, 83.8, 266.4, np.nan])
+    dec = np.array([90.0, -5.4, -29.0, 10.0])
+
+    values = ebv(ra, dec)
+    assert values.shape == ra.shape
+    for i in range(3):
+        assert values[i] == pytest.approx(ebv(ra[i], dec[i]))
+        assert isinstance(ebv(ra[i], dec[i]), float)
+    assert np.isnan(values[3])
+    # the dust map is loaded once per process
+    assert sfd_query() is sfd_query()
+
+
+def test_extinction_by_filter():
+    ra = np.array([0.0, 266.4])
+    dec = np.array([90.0, -29.0])
+
+    extinctions = extinction_by_filter(ra, dec, ["ztfg", "ztfr", "invalid_filter"])
+    assert extinctions["invalid_filter"] is None
+    for filt in ("ztfg", "ztfr"):
+        for i in range(2):
+            assert extinctions[filt][i] == pytest.approx(
+                calculate_extinction(ra[i], dec[i], filt)
+            )
+    # redder filters are less extinguished
+    assert np.all(extinctions["ztfr"] < extinctions["ztfg"])
+
+
 def test_invalid_filter_returns_none():
     extinction = calculate_extinction(180.0, 45.0, "invalid_filter", Rv=3.1)
     assert extinction is None
@@ -1,6 +1,7 @@
 import ligo.skymap.moc
 import numpy as np
 
+from skyportal.utils.crossmatch import moc_product, uniq_to_ranges
 from skyportal.utils.gcn import from_cone, from_ellipse, from_polygon
 
 
@@ -49,3 +50,26 @@ def test_from_ellipse():
     _assert_valid_skymap(skymap, "ellipse")
     _, prob = _arrays(skymap)
     np.testing.assert_allclose(prob, prob[0])
+
+
+def test_moc_product_matches_flat_product():
+    uniq1, prob1 = _arrays(from_cone(197.45, -23.38, 5.0))
+    uniq2, prob2 = _arrays(from_cone(199.0, -22.0, 3.0))
+    uniq, prob = moc_product(uniq1, prob1, uniq2, prob2)
+    assert abs(_integral({"uniq": uniq, "probdensity": prob}) - 1.0) < 1e-9
+    assert np.all(np.diff(uniq_to_ranges(uniq)[0]) > 0)
+
+    # rasterize at the finest order of the inputs, where the product is exact
+    order = int(ligo.skymap.moc.uniq2order(np.concatenate([uniq1, uniq2])).max())
+
+    def flat(uniq, prob):
+        lo, hi = uniq_to_ranges(uniq)
+        shift = 2 * (29 - order)
+        result = np.zeros(12 * 4**order)
+        for start, stop, value in zip(lo >> shift, hi >> shift, prob):
+            result[start:stop] = value
+        return result
+
+    expected = flat(uniq1, prob1) * flat(uniq2, prob2)
+    result = flat(uniq, prob)
+    np.testing.assert_allclose(result / result.sum(), expected / expected.sum())
@@ -0,0 +1,83 @@
+import numpy as np
+from healpix_alchemy.constants import PIXEL_AREA
+
+from skyportal.utils import healpix_ranges
+
+
+def as_pixels(lo, hi):
+    """Brute-force set of the pixels of ranges [lo, hi)."""
+    return {p for l, h in zip(lo, hi) for p in range(l, h)}
+
+
+def random_ranges(rng, n, size=1000, max_length=30):
+    lo = rng.integers(0, size, n)
+    return lo, lo + rng.integers(0, max_length, n)
+
+
+def test_normalize_merges_overlapping_and_adjacent_ranges():
+    lo, hi = healpix_ranges.normalize([20, 0, 5, 15, 40], [30, 10, 15, 20, 40])
+    assert lo.tolist() == [0]
+    assert hi.tolist() == [30]
+
+
+def test_normalize_keeps_adjacent_ranges_apart_if_asked():
+    lo, hi = healpix_ranges.normalize([0, 10, 5], [10, 20, 8], merge_adjacent=False)
+    assert lo.tolist() == [0, 10]
+    assert hi.tolist() == [10, 20]
+
+
+def test_normalize_empty():
+    lo, hi = healpix_ranges.normalize([], [])
+    assert len(lo) == len(hi) == 0
+
+
+def test_set_operations_match_brute_force():
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        a = healpix_ranges.normalize(*random_ranges(rng, 40))
+        b = healpix_ranges.normalize(*random_ranges(rng, 40))
+        pixels_a, pixels_b = as_pixels(*a), as_pixels(*b)
+
+        assert np.all(a[0][1:] > a[1][:-1])
+        assert as_pixels(*healpix_ranges.union(a, b)) == pixels_a | pixels_b
+        inter = healpix_ranges.intersection(a, b)
+        assert np.all(inter[0][1:] >= inter[1][:-1])
+        assert as_pixels(*inter) == pixels_a & pixels_b
+        assert healpix_ranges.npix(inter) == len(pixels_a & pixels_b)
+
+
+def test_coverage_matches_per_tile_overlap():
+    rng = np.random.default_rng(1)
+    fields = healpix_ranges.normalize(*random_ranges(rng, 50))
+    field_pixels = as_pixels(*fields)
+    # disjoint tiles covering [0, 1200)
+    edges = np.unique(np.r_[0, rng.integers(1, 1200, 100), 1200])
+    tile_lo, tile_hi = edges[:-1], edges[1:]
+    probdensity = rng.random(len(tile_lo))
+
+    overlap = healpix_ranges.overlap(fields, tile_lo[::-1], tile_hi[::-1])[::-1]
+    expected = [len(field_pixels & set(range(l, h))) for l, h in zip(tile_lo, tile_hi)]
+    assert overlap.tolist() == expected
+
+    area, probability = healpix_ranges.coverage(fields, tile_lo, tile_hi, probdensity)
+    assert np.isclose(area, len(field_pixels) * PIXEL_AREA)
+    assert np.isclose(probability, np.sum(probdensity * expected) * PIXEL_AREA)
+
+
+def test_coverage_without_fields():
+    area, probability = healpix_ranges.coverage(
+        healpix_ranges.normalize([], []), [0, 10], [10, 20], [1.0, 2.0]
+    )
+    assert area == probability == 0
+
+
+def test_bytes_round_trip():
+    ranges = healpix_ranges.normalize([0, 2**60, 40], [10, 2**60 + 4, 50])
+    data = healpix_ranges.to_bytes(ranges)
+    assert len(data) == 16 * len(ranges[0])
+    # the format written by PostgreSQL's int8send in the backfill migration
+    assert data[:16] == (0).to_bytes(8, "big") + (10).to_bytes(8, "big")
+    lo, hi = healpix_ranges.from_bytes(data)
+    assert lo.tolist() == ranges[0].tolist()
+    assert hi.tolist() == ranges[1].tolist()
+    assert len(healpix_ranges.from_bytes(b"")[0]) == 0
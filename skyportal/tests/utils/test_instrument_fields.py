@@ -0,0 +1,85 @@
+"""Unit tests for batched field tiling (skyportal.utils.instrument_fields)."""
+
+import json
+
+import numpy as np
+from astropy import units as u
+from astropy.coordinates import SkyCoord
+from healpix_alchemy import Tile
+
+from skyportal.utils import healpix_ranges, instrument_fields
+
+# one square region of 1 deg side, and a second one next to it
+RA = np.array([[10.0, 11.0, 11.0, 10.0], [11.0, 12.0, 12.0, 11.0]])
+DEC = np.array([[20.0, 20.0, 21.0, 21.0], [20.0, 20.0, 21.0, 21.0]])
+
+
+def test_field_ranges_match_region_tiles():
+    lower, upper = [], []
+    for ra, dec in zip(RA, DEC):
+        for tile in Tile.tiles_from_polygon_skycoord(SkyCoord(ra * u.deg, dec * u.deg)):
+            lo, hi = tile.strip("[)").split(",")
+            lower.append(int(lo))
+            upper.append(int(hi))
+    expected = healpix_ranges.normalize(lower, upper)
+
+    lo, hi = instrument_fields.field_ranges(RA, DEC)
+    assert lo.tolist() == expected[0].tolist()
+    assert hi.tolist() == expected[1].tolist()
+
+    tiled = list(
+        instrument_fields.iter_field_ranges(
+            np.stack([RA, RA + 5]), np.stack([DEC, DEC])
+        )
+    )
+    assert len(tiled) == 2
+    assert tiled[0][0].tolist() == lo.tolist()
+
+
+def test_field_contours():
+    contour = instrument_fields.field_contour("ZTF", 7, 11.0, 20.5, RA, DEC)
+    assert contour["properties"] == {
+        "instrument": "ZTF",
+        "ra": 11.0,
+        "dec": 20.5,
+        "field_id": 7,
+    }
+    coordinates = contour["features"][0]["geometry"]["coordinates"]
+    assert len(coordinates) == 2
+    # closed polygons
+    assert coordinates[0][0] == coordinates[0][-1] == (10.0, 20.0)
+
+    summary = instrument_fields.field_contour_summary("ZTF", None, 11.0, 20.5, RA, DEC)
+    assert "field_id" not in summary["properties"]
+    assert summary["features"][0]["geometry"]["coordinates"][:3] == [
+        (10.0, 20.0),
+        (12.0, 20.0),
+        (12.0, 21.0),
+    ]
+
+
+def test_copy_buffers():
+    ranges = (np.array([0, 100]), np.array([10, 120]))
+    row = {
+        "id": 3,
+        "instrument_id": 1,
+        "field_id": 7,
+        "ra": 11.0,
+        "dec": 20.5,
+        "contour": {"properties": {"instrument": "a\\b\tc"}},
+        "contour_summary": None,
+        "healpix_ranges": healpix_ranges.to_bytes(ranges),
+        "created_at": "2026-01-01T00:00:00",
+        "modified": "2026-01-01T00:00:00",
+    }
+    (line,) = instrument_fields.fields_buffer([row]).splitlines()
+    values = line.split("\t")
+    assert len(values) == len(instrument_fields.FIELD_COLUMNS)
+    assert values[:3] == ["3", "1", "7"]
+    # JSON's own escapes are escaped once more for COPY
+    assert values[5] == json.dumps(row["contour"]).replace("\\", "\\\\")
+    assert values[6] == "\\N"
+    assert values[7] == "\\\\x" + row["healpix_ranges"].hex()
+
+    lines = instrument_fields.tiles_buffer(1, 3, ranges, "now").splitlines()
+    assert lines == ["1\t3\t[0,10)\tnow\tnow", "1\t3\t[100,120)\tnow\tnow"]
@@ -0,0 +1,134 @@
+"""Unit tests for COPY-based tile insertion (skyportal.utils.localization_tiles)."""
+
+import datetime
+import uuid
+
+import numpy as np
+import pytest
+import sqlalchemy as sa
+
+from skyportal.models import DBSession, GcnEvent, Localization, LocalizationTile
+from skyportal.utils import localization_tiles
+
+
+def test_tiles_buffer_renders_depth29_ranges():
+    dateobs = datetime.datetime(2024, 5, 3, 12, 0, 0)
+    # order 0 pixel 1 and order 1 pixel 5
+    uniq = np.array([4 + 1, 16 + 5])
+    rows = localization_tiles.tiles_buffer(7, dateobs, uniq, [0.25, 1e-300])
+    lines = rows.splitlines()
+    assert len(lines) == 2
+    fields = [line.split("\t") for line in lines]
+    assert all(len(f) == len(localization_tiles.COLUMNS) for f in fields)
+    assert fields[0][:4] == [
+        "7",
+        "0.25",
+        "2024-05-03T12:00:00",
+        f"[{4**29},{2 * 4**29})",
+    ]
+    assert fields[1][1] == "1e-300"
+    assert fields[1][3] == f"[{5 * 4**28},{6 * 4**28})"
+
+
+def test_undeclared_month_goes_to_default_partition():
+    default = LocalizationTile.partitions["def"].__tablename__
+    table = localization_tiles.ensure_partition(None, datetime.datetime(2099, 1, 1))
+    assert table == default
+
+
+@pytest.fixture()
+def dropped_partition(monkeypatch):
+    """A declared monthly tile partition, dropped from the database; it is
+    recreated afterwards."""
+    dateobs = datetime.datetime(2027, 7, 14, 3, 25, 0)
+    name = localization_tiles.partition_name(dateobs)
+    table = LocalizationTile.partitions[name].__tablename__
+    monkeypatch.setattr(localization_tiles, "_existing", set())
+    DBSession().execute(sa.text(f"DROP TABLE IF EXISTS {table}"))
+    DBSession().commit()
+    yield dateobs, table
+    localization_tiles._existing.clear()
+    localization_tiles.ensure_partition(DBSession().get_bind(), dateobs)
+
+
+@pytest.fixture()
+def localization_in_month(super_admin_user, dropped_partition):
+    dateobs, _ = dropped_partition
+    gcnevent = GcnEvent(
+        dateobs=dateobs,
+        sent_by_id=super_admin_user.id,
+        trigger_id=str(uuid.uuid4())[:20],
+        groups=super_admin_user.groups,
+    )
+    localization = Localization(
+        dateobs=dateobs,
+        localization_name=str(uuid.uuid4()),
+        sent_by_id=super_admin_user.id,
+        uniq=[4 + 1, 16 + 5],
+        probdensity=[0.25, 0.5],
+    )
+    DBSession().add_all([gcnevent, localization])
+    DBSession().commit()
+    yield localization.id
+    DBSession().delete(localization)
+    DBSession().delete(gcnevent)
+    DBSession().commit()
+
+
+def table_exists(table):
+    return DBSession().scalar(
+        sa.text("SELECT to_regclass(:table) IS NOT NULL"), {"table": table}
+    )
+
+
+def test_copy_recreates_missing_partition(dropped_partition, localization_in_month):
+    dateobs, table = dropped_partition
+    assert not table_exists(table)
+
+    session = DBSession()
+    written = localization_tiles.copy_localization_tiles(
+        session, localization_in_month, dateobs, np.array([4 + 1, 16 + 5]), [0.25, 0.5]
+    )
+    session.commit()
+    assert written == table
+    assert table_exists(table)
+
+    # the partition is attached: the tiles are read through the parent table
+    tiles = DBSession().scalars(
+        sa.select(LocalizationTile).where(
+            LocalizationTile.localization_id == localization_in_month
+        )
+    )
+    assert sorted(tile.probdensity for tile in tiles) == [0.25, 0.5]
+
+    # and known to exist from now on, without asking the database
+    assert localization_tiles.ensure_partition(None, dateobs) == table
+
+
+def test_partition_with_rows_in_default_falls_back(
+    dropped_partition, localization_in_month
+):
+    dateobs, table = dropped_partition
+    default = LocalizationTile.partitions["def"].__tablename__
+    # a tile of that month already in the default partition makes ATTACH fail
+    DBSession().execute(
+        sa.text(
+            f"INSERT INTO {default} "
+            "(localization_id, probdensity, dateobs, healpix, created_at, modified) "
+            f"VALUES (:id, 1.0, :dateobs, '[1,2)', now(), now())"
+        ),
+        {"id": localization_in_month, "dateobs": dateobs},
+    )
+    DBSession().commit()
+    try:
+        bind = DBSession().get_bind()
+        assert localization_tiles.ensure_partition(bind, dateobs) == default
+        # the failed CREATE was rolled back, and is retried on next use
+        assert not table_exists(table)
+        assert table not in localization_tiles._existing
+    finally:
+        DBSession().execute(
+            sa.text(f"DELETE FROM {default} WHERE localization_id = :id"),
+            {"id": localization_in_month},
+        )
+        DBSession().commit()
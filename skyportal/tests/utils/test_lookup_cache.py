@@ -0,0 +1,117 @@
+"""Unit tests for the in-process lookup cache (skyportal.utils.lookup_cache).
+
+These need no database: loaders are plain coroutines counting their calls, and
+invalidation is driven directly or through the published-message handler.
+"""
+
+import asyncio
+import json
+
+from skyportal.utils import lookup_cache as lc
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+class _Loader:
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        return self.value
+
+
+def test_get_caches_until_ttl_expires(monkeypatch):
+    cache = lc.LookupCache("test.ttl", ["Instrument"], ttl=60)
+    loader = _Loader(42)
+    assert _run(cache.get("ZTF", loader)) == 42
+    assert _run(cache.get("ZTF", loader)) == 42
+    assert loader.calls == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # Jump past the TTL: the next read reloads.
+    now = lc.time.monotonic()
+    monkeypatch.setattr(lc.time, "monotonic", lambda: now + 61)
+    assert _run(cache.get("ZTF", loader)) == 42
+    assert loader.calls == 2
+
+
+def test_get_does_not_cache_missing_rows():
+    """A lookup that finds nothing is retried, so a row created later is seen."""
+    cache = lc.LookupCache("test.none", ["Instrument"], ttl=60)
+    loader = _Loader(None)
+    assert _run(cache.get("LSST", loader)) is None
+    assert _run(cache.get("LSST", loader)) is None
+    assert loader.calls == 2
+
+
+def test_get_many_loads_only_missing_keys():
+    cache = lc.LookupCache("test.many", ["Filter"], ttl=60)
+    requested = []
+
+    async def load(missing):
+        requested.append(sorted(missing))
+        return {k: k * 10 for k in missing if k != 3}
+
+    assert _run(cache.get_many([1, 2, 3], load)) == {1: 10, 2: 20}
+    assert _run(cache.get_many([1, 2, 4], load)) == {1: 10, 2: 20, 4: 40}
+    assert requested == [[1, 2, 3], [4]]
+
+
+def test_invalidate_targets_watching_caches():
+    filters = lc.lookup_cache("test.filters", ["Filter", "Group"], ttl=60)
+    streams = lc.lookup_cache("test.streams", ["Stream"], ttl=60)
+    assert lc.lookup_cache("test.filters", ["Filter"]) is filters
+    f_loader, s_loader = _Loader("f"), _Loader("s")
+    _run(filters.get(1, f_loader))
+    _run(streams.get(1, s_loader))
+
+    lc.invalidate(["Group"])
+    _run(filters.get(1, f_loader))
+    _run(streams.get(1, s_loader))
+    assert (f_loader.calls, s_loader.calls) == (2, 1)
+
+
+def test_listener_applies_published_invalidations(monkeypatch):
+    cache = lc.lookup_cache("test.listener", ["Stream"], ttl=60)
+    loader = _Loader("s")
+    _run(cache.get(1, loader))
+
+    class _FakeCache:
+        async def subscribe(self, channel):
+            assert channel == lc.INVALIDATION_CHANNEL
+            yield "not json"
+            yield json.dumps(["Stream"])
+
+    monkeypatch.setattr(lc, "get_cache", lambda: _FakeCache())
+    _run(lc.listen_for_invalidations())
+    _run(cache.get(1, loader))
+    assert loader.calls == 2
+
+
+def test_publish_keeps_task_until_done(monkeypatch):
+    published, logged = [], []
+
+    class _FakeCache:
+        async def publish(self, channel, message):
+            published.append(json.loads(message))
+            if message == json.dumps(["Filter"]):
+                raise ConnectionError("Valkey down")
+
+    monkeypatch.setattr(lc, "get_cache", lambda: _FakeCache())
+    monkeypatch.setattr(lc, "log", logged.append)
+
+    async def publish():
+        lc._publish({"Stream", "Instrument"})
+        lc._publish({"Filter"})
+        assert len(lc._publishing) == 2
+        await asyncio.gather(*lc._publishing, return_exceptions=True)
+        await asyncio.sleep(0)  # done-callbacks
+
+    _run(publish())
+    assert published == [["Instrument", "Stream"], ["Filter"]]
+    assert lc._publishing == set()
+    assert logged == ["publishing invalidation failed: Valkey down"]
@@ -0,0 +1,57 @@
+import datetime
+from decimal import Decimal
+
+import pytest
+
+from skyportal.utils.pagination import (
+    cursor_bindparam,
+    decode_cursor,
+    encode_cursor,
+    keyset_condition,
+)
+
+
+@pytest.mark.parametrize(
+    "sort_key",
+    [
+        "ZTF21aaaaaaa",
+        42,
+        1.5,
+        True,
+        None,
+        Decimal("0.123456789"),
+        datetime.datetime(2026, 1, 2, 3, 4, 5, 678),
+        {"nested": [1, 2]},
+    ],
+)
+def test_cursor_round_trip(sort_key):
+    cursor = encode_cursor(sort_key, "obj-1", scope="redshift:desc")
+    assert "=" not in cursor
+    assert decode_cursor(cursor, scope="redshift:desc") == (sort_key, "obj-1")
+
+
+def test_decode_cursor_rejects_bad_tokens():
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor("not-a-cursor")
+    cursor = encode_cursor(1.0, 7, scope="ra:asc")
+    with pytest.raises(ValueError, match="different sort order"):
+        decode_cursor(cursor, scope="ra:desc")
+
+
+def test_cursor_bindparam_types():
+    assert str(cursor_bindparam("k", 1.5).type) == "FLOAT"
+    assert str(cursor_bindparam("k", 3).type) == "BIGINT"
+    assert str(cursor_bindparam("k", "a").type) == "VARCHAR"
+    assert str(cursor_bindparam("k", datetime.datetime(2026, 1, 1)).type) == (
+        "DATETIME"
+    )
+    assert str(cursor_bindparam("k", 1.5, json_value=True).type) == "JSONB"
+
+
+def test_keyset_condition():
+    assert keyset_condition("k", "id", "desc", key_is_null=False) == (
+        "(k < :cursor_key OR (k = :cursor_key AND id < :cursor_id) OR k IS NULL)"
+    )
+    assert keyset_condition("k", "id", "asc", key_is_null=True) == (
+        "(k IS NULL AND id > :cursor_id)"
+    )
@@ -0,0 +1,63 @@
+"""Unit tests for the PhotStat rebuild job (skyportal.utils.phot_stat_rebuild).
+
+These cover the database-free parts: splitting a chunk's columnar photometry
+across workers and computing the PhotStat rows in a worker.
+"""
+
+import json
+
+import numpy as np
+
+from skyportal.models import PhotStat
+from skyportal.utils.phot_stat_rebuild import (
+    PHOT_COLUMNS,
+    STAT_COLUMNS,
+    compute_phot_stats,
+    split_columns,
+)
+
+
+def _rows(obj_ids, points_per_obj=3):
+    rng = np.random.default_rng(0)
+    return [
+        (obj_id, "ztfg", 59000.0 + i, float(rng.normal(300, 10)), 10.0, None, None)
+        for obj_id in obj_ids
+        for i in range(points_per_obj)
+    ]
+
+
+def test_split_columns_keeps_each_objects_photometry_together():
+    obj_ids = ["a", "b", "c", "d", "e"]
+    rows = _rows(["a", "c", "d", "e"])  # "b" has no photometry
+    parts = split_columns(obj_ids, rows, 2)
+
+    assert [part for part, _ in parts] == [["a", "b", "c"], ["d", "e"]]
+    first, second = (columns for _, columns in parts)
+    assert set(first) == {"obj_id", *PHOT_COLUMNS}
+    assert first["obj_id"] == ["a"] * 3 + ["c"] * 3
+    assert second["obj_id"] == ["d"] * 3 + ["e"] * 3
+    assert len(first["mjd"]) == len(first["obj_id"])
+
+
+def test_compute_phot_stats_matches_full_update():
+    obj_ids = ["a", "b"]
+    rows = _rows(["a"], points_per_obj=5)
+    [(part, columns)] = split_columns(obj_ids, rows, 1)
+
+    results = compute_phot_stats(part, columns)
+    assert [r["obj_id"] for r in results] == obj_ids
+    assert set(results[0]) == set(STAT_COLUMNS)
+
+    expected = PhotStat(obj_id="a")
+    expected.full_update(
+        [dict(zip(PHOT_COLUMNS, row[1:])) for row in rows if row[0] == "a"]
+    )
+    assert results[0]["num_obs_global"] == expected.num_obs_global == 5
+    assert np.isclose(results[0]["mean_mag_global"], expected.mean_mag_global)
+
+    # an object without photometry gets empty statistics
+    assert results[1]["num_obs_global"] == 0
+    assert results[1]["num_obs_per_filter"] == {}
+
+    # rows are plain data, ready for a bulk insert
+    json.dumps({k: v for k, v in results[0].items() if "update" not in k})
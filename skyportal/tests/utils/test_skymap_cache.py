@@ -0,0 +1,77 @@
+"""Unit tests for the rasterized skymap cache (skyportal.utils.skymap_cache)."""
+
+import os
+
+import numpy as np
+import pytest
+
+from skyportal.utils import skymap_cache
+
+
+@pytest.fixture(autouse=True)
+def empty_lru(monkeypatch):
+    monkeypatch.setattr(skymap_cache, "_lru", skymap_cache.OrderedDict())
+    monkeypatch.setattr(skymap_cache, "_max_items", 2)
+
+
+class _Rasterizer:
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return np.full(12, self.value, dtype=float)
+
+
+def test_raster_is_computed_once_and_memory_mapped(tmp_path):
+    rasterize = _Rasterizer(1.0)
+    first = skymap_cache.cached_raster(1, "abc", str(tmp_path), 1, "2d", rasterize)
+    second = skymap_cache.cached_raster(1, "abc", str(tmp_path), 1, "2d", rasterize)
+    assert rasterize.calls == 1
+    assert second is first
+    assert isinstance(first, np.memmap)
+    assert not first.flags.writeable
+    np.testing.assert_array_equal(first, np.ones(12))
+
+    # Another process (an empty LRU) maps the saved file instead of rasterizing.
+    skymap_cache._lru.clear()
+    third = skymap_cache.cached_raster(1, "abc", str(tmp_path), 1, "2d", rasterize)
+    assert rasterize.calls == 1
+    np.testing.assert_array_equal(third, first)
+
+    # A different fingerprint (e.g. a reused id) is not served the old raster.
+    other = _Rasterizer(2.0)
+    fourth = skymap_cache.cached_raster(1, "def", str(tmp_path), 1, "2d", other)
+    assert other.calls == 1
+    np.testing.assert_array_equal(fourth, np.full(12, 2.0))
+
+
+def test_lru_is_bounded(tmp_path):
+    for localization_id in range(3):
+        skymap_cache.cached_raster(
+            localization_id, "x", str(tmp_path), 1, "2d", _Rasterizer(0.0)
+        )
+    assert [key[0] for key in skymap_cache._lru] == [1, 2]
+
+
+def test_evict_removes_cached_files(tmp_path):
+    folder = tmp_path / "7"
+    skymap_cache.cached_raster(7, "x", str(folder), 1, "2d", _Rasterizer(0.0))
+    (folder / "skymap.fits").write_bytes(b"")
+    skymap_cache.evict(7, str(folder))
+    assert not skymap_cache._lru
+    assert os.listdir(folder) == ["skymap.fits"]
+
+    os.remove(folder / "skymap.fits")
+    skymap_cache.cached_raster(7, "x", str(folder), 1, "2d", _Rasterizer(0.0))
+    skymap_cache.evict(7, str(folder))
+    assert not folder.exists()
+
+
+def test_uncached_without_id(tmp_path):
+    rasterize = _Rasterizer(0.0)
+    skymap_cache.cached_raster(None, "x", str(tmp_path), 1, "2d", rasterize)
+    skymap_cache.cached_raster(None, "x", str(tmp_path), 1, "2d", rasterize)
+    assert rasterize.calls == 2
+    assert not os.listdir(tmp_path)
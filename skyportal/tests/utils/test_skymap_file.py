@@ -0,0 +1,50 @@
+"""Unit tests for on-disk multi-order skymaps (skyportal.utils.skymap_file)."""
+
+import os
+
+import numpy as np
+
+from skyportal.utils import skymap_file
+
+
+def test_2d_skymap_round_trip(tmp_path):
+    path = skymap_file.skymap_path(str(tmp_path / "1"))
+    uniq = [16, 17, 18, 19]
+    probdensity = [0.1, 0.2, 0.3, 0.4]
+    skymap_file.write(path, uniq, probdensity)
+    assert os.listdir(tmp_path / "1") == [skymap_file.FILENAME]
+
+    arrays = skymap_file.read(path)
+    assert set(arrays) == set(skymap_file.COLUMNS)
+    np.testing.assert_array_equal(arrays["UNIQ"], uniq)
+    np.testing.assert_array_equal(arrays["PROBDENSITY"], probdensity)
+    assert arrays["DISTMU"] is None
+    assert arrays["DISTSIGMA"] is None
+    assert arrays["DISTNORM"] is None
+    # the columns are views of the file, not copies
+    assert not arrays["UNIQ"].flags.owndata
+    assert not arrays["PROBDENSITY"].flags.writeable
+
+
+def test_3d_skymap_round_trip(tmp_path):
+    path = skymap_file.skymap_path(str(tmp_path))
+    columns = {
+        "UNIQ": np.array([4, 5, 6], dtype=np.int64),
+        "PROBDENSITY": np.array([0.5, 0.25, 0.25]),
+        "DISTMU": np.array([100.0, 110.0, 120.0]),
+        "DISTSIGMA": np.array([10.0, 11.0, 12.0]),
+        "DISTNORM": np.array([1e-4, 2e-4, 3e-4]),
+    }
+    skymap_file.write(path, *columns.values())
+
+    arrays = skymap_file.read(path)
+    for name, expected in columns.items():
+        np.testing.assert_array_equal(arrays[name], expected)
+
+
+def test_missing_or_unreadable_file(tmp_path):
+    assert skymap_file.read(str(tmp_path / "missing.fits")) is None
+
+    path = tmp_path / skymap_file.FILENAME
+    path.write_bytes(b"not a FITS file")
+    assert skymap_file.read(str(path)) is None
@@ -0,0 +1,57 @@
+"""Unit tests for the localization post-processing stages
+(skyportal.utils.skymap_pipeline)."""
+
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from skyportal.utils import skymap_pipeline
+
+
+def _fail():
+    raise ValueError("bad skymap")
+
+
+def test_submit_runs_inline_without_pool(monkeypatch):
+    monkeypatch.setattr(skymap_pipeline, "get_pool", lambda: None)
+    assert skymap_pipeline.submit(sum, [1, 2, 3]).result() == 6
+    with pytest.raises(ValueError, match="bad skymap"):
+        skymap_pipeline.submit(_fail).result()
+
+
+def test_stage_timer_records_every_stage(monkeypatch):
+    monkeypatch.setattr(skymap_pipeline, "get_pool", lambda: None)
+    timer = skymap_pipeline.StageTimer(1)
+    with timer.stage("rasterize"):
+        time.sleep(0.01)
+    started = time.perf_counter()
+    future = skymap_pipeline.submit(sum, [1, 2])
+    assert timer.wait("properties", future, started) == 3
+    with pytest.raises(ValueError):
+        with timer.stage("tiles"):
+            raise ValueError
+    assert list(timer.durations) == ["rasterize", "properties", "tiles"]
+    assert timer.durations["rasterize"] >= 0.01
+    timer.finish()
+
+
+def _die_in_worker(value):
+    if multiprocessing.parent_process() is not None:
+        os._exit(1)
+    return value
+
+
+def test_wait_reruns_inline_when_a_worker_dies(monkeypatch):
+    pool = ProcessPoolExecutor(
+        max_workers=1, mp_context=multiprocessing.get_context("spawn")
+    )
+    monkeypatch.setattr(skymap_pipeline, "_pool", pool)
+    timer = skymap_pipeline.StageTimer(1)
+    future = skymap_pipeline.submit(_die_in_worker, 42)
+    assert timer.wait("properties", future, time.perf_counter()) == 42
+    assert "properties" in timer.durations
+    # the broken pool is dropped, to be recreated on next use
+    assert skymap_pipeline._pool is None
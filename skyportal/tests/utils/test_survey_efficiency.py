@@ -0,0 +1,67 @@
+"""Unit tests for batched survey efficiency analyses
+(skyportal.utils.survey_efficiency)."""
+
+from skyportal.utils.survey_efficiency import batch_sizes, merge_lightcurves
+
+SIDE = {"threshold": 5.0, "n_det": 2, "p_bins": [-30, -25, -20], "version": "0.7.5"}
+
+
+def collection(detected, rejected, notobserved, bands):
+    """Serialized LightcurveCollection, with transients numbered from 0."""
+
+    def meta(indices):
+        if len(indices) == 0:
+            return None
+        return {"z": [0.01] * len(indices), "idx_orig": list(indices)}
+
+    n = len(detected)
+    return {
+        "lcs": [[[58600.0, "ztfg", 1.0]]] * n if n else None,
+        "meta": meta(detected),
+        "meta_rejected": meta(rejected),
+        "meta_notobserved": meta(notobserved),
+        "stats": {
+            "p_det": [0.1] * n,
+            "p_last": [0.2] * n,
+            "dt_det": [0.1] * n,
+            "p_binned": {
+                "all": [[1, 0]] * n if n else None,
+                **{band: [[1, 0]] * n for band in bands},
+            },
+            "mag_max": {band: [19.0] * n for band in bands},
+        },
+        "side": SIDE,
+    }
+
+
+def test_batch_sizes():
+    assert batch_sizes(1000, 4, 100) == [100] * 10
+    assert batch_sizes(10, 4, 100) == [3, 3, 3, 1]
+    assert batch_sizes(250, 2, 100) == [100, 100, 50]
+    assert batch_sizes(0, 4) == []
+
+
+def test_merge_lightcurves():
+    first = collection([0, 2], [3], [1], ["ztfg"])
+    merged = merge_lightcurves(None, first)
+    assert merged == first
+
+    merged = merge_lightcurves(merged, collection([1], [], [0, 2], ["ztfr"]))
+    # the second batch's transients are numbered after the first's four
+    assert merged["meta"]["idx_orig"] == [0, 2, 5]
+    assert merged["meta_notobserved"]["idx_orig"] == [1, 4, 6]
+    assert merged["meta_rejected"]["idx_orig"] == [3]
+    assert len(merged["lcs"]) == 3
+    stats = merged["stats"]
+    assert stats["p_det"] == [0.1] * 3
+    # bands without detections in a batch are padded
+    assert stats["p_binned"]["all"] == [[1, 0]] * 3
+    assert stats["p_binned"]["ztfg"] == [[1, 0], [1, 0], [0, 0]]
+    assert stats["p_binned"]["ztfr"] == [[0, 0], [0, 0], [1, 0]]
+    assert stats["mag_max"] == {"ztfg": [19.0, 19.0, 99.0], "ztfr": [99.0, 99.0, 19.0]}
+
+    # a batch where nothing was observed
+    merged = merge_lightcurves(merged, collection([], [], [0], []))
+    assert merged["meta_notobserved"]["idx_orig"] == [1, 4, 6, 7]
+    assert len(merged["lcs"]) == 3
+    assert merged["stats"]["p_binned"]["all"] == [[1, 0]] * 3
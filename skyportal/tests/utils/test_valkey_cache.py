@@ -22,11 +22,12 @@ def _run(coro):
 
 class _FakeRedis:
     """Minimal async stand-in for redis.asyncio, backed by a dict, exposing just
-    the methods ValkeyCache uses (get/set/unlink/scan_iter)."""
+    the methods ValkeyCache uses (get/set/unlink/scan_iter/publish)."""
 
     def __init__(self):
         self.store = {}
         self.expirations = {}
+        self.published = []
 
     async def get(self, key):
         return self.store.get(key)
@@ -41,6 +42,10 @@ class _FakeRedis:
         self.expirations.pop(key, None)
         return 1
 
+    async def publish(self, channel, message):
+        self.published.append((channel, message))
+        return 1
+
     async def scan_iter(self, match=None, count=None):
         # redis glob matching ("prefix*"); iterate a snapshot since we mutate.
         for key in list(self.store):
@@ -57,6 +62,12 @@ def test_noop_cache_methods():
     assert _run(cache.set_json("k", {"a": 1})) is False
     assert _run(cache.delete("k")) is False
     assert _run(cache.delete_prefix("p:")) == 0
+    assert _run(cache.publish("chan", "msg")) is False
+
+    async def _collect():
+        return [m async for m in cache.subscribe("chan")]
+
+    assert _run(_collect()) == []
 
 
 def test_get_cache_disabled_returns_noop():
@@ -118,6 +129,13 @@ def test_delete_and_delete_prefix():
     assert _run(cache.get("photcache:v1:ZTF2:s1:v1")) == "c"
 
 
+def test_publish_with_fake_client():
+    cache = ValkeyCache()
+    cache._client = _FakeRedis()
+    assert _run(cache.publish("chan", "msg")) is True
+    assert cache._client.published == [("chan", "msg")]
+
+
 def test_graceful_degradation_when_unreachable():
     """A real client pointed at a closed port must degrade to misses/no-ops
     (log and carry on), never propagating an exception to the caller."""
@@ -0,0 +1,116 @@
+"""Unit tests for the keyed background pool (skyportal.utils.worker_pool)."""
+
+import threading
+from concurrent.futures import Future, wait
+
+import pytest
+
+from skyportal.utils.worker_pool import DedupWorkerPool, OffsetTracker
+
+
+def claiming_job(pool, ran, holding, release):
+    def job(key, name, fail=False):
+        with pool.claim(key) as claimed:
+            if claimed:
+                holding.set()
+                release.wait(timeout=5)
+                ran.append(name)
+                if fail:
+                    raise RuntimeError("boom")
+
+    return job
+
+
+def test_claim_skips_jobs_with_the_same_key():
+    pool = DedupWorkerPool(max_workers=4, max_pending=4)
+    holding, release = threading.Event(), threading.Event()
+    ran = []
+    job = claiming_job(pool, ran, holding, release)
+
+    first = pool.submit(job, "https://example.org/skymap.fits", "first")
+    assert holding.wait(timeout=5)
+    second = pool.submit(job, "https://example.org/skymap.fits", "second")
+    third = pool.submit(job, "https://example.org/other.fits", "third")
+    # the duplicate waits for the job holding its key
+    assert not wait([second], timeout=0.2).done
+    release.set()
+    for future in (first, second, third):
+        future.result(timeout=5)
+    pool.shutdown()
+
+    assert sorted(ran) == ["first", "third"]
+
+    # the claim is released once the job is done
+    with pool.claim("https://example.org/skymap.fits") as claimed:
+        assert claimed
+
+
+def test_claim_retries_after_a_failed_job():
+    pool = DedupWorkerPool(max_workers=2, max_pending=2)
+    holding, release = threading.Event(), threading.Event()
+    ran = []
+    job = claiming_job(pool, ran, holding, release)
+
+    first = pool.submit(job, "https://example.org/skymap.fits", "first", fail=True)
+    assert holding.wait(timeout=5)
+    second = pool.submit(job, "https://example.org/skymap.fits", "second")
+    release.set()
+    with pytest.raises(RuntimeError):
+        first.result(timeout=5)
+    second.result(timeout=5)
+    pool.shutdown()
+
+    assert ran == ["first", "second"]
+
+
+def test_submit_blocks_when_the_pool_is_full():
+    pool = DedupWorkerPool(max_workers=1, max_pending=1)
+    release = threading.Event()
+    pool.submit(release.wait, 5)
+
+    submitted = threading.Event()
+
+    def submit_second():
+        pool.submit(lambda: None).result(timeout=5)
+        submitted.set()
+
+    thread = threading.Thread(target=submit_second)
+    thread.start()
+    assert not submitted.wait(timeout=0.2)
+    release.set()
+    thread.join(timeout=5)
+    assert submitted.is_set()
+    pool.shutdown()
+
+
+def test_failed_job_frees_its_slot():
+    pool = DedupWorkerPool(max_workers=1, max_pending=1)
+
+    def fail():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        pool.submit(fail).result(timeout=5)
+    assert pool.submit(lambda: 42).result(timeout=5) == 42
+    pool.shutdown()
+
+
+def test_offsets_are_committed_up_to_the_oldest_unfinished_message():
+    commits = []
+    offsets = OffsetTracker(lambda key, offset: commits.append((key, offset)))
+    for offset in (10, 11, 12):
+        offsets.start(("gcn", 0), offset)
+    offsets.start(("gcn", 1), 3)
+
+    offsets.finish(("gcn", 0), 11)
+    assert commits == []
+    offsets.finish(("gcn", 1), 3)
+    assert commits == [(("gcn", 1), 4)]
+    offsets.finish(("gcn", 0), 10)
+    assert commits[-1] == (("gcn", 0), 12)
+
+    future = Future()
+    offsets.finish_when_done(future, ("gcn", 0), 12)
+    assert commits[-1] == (("gcn", 0), 12)
+    future.set_result(None)
+    assert commits[-1] == (("gcn", 0), 13)
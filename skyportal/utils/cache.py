@@ -1,3 +1,4 @@
+import asyncio
 import hashlib
 import io
 import os
@@ -37,6 +38,28 @@ def dict_to_bytes(dictionary):
     return b.getvalue()
 
 
+def bytes_to_array(data):
+    """Inverse of `array_to_bytes`.
+
+    Parameters
+    ----------
+    data : bytes
+        Bytes returned by `array_to_bytes` (e.g. read back from a cache).
+    """
+    return np.load(io.BytesIO(data))
+
+
+def bytes_to_dict(data):
+    """Inverse of `dict_to_bytes`.
+
+    Parameters
+    ----------
+    data : bytes
+        Bytes returned by `dict_to_bytes` (e.g. read back from a cache).
+    """
+    return np.load(io.BytesIO(data), allow_pickle=True).item()
+
+
 class Cache:
     def __init__(self, cache_dir, max_items=None, max_age=None):
         """
@@ -173,3 +196,299 @@ class Cache:
 
     def __len__(self):
         return len(list(self._cache_dir.glob("*")))
+
+
+class CacheBackend:
+    """Storage behind a `SharedCache`: maps names to bytes.
+
+    The ``a``-prefixed coroutines are for callers running on the event loop;
+    by default they run the blocking methods in the default executor.
+    """
+
+    def get(self, name):
+        """Return the bytes stored under ``name``, or None."""
+        raise NotImplementedError
+
+    def set(self, name, data):
+        raise NotImplementedError
+
+    def delete(self, name):
+        raise NotImplementedError
+
+    async def aget(self, name):
+        return await asyncio.get_running_loop().run_in_executor(None, self.get, name)
+
+    async def aset(self, name, data):
+        await asyncio.get_running_loop().run_in_executor(None, self.set, name, data)
+
+    async def adelete(self, name):
+        await asyncio.get_running_loop().run_in_executor(None, self.delete, name)
+
+
+class DiskCacheBackend(CacheBackend):
+    """Files in a local directory (see `Cache`). Only shared by the processes
+    of one machine, and every access scans the directory for stale entries."""
+
+    def __init__(self, cache_dir, max_items=None, max_age=None):
+        self._cache = Cache(cache_dir, max_items=max_items, max_age=max_age)
+
+    def get(self, name):
+        cache_file = self._cache[name]
+        if cache_file is None:
+            return None
+        try:
+            return cache_file.read_bytes()
+        except FileNotFoundError:  # removed by another process meanwhile
+            return None
+
+    def set(self, name, data):
+        self._cache[name] = data
+
+    def delete(self, name):
+        del self._cache[name]
+
+
+class ValkeyCacheBackend(CacheBackend):
+    """Keys in Valkey, shared by every process using the same server.
+
+    Entries expire through a Valkey TTL of ``max_age`` seconds, renewed on
+    each read, so expiry costs nothing at access time. With ``max_items``, a
+    sorted set indexes the entries by last access and the least recently used
+    ones beyond ``max_items`` are evicted on write.
+
+    ``client`` is a blocking ``redis.Redis`` used by `get`/`set`/`delete`;
+    ``async_client``, a ``redis.asyncio`` client, is awaited by
+    `aget`/`aset`/`adelete` so handlers never block the event loop on
+    Valkey (without one, those run the blocking calls in an executor).
+
+    Errors are logged and treated as a miss / no-op, like `ValkeyCache`.
+    """
+
+    def __init__(
+        self, client, namespace, max_items=None, max_age=None, async_client=None
+    ):
+        self._client = client
+        self._async_client = async_client
+        self._prefix = f"skyportal:cache:{namespace}:"
+        self._index = f"skyportal:cache_index:{namespace}"
+        self._max_items = max_items
+        self._max_age = max_age
+
+    def _queue_set(self, pipe, key, data):
+        """Queue the writes of `set` on ``pipe``; its last result is the
+        number of indexed entries when there is an index."""
+        pipe.set(key, data, ex=self._max_age)
+        if self._max_items is not None:
+            now = time.time()
+            pipe.zadd(self._index, {key: now})
+            if self._max_age is not None:
+                # entries not read for max_age seconds have expired
+                pipe.zremrangebyscore(self._index, "-inf", now - self._max_age)
+            pipe.zcard(self._index)
+
+    def _num_to_evict(self, results):
+        if self._max_items is None:
+            return 0
+        return max(results[-1] - self._max_items, 0)
+
+    def get(self, name):
+        key = self._prefix + name
+        try:
+            if self._max_age is None:
+                data = self._client.get(key)
+            else:
+                data = self._client.getex(key, ex=self._max_age)
+            if data is not None and self._max_items is not None:
+                self._client.zadd(self._index, {key: time.time()}, xx=True)
+            return data
+        except Exception as e:
+            log(f"get failed [{key}]: {e}")
+            return None
+
+    def set(self, name, data):
+        key = self._prefix + name
+        try:
+            pipe = self._client.pipeline(transaction=False)
+            self._queue_set(pipe, key, data)
+            num_evicted = self._num_to_evict(pipe.execute())
+            if num_evicted > 0:
+                evicted = self._client.zpopmin(self._index, num_evicted)
+                if evicted:
+                    self._client.unlink(*(k for k, _ in evicted))
+        except Exception as e:
+            log(f"set failed [{key}]: {e}")
+
+    def delete(self, name):
+        key = self._prefix + name
+        try:
+            pipe = self._client.pipeline(transaction=False)
+            pipe.unlink(key)
+            pipe.zrem(self._index, key)
+            pipe.execute()
+        except Exception as e:
+            log(f"delete failed [{key}]: {e}")
+
+    async def aget(self, name):
+        if self._async_client is None:
+            return await super().aget(name)
+        key = self._prefix + name
+        try:
+            if self._max_age is None:
+                data = await self._async_client.get(key)
+            else:
+                data = await self._async_client.getex(key, ex=self._max_age)
+            if data is not None and self._max_items is not None:
+                await self._async_client.zadd(self._index, {key: time.time()}, xx=True)
+            return data
+        except Exception as e:
+            log(f"get failed [{key}]: {e}")
+            return None
+
+    async def aset(self, name, data):
+        if self._async_client is None:
+            return await super().aset(name, data)
+        key = self._prefix + name
+        try:
+            pipe = self._async_client.pipeline(transaction=False)
+            self._queue_set(pipe, key, data)
+            num_evicted = self._num_to_evict(await pipe.execute())
+            if num_evicted > 0:
+                evicted = await self._async_client.zpopmin(self._index, num_evicted)
+                if evicted:
+                    await self._async_client.unlink(*(k for k, _ in evicted))
+        except Exception as e:
+            log(f"set failed [{key}]: {e}")
+
+    async def adelete(self, name):
+        if self._async_client is None:
+            return await super().adelete(name)
+        key = self._prefix + name
+        try:
+            pipe = self._async_client.pipeline(transaction=False)
+            pipe.unlink(key)
+            pipe.zrem(self._index, key)
+            await pipe.execute()
+        except Exception as e:
+            log(f"delete failed [{key}]: {e}")
+
+
+class SharedCache:
+    """Cache of bytes (e.g. query results keyed by query ID) for use from
+    handlers, with a dict-like interface. Unlike `Cache`, items are returned
+    as bytes rather than file paths, so the storage is pluggable.
+
+    Hits and misses are counted on the instance and reported as the
+    OpenTelemetry counter ``cache.requests``.
+    """
+
+    def __init__(self, namespace, backend):
+        """
+        Parameters
+        ----------
+        namespace : str
+            Name of the cache, used in metrics (and in Valkey keys).
+        backend : CacheBackend
+            Where items are stored.
+        """
+        from .observability import get_meter
+
+        self.namespace = namespace
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._requests = get_meter("skyportal.cache").create_counter(
+            "cache.requests",
+            unit="{request}",
+            description="Shared cache lookups, by cache and result (hit or miss).",
+        )
+
+    def __getitem__(self, name):
+        """Return the bytes cached under ``name``, or None.
+
+        Parameters
+        ----------
+        name : str
+        """
+        if name is None:
+            return None
+        return self._count(name, self.backend.get(name))
+
+    def _count(self, name, data):
+        if data is None:
+            self.misses += 1
+            result = "miss"
+        else:
+            self.hits += 1
+            result = "hit"
+            log(f"hit [{self.namespace}:{name}]")
+        self._requests.add(1, {"cache": self.namespace, "result": result})
+        return data
+
+    def __setitem__(self, name, data):
+        """Insert item into cache.
+
+        Parameters
+        ----------
+        name : str
+            Name for this entry.
+        data : bytes
+            Contents of the entry.
+        """
+        self.backend.set(name, data)
+
+    def __delitem__(self, name):
+        if name is not None:
+            self.backend.delete(name)
+
+    async def aget(self, name):
+        """Like ``cache[name]``, without blocking the event loop."""
+        if name is None:
+            return None
+        return self._count(name, await self.backend.aget(name))
+
+    async def aset(self, name, data):
+        """Like ``cache[name] = data``, without blocking the event loop."""
+        await self.backend.aset(name, data)
+
+    async def adelete(self, name):
+        """Like ``del cache[name]``, without blocking the event loop."""
+        if name is not None:
+            await self.backend.adelete(name)
+
+
+def shared_cache(namespace, max_age=None, max_items=None):
+    """Return a `SharedCache`, stored in Valkey when ``cache.enabled`` is set
+    (so it is shared by every app process), and otherwise in the directory
+    ``cache/<namespace>``, as before.
+
+    Parameters
+    ----------
+    namespace : str
+        Name of the cache, e.g. "sources_queries".
+    max_age : int, optional
+        Seconds an item is kept after it was last read or written.
+    max_items : int, optional
+        Maximum number of items; defaults to ``cache.max_items``. The least
+        recently used items are evicted first.
+    """
+    from baselayer.app.env import load_env
+
+    from .valkey_cache import get_async_client, get_sync_client
+
+    _, cfg = load_env()
+    if max_items is None:
+        max_items = cfg.get("cache.max_items")
+    client = get_sync_client()
+    if client is None:
+        backend = DiskCacheBackend(
+            f"cache/{namespace}", max_items=max_items, max_age=max_age
+        )
+    else:
+        backend = ValkeyCacheBackend(
+            client,
+            namespace,
+            max_items=max_items,
+            max_age=max_age,
+            async_client=get_async_client(),
+        )
+    return SharedCache(namespace, backend)
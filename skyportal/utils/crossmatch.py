@@ -14,10 +14,11 @@ or refuses to return anything at all.
 
 import json
 
+import ligo.skymap.moc
 import numpy as np
 import sqlalchemy as sa
 from astropy import units as u
-from healpix_alchemy.constants import HPX, PIXEL_AREA
+from healpix_alchemy.constants import HPX, LEVEL, PIXEL_AREA
 
 from baselayer.log import make_log
 
@@ -31,6 +32,10 @@ DEFAULT_CREDIBLE_LEVEL = 90
 # the localizationCumprob default on the source query.
 DEFAULT_CUMPROB = 0.95
 
+# Credible levels whose regions are stored, as merged HEALPix ranges, in
+# localizationcredibleregions when a localization's tiles are added.
+CREDIBLE_LEVELS = (0.5, 0.68, 0.9, 0.95, 0.99)
+
 
 def great_circle_distance(ra1_deg, dec1_deg, ra2_deg, dec2_deg):
     """Angular separation in degrees, vectorized over the second position.
@@ -189,7 +194,8 @@ async def contained_in_localization(
     resolved analytically; everything else is resolved against the stored
     HEALPix tiles using the same cumulative-probability containment the
     ``localizationDateobs`` source query uses, so the two agree on what "inside
-    the 95% region" means.
+    the 95% region" means. Levels in CREDIBLE_LEVELS use the stored region
+    when there is one.
 
     Returns a set of indices into ``positions``.
     """
@@ -211,6 +217,28 @@ async def contained_in_localization(
         np.asarray([p[0] for p in positions]) * u.deg,
         np.asarray([p[1] for p in positions]) * u.deg,
     )
+    params = {
+        "idxs": list(range(len(positions))),
+        "hpxs": [int(i) for i in np.atleast_1d(indices)],
+    }
+
+    # A stored credible region answers with a binary search per position.
+    level = precomputed_level(cumprob)
+    if level is not None and await session.scalar(
+        credible_region_exists_statement(localization.id, level)
+    ):
+        result = await session.execute(
+            sa.text(
+                f"""
+                SELECT p.idx
+                FROM unnest(CAST(:idxs AS bigint[]), CAST(:hpxs AS bigint[]))
+                     AS p(idx, hpx)
+                WHERE {credible_region_condition(localization.id, level, "p.hpx")}
+                """
+            ),
+            params,
+        )
+        return {row[0] for row in result}
 
     result = await session.execute(
         sa.text(
@@ -239,8 +267,281 @@ async def contained_in_localization(
             "dateobs": localization.dateobs,
             "pixel_area": PIXEL_AREA,
             "cumprob": cumprob,
-            "idxs": list(range(len(positions))),
-            "hpxs": [int(i) for i in np.atleast_1d(indices)],
+            **params,
         },
     )
     return {row[0] for row in result}
+
+
+def uniq_to_ranges(uniq):
+    """Depth-29 nested HEALPix ranges ``[lo, hi)`` of multi-order UNIQ indices,
+    as stored in ``LocalizationTile.healpix``."""
+    order, ipix = ligo.skymap.moc.uniq2nest(np.asarray(uniq, dtype=np.int64))
+    shift = 2 * (LEVEL - order.astype(np.int64))
+    lo = ipix.astype(np.int64) << shift
+    hi = (ipix.astype(np.int64) + 1) << shift
+    return lo, hi
+
+
+def ranges_to_uniq(lo, hi):
+    """Multi-order UNIQ indices of depth-29 nested ranges ``[lo, hi)`` that are
+    each exactly one HEALPix pixel (the inverse of :func:`uniq_to_ranges`)."""
+    lo = np.asarray(lo, dtype=np.int64)
+    shift = np.round(np.log2(np.asarray(hi, dtype=np.int64) - lo)).astype(np.int64)
+    order = LEVEL - shift // 2
+    return (lo >> shift) + (np.int64(4) << (2 * order))
+
+
+def moc_product(uniq1, probdensity1, uniq2, probdensity2):
+    """Normalized product of two multi-order skymaps, without rasterizing.
+
+    Nested HEALPix pixels are either disjoint or contained in one another, so
+    the overlap of a tile of each map is the smaller of the two; the product
+    is defined on these overlaps, each tile at the finer of the two maps'
+    resolutions there.
+
+    Parameters
+    ----------
+    uniq1, probdensity1, uniq2, probdensity2 : array
+        The two multi-order skymaps (UNIQ indices and probability densities
+        per steradian).
+
+    Returns
+    -------
+    (uniq, probdensity) : tuple of numpy.ndarray
+        The product, normalized to unit probability, sorted by position.
+
+    Raises
+    ------
+    ValueError
+        If the skymaps do not overlap.
+    """
+    lo1, hi1 = uniq_to_ranges(uniq1)
+    lo2, hi2 = uniq_to_ranges(uniq2)
+    order1, order2 = np.argsort(lo1), np.argsort(lo2)
+    lo1, hi1 = lo1[order1], hi1[order1]
+    lo2, hi2 = lo2[order2], hi2[order2]
+    probdensity1 = np.asarray(probdensity1, dtype=float)[order1]
+    probdensity2 = np.asarray(probdensity2, dtype=float)[order2]
+
+    # every overlap starts where a tile of one of the maps starts
+    lo = np.union1d(lo1, lo2)
+    index1 = np.searchsorted(lo1, lo, side="right") - 1
+    index2 = np.searchsorted(lo2, lo, side="right") - 1
+    valid = (index1 >= 0) & (index2 >= 0)
+    lo, index1, index2 = lo[valid], index1[valid], index2[valid]
+    valid = (lo < hi1[index1]) & (lo < hi2[index2])
+    lo, index1, index2 = lo[valid], index1[valid], index2[valid]
+    hi = np.minimum(hi1[index1], hi2[index2])
+
+    probdensity = probdensity1[index1] * probdensity2[index2]
+    norm = np.sum(probdensity * (hi - lo) * PIXEL_AREA)
+    if not norm > 0:
+        raise ValueError("The skymaps do not overlap")
+    return ranges_to_uniq(lo, hi), probdensity / norm
+
+
+def credible_region_moc(uniq, probdensity):
+    """A localization's tiles as sorted, level-29 nested HEALPix ranges, each
+    with the cumulative probability the credible-region test compares against.
+
+    The cumulative probability of a tile is the probability of all tiles at
+    least as dense, ties included -- the ``SUM(...) OVER (ORDER BY probdensity
+    DESC)`` window of the tile queries -- so a tile belongs to the ``cumprob``
+    credible region exactly when its value is ``<= cumprob``.
+
+    Parameters
+    ----------
+    uniq : array of int
+        Multi-order HEALPix UNIQ indices (``Localization.uniq``).
+    probdensity : array of float
+        Probability density per tile, per steradian.
+
+    Returns
+    -------
+    (lo, hi, cum_prob) : tuple of numpy.ndarray
+        Half-open ranges ``[lo, hi)`` sorted by ``lo``, and each range's
+        cumulative probability.
+    """
+    lo, hi = uniq_to_ranges(uniq)
+    probdensity = np.asarray(probdensity, dtype=float)
+
+    by_density = np.argsort(-probdensity, kind="stable")
+    density = probdensity[by_density]
+    cum = np.cumsum(density * (hi - lo)[by_density] * PIXEL_AREA)
+    # Tiles of equal density share the running total of the last of them.
+    last_of_group = np.flatnonzero(np.r_[density[1:] != density[:-1], True])
+    cum = cum[last_of_group[np.searchsorted(last_of_group, np.arange(len(cum)))]]
+
+    cum_prob = np.empty_like(cum)
+    cum_prob[by_density] = cum
+    by_lo = np.argsort(lo, kind="stable")
+    return lo[by_lo], hi[by_lo], cum_prob[by_lo]
+
+
+def precomputed_level(cumprob):
+    """The entry of CREDIBLE_LEVELS equal to ``cumprob``, or None."""
+    for level in CREDIBLE_LEVELS:
+        if np.isclose(level, cumprob, rtol=0, atol=1e-9):
+            return level
+    return None
+
+
+def credible_region_ranges(moc, level):
+    """The ``level`` credible region of a :func:`credible_region_moc`, as
+    sorted, disjoint, non-adjacent ranges ``(lo, hi)``."""
+    lo, hi, cum_prob = moc
+    keep = cum_prob <= level
+    lo, hi = lo[keep], hi[keep]
+    if len(lo) == 0:
+        return lo, hi
+    # Start a new range wherever a tile does not continue the previous one.
+    starts = np.r_[True, lo[1:] != hi[:-1]]
+    ends = np.r_[starts[1:], True]
+    return lo[starts], hi[ends]
+
+
+def in_ranges(lo, hi, healpix):
+    """Boolean mask of the ``healpix`` indices inside the sorted, disjoint
+    ranges ``[lo, hi)``, by binary search."""
+    healpix = np.asarray(healpix, dtype=np.int64)
+    if len(lo) == 0:
+        return np.zeros(len(healpix), dtype=bool)
+    index = np.searchsorted(lo, healpix, side="right") - 1
+    return (index >= 0) & (healpix < hi[np.maximum(index, 0)])
+
+
+def crossmatch_matrix(healpix, mocs, cumprob=DEFAULT_CUMPROB):
+    """Test many positions against many localizations at once.
+
+    Parameters
+    ----------
+    healpix : array of int
+        Level-29 nested HEALPix indices of the positions (``Obj.healpix``).
+    mocs : list of tuple
+        One :func:`credible_region_moc` per localization.
+    cumprob : float
+        Credible level of the regions to test membership in.
+
+    Returns
+    -------
+    (member, cum_prob) : tuple of numpy.ndarray
+        Arrays of shape ``(len(healpix), len(mocs))``: whether each position
+        is in each credible region, and the cumulative probability of the tile
+        containing it (NaN outside the skymap).
+    """
+    healpix = np.asarray(healpix, dtype=np.int64)
+    cum_prob = np.full((len(healpix), len(mocs)), np.nan)
+    for column, (lo, hi, tile_cum_prob) in enumerate(mocs):
+        inside = in_ranges(lo, hi, healpix)
+        tile = np.searchsorted(lo, healpix[inside], side="right") - 1
+        cum_prob[inside, column] = tile_cum_prob[tile]
+    with np.errstate(invalid="ignore"):
+        member = cum_prob <= cumprob
+    return member, cum_prob
+
+
+def save_credible_regions(session, localization_id, uniq, probdensity):
+    """Store the CREDIBLE_LEVELS regions of a localization, replacing any
+    stored before. Does not commit.
+
+    Parameters
+    ----------
+    session : sqlalchemy.orm.Session
+        Synchronous database session.
+    localization_id : int
+        Localization the regions belong to.
+    uniq, probdensity : array
+        The localization's multi-order skymap.
+    """
+    moc = credible_region_moc(uniq, probdensity)
+    session.execute(
+        sa.text(
+            "DELETE FROM localizationcredibleregions "
+            "WHERE localization_id = :localization_id"
+        ),
+        {"localization_id": localization_id},
+    )
+    for level in CREDIBLE_LEVELS:
+        lo, hi = credible_region_ranges(moc, level)
+        # range_agg builds the multirange server side from two arrays, far
+        # cheaper than binding tens of thousands of Range objects.
+        session.execute(
+            sa.text(
+                """
+                INSERT INTO localizationcredibleregions
+                    (localization_id, level, healpix, created_at, modified)
+                SELECT
+                    :localization_id,
+                    :level,
+                    COALESCE(range_agg(int8range(r.lo, r.hi)), '{}'),
+                    now() AT TIME ZONE 'UTC',
+                    now() AT TIME ZONE 'UTC'
+                FROM unnest(CAST(:lo AS bigint[]), CAST(:hi AS bigint[])) AS r(lo, hi)
+                """
+            ),
+            {
+                "localization_id": localization_id,
+                "level": level,
+                "lo": lo.tolist(),
+                "hi": hi.tolist(),
+            },
+        )
+
+
+def credible_region_statement(localization_id, level):
+    """Statement selecting a stored credible region as ``(lo, hi)`` rows, in
+    order; no rows if the region was not stored (or is empty)."""
+    return sa.text(
+        """
+        SELECT lower(r), upper(r)
+        FROM localizationcredibleregions AS cr, unnest(cr.healpix) AS r
+        WHERE cr.localization_id = :localization_id AND cr.level = :level
+        ORDER BY lower(r)
+        """
+    ).bindparams(localization_id=localization_id, level=level)
+
+
+def credible_region_exists_statement(localization_id, level):
+    """Statement selecting whether the ``level`` credible region of a
+    localization is stored."""
+    return sa.select(
+        sa.exists(
+            sa.text(
+                "SELECT 1 FROM localizationcredibleregions "
+                "WHERE localization_id = :localization_id AND level = :level"
+            ).bindparams(localization_id=localization_id, level=level)
+        )
+    )
+
+
+def credible_region_condition(localization_id, level, healpix_sql):
+    """SQL predicate testing whether the HEALPix index ``healpix_sql`` (a
+    column or expression) lies in a stored credible region. The multirange
+    containment is a binary search over the region's ranges."""
+    return (
+        f"EXISTS (SELECT 1 FROM localizationcredibleregions AS cr "
+        f"WHERE cr.localization_id = {int(localization_id)} "
+        f"AND cr.level = {float(level)!r} "
+        f"AND cr.healpix @> {healpix_sql})"
+    )
+
+
+def load_credible_region(session, localization_id, cumprob):
+    """The stored ``cumprob`` credible region of a localization as sorted
+    ``(lo, hi)`` arrays, or None if it is not stored.
+
+    Parameters
+    ----------
+    session : sqlalchemy.orm.Session
+        Synchronous database session.
+    """
+    level = precomputed_level(cumprob)
+    if level is None or not session.scalar(
+        credible_region_exists_statement(localization_id, level)
+    ):
+        return None
+    rows = session.execute(credible_region_statement(localization_id, level)).all()
+    lo = np.array([row[0] for row in rows], dtype=np.int64)
+    hi = np.array([row[1] for row in rows], dtype=np.int64)
+    return lo, hi
@@ -1,4 +1,6 @@
+import functools
 import os
+import threading
 
 import astropy.units as u
 import dustmaps.sfd
@@ -14,10 +16,14 @@ config["data_dir"] = "/tmp"
 log = make_log("extinction")
 
 
+@functools.lru_cache(maxsize=256)
 def get_extinction_coefficient(filter_name, Rv=3.1, Ebv=1.0):
     """
     Calculate the extinction coefficient for a given filter.
 
+    Coefficients are cached per (filter, Rv, Ebv), as building the bandpass is
+    much slower than the lookup itself.
+
     Parameters:
     -----------
     filter_name : str
@@ -27,7 +33,7 @@ def get_extinction_coefficient(filter_name, Rv=3.1, Ebv=1.0):
     Ebv : float, optional
         E(B-V) reference value (default: 1.0)
 
-    Returns:
+    Returns
     --------
     float
         Extinction coefficient A_λ/E(B-V) in magnitudes
@@ -42,31 +48,94 @@ def get_extinction_coefficient(filter_name, Rv=3.1, Ebv=1.0):
         raise Exception(f"Filter '{filter_name}' not recognized: {e}")
 
 
-class _ExtinctionCalculator:
-    """Internal class to handle SFD dust map queries efficiently."""
+_sfd_query = None
+_sfd_lock = threading.Lock()
 
-    def __init__(self):
-        self._sfd_query = None
 
-    def _ensure_sfd_ready(self):
-        """Ensure SFD dust map data and query are ready."""
-        if self._sfd_query is None:
-            path = dustmaps.sfd.data_dir()
-            path = os.path.join(path, "sfd")
-            if not os.path.exists(path):
-                log("No SFD data for dustmaps, downloading it")
-                dustmaps.sfd.fetch()
+def sfd_query():
+    """The process-wide SFD dust map query, loaded on first use.
 
-            self._sfd_query = dustmaps.sfd.SFDQuery()
+    Loading the maps takes seconds, so it is done once per process (and the
+    maps downloaded if missing) rather than per request. Async callers should
+    query it from an executor, as the first call blocks while loading.
+    """
+    global _sfd_query
+    if _sfd_query is None:
+        with _sfd_lock:
+            if _sfd_query is None:
+                path = os.path.join(dustmaps.sfd.data_dir(), "sfd")
+                if not os.path.exists(path):
+                    log("No SFD data for dustmaps, downloading it")
+                    dustmaps.sfd.fetch()
+                _sfd_query = dustmaps.sfd.SFDQuery()
+    return _sfd_query
 
-    def get_ebv(self, ra: float, dec: float) -> float:
-        """Get E(B-V) extinction value."""
-        self._ensure_sfd_ready()
-        coords = SkyCoord(ra, dec, unit="deg")
-        return self._sfd_query(coords)
 
+def ebv(ra, dec):
+    """E(B-V) from the SFD dust map at the given coordinates.
 
-_calculator = _ExtinctionCalculator()
+    Parameters
+    ----------
+    ra, dec : float or array
+        Coordinates in degrees.
+
+    Returns
+    -------
+    float or numpy.ndarray
+        E(B-V) in magnitudes, in the shape of ``ra``; NaN where the
+        coordinates are missing or not finite.
+    """
+    ra = np.asarray(ra, dtype=float)
+    dec = np.asarray(dec, dtype=float)
+    ra, dec = np.broadcast_arrays(ra, dec)
+    values = np.full(ra.shape, np.nan)
+    valid = np.isfinite(ra) & np.isfinite(dec)
+    if valid.any():
+        coords = SkyCoord(ra[valid], dec[valid], unit="deg")
+        values[valid] = sfd_query()(coords)
+    return values if values.ndim else float(values)
+
+
+def extinction_by_filter(ra, dec, filters, Rv=3.1):
+    """Extinction A_lambda in several filters, with one dust map query.
+
+    Parameters
+    ----------
+    ra, dec : float or array
+        Coordinates in degrees, of one or many objects.
+    filters : iterable of str
+        Filter names (any sncosmo filter).
+    Rv : float, optional
+        Total-to-selective extinction ratio (default: 3.1)
+
+    Returns
+    -------
+    dict
+        Filter name to A_lambda in magnitudes (a float, or an array in the
+        shape of ``ra``), or None for filters without a coefficient.
+    """
+    filters = list(dict.fromkeys(filters))
+    coefficients = {}
+    for filter_name in filters:
+        try:
+            coefficients[filter_name] = get_extinction_coefficient(
+                filter_name, Rv=Rv, Ebv=1.0
+            )
+        except Exception as e:
+            log(f"Could not calculate extinction for {filter_name}: {e}")
+            coefficients[filter_name] = None
+    if all(coeff is None for coeff in coefficients.values()):
+        return coefficients
+
+    try:
+        values = ebv(ra, dec)
+    except Exception as e:
+        log(f"Could not query the SFD dust map: {e}")
+        return dict.fromkeys(filters)
+    return {
+        filter_name: None if coeff is None else coeff * values
+        for filter_name, coeff in coefficients.items()
+    }
 
 
 def calculate_extinction(
@@ -100,11 +169,10 @@ def calculate_extinction(
         # Get extinction coefficient A_λ/E(B-V)
         coeff = get_extinction_coefficient(filter_name, Rv=Rv, Ebv=1.0)
 
-        # Get E(B-V) from SFD dust maps
-        ebv = _calculator.get_ebv(ra, dec)
-
-        # Calculate A_λ = (A_λ/E(B-V)) * E(B-V)
-        extinction = coeff * ebv
+        # Calculate A_λ = (A_λ/E(B-V)) * E(B-V), with E(B-V) from SFD dust maps
+        extinction = coeff * ebv(ra, dec)
+        if np.isnan(extinction):
+            raise ValueError(f"invalid coordinates ({ra}, {dec})")
 
         return extinction
 
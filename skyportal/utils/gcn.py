@@ -861,16 +861,17 @@ def from_url(url):
     return skymap, properties_dict, tags_list
 
 
-def get_contour(localization):
+def contour_from_flat(prob):
+    """GeoJSON contours of a flat (RING) probability map: the posterior
+    maximum and the 50% and 90% credible levels."""
     # Calculate credible levels.
-    prob = localization.flat_2d
     cls = 100 * ligo.skymap.postprocess.find_greedy_credible_levels(prob)
 
     # Construct contours and return as a GeoJSON feature collection.
     levels = [50, 90]
     paths = ligo.skymap.postprocess.contour(cls, levels, degrees=True, simplify=True)
     center = ligo.skymap.postprocess.posterior_max(prob)
-    localization.contour = {
+    return {
         "type": "FeatureCollection",
         "features": [
             {
@@ -892,11 +893,19 @@ def get_contour(localization):
         ],
     }
 
+
+def get_contour(localization):
+    localization.contour = contour_from_flat(localization.flat_2d)
     return localization
 
 
-def get_skymap_properties(localization):
-    sky_map = localization.table_2d
+def skymap_properties(uniq, probdensity):
+    """Properties (90% area, probability within 500 sq. deg.) and matching
+    tags of a multi-order skymap given as plain arrays."""
+    sky_map = Table(
+        [np.asarray(uniq, dtype=np.int64), probdensity],
+        names=["UNIQ", "PROBDENSITY"],
+    )
 
     properties_dict = {}
     tags_list = []
@@ -923,6 +932,11 @@ def get_skymap_properties(localization):
     return properties_dict, tags_list
 
 
+def get_skymap_properties(localization):
+    arrays = localization.skymap_arrays
+    return skymap_properties(arrays["UNIQ"], arrays["PROBDENSITY"])
+
+
 def get_xml_notice_type(root):
     # This is only useful for events that aren't automatically
     # ingested by the GCN service. For these, we can only try to
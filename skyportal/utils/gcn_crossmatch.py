@@ -37,7 +37,7 @@ import healpy
 import numpy as np
 import sqlalchemy as sa
 from astropy.time import Time
-from sqlalchemy.orm import selectinload, undefer
+from sqlalchemy.orm import selectinload
 from sqlalchemy.orm.attributes import flag_modified
 
 from baselayer.app import models
@@ -473,6 +473,10 @@ async def process_event_filter(
     candidate out: a position already flaring last month is a variable, not a
     counterpart.
     """
+    # distance_lookup reads the skymap arrays, which are deferred: a lazy load
+    # in an async session raises MissingGreenlet
+    await localization.load_skymap_arrays(session)
+
     cone = search_cone(
         localization,
         max_radius_deg=float(conf(config, "max_radius_deg")),
@@ -749,13 +753,6 @@ async def run_cycle(config=None, user_id=1):
                         # load in an async session raises MissingGreenlet.
                         selectinload(GcnEvent.localizations).options(
                             selectinload(Localization.tags),
-                            # deferred arrays: distance_lookup reads them, and a
-                            # lazy load in an async session raises MissingGreenlet
-                            undefer(Localization.uniq),
-                            undefer(Localization.probdensity),
-                            undefer(Localization.distmu),
-                            undefer(Localization.distsigma),
-                            undefer(Localization.distnorm),
                         ),
                     )
                 )
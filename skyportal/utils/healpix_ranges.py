@@ -0,0 +1,226 @@
+"""Sets of HEALPix ranges as sorted NumPy arrays.
+
+Instrument fields and localization tiles are stored as depth-29 nested
+HEALPix ranges ``[lo, hi)`` (``healpix_alchemy``'s ``Tile.healpix``). A
+region is represented here as two int64 arrays ``(lo, hi)`` of sorted,
+disjoint ranges, as returned by :func:`normalize`; set operations are then
+single passes of ``searchsorted`` over the arrays instead of comparisons of
+every range against every other, so that computing the coverage of a large
+survey footprint against a fine skymap costs ``O((n + m) log n)``.
+
+Each InstrumentField also stores the ranges of its footprint
+(``InstrumentField.healpix_ranges``, see :func:`to_bytes`), written once when
+its tiles are added, so that coverage computations read one compact value
+per field involved (:func:`load_fields`) instead of all of its tiles.
+"""
+
+import numpy as np
+import sqlalchemy as sa
+from healpix_alchemy.constants import PIXEL_AREA
+
+
+def _as_arrays(lo, hi):
+    lo = np.asarray(lo, dtype=np.int64).ravel()
+    hi = np.asarray(hi, dtype=np.int64).ravel()
+    if lo.shape != hi.shape:
+        raise ValueError("lo and hi must have the same length")
+    return lo, hi
+
+
+def normalize(lo, hi, merge_adjacent=True):
+    """Merge ranges ``[lo, hi)`` into sorted, disjoint ranges.
+
+    Parameters
+    ----------
+    lo, hi : array of int
+        Bounds of the ranges, in any order; empty ranges are dropped.
+    merge_adjacent : bool
+        Whether ranges that only touch (one ends where the next starts) are
+        merged too; if False, only overlapping ranges are.
+
+    Returns
+    -------
+    (lo, hi) : tuple of numpy.ndarray
+        The merged ranges, sorted by ``lo``.
+    """
+    lo, hi = _as_arrays(lo, hi)
+    keep = hi > lo
+    lo, hi = lo[keep], hi[keep]
+    if len(lo) == 0:
+        return lo, hi
+    order = np.argsort(lo, kind="stable")
+    lo, hi = lo[order], hi[order]
+    # furthest upper bound of the ranges so far: a range starting beyond it
+    # starts a new merged range
+    reach = np.maximum.accumulate(hi)
+    if merge_adjacent:
+        starts = np.flatnonzero(np.r_[True, lo[1:] > reach[:-1]])
+    else:
+        starts = np.flatnonzero(np.r_[True, lo[1:] >= reach[:-1]])
+    ends = np.r_[starts[1:], len(lo)] - 1
+    return lo[starts], reach[ends]
+
+
+def union(a, b):
+    """Union of two sets of ranges ``(lo, hi)``, normalized."""
+    return normalize(np.r_[a[0], b[0]], np.r_[a[1], b[1]])
+
+
+def intersection(a, b):
+    """Intersection of two normalized sets of ranges ``(lo, hi)``."""
+    a_lo, a_hi = _as_arrays(*a)
+    b_lo, b_hi = _as_arrays(*b)
+    # the ranges of b overlapping each range of a are b[first:last]
+    first = np.searchsorted(b_hi, a_lo, side="right")
+    last = np.searchsorted(b_lo, a_hi, side="left")
+    counts = np.maximum(last - first, 0)
+    a_index = np.repeat(np.arange(len(a_lo)), counts)
+    # position of each overlapping b range within its run, added to its first
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    b_index = first[a_index] + offsets
+    lo = np.maximum(a_lo[a_index], b_lo[b_index])
+    hi = np.minimum(a_hi[a_index], b_hi[b_index])
+    return lo, hi
+
+
+def npix(ranges):
+    """Number of depth-29 pixels in a normalized set of ranges."""
+    lo, hi = _as_arrays(*ranges)
+    return int(np.sum(hi - lo))
+
+
+def area(ranges):
+    """Area of a normalized set of ranges, in steradians."""
+    return npix(ranges) * PIXEL_AREA
+
+
+def overlap(ranges, tile_lo, tile_hi):
+    """Number of depth-29 pixels each tile ``[tile_lo, tile_hi)`` has in
+    common with a normalized set of ranges.
+
+    Parameters
+    ----------
+    ranges : tuple of numpy.ndarray
+        Normalized ranges ``(lo, hi)``, such as the union of fields.
+    tile_lo, tile_hi : array of int
+        Bounds of the tiles, such as those of a localization, in any order.
+
+    Returns
+    -------
+    numpy.ndarray
+        The overlap of each tile, in pixels.
+    """
+    lo, hi = _as_arrays(*ranges)
+    tile_lo, tile_hi = _as_arrays(tile_lo, tile_hi)
+    if len(lo) == 0:
+        return np.zeros(len(tile_lo), dtype=np.int64)
+    # pixels of the ranges below each range
+    below = np.r_[0, np.cumsum(hi - lo)[:-1]]
+
+    def covered_below(x):
+        index = np.searchsorted(lo, x, side="right") - 1
+        clipped = np.maximum(index, 0)
+        inside = np.clip(x - lo[clipped], 0, hi[clipped] - lo[clipped])
+        return np.where(index >= 0, below[clipped] + inside, 0)
+
+    return np.maximum(covered_below(tile_hi) - covered_below(tile_lo), 0)
+
+
+def coverage(ranges, tile_lo, tile_hi, probdensity):
+    """Area and probability of a skymap covered by a set of ranges.
+
+    Parameters
+    ----------
+    ranges : tuple of numpy.ndarray
+        Normalized ranges ``(lo, hi)`` covered, such as the union of the
+        observed fields.
+    tile_lo, tile_hi : array of int
+        Bounds of the skymap's tiles (``LocalizationTile.healpix``).
+    probdensity : array of float
+        Probability density of each tile, per steradian.
+
+    Returns
+    -------
+    (area, probability) : tuple of float
+        The area of the tiles covered, in steradians, and their integrated
+        probability.
+    """
+    pixels = overlap(ranges, tile_lo, tile_hi)
+    probdensity = np.asarray(probdensity, dtype=float).ravel()
+    return (
+        float(np.sum(pixels) * PIXEL_AREA),
+        float(np.sum(probdensity * pixels) * PIXEL_AREA),
+    )
+
+
+def to_bytes(ranges):
+    """Serialize ranges ``(lo, hi)`` as interleaved big-endian int64 bounds,
+    the format of ``InstrumentField.healpix_ranges``."""
+    lo, hi = _as_arrays(*ranges)
+    return np.stack([lo, hi], axis=1).astype(">i8").tobytes()
+
+
+def from_bytes(data):
+    """The ranges ``(lo, hi)`` serialized by :func:`to_bytes`."""
+    bounds = np.frombuffer(data, dtype=">i8").astype(np.int64).reshape(-1, 2)
+    return bounds[:, 0], bounds[:, 1]
+
+
+def _field_statements(field_ids):
+    from ..models import InstrumentField, InstrumentFieldTile
+
+    def tiles_statement(missing_ids):
+        return sa.select(
+            InstrumentFieldTile.healpix.lower, InstrumentFieldTile.healpix.upper
+        ).where(InstrumentFieldTile.instrument_field_id.in_(missing_ids))
+
+    fields_statement = sa.select(
+        InstrumentField.id, InstrumentField.healpix_ranges
+    ).where(InstrumentField.id.in_(field_ids))
+    return fields_statement, tiles_statement
+
+
+def _union_fields(field_rows, tile_rows):
+    ranges = [from_bytes(data) for _, data in field_rows if data is not None]
+    lo = [r[0] for r in ranges]
+    hi = [r[1] for r in ranges]
+    lo.append(np.array([t[0] for t in tile_rows], dtype=np.int64))
+    hi.append(np.array([t[1] for t in tile_rows], dtype=np.int64))
+    return normalize(np.concatenate(lo), np.concatenate(hi))
+
+
+def load_fields(session, field_ids):
+    """Union of the footprints of InstrumentFields.
+
+    Reads each field's precomputed ``healpix_ranges``, falling back to its
+    InstrumentFieldTiles for fields that have none.
+
+    Parameters
+    ----------
+    session : sqlalchemy.orm.Session
+        Database session.
+    field_ids : list of int or sqlalchemy.sql.Select
+        The InstrumentField IDs (not the instruments' field numbers), or a
+        query selecting them.
+
+    Returns
+    -------
+    (lo, hi) : tuple of numpy.ndarray
+        The normalized union of the fields.
+    """
+    fields_statement, tiles_statement = _field_statements(field_ids)
+    field_rows = session.execute(fields_statement).all()
+    missing = [id for id, data in field_rows if data is None]
+    tile_rows = session.execute(tiles_statement(missing)).all() if missing else []
+    return _union_fields(field_rows, tile_rows)
+
+
+async def load_fields_async(session, field_ids):
+    """:func:`load_fields`, on an asynchronous session."""
+    fields_statement, tiles_statement = _field_statements(field_ids)
+    field_rows = (await session.execute(fields_statement)).all()
+    missing = [id for id, data in field_rows if data is None]
+    tile_rows = (
+        (await session.execute(tiles_statement(missing))).all() if missing else []
+    )
+    return _union_fields(field_rows, tile_rows)
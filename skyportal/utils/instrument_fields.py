@@ -0,0 +1,316 @@
+"""Batched tiling of instrument fields, written with COPY.
+
+Uploading a survey footprint of thousands of fields (Rubin, WINTER, LS4, ...)
+used to create, tile and commit one InstrumentField at a time. Instead
+``add_tiles`` transforms the polygons of all fields with one vectorized
+coordinate transform, then hands the fields' vertices to this module:
+their HEALPix coverage, the slow part, is computed by :func:`field_ranges`,
+on a process pool (``misc.instrument_tiling_workers`` processes) for large
+uploads, and the InstrumentField and InstrumentFieldTile rows are streamed
+with psycopg's COPY protocol, in batches of ``BATCH_SIZE`` fields, the same
+technique ``localization_tiles`` uses for skymap tiles. Progress is recorded
+after each batch on the upload's InstrumentFieldUpload.
+"""
+
+import json
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from io import StringIO
+
+import numpy as np
+import sqlalchemy as sa
+from astropy import units as u
+from astropy.coordinates import SkyCoord
+from healpix_alchemy.constants import HPX
+from mocpy import MOC
+
+from baselayer.log import make_log
+
+from ..models import InstrumentField, InstrumentFieldTile, InstrumentFieldUpload
+from . import healpix_ranges
+from .naive_datetime import utcnow_naive
+
+log = make_log("instrument_fields")
+
+DEFAULT_NUM_WORKERS = 4
+
+# Below this many fields, starting worker processes costs more than it saves.
+MIN_FIELDS_FOR_POOL = 500
+
+# Number of fields written (and committed) at once.
+BATCH_SIZE = 500
+
+FIELD_COLUMNS = (
+    "id",
+    "instrument_id",
+    "field_id",
+    "ra",
+    "dec",
+    "contour",
+    "contour_summary",
+    "healpix_ranges",
+    "created_at",
+    "modified",
+)
+
+TILE_COLUMNS = (
+    "instrument_id",
+    "instrument_field_id",
+    "healpix",
+    "created_at",
+    "modified",
+)
+
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def num_workers():
+    """Number of processes tiling fields (``misc.instrument_tiling_workers``)."""
+    from baselayer.app.env import load_env
+
+    _, cfg = load_env()
+    return max(int(cfg.get("misc.instrument_tiling_workers", DEFAULT_NUM_WORKERS)), 1)
+
+
+def field_ranges(ra, dec):
+    """Depth-29 HEALPix ranges covered by a field.
+
+    Parameters
+    ----------
+    ra, dec : numpy.ndarray
+        ICRS vertices of the field's regions, in degrees, of shape
+        ``(n_regions, n_vertices)``.
+
+    Returns
+    -------
+    (lo, hi) : tuple of numpy.ndarray
+        The normalized union of the regions' coverage.
+    """
+    lower, upper = [], []
+    for region_ra, region_dec in zip(ra, dec):
+        polygon = SkyCoord(region_ra * u.deg, region_dec * u.deg, frame=HPX.frame)
+        ranges = MOC.from_polygon_skycoord(polygon).to_depth29_ranges
+        lower.append(ranges[:, 0])
+        upper.append(ranges[:, 1])
+    return healpix_ranges.normalize(np.concatenate(lower), np.concatenate(upper))
+
+
+def iter_field_ranges(ra, dec, max_workers=None):
+    """:func:`field_ranges` of each field, in order, computed on a process
+    pool when there are many fields.
+
+    Parameters
+    ----------
+    ra, dec : numpy.ndarray
+        Vertices of the fields, of shape ``(n_fields, n_regions, n_vertices)``.
+    max_workers : int, optional
+        Number of processes; defaults to :func:`num_workers`.
+    """
+    if len(ra) >= MIN_FIELDS_FOR_POOL:
+        max_workers = max_workers or num_workers()
+    if len(ra) < MIN_FIELDS_FOR_POOL or max_workers == 1:
+        for field_ra, field_dec in zip(ra, dec):
+            yield field_ranges(field_ra, field_dec)
+        return
+
+    # spawn, as the app holds database connections and threads that must not
+    # be shared with forked children
+    with ProcessPoolExecutor(
+        max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")
+    ) as pool:
+        chunksize = max(math.ceil(len(ra) / (4 * max_workers)), 1)
+        yield from pool.map(field_ranges, ra, dec, chunksize=chunksize)
+
+
+def field_contour(instrument_name, field_id, ra, dec, region_ra, region_dec):
+    """GeoJSON contour of a field (``InstrumentField.contour``), from the
+    vertices of its regions; ``field_id`` is None for fields numbered on
+    insertion."""
+    properties = {"instrument": instrument_name, "ra": ra, "dec": dec}
+    if field_id is not None:
+        properties["field_id"] = field_id
+    geometry = [
+        list(zip([*r, r[0]], [*d, d[0]]))
+        for r, d in zip(region_ra.tolist(), region_dec.tolist())
+    ]
+    return {
+        "properties": properties,
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "geometry": {"type": "MultiLineString", "coordinates": geometry},
+            },
+        ],
+    }
+
+
+def field_contour_summary(instrument_name, field_id, ra, dec, region_ra, region_dec):
+    """Bounding-box contour of a field (``InstrumentField.contour_summary``),
+    for lower memory display."""
+    properties = {"instrument": instrument_name, "ra": ra, "dec": dec}
+    if field_id is not None:
+        properties["field_id"] = field_id
+    min_ra, max_ra = float(np.min(region_ra)), float(np.max(region_ra))
+    min_dec, max_dec = float(np.min(region_dec)), float(np.max(region_dec))
+    geometry_summary = [
+        (min_ra, min_dec),
+        (max_ra, min_dec),
+        (max_ra, max_dec),
+        (min_ra, max_dec),
+        (min_ra, min_dec),
+    ]
+    return {
+        "properties": properties,
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "geometry": {"type": "LineString", "coordinates": geometry_summary},
+            },
+        ],
+    }
+
+
+def _copy_value(value):
+    if value is None:
+        return "\\N"
+    if isinstance(value, bytes):
+        # bytea hex format, its backslash escaped for COPY
+        return "\\\\x" + value.hex()
+    if isinstance(value, dict):
+        value = json.dumps(value)
+    return str(value).translate(_COPY_ESCAPES)
+
+
+def fields_buffer(rows):
+    """COPY text-format rows (in FIELD_COLUMNS order) of InstrumentFields,
+    given as dicts."""
+    output = StringIO()
+    output.writelines(
+        "\t".join(_copy_value(row[column]) for column in FIELD_COLUMNS) + "\n"
+        for row in rows
+    )
+    return output.getvalue()
+
+
+def tiles_buffer(instrument_id, instrument_field_id, ranges, now):
+    """COPY text-format rows (in TILE_COLUMNS order) of a field's tiles."""
+    prefix = f"{instrument_id}\t{instrument_field_id}\t"
+    suffix = f"\t{now}\t{now}\n"
+    lo, hi = ranges
+    return "".join(
+        f"{prefix}[{a},{b}){suffix}" for a, b in zip(lo.tolist(), hi.tolist())
+    )
+
+
+def _copy(session, table, columns, data):
+    connection = session.connection().connection
+    copy_sql = (
+        f"COPY {table} ({', '.join(columns)}) FROM STDIN "
+        "WITH (FORMAT text, DELIMITER E'\\t')"
+    )
+    with connection.cursor() as cursor:
+        with cursor.copy(copy_sql) as copy:
+            copy.write(data)
+
+
+def allocate_field_ids(session, n):
+    """Reserve ``n`` InstrumentField primary keys, so that fields can be
+    written with COPY (which returns nothing) and their tiles refer to them."""
+    if n == 0:
+        return []
+    return session.scalars(
+        sa.text(
+            "SELECT nextval(pg_get_serial_sequence(:table, 'id')) "
+            "FROM generate_series(1, :n)"
+        ),
+        {"table": InstrumentField.__tablename__, "n": n},
+    ).all()
+
+
+def write_fields(session, instrument_id, fields):
+    """Write a batch of tiled fields in ``session``'s transaction; does not
+    commit.
+
+    Parameters
+    ----------
+    session : sqlalchemy.orm.Session
+        Synchronous session bound to PostgreSQL through psycopg 3.
+    instrument_id : int
+        Instrument the fields belong to.
+    fields : list of dict
+        One per field: ``id`` (the InstrumentField to replace the contours
+        and tiles of, or None to create one), ``field_id``, ``ra``, ``dec``,
+        ``contour``, ``contour_summary`` and ``ranges`` (from
+        :func:`field_ranges`).
+
+    Returns
+    -------
+    list of int
+        The InstrumentField IDs of the fields.
+    """
+    now = utcnow_naive().isoformat()
+    new = [field for field in fields if field["id"] is None]
+    existing = [field for field in fields if field["id"] is not None]
+    for field, id in zip(new, allocate_field_ids(session, len(new))):
+        field["id"] = id
+    for field in fields:
+        field["healpix_ranges"] = healpix_ranges.to_bytes(field["ranges"])
+
+    if existing:
+        session.execute(
+            sa.delete(InstrumentFieldTile).where(
+                InstrumentFieldTile.instrument_id == instrument_id,
+                InstrumentFieldTile.instrument_field_id.in_(
+                    [field["id"] for field in existing]
+                ),
+            )
+        )
+        session.execute(
+            sa.update(InstrumentField),
+            [
+                {
+                    "id": field["id"],
+                    "contour": field["contour"],
+                    "contour_summary": field["contour_summary"],
+                    "healpix_ranges": field["healpix_ranges"],
+                }
+                for field in existing
+            ],
+        )
+    if new:
+        rows = [
+            {
+                **field,
+                "instrument_id": instrument_id,
+                "created_at": now,
+                "modified": now,
+            }
+            for field in new
+        ]
+        _copy(
+            session, InstrumentField.__tablename__, FIELD_COLUMNS, fields_buffer(rows)
+        )
+    _copy(
+        session,
+        InstrumentFieldTile.__tablename__,
+        TILE_COLUMNS,
+        "".join(
+            tiles_buffer(instrument_id, field["id"], field["ranges"], now)
+            for field in fields
+        ),
+    )
+    return [field["id"] for field in fields]
+
+
+def update_upload(session, upload_id, **values):
+    """Record the progress of an InstrumentFieldUpload, if there is one."""
+    if upload_id is None:
+        return
+    session.execute(
+        sa.update(InstrumentFieldUpload)
+        .where(InstrumentFieldUpload.id == upload_id)
+        .values(**values)
+    )
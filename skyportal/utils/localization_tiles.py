@@ -0,0 +1,162 @@
+"""Bulk insertion of LocalizationTile rows with COPY.
+
+A high-resolution multi-order skymap has tens of thousands of tiles; adding
+them as ORM objects costs seconds of Python and INSERT round trips. Instead
+the tiles are rendered as one tab-separated buffer (healpix ranges computed
+with NumPy) and streamed with psycopg's COPY protocol, the same technique
+``save_data_using_copy`` uses for photometry, straight into the monthly
+partition the rows belong to -- skipping per-row partition routing.
+
+Partitions are declared on the model (``LocalizationTile.partitions``), and
+readers pick the table to query from that mapping, so a month is only written
+to its own partition when the model declares it. A declared partition missing
+from the database is created on first use, under an advisory lock so
+concurrent writers do not race, and attached without blocking readers of the
+other partitions. Dates outside the declared months, or whose month cannot be
+attached because the default partition already holds rows for it, go to the
+default partition, as before.
+"""
+
+from io import StringIO
+
+import sqlalchemy as sa
+from dateutil.relativedelta import relativedelta
+
+from baselayer.log import make_log
+
+from ..models import LocalizationTile
+from .crossmatch import uniq_to_ranges
+from .naive_datetime import utcnow_naive
+
+log = make_log("localization_tiles")
+
+COLUMNS = (
+    "localization_id",
+    "probdensity",
+    "dateobs",
+    "healpix",
+    "created_at",
+    "modified",
+)
+
+# Partitions known to exist in this process's database.
+_existing = set()
+
+
+def partition_name(dateobs):
+    """Key of ``dateobs``'s monthly partition in ``LocalizationTile.partitions``."""
+    return f"{dateobs.year}_{dateobs.month:02d}"
+
+
+def ensure_partition(bind, dateobs):
+    """Name of the table tiles dated ``dateobs`` should be written to,
+    creating its declared monthly partition if the database lacks it.
+
+    Runs in its own short transaction on ``bind`` (an Engine), so the DDL is
+    committed, and its locks released, before any tiles are written.
+    """
+    name = partition_name(dateobs)
+    partition = LocalizationTile.partitions.get(name)
+    if partition is None:
+        return LocalizationTile.partitions["def"].__tablename__
+    table = partition.__tablename__
+    if table in _existing:
+        return table
+
+    parent = LocalizationTile.__tablename__
+    lower = dateobs.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    upper = lower + relativedelta(months=1)
+    try:
+        with bind.begin() as connection:
+            connection.execute(
+                sa.text("SELECT pg_advisory_xact_lock(hashtext(:table))"),
+                {"table": table},
+            )
+            exists = connection.scalar(
+                sa.text("SELECT to_regclass(:table) IS NOT NULL"), {"table": table}
+            )
+            if not exists:
+                log(f"Creating missing partition {table}")
+                # Create and attach separately: ATTACH only takes a SHARE
+                # UPDATE EXCLUSIVE lock on the parent, where CREATE TABLE ...
+                # PARTITION OF would block every reader of the tiles. The
+                # CHECK constraint spares ATTACH a scan of the new table.
+                connection.execute(
+                    sa.text(
+                        f"CREATE TABLE {table} "
+                        f"(LIKE {parent} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+                    )
+                )
+                bounds = f"('{lower:%Y-%m-%d}') TO ('{upper:%Y-%m-%d}')"
+                connection.execute(
+                    sa.text(
+                        f"ALTER TABLE {table} ADD CONSTRAINT {table}_dateobs_check "
+                        f"CHECK (dateobs >= '{lower:%Y-%m-%d}' "
+                        f"AND dateobs < '{upper:%Y-%m-%d}')"
+                    )
+                )
+                connection.execute(
+                    sa.text(
+                        f"ALTER TABLE {parent} ATTACH PARTITION {table} "
+                        f"FOR VALUES FROM {bounds}"
+                    )
+                )
+                connection.execute(
+                    sa.text(
+                        f"ALTER TABLE {table} DROP CONSTRAINT {table}_dateobs_check"
+                    )
+                )
+    except sa.exc.DBAPIError as e:
+        # e.g. the default partition already holds rows of that month
+        log(f"Could not create partition {table}, using the default one: {e}")
+        return LocalizationTile.partitions["def"].__tablename__
+    _existing.add(table)
+    return table
+
+
+def tiles_buffer(localization_id, dateobs, uniq, probdensity):
+    """COPY text-format rows (in COLUMNS order) for a localization's tiles."""
+    lo, hi = uniq_to_ranges(uniq)
+    now = utcnow_naive().isoformat()
+    prefix = f"{localization_id}\t"
+    suffix = f"\t{dateobs.isoformat()}\t"
+    timestamps = f"\t{now}\t{now}\n"
+    output = StringIO()
+    output.writelines(
+        f"{prefix}{p!r}{suffix}[{a},{b}){timestamps}"
+        for p, a, b in zip([float(p) for p in probdensity], lo.tolist(), hi.tolist())
+    )
+    return output.getvalue()
+
+
+def copy_localization_tiles(session, localization_id, dateobs, uniq, probdensity):
+    """Write a localization's tiles with COPY, in ``session``'s transaction.
+    Does not commit.
+
+    Parameters
+    ----------
+    session : sqlalchemy.orm.Session
+        Synchronous session bound to PostgreSQL through psycopg 3.
+    localization_id : int
+        Localization the tiles belong to.
+    dateobs : datetime.datetime
+        The localization's event time, which picks the partition.
+    uniq, probdensity : array
+        The localization's multi-order skymap.
+
+    Returns
+    -------
+    str
+        The table the tiles were written to.
+    """
+    table = ensure_partition(session.get_bind(), dateobs)
+    data = tiles_buffer(localization_id, dateobs, uniq, probdensity)
+    connection = session.connection().connection
+    copy_sql = (
+        f"COPY {table} ({', '.join(COLUMNS)}) FROM STDIN "
+        "WITH (FORMAT text, DELIMITER E'\\t')"
+    )
+    with connection.cursor() as cursor:
+        with cursor.copy(copy_sql) as copy:
+            copy.write(data)
+    return table
@@ -0,0 +1,189 @@
+"""Process-local cache for small, rarely-changing lookup tables.
+
+Hot paths such as broker ingestion resolve the same handful of rows on every
+alert (the survey ``Instrument``, the ``Stream`` program map, ``Filter``
+criteria, the ingest ``User``). :class:`LookupCache` keeps those results in the
+process so that, in steady state, the hot path performs no lookup queries.
+
+Entries are kept fresh three ways:
+
+- Every entry expires after a TTL (``cache.ttl.lookups``, default 60 s), which
+  bounds staleness even when nothing else fires.
+- SQLAlchemy ``after_flush``/``after_commit`` session events record which
+  models a transaction touched through the ORM; on commit, every cache watching
+  one of those models is cleared in this process.
+- The same commit publishes the touched model names on a Valkey channel (when
+  ``cache.enabled``); long-running processes run
+  :func:`listen_for_invalidations` to apply changes made elsewhere.
+
+Cached values must be plain data or detached instances: they outlive the
+session that loaded them.
+"""
+
+import asyncio
+import json
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from baselayer.log import make_log
+
+from .valkey_cache import get_cache
+
+log = make_log("lookup_cache")
+
+INVALIDATION_CHANNEL = "skyportal:lookup_cache:invalidate"
+DEFAULT_TTL = 60  # seconds
+
+# Session.info key collecting the model names a transaction flushed.
+_TOUCHED_KEY = "lookup_cache_touched"
+
+_caches: dict = {}
+
+# In-flight invalidation publishes; the loop only keeps weak references to tasks.
+_publishing: set = set()
+
+
+class LookupCache:
+    """A named, TTL-bounded, in-process map from key to loaded value.
+
+    ``models`` are the mapped class names whose changes invalidate the cache.
+    """
+
+    def __init__(self, name, models, ttl=None):
+        self.name = name
+        self.models = frozenset(models)
+        self._ttl = ttl
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def ttl(self):
+        if self._ttl is None:
+            from baselayer.app.env import load_env
+
+            _, cfg = load_env()
+            self._ttl = float(cfg.get("cache.ttl.lookups", DEFAULT_TTL))
+        return self._ttl
+
+    async def get(self, key, loader):
+        """Return the cached value for ``key``, awaiting ``loader()`` to fill a
+        missing or expired entry. ``None`` results are not cached, so a row that
+        does not exist yet is found as soon as it is created."""
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] > now:
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+        value = await loader()
+        if value is not None:
+            self._entries[key] = (value, now + self.ttl)
+        return value
+
+    async def get_many(self, keys, loader):
+        """Return ``{key: value}`` for ``keys``, awaiting ``loader(missing)`` once
+        for every missing or expired key; it returns a dict of whatever it found.
+        Keys the loader does not return are absent from the result."""
+        now = time.monotonic()
+        found, missing = {}, []
+        for key in keys:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                found[key] = entry[0]
+            else:
+                missing.append(key)
+        self.hits += len(found)
+        if missing:
+            self.misses += len(missing)
+            loaded = await loader(missing)
+            expires = now + self.ttl
+            for key, value in loaded.items():
+                self._entries[key] = (value, expires)
+            found.update(loaded)
+        return found
+
+    def invalidate(self):
+        self._entries.clear()
+
+
+def lookup_cache(name, models, ttl=None):
+    """Return the process-wide :class:`LookupCache` called ``name``, creating it
+    on first use."""
+    cache = _caches.get(name)
+    if cache is None:
+        cache = _caches[name] = LookupCache(name, models, ttl=ttl)
+    return cache
+
+
+def invalidate(model_names=None):
+    """Clear every cache watching one of ``model_names`` (all caches if None)."""
+    for cache in _caches.values():
+        if model_names is None or cache.models & set(model_names):
+            cache.invalidate()
+
+
+def _watched_models():
+    return set().union(*(cache.models for cache in _caches.values()))
+
+
+@event.listens_for(Session, "after_flush")
+def _record_touched_models(session, flush_context):
+    watched = _watched_models()
+    if not watched:
+        return
+    # Pre-flush state is still visible in after_flush.
+    touched = {
+        type(instance).__name__
+        for instance in (*session.new, *session.dirty, *session.deleted)
+    } & watched
+    if touched:
+        session.info.setdefault(_TOUCHED_KEY, set()).update(touched)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    touched = session.info.pop(_TOUCHED_KEY, None)
+    if not touched:
+        return
+    invalidate(touched)
+    _publish(touched)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_touched_models(session):
+    session.info.pop(_TOUCHED_KEY, None)
+
+
+def _publish(model_names):
+    """Tell other processes to drop caches for ``model_names``. Best-effort:
+    from a thread without an event loop only the TTL covers other processes."""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    task = loop.create_task(
+        get_cache().publish(INVALIDATION_CHANNEL, json.dumps(sorted(model_names)))
+    )
+    _publishing.add(task)
+    task.add_done_callback(_published)
+
+
+def _published(task):
+    _publishing.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        log(f"publishing invalidation failed: {task.exception()}")
+
+
+async def listen_for_invalidations():
+    """Apply invalidations published by other processes, until cancelled.
+
+    A no-op when Valkey caching is disabled (entries then rely on the TTL).
+    """
+    async for message in get_cache().subscribe(INVALIDATION_CHANNEL):
+        try:
+            invalidate(json.loads(message))
+        except (TypeError, ValueError) as e:
+            log(f"ignoring malformed invalidation {message!r}: {e}")
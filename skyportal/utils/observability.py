@@ -85,3 +85,78 @@ def _instrument_event_loop_lag():
 
     _lag_probe = PeriodicCallback(probe, _LAG_PROBE_INTERVAL_MS)
     _lag_probe.start()
+
+
+def setup_service_metrics(cfg, service_name, port=None):
+    """Export OpenTelemetry metrics from a non-web service (e.g. broker_ingest).
+
+    Like :func:`setup_observability` this is opt-in via
+    ``observability.enabled``. The service has no Tornado app to mount the
+    ``/metrics`` route on, so when ``port`` is given the Prometheus registry is
+    served from a standalone HTTP listener on that port instead. Returns True
+    when metrics were enabled.
+    """
+    if not cfg.get("observability.enabled", False):
+        return False
+
+    try:
+        from opentelemetry import metrics
+        from opentelemetry.exporter.prometheus import PrometheusMetricReader
+        from opentelemetry.sdk.metrics import MeterProvider
+        from opentelemetry.sdk.resources import SERVICE_NAME, Resource
+        from prometheus_client import start_http_server
+    except ImportError:
+        log("OpenTelemetry packages not installed; skipping service metrics")
+        return False
+
+    prefix = cfg.get("observability.service_name", "skyportal")
+    resource = Resource.create({SERVICE_NAME: f"{prefix}-{service_name}"})
+    metrics.set_meter_provider(
+        MeterProvider(resource=resource, metric_readers=[PrometheusMetricReader()])
+    )
+    if port is not None:
+        start_http_server(int(port))
+        log(f"{service_name} Prometheus metrics on port {port}")
+    return True
+
+
+class _NoOpInstrument:
+    def add(self, amount, attributes=None):
+        pass
+
+    def record(self, amount, attributes=None):
+        pass
+
+    def set(self, amount, attributes=None):
+        pass
+
+
+class _NoOpMeter:
+    """Stand-in used when OpenTelemetry is not installed, so instrumented code
+    never branches on it."""
+
+    def create_counter(self, *args, **kwargs):
+        return _NoOpInstrument()
+
+    def create_up_down_counter(self, *args, **kwargs):
+        return _NoOpInstrument()
+
+    def create_histogram(self, *args, **kwargs):
+        return _NoOpInstrument()
+
+    def create_gauge(self, *args, **kwargs):
+        return _NoOpInstrument()
+
+
+def get_meter(name):
+    """Return an OpenTelemetry meter for ``name``.
+
+    Without a configured meter provider the OpenTelemetry API hands out no-op
+    instruments, so it is always safe to record; without the package installed
+    at all, a local no-op meter is returned instead.
+    """
+    try:
+        from opentelemetry import metrics
+    except ImportError:
+        return _NoOpMeter()
+    return metrics.get_meter(name)
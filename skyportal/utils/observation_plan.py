@@ -20,6 +20,7 @@ from baselayer.app.flow import Flow
 from baselayer.log import make_log
 
 from ..handlers.api.galaxy import get_galaxies
+from . import healpix_ranges
 from .cache import Cache, array_to_bytes
 
 log = make_log("api/observation_plan")
@@ -40,36 +41,18 @@ Ncores = cfg.get("app.observation_plan.Ncores", 1)
 
 def combine_healpix_tuples(input_tiles):
     """
-    Combine (adjacent?) healpix tiles, given as tuples of (lower,upper).
-    Returns a list of tuples that do not overlap.
+    Combine overlapping healpix tiles, given as tuples of (lower,upper).
+    Returns a list of tuples that do not overlap; tiles that only
+    touch are kept apart.
     """
-
-    # set upper bound to make sure this algorithm isn't crazy expensive
-    for i in range(100000):
-        input_tiles.sort()
-        # check each tuple against all other tuples:
-        for j1, t1 in enumerate(input_tiles):
-            for j2 in range(j1 + 1, len(input_tiles)):
-                t2 = input_tiles[j2]
-                # check if overlapping with any of the combined tiles
-                if t2[0] < t1[1] and t1[0] < t2[1]:
-                    # if overlapping, grow to the union of both tiles
-                    input_tiles[j1] = (min(t1[0], t2[0]), max(t1[1], t2[1]))
-                    input_tiles[j2] = input_tiles[j1]  # grow both tiles in the list!
-                else:
-                    # if not overlapping, no need to scan next tiles,
-                    # since they are sorted by lower bound
-                    break
-        output_tiles = list(set(input_tiles))  # remove duplicates
-
-        # when none of the tiles are overlapping,
-        # none will be removed by the actions of the loop
-        if len(output_tiles) == len(input_tiles):
-            return output_tiles
-
-        input_tiles = output_tiles
-
-    raise RuntimeError("Too many iterations (1000) to combine_healpix_tuples!")
+    if len(input_tiles) == 0:
+        return []
+    lower, upper = healpix_ranges.normalize(
+        [t[0] for t in input_tiles],
+        [t[1] for t in input_tiles],
+        merge_adjacent=False,
+    )
+    return list(zip(lower.tolist(), upper.tolist()))
 
 
 def generate_observation_plan_statistics(
@@ -191,10 +174,13 @@ def generate_observation_plan_statistics(
         # get the localization tiles as python objects
         if stats_method == "python":
             t0 = time.time()
-            localization_tiles = session.scalars(
-                sa.select(localizationtilescls)
+            localization_tiles = session.execute(
+                sa.select(
+                    localizationtilescls.healpix.lower,
+                    localizationtilescls.healpix.upper,
+                    localizationtilescls.probdensity,
+                )
                 .where(localizationtilescls.localization_id == request.localization_id)
-                .order_by(localizationtilescls.probdensity.desc())
                 .distinct()
             ).all()
             if stats_logging:
@@ -204,68 +190,31 @@ def generate_observation_plan_statistics(
                     f"{request.localization_id} retrieved in {time.time() - t0:.2f}s. ",
                 )
 
-            # get the instrument field tiles as python objects
+            # get the union of the planned fields
             t0 = time.time()
-            instrument_field_tiles = session.scalars(
-                sa.select(InstrumentFieldTile)
-                .where(
+            fields = healpix_ranges.load_fields(
+                session,
+                sa.select(InstrumentField.id).where(
                     InstrumentField.instrument_id == plan.instrument_id,
-                    InstrumentFieldTile.instrument_field_id == InstrumentField.id,
-                    InstrumentFieldTile.instrument_field_id
-                    == PlannedObservation.field_id,
+                    InstrumentField.id == PlannedObservation.field_id,
                     PlannedObservation.observation_plan_id == plan.id,
-                )
-                .distinct()
-            ).all()
+                ),
+            )
             if stats_logging:
                 log(
-                    f"STATS: {len(instrument_field_tiles)} instrument "
-                    f"fields retrieved in {time.time() - t0:.2f}s. "
+                    f"STATS: {len(fields[0])} instrument "
+                    f"field ranges retrieved in {time.time() - t0:.2f}s. "
                 )
 
-            # calculate the area and integrated probability directly:
+            # calculate the area and integrated probability directly
             t0 = time.time()
-            intarea = 0  # total area covered by instrument field tiles
-            intprob = 0  # total probability covered by instrument field tiles
-            field_lower_bounds = np.array(
-                [f.healpix.lower for f in instrument_field_tiles]
-            )
-            field_upper_bounds = np.array(
-                [f.healpix.upper for f in instrument_field_tiles]
+            intarea, intprob = healpix_ranges.coverage(
+                fields,
+                [t[0] for t in localization_tiles],
+                [t[1] for t in localization_tiles],
+                [t[2] for t in localization_tiles],
             )
 
-            for i, t in enumerate(localization_tiles):
-                # has True values where tile t has any overlap with one of the fields
-                overlap_array = np.logical_and(
-                    t.healpix.lower <= field_upper_bounds,
-                    t.healpix.upper >= field_lower_bounds,
-                )
-
-                # only add area/prob if there's any overlap
-                overlap = 0
-                if np.any(overlap_array):
-                    lower_upper = zip(
-                        field_lower_bounds[overlap_array],
-                        field_upper_bounds[overlap_array],
-                    )
-                    # tuples of (lower, upper) for all fields that overlap with tile t
-                    new_fields = [(l, u) for (l, u) in lower_upper]
-
-                    # combine any overlapping fields
-                    output_fields = combine_healpix_tuples(new_fields)
-
-                    # get the area of the combined fields that overlaps with tile t
-                    for lower, upper in output_fields:
-                        mx = np.minimum(t.healpix.upper, upper)
-                        mn = np.maximum(t.healpix.lower, lower)
-                        overlap += mx - mn
-
-                intarea += overlap
-                intprob += t.probdensity * overlap
-
-            intarea *= ha.constants.PIXEL_AREA
-            intprob *= ha.constants.PIXEL_AREA
-
             if stats_logging:
                 log(
                     "STATS: ",
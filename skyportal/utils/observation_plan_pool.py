@@ -0,0 +1,120 @@
+"""Process pool generating observation plans in parallel.
+
+A new localization can trigger default observation plans for dozens of
+instruments. Plans of different requests (or combined groups of requests)
+are independent, so the observation plan queue hands each one to a worker
+process (``app.observation_plan.workers`` of them) instead of running them
+one after the other. Each worker has its own database connections; the data
+the plans have in common is shared through files rather than recomputed or
+copied: the localization's multi-order skymap and rasters are memory-mapped
+from disk (see ``skymap_file`` and ``skymap_cache``), and the field/tile
+coverage of each localization and instrument is cached on disk by
+``generate_plan``.
+
+The time each plan takes is logged, and recorded by the queue per instrument
+in the ``observation_plan.generation.duration`` histogram.
+"""
+
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from baselayer.log import make_log
+
+log = make_log("observation_plan_pool")
+
+DEFAULT_NUM_WORKERS = 4
+
+_histogram = None
+
+
+def num_workers():
+    """Number of plans generated at once (``app.observation_plan.workers``)."""
+    from baselayer.app.env import load_env
+
+    _, cfg = load_env()
+    return max(int(cfg.get("app.observation_plan.workers", DEFAULT_NUM_WORKERS)), 1)
+
+
+def _init_worker():
+    from baselayer.app.env import load_env
+    from baselayer.app.models import init_db
+
+    _, cfg = load_env()
+    init_db(**cfg["database"])
+
+
+def create_pool(max_workers=None):
+    """Pool of processes running :func:`submit_plan_requests`; uses the
+    ``spawn`` start method, as the queue service holds database connections
+    that must not be shared with forked children."""
+    return ProcessPoolExecutor(
+        max_workers=max_workers or num_workers(),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+    )
+
+
+def record_duration(instrument_names, seconds):
+    """Record how long generating a plan for ``instrument_names`` took."""
+    global _histogram
+    if _histogram is None:
+        from .observability import get_meter
+
+        _histogram = get_meter("skyportal.observation_plan").create_histogram(
+            "observation_plan.generation.duration",
+            unit="s",
+            description="Time to generate an observation plan, per instrument.",
+        )
+    for name in instrument_names:
+        _histogram.record(seconds, {"instrument": name})
+
+
+def submit_plan_requests(request_ids):
+    """Generate the plan(s) of ObservationPlanRequests, in a worker process.
+
+    Parameters
+    ----------
+    request_ids : list of int
+        One request, or the requests of a combined plan.
+
+    Returns
+    -------
+    (plan_ids, instrument_names, seconds) : tuple
+        The generated EventObservationPlan IDs, the instruments they are for,
+        and how long generating them took.
+    """
+    import sqlalchemy as sa
+
+    from baselayer.app import models
+
+    from ..models import DBSession, ObservationPlanRequest
+
+    started = time.perf_counter()
+    with DBSession() as session:
+        requests = session.scalars(
+            sa.select(ObservationPlanRequest).where(
+                ObservationPlanRequest.id.in_(request_ids)
+            )
+        ).all()
+        if len(requests) == 0:
+            raise ValueError(f"No observation plan requests with IDs {request_ids}")
+        api = requests[0].allocation.instrument.api_class_obsplan
+        instrument_names = sorted({r.allocation.instrument.name for r in requests})
+
+    async def _submit():
+        async with models.async_plain_session_factory() as session:
+            if len(request_ids) > 1:
+                return await api.submit_multiple(
+                    request_ids, session, asynchronous=False
+                )
+            return [await api.submit(request_ids[0], session, asynchronous=False)]
+
+    plan_ids = asyncio.run(_submit())
+    seconds = time.perf_counter() - started
+    log(
+        f"Generated plan(s) {plan_ids} for {', '.join(instrument_names)} "
+        f"in {seconds:.1f}s"
+    )
+    return plan_ids, instrument_names, seconds
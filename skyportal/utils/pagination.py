@@ -0,0 +1,162 @@
+"""Keyset ("cursor") pagination helpers.
+
+Offset pagination (``pageNumber``) makes the database, or Python, produce and
+discard every row before the requested page, so late pages of a broad query
+cost as much as materializing the whole result. Keyset pagination instead
+remembers where the previous page stopped -- the sort key and id of its last
+row -- and asks for rows strictly after that point, which PostgreSQL answers
+with a bounded ``ORDER BY ... LIMIT``.
+
+The position is handed to clients as an opaque token: :func:`encode_cursor`
+builds it from the last row of a page and :func:`decode_cursor` reads it back,
+refusing tokens issued for a different ordering. :func:`keyset_condition`
+renders the matching SQL predicate for raw SQL queries, and
+:func:`keyset_clause` builds it for SQLAlchemy Core queries.
+"""
+
+import base64
+import datetime
+import json
+from decimal import Decimal
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import JSONB
+
+# Ways to report the total number of matches alongside a cursor page.
+TOTAL_MATCHES_MODES = ("exact", "estimate", "none")
+
+
+def encode_cursor(sort_key, last_id, scope=""):
+    """Encode the position after a row as an opaque, URL-safe token.
+
+    Parameters
+    ----------
+    sort_key : str, int, float, bool, Decimal, datetime, JSON-able or None
+        Value of the sort key of the last row of the page.
+    last_id : str or int
+        Unique id of that row, which breaks ties between equal sort keys.
+    scope : str
+        Identifies the ordering the token belongs to (e.g. the sort column
+        and direction); :func:`decode_cursor` rejects a token used with any
+        other scope.
+
+    Returns
+    -------
+    str
+    """
+    if isinstance(sort_key, datetime.datetime):
+        key = ["datetime", sort_key.isoformat()]
+    elif isinstance(sort_key, Decimal):
+        key = ["decimal", str(sort_key)]
+    else:
+        key = ["value", sort_key]
+    payload = json.dumps([scope, *key, last_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, scope=""):
+    """Decode a token made by :func:`encode_cursor`.
+
+    Returns
+    -------
+    tuple
+        ``(sort_key, last_id)``.
+
+    Raises
+    ------
+    ValueError
+        If the token is malformed or was issued for another scope.
+    """
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        token_scope, kind, key, last_id = json.loads(payload)
+        if kind == "datetime":
+            key = datetime.datetime.fromisoformat(key)
+        elif kind == "decimal":
+            key = Decimal(key)
+        elif kind != "value":
+            raise ValueError(kind)
+    except (TypeError, ValueError, ArithmeticError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if token_scope != scope:
+        raise ValueError(
+            "Cursor was issued for a different sort order; restart from the first page"
+        )
+    return key, last_id
+
+
+def cursor_bindparam(name, value, json_value=False):
+    """A bind parameter for a decoded sort key, typed after its Python value so
+    PostgreSQL compares it against the sort column without a cast."""
+    if json_value:
+        type_ = JSONB
+    elif isinstance(value, datetime.datetime):
+        type_ = sa.DateTime
+    elif isinstance(value, bool):
+        type_ = sa.Boolean
+    elif isinstance(value, int):
+        type_ = sa.BigInteger
+    elif isinstance(value, float):
+        type_ = sa.Float
+    elif isinstance(value, Decimal):
+        type_ = sa.Numeric
+    else:
+        type_ = sa.String
+    return sa.bindparam(name, value, type_=type_)
+
+
+def keyset_condition(sort_column, id_column, sort_order, key_is_null, prefix="cursor"):
+    """SQL predicate selecting the rows after a cursor position, for rows
+    ordered by ``sort_column {sort_order} NULLS LAST, id_column {sort_order}``.
+
+    The cursor's sort key and id are read from the bind parameters
+    ``:{prefix}_key`` and ``:{prefix}_id``; ``key_is_null`` tells whether the
+    key is NULL, in which case only the trailing NULL rows remain.
+    """
+    op = ">" if sort_order.lower() == "asc" else "<"
+    after_id = f"{id_column} {op} :{prefix}_id"
+    if key_is_null:
+        return f"({sort_column} IS NULL AND {after_id})"
+    return (
+        f"({sort_column} {op} :{prefix}_key "
+        f"OR ({sort_column} = :{prefix}_key AND {after_id}) "
+        f"OR {sort_column} IS NULL)"
+    )
+
+
+def keyset_clause(sort_column, id_column, sort_order, sort_key, last_id):
+    """Same as :func:`keyset_condition`, as a SQLAlchemy expression on the
+    columns ``sort_column`` and ``id_column`` with the decoded cursor values."""
+    if sort_order.lower() == "asc":
+        after_id = id_column > last_id
+        after_key = sort_column > sort_key
+    else:
+        after_id = id_column < last_id
+        after_key = sort_column < sort_key
+    if sort_key is None:
+        return sa.and_(sort_column.is_(None), after_id)
+    return sa.or_(
+        after_key,
+        sa.and_(sort_column == sort_key, after_id),
+        sort_column.is_(None),
+    )
+
+
+async def estimate_count(session, statement, bindparams=()):
+    """The planner's estimate of the number of rows ``statement`` (SQL text or
+    a SQLAlchemy selectable) returns, without running it. Cheap, but only as
+    good as the table statistics."""
+    if not isinstance(statement, str):
+        statement = str(
+            statement.compile(
+                dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+            )
+        )
+    result = await session.execute(
+        sa.text(f"EXPLAIN (FORMAT JSON) {statement}").bindparams(*bindparams)
+    )
+    plan = result.scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
@@ -0,0 +1,221 @@
+"""Rebuild every object's PhotStat in the background.
+
+A rebuild is a :class:`~skyportal.models.PhotStatRebuild` row, created through
+``POST /api/phot_stats/rebuild`` and run by ``services/phot_stat_rebuild``.
+The service walks objects in ``Obj.id`` order, ``chunk_size`` at a time. For
+each chunk it:
+
+1. fetches the chunk's photometry in one columnar query,
+2. splits the objects across a process pool, where ``PhotStat.full_update``
+   runs without touching the database,
+3. upserts the resulting rows in bulk and advances the cursor
+   (``last_obj_id``) in the same transaction.
+
+A crash therefore repeats at most one chunk, and a restarted service picks up
+an unfinished rebuild from its cursor. Cancelling (``DELETE``) is noticed
+between chunks.
+
+The logic lives here rather than in the service module so it can be imported
+and tested without the service's ``init_db`` side effect.
+"""
+
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from baselayer.app import models
+from baselayer.log import make_log
+from skyportal.handlers.api.photometry import numpy_to_native
+from skyportal.models import Obj, Photometry, PhotStat, PhotStatRebuild
+from skyportal.utils.naive_datetime import utcnow_naive
+
+log = make_log("phot_stat_rebuild")
+
+DEFAULT_NUM_WORKERS = 4
+
+# Photometry columns PhotStat.full_update reads.
+PHOT_COLUMNS = ("filter", "mjd", "flux", "fluxerr", "origin", "original_user_data")
+
+# PhotStat columns written by a rebuild: everything but the bookkeeping ones.
+STAT_COLUMNS = tuple(
+    c.name
+    for c in PhotStat.__table__.columns
+    if c.name not in ("id", "created_at", "modified")
+)
+
+# Rows per bulk upsert, keeping the bind parameters well under PostgreSQL's
+# 65535 limit (~40 columns per row).
+WRITE_BATCH_SIZE = 500
+
+
+def compute_phot_stats(obj_ids, columns):
+    """Compute PhotStat column values for ``obj_ids`` from columnar photometry.
+
+    Runs in a worker process, so it takes and returns plain data only.
+
+    Parameters
+    ----------
+    obj_ids : list of str
+        Objects to compute statistics for; objects without photometry get
+        empty statistics.
+    columns : dict
+        Maps ``"obj_id"`` and every name in PHOT_COLUMNS to a list with one
+        entry per photometry point.
+
+    Returns
+    -------
+    list of dict
+        One row per object, keyed by the names in STAT_COLUMNS.
+    """
+    rows_by_obj = {}
+    for i, obj_id in enumerate(columns["obj_id"]):
+        rows_by_obj.setdefault(obj_id, []).append(i)
+
+    results = []
+    for obj_id in obj_ids:
+        points = [
+            {name: columns[name][i] for name in PHOT_COLUMNS}
+            for i in rows_by_obj.get(obj_id, [])
+        ]
+        phot_stat = PhotStat(obj_id=obj_id)
+        phot_stat.full_update(points)
+        results.append(
+            {name: numpy_to_native(getattr(phot_stat, name)) for name in STAT_COLUMNS}
+        )
+    return results
+
+
+def split_columns(obj_ids, rows, num_parts):
+    """Split ``obj_ids`` into ``num_parts`` contiguous parts, and the photometry
+    ``rows`` (tuples of obj_id followed by PHOT_COLUMNS) into matching columnar
+    dicts, in a single pass over the rows."""
+    size = -(-len(obj_ids) // num_parts)  # ceiling division
+    parts = [obj_ids[i : i + size] for i in range(0, len(obj_ids), size)]
+    part_of = {obj_id: n for n, part in enumerate(parts) for obj_id in part}
+    names = ("obj_id", *PHOT_COLUMNS)
+    columns = [{name: [] for name in names} for _ in parts]
+    for row in rows:
+        part = columns[part_of[row[0]]]
+        for name, value in zip(names, row):
+            part[name].append(value)
+    return list(zip(parts, columns))
+
+
+async def write_phot_stats(session, rows):
+    """Insert or overwrite the PhotStat of every object in ``rows``."""
+    for start in range(0, len(rows), WRITE_BATCH_SIZE):
+        stmt = pg_insert(PhotStat).values(rows[start : start + WRITE_BATCH_SIZE])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["obj_id"],
+            set_={
+                **{name: stmt.excluded[name] for name in STAT_COLUMNS},
+                "modified": utcnow_naive(),
+            },
+        )
+        await session.execute(stmt)
+
+
+async def rebuild_chunk(session, rebuild, pool, num_workers):
+    """Rebuild the next chunk of ``rebuild``; return False once no objects are
+    left. Does not commit."""
+    stmt = sa.select(Obj.id).order_by(Obj.id).limit(rebuild.chunk_size)
+    if rebuild.last_obj_id is not None:
+        stmt = stmt.where(Obj.id > rebuild.last_obj_id)
+    obj_ids = (await session.scalars(stmt)).all()
+    if not obj_ids:
+        return False
+
+    rows = (
+        await session.execute(
+            sa.select(
+                Photometry.obj_id, *(getattr(Photometry, c) for c in PHOT_COLUMNS)
+            ).where(Photometry.obj_id.in_(obj_ids))
+        )
+    ).all()
+
+    loop = asyncio.get_running_loop()
+    results = await asyncio.gather(
+        *(
+            loop.run_in_executor(pool, compute_phot_stats, part, columns)
+            for part, columns in split_columns(obj_ids, rows, num_workers)
+        )
+    )
+    await write_phot_stats(session, [row for part in results for row in part])
+
+    rebuild.last_obj_id = obj_ids[-1]
+    rebuild.num_processed += len(obj_ids)
+    return True
+
+
+async def run_rebuild(rebuild_id, num_workers=DEFAULT_NUM_WORKERS):
+    """Run (or resume) one rebuild until it is done, cancelled or fails."""
+    async with models.async_plain_session_factory() as session:
+        rebuild = await session.get(PhotStatRebuild, rebuild_id)
+        if rebuild is None or rebuild.status not in ("pending", "running"):
+            return
+        if rebuild.num_total is None:
+            rebuild.num_total = await session.scalar(
+                sa.select(sa.func.count()).select_from(Obj)
+            )
+        rebuild.status = "running"
+        rebuild.started_at = utcnow_naive()
+        rebuild.num_processed_at_start = rebuild.num_processed
+        log(
+            f"Rebuilding PhotStats ({rebuild_id}): "
+            f"{rebuild.num_processed}/{rebuild.num_total} objects done"
+        )
+        await session.commit()
+
+    with ProcessPoolExecutor(max_workers=num_workers) as pool:
+        while True:
+            async with models.async_plain_session_factory() as session:
+                # re-read each chunk so a cancellation is noticed
+                rebuild = await session.get(
+                    PhotStatRebuild, rebuild_id, with_for_update=True
+                )
+                if rebuild.status != "running":
+                    log(f"PhotStat rebuild {rebuild_id} is {rebuild.status}, stopping")
+                    return
+                try:
+                    more = await rebuild_chunk(session, rebuild, pool, num_workers)
+                except Exception as e:
+                    await session.rollback()
+                    await mark_failed(rebuild_id, str(e))
+                    raise
+                if not more:
+                    rebuild.status = "done"
+                    rebuild.finished_at = utcnow_naive()
+                    log(
+                        f"PhotStat rebuild {rebuild_id} done "
+                        f"({rebuild.num_processed} objects)"
+                    )
+                await session.commit()
+                if not more:
+                    return
+
+
+async def mark_failed(rebuild_id, error):
+    async with models.async_plain_session_factory() as session:
+        await session.execute(
+            sa.update(PhotStatRebuild)
+            .where(PhotStatRebuild.id == rebuild_id)
+            .values(status="failed", error=error, finished_at=utcnow_naive())
+        )
+        await session.commit()
+
+
+async def run_pending(num_workers=DEFAULT_NUM_WORKERS):
+    """Run every unfinished rebuild, oldest first. Returns how many ran."""
+    async with models.async_plain_session_factory() as session:
+        rebuild_ids = (
+            await session.scalars(
+                sa.select(PhotStatRebuild.id)
+                .where(PhotStatRebuild.status.in_(["pending", "running"]))
+                .order_by(PhotStatRebuild.created_at)
+            )
+        ).all()
+    for rebuild_id in rebuild_ids:
+        await run_rebuild(rebuild_id, num_workers=num_workers)
+    return len(rebuild_ids)
@@ -1,4 +1,20 @@
+import json
+import os
+
+import afterglowpy
+import astropy
+import healpy as hp
 import numpy as np
+import pandas as pd
+import simsurvey
+import sncosmo
+from astropy import units as u
+from astropy.coordinates import SkyCoord
+from astropy.time import Time
+from ligo.skymap.bayestar import rasterize
+from ligo.skymap.distance import parameters_to_marginal_moments
+from simsurvey.models import AngularTimeSeriesSource
+from simsurvey.utils import model_tools
 
 from ..models import (
     cosmo,
@@ -81,3 +97,345 @@ def random_parameters_notheta(redshifts, model, r_v=2.0, ebv_rate=0.11, **kwargs
         amp.append(10 ** (-0.4 * cosmo.distmod(z).value))
 
     return {"amplitude": np.array(amp)}
+
+
+class NumpyEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, np.ndarray):
+            return obj.tolist()
+        return json.JSONEncoder.default(self, obj)
+
+
+def field_size(contour_summary):
+    """Width and height (in degrees) of a field, from its contour summary
+    Parameters
+    ----------
+    contour_summary : dict
+        The InstrumentField.contour_summary GeoJSON of the field
+    """
+
+    coordinates = np.squeeze(
+        np.array(contour_summary["features"][0]["geometry"]["coordinates"])
+    )
+    coords = SkyCoord(
+        coordinates[:, 0] * u.deg, coordinates[:, 1] * u.deg, frame="icrs"
+    )
+    width, height = None, None
+    for c1 in coords:
+        for c2 in coords:
+            dra, ddec = c1.spherical_offsets_to(c2)
+            dra = dra.to(u.deg)
+            ddec = ddec.to(u.deg)
+            if width is None and height is None:
+                width = dra
+                height = ddec
+            else:
+                if dra > width:
+                    width = dra
+                if ddec > height:
+                    height = ddec
+
+    return width.value, height.value
+
+
+def survey_pointings(observations, sensitivity_data):
+    """Get the simsurvey pointings of a set of observations
+    Parameters
+    ----------
+    observations : list of dict
+        The observations, with their field, filt, exposure_time, obstime
+        and (optionally) limmag
+    sensitivity_data : dict
+        The instrument's sensitivity data, per filter
+    """
+
+    keys = ["ra", "dec", "field_id", "limMag", "jd", "filter", "skynoise"]
+    pointings = {k: [] for k in keys}
+    for obs in observations:
+        nmag = -2.5 * np.log10(
+            np.sqrt(
+                sensitivity_data[obs["filt"]]["exposure_time"] / obs["exposure_time"]
+            )
+        )
+
+        if "limmag" in obs:
+            limMag = obs["limmag"]
+        else:
+            limMag = sensitivity_data[obs["filt"]]["limiting_magnitude"] + nmag
+        zp = sensitivity_data[obs["filt"]]["zeropoint"] + nmag
+
+        pointings["ra"].append(obs["field"]["ra"])
+        pointings["dec"].append(obs["field"]["dec"])
+        pointings["filter"].append(obs["filt"])
+        pointings["jd"].append(Time(obs["obstime"], format="datetime").jd)
+        pointings["field_id"].append(obs["field"]["field_id"])
+
+        pointings["limMag"].append(limMag)
+        pointings["skynoise"].append(10 ** (-0.4 * (limMag - zp)) / 5.0)
+        pointings["zp"] = zp
+
+    return pointings
+
+
+def localization_skymap(localization):
+    """Get the skymap and redshift range to draw transients from
+    Parameters
+    ----------
+    localization : skyportal.models.localization.Localization
+        The localization of the event
+
+    Returns
+    -------
+    dict
+        map_struct : dict
+            RING ordered probability (and distance) maps
+        z_range : list
+            Redshift range of the transients
+        trigger_jd : float
+            Time of the event
+    """
+
+    trigger_time = astropy.time.Time(localization.dateobs, format="datetime")
+
+    order = hp.nside2order(localization.nside)
+    t = rasterize(localization.table, order)
+
+    if {"DISTMU", "DISTSIGMA", "DISTNORM"}.issubset(set(t.colnames)):
+        result = t["PROB"], t["DISTMU"], t["DISTSIGMA"], t["DISTNORM"]
+        hp_data = hp.reorder(result, "NESTED", "RING")
+        map_struct = {}
+        map_struct["prob"] = hp_data[0]
+        map_struct["distmu"] = hp_data[1]
+        map_struct["distsigma"] = hp_data[2]
+
+        distmean, diststd = parameters_to_marginal_moments(
+            map_struct["prob"], map_struct["distmu"], map_struct["distsigma"]
+        )
+
+        distance_lower = astropy.coordinates.Distance(
+            np.max([1, (distmean - 5 * diststd)]) * u.Mpc
+        )
+        distance_upper = astropy.coordinates.Distance(
+            np.max([2, (distmean + 5 * diststd)]) * u.Mpc
+        )
+    else:
+        result = t["PROB"]
+        hp_data = hp.reorder(result, "NESTED", "RING")
+        map_struct = {}
+        map_struct["prob"] = hp_data
+        distance_lower = astropy.coordinates.Distance(1 * u.Mpc)
+        distance_upper = astropy.coordinates.Distance(1000 * u.Mpc)
+
+    return {
+        "map_struct": map_struct,
+        "z_range": [distance_lower.z, distance_upper.z],
+        "trigger_jd": trigger_time.jd,
+    }
+
+
+def transient_properties(model_name, optional_injection_parameters):
+    """Get the simsurvey light curve model of the injected transients
+    Parameters
+    ----------
+    model_name : str
+        Model to simulate efficiency for. Must be one of kilonova, afterglow, or linear.
+    optional_injection_parameters: dict
+        The model parameters, from get_simsurvey_parameters
+
+    Returns
+    -------
+    (transientprop, template) : tuple
+        The transientprop and template arguments of
+        simsurvey.get_transient_generator
+    """
+
+    if model_name == "kilonova":
+        phase, wave, cos_theta, flux = model_tools.read_possis_file(
+            optional_injection_parameters["injection_filename"]
+        )
+        transientprop = {
+            "lcmodel": sncosmo.Model(
+                AngularTimeSeriesSource(
+                    phase=phase, wave=wave, flux=flux, cos_theta=cos_theta
+                )
+            )
+        }
+        template = "AngularTimeSeriesSource"
+
+    elif model_name == "afterglow":
+        phases = np.linspace(
+            optional_injection_parameters["t_i"],
+            optional_injection_parameters["t_f"],
+            optional_injection_parameters["ntime"],
+        )
+        wave = np.linspace(
+            optional_injection_parameters["lambda_min"],
+            optional_injection_parameters["lambda_max"],
+            optional_injection_parameters["nlambda"],
+        )
+        nu = 3e8 / (wave * 1e-10)
+
+        grb_param_keys = [
+            "jetType",
+            "specType",
+            "thetaObs",
+            "E0",
+            "thetaCore",
+            "thetaWing",
+            "n0",
+            "p",
+            "epsilon_e",
+            "epsilon_B",
+            "z",
+            "d_L",
+            "xi_N",
+        ]
+        grb_params = {k: optional_injection_parameters[k] for k in grb_param_keys}
+        # explicitly case E0 and d_L as float as they like to be an int
+        grb_params["E0"] = float(grb_params["E0"])
+        grb_params["d_L"] = float(grb_params["d_L"])
+
+        flux = []
+        for phase in phases:
+            t = phase * np.ones(nu.shape)
+            mJys = afterglowpy.fluxDensity(t, nu, **grb_params)
+            Jys = 1e-3 * mJys
+            # convert to erg/s/cm^2/A
+            flux.append(Jys * 2.99792458e-05 / (wave**2))
+        transientprop = {
+            "lcmodel": sncosmo.Model(
+                sncosmo.TimeSeriesSource(phases, wave, np.array(flux))
+            ),
+            "lcsimul_func": random_parameters_notheta,
+        }
+        template = None
+
+    elif model_name == "linear":
+        phases = np.linspace(
+            optional_injection_parameters["t_i"],
+            optional_injection_parameters["t_f"],
+            optional_injection_parameters["ntime"],
+        )
+        wave = np.linspace(
+            optional_injection_parameters["lambda_min"],
+            optional_injection_parameters["lambda_max"],
+            optional_injection_parameters["nlambda"],
+        )
+        magdiff = (
+            optional_injection_parameters["mag"]
+            + phases * optional_injection_parameters["dmag"]
+        )
+        F_Lxlambda2 = 10 ** (-(magdiff + 2.406) / 2.5)
+        waves, F_Lxlambda2s = np.meshgrid(wave, F_Lxlambda2)
+        flux = F_Lxlambda2s / (waves) ** 2
+        transientprop = {
+            "lcmodel": sncosmo.Model(sncosmo.TimeSeriesSource(phases, wave, flux)),
+            "lcsimul_func": random_parameters_notheta,
+        }
+        template = None
+
+    return transientprop, template
+
+
+def simulate_lightcurves(
+    pointings,
+    skymap,
+    width,
+    height,
+    number_of_injections=1000,
+    number_of_detections=2,
+    detection_threshold=5,
+    minimum_phase=0,
+    maximum_phase=3,
+    model_name="kilonova",
+    optional_injection_parameters=None,
+):
+    """Inject transients in a skymap and simulate their light curves
+    Parameters
+    ----------
+    pointings : dict
+        The observations, from survey_pointings
+    skymap : dict
+        The localization's skymap, from localization_skymap
+    width : float
+        Width of the telescope field of view in degrees.
+    height : float
+        Height of the telescope field of view in degrees.
+    number_of_injections : int
+        Number of simulations to evaluate efficiency with. Defaults to 1000.
+    number_of_detections : int
+        Number of detections required for detection. Defaults to 2.
+    detection_threshold : int
+        Threshold (in sigmas) required for detection. Defaults to 5.
+    minimum_phase : int
+        Minimum phase (in days) post event time to consider detections. Defaults to 0.
+    maximum_phase : int
+        Maximum phase (in days) post event time to consider detections. Defaults to 3.
+    model_name : str
+        Model to simulate efficiency for. Must be one of kilonova, afterglow, or linear. Defaults to kilonova.
+    optional_injection_parameters: dict
+        Optional parameters to specify the injection type, along with a list of possible values (to be used in a dropdown UI)
+
+    Returns
+    -------
+    dict
+        The simulated simsurvey.simulsurvey.LightcurveCollection (lcs, meta,
+        meta_rejected, meta_notobserved, stats and side), as JSON
+        serializable values
+    """
+
+    from baselayer.app.env import load_env
+
+    _, cfg = load_env()
+
+    df = pd.DataFrame.from_dict(pointings)
+    plan = simsurvey.SurveyPlan(
+        time=df["jd"],
+        band=df["filter"],
+        obs_field=df["field_id"].astype(int),
+        skynoise=df["skynoise"],
+        zp=df["zp"],
+        width=width,
+        height=height,
+        fields={k: v for k, v in pointings.items() if k in ["ra", "dec", "field_id"]},
+    )
+
+    transientprop, template = transient_properties(
+        model_name, optional_injection_parameters or {}
+    )
+
+    tr = simsurvey.get_transient_generator(
+        skymap["z_range"],
+        transient="generic",
+        template=template,
+        ntransient=number_of_injections,
+        ratefunc=lambda z: 5e-7,
+        dec_range=(-90, 90),
+        ra_range=(0, 360),
+        mjd_range=(skymap["trigger_jd"], skymap["trigger_jd"]),
+        transientprop=transientprop,
+        skymap=skymap["map_struct"],
+        sfd98_dir=os.path.join(cfg["misc.dustmap_folder"], "sfd"),
+        apply_mwebv=True,
+    )
+
+    survey = simsurvey.SimulSurvey(
+        generator=tr,
+        plan=plan,
+        phase_range=(minimum_phase, maximum_phase),
+        n_det=number_of_detections,
+        threshold=detection_threshold,
+    )
+
+    lcs = survey.get_lightcurves(notebook=True)
+
+    data = {
+        "lcs": lcs._properties["lcs"],
+        "meta": lcs._properties["meta"],
+        "meta_rejected": lcs._properties["meta_rejected"],
+        "meta_notobserved": lcs._properties["meta_notobserved"],
+        "stats": lcs._derived_properties["stats"],
+        "side": lcs._side_properties,
+    }
+
+    return json.loads(json.dumps(data, cls=NumpyEncoder))
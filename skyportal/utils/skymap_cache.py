@@ -0,0 +1,161 @@
+"""Cache of rasterized localization skymaps.
+
+``Localization.flat_2d`` and ``Localization.flat`` rasterize the
+multi-order skymap to a flat HEALPix grid (3 million pixels at nside 512),
+which takes seconds and is repeated by every consumer: galaxy probabilities,
+follow-up priorities, observation plans, contours, and so on.
+:func:`cached_raster` computes each raster once, saves it as a ``.npy`` file
+next to the localization's data, and memory-maps it afterwards. The mapped
+arrays are kept in a small in-process LRU, so repeated reads in one process
+return the same array without any I/O or copying.
+
+A localization's arrays are never updated after it is created, so a raster is
+identified by the localization id, nside, kind (``"2d"`` for the probability
+only, ``"3d"`` for probability and distance), and a fingerprint of the row
+(see :func:`fingerprint`) that keeps a file left over from a reset database
+from being served for a new localization reusing the id. The files live in the
+localization's data folder and are removed with it (see :func:`evict`).
+
+Cached arrays are read-only; callers that need to modify one must copy it.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from baselayer.log import make_log
+
+log = make_log("skymap_cache")
+
+DEFAULT_MAX_ITEMS = 8
+
+_lru = OrderedDict()
+_lock = threading.Lock()
+_max_items = None
+
+
+def max_items():
+    """Number of rasters kept mapped in this process (``misc.skymap_cache_size``)."""
+    global _max_items
+    if _max_items is None:
+        from baselayer.app.env import load_env
+
+        _, cfg = load_env()
+        _max_items = int(cfg.get("misc.skymap_cache_size", DEFAULT_MAX_ITEMS))
+    return _max_items
+
+
+def fingerprint(*values):
+    """Short digest of the values identifying a localization's content."""
+    text = "|".join(str(value) for value in values)
+    return hashlib.sha1(text.encode()).hexdigest()[:12]
+
+
+def raster_path(directory, nside, kind, digest):
+    """File holding the ``kind`` raster at ``nside`` in ``directory``."""
+    return os.path.join(directory, f"flat_{kind}_nside{nside}_{digest}.npy")
+
+
+def _remember(key, array):
+    with _lock:
+        _lru[key] = array
+        _lru.move_to_end(key)
+        while len(_lru) > max(max_items(), 0):
+            _lru.popitem(last=False)
+
+
+def _write(path, array):
+    """Save ``array`` to ``path`` atomically, so concurrent readers never map
+    a partially written file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path), prefix=".", suffix=".npy.tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def cached_raster(localization_id, digest, directory, nside, kind, rasterize):
+    """Return the ``kind`` raster of a localization at ``nside``.
+
+    Parameters
+    ----------
+    localization_id : int or None
+        Localization the raster belongs to. Without an id (a localization that
+        has not been flushed yet) nothing is cached.
+    digest : str
+        :func:`fingerprint` of the localization.
+    directory : str
+        Folder the raster file is stored in.
+    nside : int
+        HEALPix resolution of the raster.
+    kind : str
+        Name distinguishing rasters of the same localization.
+    rasterize : callable
+        Computes the raster (a numpy array) when it is not cached.
+
+    Returns
+    -------
+    numpy.ndarray
+        Read-only when it comes from the cache.
+    """
+    if localization_id is None:
+        return rasterize()
+
+    key = (localization_id, nside, kind, digest)
+    with _lock:
+        array = _lru.get(key)
+        if array is not None:
+            _lru.move_to_end(key)
+            return array
+
+    path = raster_path(directory, nside, kind, digest)
+    try:
+        array = np.load(path, mmap_mode="r")
+    except FileNotFoundError:
+        array = None
+    except (OSError, ValueError) as e:
+        log(f"Ignoring unreadable skymap cache file {path}: {e}")
+        array = None
+
+    if array is None:
+        array = rasterize()
+        try:
+            _write(path, array)
+            array = np.load(path, mmap_mode="r")
+        except OSError as e:
+            log(f"Could not cache skymap of localization {localization_id}: {e}")
+            return array
+
+    _remember(key, array)
+    return array
+
+
+def evict(localization_id, directory=None):
+    """Forget the rasters of a localization, and delete their files from
+    ``directory`` (and the directory itself if that leaves it empty)."""
+    with _lock:
+        for key in [key for key in _lru if key[0] == localization_id]:
+            del _lru[key]
+    if directory is None or not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        if name.startswith("flat_") and name.endswith(".npy"):
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+    try:
+        os.rmdir(directory)
+    except OSError:
+        pass  # still holds the localization's own files
@@ -0,0 +1,106 @@
+"""Multi-order skymaps stored as FITS files next to their localization.
+
+``Localization.uniq``, ``probdensity`` and the distance arrays are multi-MB
+PostgreSQL arrays; loading them through the ORM turns them into Python lists
+before they become NumPy arrays again. Each localization's multi-order map is
+therefore also written, once, to an uncompressed FITS binary table in its
+data folder (:func:`write`), and read back memory-mapped (:func:`read`): the
+columns are views of the file, paged in as they are used, and shared between
+the processes reading the same localization.
+
+With ``misc.localization_storage: file`` the database arrays are cleared once
+the file is written, so that localizations are only ever read from disk (see
+:func:`store_arrays_in_database`); with the default, ``database``, the file is
+a cache in front of the columns. Localizations without a file are read from
+the database either way.
+
+The columns are big-endian, as FITS requires; NumPy and the ligo.skymap
+functions handle them transparently.
+"""
+
+import os
+import tempfile
+
+import numpy as np
+from astropy.io import fits
+from astropy.table import Table
+
+from baselayer.log import make_log
+
+log = make_log("skymap_file")
+
+FILENAME = "skyportal_multiorder.fits"
+
+COLUMNS = ("UNIQ", "PROBDENSITY", "DISTMU", "DISTSIGMA", "DISTNORM")
+
+STORAGE_MODES = ("database", "file")
+
+
+def store_arrays_in_database():
+    """Whether localization arrays are kept in the database
+    (``misc.localization_storage``)."""
+    from baselayer.app.env import load_env
+
+    _, cfg = load_env()
+    storage = cfg.get("misc.localization_storage", "database")
+    if storage not in STORAGE_MODES:
+        raise ValueError(
+            f"misc.localization_storage must be one of {STORAGE_MODES}, not {storage!r}"
+        )
+    return storage == "database"
+
+
+def skymap_path(directory):
+    """The multi-order skymap file of the localization stored in ``directory``."""
+    return os.path.join(directory, FILENAME)
+
+
+def write(path, uniq, probdensity, distmu=None, distsigma=None, distnorm=None):
+    """Save a multi-order skymap to ``path`` as a FITS binary table.
+
+    The file is written atomically, so readers never map a partial file.
+    The distance columns are only written when all three are given.
+    """
+    columns = [np.asarray(uniq, dtype=np.int64), np.asarray(probdensity, float)]
+    if distmu is not None and distsigma is not None and distnorm is not None:
+        columns += [np.asarray(c, dtype=float) for c in (distmu, distsigma, distnorm)]
+    table = Table(columns, names=COLUMNS[: len(columns)])
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".fits.tmp")
+    os.close(fd)
+    try:
+        table.write(tmp_path, format="fits", overwrite=True)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def read(path):
+    """Memory-mapped columns of the multi-order skymap saved at ``path``.
+
+    Returns
+    -------
+    dict or None
+        Column name (``COLUMNS``) to read-only array; the distance columns
+        are None for 2D skymaps. None if there is no readable file.
+    """
+    try:
+        with fits.open(path, memmap=True, mode="readonly") as hdul:
+            data = hdul[1].data
+            # the arrays keep the mapping open after the file is closed
+            arrays = {name: data[name] for name in data.columns.names}
+        for array in arrays.values():
+            array.flags.writeable = False
+    except FileNotFoundError:
+        return None
+    except (OSError, IndexError, KeyError, ValueError) as e:
+        log(f"Ignoring unreadable skymap file {path}: {e}")
+        return None
+    if "UNIQ" not in arrays or "PROBDENSITY" not in arrays:
+        log(f"Ignoring skymap file {path} without UNIQ and PROBDENSITY")
+        return None
+    return {name: arrays.get(name) for name in COLUMNS}
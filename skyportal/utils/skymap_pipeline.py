@@ -0,0 +1,168 @@
+"""Staged post-processing of new GCN localizations.
+
+A new localization needs tiles, credible regions, properties, tags and
+contours before it can be used for crossmatches and observation plans.
+``add_tiles_and_properties_and_contour`` runs them as stages:
+
+1. ``skymap_file``: the multi-order arrays are saved to the localization's
+   skymap file (see ``skymap_file``), from which the next stages read them.
+   ``rasterize``: the flat skymap is computed once (and cached on disk, see
+   ``skymap_cache``).
+2. ``properties`` and ``contour`` run in a process pool on plain arrays,
+   while the calling thread inserts the ``tiles`` and credible regions.
+3. ``tags``: properties, localization tags and default GCN tags are written
+   once the properties are known, since default tags filter on them.
+4. ``contour_write``: the contour is saved.
+
+Each stage's duration is logged and recorded in the
+``skymap_pipeline.stage.duration`` histogram, and the time from the
+localization's creation to the end of the pipeline in
+``skymap_pipeline.ready.latency``, the part of notice-to-plan latency spent
+here.
+
+The pool uses the ``spawn`` start method, as the callers are threads of
+multi-threaded processes where forking is unsafe; workers only import the
+array functions of ``skyportal.utils.gcn``.
+"""
+
+import multiprocessing
+import threading
+import time
+from concurrent.futures import BrokenExecutor, Future, ProcessPoolExecutor
+from contextlib import contextmanager
+
+from baselayer.log import make_log
+
+log = make_log("skymap_pipeline")
+
+DEFAULT_NUM_WORKERS = 2
+
+_pool = None
+_pool_lock = threading.Lock()
+_metrics = None
+
+
+def get_pool():
+    """The process-wide worker pool (``misc.skymap_pipeline_workers``
+    processes), or None when that is 0 and stages run inline."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            from baselayer.app.env import load_env
+
+            _, cfg = load_env()
+            num_workers = int(
+                cfg.get("misc.skymap_pipeline_workers", DEFAULT_NUM_WORKERS)
+            )
+            if num_workers <= 0:
+                return None
+            _pool = ProcessPoolExecutor(
+                max_workers=num_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def _discard_pool(pool):
+    """Drop a broken ``pool``, so that it is recreated on next use."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def submit(fn, *args):
+    """Run ``fn(*args)`` in the pool; returns a Future. Runs inline when the
+    pool is disabled, or broken (a worker died), in which case it is
+    recreated on next use. A worker dying while running ``fn`` is handled
+    by `StageTimer.wait`."""
+    pool = get_pool()
+    if pool is not None:
+        try:
+            future = pool.submit(fn, *args)
+        except RuntimeError as e:  # BrokenProcessPool, or shut down
+            log(f"Skymap pipeline pool unavailable ({e}); running inline")
+            _discard_pool(pool)
+        else:
+            future.skymap_call = (pool, fn, args)
+            return future
+    future = Future()
+    try:
+        future.set_result(fn(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def _get_metrics():
+    global _metrics
+    if _metrics is None:
+        from .observability import get_meter
+
+        meter = get_meter("skyportal.skymap_pipeline")
+        _metrics = (
+            meter.create_histogram(
+                "skymap_pipeline.stage.duration",
+                unit="s",
+                description="Time spent per localization post-processing stage.",
+            ),
+            meter.create_histogram(
+                "skymap_pipeline.ready.latency",
+                unit="s",
+                description="Time from a localization's creation to the end of "
+                "its post-processing.",
+            ),
+        )
+    return _metrics
+
+
+class StageTimer:
+    """Times the stages of one localization's pipeline."""
+
+    def __init__(self, localization_id):
+        self.localization_id = localization_id
+        self.durations = {}
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def record(self, name, seconds):
+        self.durations[name] = seconds
+        _get_metrics()[0].record(seconds, {"stage": name})
+
+    def wait(self, name, future, started):
+        """Result of a pool ``future`` (from `submit`), recording its stage as
+        lasting from ``started`` (a ``time.perf_counter()``) until it
+        completed. If the pool broke while running it, the function is run
+        again inline."""
+        try:
+            try:
+                return future.result()
+            except BrokenExecutor as e:
+                pool, fn, args = future.skymap_call
+                log(
+                    f"Skymap pipeline pool broke during {name} of localization "
+                    f"{self.localization_id} ({e}); running it inline"
+                )
+                _discard_pool(pool)
+                return fn(*args)
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def finish(self, created_at=None):
+        """Log the stage durations and record the creation-to-ready latency
+        (``created_at`` is a naive UTC datetime)."""
+        summary = ", ".join(f"{k} {v:.2f}s" for k, v in self.durations.items())
+        if created_at is not None:
+            from .naive_datetime import utcnow_naive
+
+            latency = (utcnow_naive() - created_at).total_seconds()
+            _get_metrics()[1].record(latency)
+            summary += f"; ready {latency:.1f}s after creation"
+        log(f"Localization {self.localization_id} processed: {summary}")
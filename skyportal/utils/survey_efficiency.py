@@ -0,0 +1,576 @@
+"""Survey efficiency analyses of executed observations, run by a queue.
+
+Simulating the light curves of an analysis' injected transients took
+minutes on a web worker's executor, in one thread. The
+``survey_efficiency_queue`` service instead takes the
+SurveyEfficiencyForObservations analyses in order of creation and splits
+their ``number_of_injections`` into batches (:func:`batch_sizes`), simulated
+on a pool of ``survey_efficiency.num_workers`` processes. The injections are
+independent draws, so the light curve collections of the batches are merged
+(:func:`merge_lightcurves`) into the analysis' ``lightcurves`` as they
+complete, along with ``injections_completed``: partial results are visible
+while the analysis runs, and an analysis interrupted by a restart resumes
+with the injections left.
+
+The observations of an analysis (a localization query over the time window)
+and the field size are cached on disk (:func:`observation_table`), so other
+analyses of the same localization, instrument and time window, e.g. with
+another transient model, skip that query. The cache key includes the count
+and latest modification of the instrument's observations in the window, so
+observations ingested afterwards are not missed.
+"""
+
+import asyncio
+import json
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import sqlalchemy as sa
+from astropy.time import Time
+from sqlalchemy.orm import joinedload
+
+from baselayer.log import make_log
+
+from ..models import (
+    DBSession,
+    ExecutedObservation,
+    Instrument,
+    InstrumentField,
+    Localization,
+    SurveyEfficiencyForObservations,
+    User,
+)
+from .cache import Cache, bytes_to_dict, dict_to_bytes
+
+log = make_log("survey_efficiency")
+
+DEFAULT_NUM_WORKERS = 4
+
+# Injections per batch, i.e. between checkpoints, at most.
+DEFAULT_BATCH_SIZE = 100
+
+PENDING = "pending submission"
+RUNNING = "running"
+COMPLETE = "complete"
+FAILED = "failed"
+
+META_KEYS = ("meta", "meta_rejected", "meta_notobserved")
+
+# Observation fields kept in the cached tables, see survey_pointings.
+OBSERVATION_KEYS = ("filt", "exposure_time", "limmag", "obstime")
+FIELD_KEYS = ("id", "field_id", "ra", "dec")
+
+_cache = None
+
+# Skymap of the analysis a worker is simulating, by localization ID.
+_skymaps = {}
+
+
+def observations_cache():
+    """Disk cache of the observation tables of analyses."""
+    global _cache
+    if _cache is None:
+        from baselayer.app.env import load_env
+
+        _, cfg = load_env()
+        _cache = Cache(
+            cache_dir="cache/survey_efficiency_observations",
+            max_items=cfg.get("survey_efficiency.max_cached_observation_tables", 20),
+            max_age=cfg.get("survey_efficiency.hours_to_keep_observation_tables", 24)
+            * 60
+            * 60,
+        )
+    return _cache
+
+
+def batch_sizes(number_of_injections, num_workers, max_batch_size=DEFAULT_BATCH_SIZE):
+    """Split injections in batches, at least one per worker process.
+
+    Parameters
+    ----------
+    number_of_injections : int
+        Number of transients left to inject.
+    num_workers : int
+        Number of processes simulating batches.
+    max_batch_size : int, optional
+        Maximum number of injections per batch.
+
+    Returns
+    -------
+    list of int
+    """
+    if number_of_injections <= 0:
+        return []
+    size = min(math.ceil(number_of_injections / max(num_workers, 1)), max_batch_size)
+    sizes = [size] * (number_of_injections // size)
+    if number_of_injections % size:
+        sizes.append(number_of_injections % size)
+    return sizes
+
+
+def _concat_columns(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return {key: a[key] + b[key] for key in a}
+
+
+def _merge_stats(a, b, num_bins):
+    """Merge LightcurveCollection stats, which have one row per detected
+    transient; bands a collection has no detection in are padded the way
+    simsurvey pads them (no points, and a maximum magnitude of 99)."""
+    n_a, n_b = len(a["p_det"]), len(b["p_det"])
+    stats = {key: a[key] + b[key] for key in ("p_det", "p_last", "dt_det")}
+
+    def rows(binned, band, n):
+        return binned.get(band) or [[0] * num_bins for _ in range(n)]
+
+    p_binned = {}
+    for band in dict.fromkeys([*a["p_binned"], *b["p_binned"]]):
+        p_binned[band] = rows(a["p_binned"], band, n_a) + rows(b["p_binned"], band, n_b)
+    if not p_binned.get("all"):
+        p_binned["all"] = None
+    stats["p_binned"] = p_binned
+
+    stats["mag_max"] = {
+        band: a["mag_max"].get(band, [99.0] * n_a)
+        + b["mag_max"].get(band, [99.0] * n_b)
+        for band in dict.fromkeys([*a["mag_max"], *b["mag_max"]])
+    }
+    return stats
+
+
+def merge_lightcurves(merged, data):
+    """Merge the light curves of a batch into those of the analysis.
+
+    Parameters
+    ----------
+    merged : dict or None
+        The analysis' light curves so far (see
+        skyportal.utils.simsurvey.simulate_lightcurves), None before the
+        first batch.
+    data : dict
+        The light curves of the batch.
+
+    Returns
+    -------
+    dict
+        The light curves of both; the transients of the batch are numbered
+        (``idx_orig``) after those already merged.
+    """
+    offset = 0
+    if merged is not None:
+        offset = sum(
+            len(merged[key]["z"]) for key in META_KEYS if merged[key] is not None
+        )
+    data = dict(data)
+    for key in META_KEYS:
+        if data[key] is not None and "idx_orig" in data[key]:
+            data[key] = {
+                **data[key],
+                "idx_orig": [idx + offset for idx in data[key]["idx_orig"]],
+            }
+    if merged is None:
+        return data
+
+    side = merged["side"] or data["side"]
+    lcs = None
+    if merged["lcs"] is not None or data["lcs"] is not None:
+        lcs = (merged["lcs"] or []) + (data["lcs"] or [])
+    return {
+        "lcs": lcs,
+        **{key: _concat_columns(merged[key], data[key]) for key in META_KEYS},
+        "stats": _merge_stats(merged["stats"], data["stats"], len(side["p_bins"]) - 1),
+        "side": side,
+    }
+
+
+def num_workers():
+    """Number of processes simulating batches (``survey_efficiency.num_workers``)."""
+    from baselayer.app.env import load_env
+
+    _, cfg = load_env()
+    return max(int(cfg.get("survey_efficiency.num_workers", DEFAULT_NUM_WORKERS)), 1)
+
+
+def _init_worker():
+    from baselayer.app.env import load_env
+    from baselayer.app.models import init_db
+
+    _, cfg = load_env()
+    init_db(**cfg["database"])
+
+
+def create_pool(max_workers=None):
+    """Pool of processes running :func:`simulate_batch`; uses the ``spawn``
+    start method, as the queue service holds database connections that must
+    not be shared with forked children."""
+    return ProcessPoolExecutor(
+        max_workers=max_workers or num_workers(),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+    )
+
+
+def simulate_batch(localization_id, pointings, width, height, parameters, size):
+    """Simulate the light curves of a batch of injections, in a worker process.
+
+    Parameters
+    ----------
+    localization_id : int
+        The localization the transients are drawn from.
+    pointings : dict
+        The observations, from skyportal.utils.simsurvey.survey_pointings.
+    width, height : float
+        Size of the telescope field of view in degrees.
+    parameters : dict
+        The remaining arguments of
+        skyportal.utils.simsurvey.simulate_lightcurves (model, detection
+        criteria and phase range).
+    size : int
+        Number of transients to inject.
+
+    Returns
+    -------
+    dict
+        The simulated light curves.
+    """
+    from .simsurvey import localization_skymap, simulate_lightcurves
+
+    if localization_id not in _skymaps:
+        with DBSession() as session:
+            localization = session.scalar(
+                sa.select(Localization).where(Localization.id == localization_id)
+            )
+            if localization is None:
+                raise ValueError(f"No localization with ID {localization_id}")
+            _skymaps.clear()
+            _skymaps[localization_id] = localization_skymap(localization)
+
+    return simulate_lightcurves(
+        pointings,
+        _skymaps[localization_id],
+        width,
+        height,
+        number_of_injections=size,
+        **parameters,
+    )
+
+
+def time_window(payload):
+    """Start and end dates of the observations of an analysis."""
+    return Time(payload["start_date"]).datetime, Time(payload["end_date"]).datetime
+
+
+def observation_table_key(session, analysis):
+    """Cache key of the observation table of an analysis."""
+    payload = analysis.payload
+    start_date, end_date = time_window(payload)
+    count, last_modified = session.execute(
+        sa.select(
+            sa.func.count(ExecutedObservation.id),
+            sa.func.max(ExecutedObservation.modified),
+        ).where(
+            ExecutedObservation.instrument_id == analysis.instrument_id,
+            ExecutedObservation.obstime >= start_date,
+            ExecutedObservation.obstime <= end_date,
+        )
+    ).one()
+    return (
+        f"{analysis.instrument_id}_{analysis.localization_id}_"
+        f"{payload['start_date']}_{payload['end_date']}_"
+        f"{payload['localization_cumprob']}_{count}_{last_modified}"
+    )
+
+
+async def _fetch_observation_table(
+    requester_id, instrument_id, localization_id, payload
+):
+    from baselayer.app import models
+    from baselayer.app.models import AsyncVerifiedSession
+
+    from ..handlers.api.observation import MAX_OBSERVATIONS, get_observations
+
+    start_date, end_date = time_window(payload)
+    async with models.async_plain_session_factory() as session:
+        user = await session.get(User, requester_id)
+        instrument = await session.scalar(
+            sa.select(Instrument)
+            .options(joinedload(Instrument.telescope))
+            .where(Instrument.id == instrument_id)
+        )
+        localization = await session.get(Localization, localization_id)
+        async with AsyncVerifiedSession(user) as asession:
+            data = await get_observations(
+                asession,
+                start_date,
+                end_date,
+                telescope_name=instrument.telescope.name,
+                instrument_name=instrument.name,
+                localization_dateobs=localization.dateobs,
+                localization_name=localization.localization_name,
+                localization_cumprob=payload["localization_cumprob"],
+                n_per_page=MAX_OBSERVATIONS,
+            )
+
+        observations = [
+            {
+                **{key: obs[key] for key in OBSERVATION_KEYS if key in obs},
+                "field": {key: obs["field"][key] for key in FIELD_KEYS},
+            }
+            for obs in data["observations"]
+        ]
+        if len(observations) == 0:
+            return {"observations": observations}
+
+        contour_summary = await session.scalar(
+            sa.select(InstrumentField.contour_summary).where(
+                InstrumentField.id == observations[0]["field"]["id"]
+            )
+        )
+    if contour_summary is None:
+        raise ValueError(
+            f"Missing field {observations[0]['field']['id']} required to estimate field size"
+        )
+
+    from .simsurvey import field_size
+
+    width, height = field_size(contour_summary)
+    return {"observations": observations, "width": width, "height": height}
+
+
+def observation_table(session, analysis):
+    """The observations of an analysis, and the size of their fields.
+
+    Parameters
+    ----------
+    session : sqlalchemy.orm.Session
+        Session the analysis was loaded with.
+    analysis : skyportal.models.SurveyEfficiencyForObservations
+        The analysis.
+
+    Returns
+    -------
+    dict
+        ``observations`` (dicts with their field), and the ``width`` and
+        ``height`` of the fields in degrees if there are observations.
+    """
+    cache = observations_cache()
+    key = observation_table_key(session, analysis)
+    cached = cache[key]
+    if cached is not None:
+        return bytes_to_dict(cached.read_bytes())
+
+    table = asyncio.run(
+        _fetch_observation_table(
+            analysis.requester_id,
+            analysis.instrument_id,
+            analysis.localization_id,
+            analysis.payload,
+        )
+    )
+    cache[key] = dict_to_bytes(table)
+    return table
+
+
+def check_observations(observations, sensitivity_data):
+    """Raise a ValueError if the instrument's sensitivity data does not
+    cover the observations."""
+    if len(observations) == 0:
+        raise ValueError("Need at least one observation to run SimSurvey")
+    if sensitivity_data is None:
+        raise ValueError("Need sensitivity_data to evaluate efficiency")
+
+    unique_filters = list({observation["filt"] for observation in observations})
+
+    if not set(unique_filters).issubset(set(sensitivity_data.keys())):
+        raise ValueError("Need sensitivity_data for all filters present")
+
+    for filt in unique_filters:
+        if not {"exposure_time", "limiting_magnitude", "zeropoint"}.issubset(
+            set(sensitivity_data[filt].keys())
+        ):
+            raise ValueError(
+                f"Sensitivity_data dictionary missing keys for filter {filt}"
+            )
+
+
+def claim_analysis(statuses=(PENDING,)):
+    """Mark the oldest analysis with one of ``statuses`` running.
+
+    Returns
+    -------
+    int or None
+        Its ID, None if there is no such analysis.
+    """
+    with DBSession() as session:
+        analysis = session.scalar(
+            sa.select(SurveyEfficiencyForObservations)
+            .where(SurveyEfficiencyForObservations.status.in_(statuses))
+            .order_by(SurveyEfficiencyForObservations.created_at)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        if analysis is None:
+            return None
+        analysis.status = RUNNING
+        session.commit()
+        return analysis.id
+
+
+def interrupted_analyses():
+    """IDs of the analyses left running by a previous run of the queue."""
+    with DBSession() as session:
+        return session.scalars(
+            sa.select(SurveyEfficiencyForObservations.id)
+            .where(SurveyEfficiencyForObservations.status == RUNNING)
+            .order_by(SurveyEfficiencyForObservations.created_at)
+        ).all()
+
+
+def checkpoint(analysis_id, lightcurves, injections_completed, status):
+    """Record the light curves of an analysis so far."""
+    with DBSession() as session:
+        session.execute(
+            sa.update(SurveyEfficiencyForObservations)
+            .where(SurveyEfficiencyForObservations.id == analysis_id)
+            .values(
+                lightcurves=json.dumps(lightcurves),
+                injections_completed=injections_completed,
+                status=status,
+            )
+        )
+        session.commit()
+
+
+def mark_failed(analysis_id, error):
+    """Mark an analysis failed, and tell its requester why."""
+    from baselayer.app.flow import Flow
+
+    with DBSession() as session:
+        analysis = session.scalar(
+            sa.select(SurveyEfficiencyForObservations).where(
+                SurveyEfficiencyForObservations.id == analysis_id
+            )
+        )
+        if analysis is None:
+            return
+        analysis.status = FAILED
+        requester_id = analysis.requester_id
+        session.commit()
+
+    Flow().push(
+        user_id=requester_id,
+        action_type="baselayer/SHOW_NOTIFICATION",
+        payload={
+            "note": f"Survey efficiency analysis {analysis_id} failed: {error}",
+            "type": "error",
+            "duration": 8000,
+        },
+    )
+
+
+def run_analysis(pool, analysis_id, num_workers, max_batch_size=DEFAULT_BATCH_SIZE):
+    """Run (or resume) a survey efficiency analysis on a process pool,
+    checkpointing its light curves after each batch.
+
+    Parameters
+    ----------
+    pool : concurrent.futures.ProcessPoolExecutor
+        Pool from :func:`create_pool`.
+    analysis_id : int
+        The SurveyEfficiencyForObservations to run.
+    num_workers : int
+        Number of processes of the pool.
+    max_batch_size : int, optional
+        Maximum number of injections per batch.
+
+    Raises
+    ------
+    ValueError
+        If the analysis cannot be run (no observations, missing
+        sensitivity data, ...).
+    """
+    from baselayer.app.flow import Flow
+
+    from .simsurvey import survey_pointings
+
+    with DBSession() as session:
+        analysis = session.scalar(
+            sa.select(SurveyEfficiencyForObservations).where(
+                SurveyEfficiencyForObservations.id == analysis_id
+            )
+        )
+        if analysis is None:
+            raise ValueError(
+                f"No SurveyEfficiencyForObservations with ID {analysis_id}"
+            )
+        payload = analysis.payload
+        localization_id = analysis.localization_id
+        dateobs = analysis.localization.dateobs
+        sensitivity_data = analysis.instrument.sensitivity_data
+        injections_completed = analysis.injections_completed
+        merged = None
+        if injections_completed > 0 and analysis.lightcurves is not None:
+            merged = json.loads(analysis.lightcurves)
+        else:
+            injections_completed = 0
+        table = observation_table(session, analysis)
+
+    check_observations(table["observations"], sensitivity_data)
+    pointings = survey_pointings(table["observations"], sensitivity_data)
+    parameters = {
+        "number_of_detections": payload["number_of_detections"],
+        "detection_threshold": payload["detection_threshold"],
+        "minimum_phase": payload["minimum_phase"],
+        "maximum_phase": payload["maximum_phase"],
+        "model_name": payload["model_name"],
+        "optional_injection_parameters": payload["optional_injection_parameters"],
+    }
+
+    number_of_injections = payload["number_of_injections"]
+    sizes = batch_sizes(
+        number_of_injections - injections_completed,
+        num_workers,
+        max_batch_size,
+    )
+    log(
+        f"Simulating {number_of_injections - injections_completed} injections of "
+        f"analysis {analysis_id} in {len(sizes)} batches"
+    )
+    futures = {
+        pool.submit(
+            simulate_batch,
+            localization_id,
+            pointings,
+            table["width"],
+            table["height"],
+            parameters,
+            size,
+        ): size
+        for size in sizes
+    }
+    flow = Flow()
+    try:
+        for future in as_completed(futures):
+            merged = merge_lightcurves(merged, future.result())
+            injections_completed += futures[future]
+            done = injections_completed >= number_of_injections
+            checkpoint(
+                analysis_id, merged, injections_completed, COMPLETE if done else RUNNING
+            )
+            flow.push(
+                "*",
+                "skyportal/REFRESH_GCNEVENT_SURVEY_EFFICIENCY",
+                payload={"gcnEvent_dateobs": dateobs},
+            )
+    finally:
+        for future in futures:
+            future.cancel()
+
+    if len(sizes) == 0:
+        # resumed after its last checkpoint
+        checkpoint(analysis_id, merged, injections_completed, COMPLETE)
+    log(f"Finished survey efficiency analysis for ID {analysis_id}")
@@ -20,6 +20,10 @@ Design notes:
   uses it.
 - When ``cache.enabled`` is false (the default), :func:`get_cache` returns a
   no-op cache so callers need no conditional logic.
+- Code that cannot await (sync handlers, model methods, the dict-like
+  ``SharedCache`` in :mod:`skyportal.utils.cache`) uses the blocking client
+  from :func:`get_sync_client` instead; ``SharedCache``'s coroutines await
+  the pooled async client from :func:`get_async_client`.
 """
 
 import json
@@ -116,6 +120,43 @@ class ValkeyCache:
             log(f"delete_prefix failed [{prefix}]: {e}")
         return deleted
 
+    async def publish(self, channel, message):
+        """Publish ``message`` on a pub/sub ``channel``. Returns success."""
+        try:
+            await self._connect().publish(channel, message)
+            return True
+        except Exception as e:
+            log(f"publish failed [{channel}]: {e}")
+            return False
+
+    async def subscribe(self, channel, retry_interval=5):
+        """Yield each message published on ``channel`` (decoded to str), forever.
+
+        A dropped connection is logged and retried after ``retry_interval``
+        seconds, so a long-running subscriber survives a Valkey restart.
+        """
+        import asyncio
+
+        while True:
+            pubsub = None
+            try:
+                pubsub = self._connect().pubsub()
+                await pubsub.subscribe(channel)
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    data = message["data"]
+                    yield data.decode() if isinstance(data, bytes) else data
+            except Exception as e:
+                log(f"subscribe failed [{channel}]: {e}")
+            finally:
+                if pubsub is not None:
+                    try:
+                        await pubsub.aclose()
+                    except Exception as e:
+                        log(f"closing subscription failed [{channel}]: {e}")
+            await asyncio.sleep(retry_interval)
+
 
 class _NoOpCache:
     """Stand-in used when caching is disabled, so callers never branch."""
@@ -138,6 +179,13 @@ class _NoOpCache:
     async def delete_prefix(self, prefix):
         return 0
 
+    async def publish(self, channel, message):
+        return False
+
+    async def subscribe(self, channel, retry_interval=5):
+        return
+        yield
+
 
 _cache = None
 _noop = _NoOpCache()
@@ -166,3 +214,46 @@ def get_cache():
             default_ttl=int(cfg.get("cache.ttl.default", 300)),
         )
     return _cache
+
+
+_sync_client = None
+
+
+def get_sync_client():
+    """Return the process-wide blocking ``redis.Redis`` client, or None when
+    ``cache.enabled`` is false.
+
+    Uses the same ``redis:`` config block as :func:`get_cache`. Callers handle
+    errors themselves (see ``ValkeyCacheBackend``).
+    """
+    global _sync_client
+    from baselayer.app.env import load_env
+
+    _, cfg = load_env()
+    if not cfg.get("cache.enabled", False):
+        return None
+    if _sync_client is None:
+        import redis  # lazy: optional dependency
+
+        host = cfg.get("redis.host", "localhost")
+        port = int(cfg.get("redis.port", 6379))
+        db = int(cfg.get("redis.db", 0) or 0)
+        _sync_client = redis.from_url(
+            f"redis://{host}:{port}/{db}",
+            socket_timeout=2,
+            socket_connect_timeout=2,
+        )
+    return _sync_client
+
+
+def get_async_client():
+    """Return the process-wide ``redis.asyncio`` client, or None when
+    ``cache.enabled`` is false.
+
+    This is the client behind :func:`get_cache`, for callers that handle
+    errors themselves (see ``ValkeyCacheBackend``).
+    """
+    cache = get_cache()
+    if cache is _noop:
+        return None
+    return cache._connect()
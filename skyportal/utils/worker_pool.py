@@ -0,0 +1,147 @@
+"""Bounded thread pool for slow, keyed background jobs.
+
+Used by the GCN service to download and process skymaps without holding up
+the ingestion of the notices that follow: jobs run on at most ``max_workers``
+threads, at most ``max_pending`` jobs are queued or running at once (further
+submissions wait, so a burst cannot grow the queue without bound), and
+:meth:`DedupWorkerPool.claim` lets a job skip work another one has done for
+the same key, such as the same skymap URL. :class:`OffsetTracker` gives the
+Kafka offsets that are safe to commit while such jobs finish out of order.
+"""
+
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from baselayer.log import make_log
+
+log = make_log("worker_pool")
+
+
+class DedupWorkerPool:
+    """Thread pool running at most one job per key at a time.
+
+    Parameters
+    ----------
+    max_workers : int
+        Number of threads running jobs.
+    max_pending : int
+        Number of jobs queued or running beyond which :meth:`submit` blocks.
+    name : str
+        Prefix of the thread names, for the logs.
+    """
+
+    def __init__(self, max_workers, max_pending, name="worker"):
+        self.name = name
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=name
+        )
+        self._slots = threading.BoundedSemaphore(max(max_pending, max_workers))
+        self._lock = threading.Lock()
+        # key -> (event set when its job is done, [whether it succeeded])
+        self._in_flight = {}
+
+    def submit(self, fn, *args, **kwargs):
+        """Run ``fn(*args, **kwargs)`` on the pool, waiting for a free slot if
+        the pool is full. Exceptions raised by ``fn`` are logged.
+
+        Returns
+        -------
+        concurrent.futures.Future
+        """
+        if not self._slots.acquire(blocking=False):
+            log(f"{self.name} pool is full, waiting for a job to finish")
+            self._slots.acquire()
+
+        def run():
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                traceback.print_exc()
+                log(f"{self.name} job {fn.__name__} failed: {e}")
+                raise
+            finally:
+                self._slots.release()
+
+        try:
+            return self._executor.submit(run)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    @contextmanager
+    def claim(self, key):
+        """Context manager yielding whether the caller should do the work for
+        ``key``.
+
+        If another job holds ``key``, waits for it to finish: yields False if
+        it succeeded, and otherwise claims ``key`` in turn, so a failed job is
+        retried by the next one. A claim fails when its ``with`` block raises,
+        and is released on exit.
+        """
+        while True:
+            with self._lock:
+                holder = self._in_flight.get(key)
+                if holder is None:
+                    done, succeeded = self._in_flight[key] = (threading.Event(), [])
+                    break
+            holder[0].wait()
+            if holder[1]:
+                yield False
+                return
+        try:
+            yield True
+            succeeded.append(True)
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            done.set()
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+class OffsetTracker:
+    """Commits the offsets of Kafka messages whose processing finishes out of
+    order.
+
+    Messages are :meth:`start`-ed in the order they are consumed and
+    :meth:`finish`-ed when their processing is done. Per (topic, partition),
+    ``commit(key, offset)`` is then called with the offset of the oldest
+    unfinished message (or the one after the last message), so a restart
+    resumes from the first message that was not fully processed.
+
+    Parameters
+    ----------
+    commit : callable
+        ``commit((topic, partition), offset)``; called under a lock, so
+        commits are made in offset order.
+    """
+
+    def __init__(self, commit):
+        self._commit = commit
+        self._lock = threading.Lock()
+        # (topic, partition) -> {offset: finished}, in consumption order
+        self._pending = {}
+
+    def start(self, key, offset):
+        with self._lock:
+            self._pending.setdefault(key, {})[offset] = False
+
+    def finish(self, key, offset):
+        with self._lock:
+            pending = self._pending[key]
+            pending[offset] = True
+            position = None
+            for first, finished in list(pending.items()):
+                if not finished:
+                    break
+                del pending[first]
+                position = first + 1
+            if position is not None:
+                self._commit(key, position)
+
+    def finish_when_done(self, future, key, offset):
+        """:meth:`finish` the message once ``future`` is done."""
+        future.add_done_callback(lambda _: self.finish(key, offset))